@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.core.db import get_db
 from app.core.security import decode_token
+from app.core.auth_cache import auth_cache, token_id
 from app.models.user import User
 from uuid import UUID
 from typing import Dict, Any, List
@@ -46,10 +47,15 @@ def get_current_user(
             detail="Invalid user ID format"
         )
     
-    # Fetch user from database
-    user = db.execute(
-        select(User).where(User.id == user_uuid)
-    ).scalar_one_or_none()
+    # Fetch user from the auth cache, falling back to the database
+    tid = token_id(claims, token)
+    user = auth_cache.get_user(db, user_id_str, tid)
+    if user is None:
+        user = db.execute(
+            select(User).where(User.id == user_uuid)
+        ).scalar_one_or_none()
+        if user and user.is_active:
+            auth_cache.put_user(user, tid)
     
     if not user:
         raise HTTPException(
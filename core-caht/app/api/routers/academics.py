@@ -0,0 +1,86 @@
+# app/api/routers/academics.py - Term rollover and bulk term enrollment as background jobs
+import uuid
+from typing import Optional, List, Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+from app.api.deps.auth import get_current_user
+from app.api.deps.tenancy import require_school
+from app.api.routers.chat.blocks import job_status_block
+from app.core.executor import run_blocking
+from app.services.academics import start_term_advance, start_bulk_term_enrollment
+
+router = APIRouter(prefix="/academics", tags=["Academics"])
+
+
+class AdvanceTermRequest(BaseModel):
+    force: bool = False
+    promotion_rules: Optional[Dict[str, Optional[str]]] = None  # from_class_id -> to_class_id (None graduates)
+    generate_invoices: bool = False
+
+
+class EnrollmentMapping(BaseModel):
+    student_id: str
+    class_id: str
+
+
+class BulkTermEnrollmentRequest(BaseModel):
+    enrollment_mappings: List[EnrollmentMapping]
+    auto_generate_invoices: bool = True
+
+
+def _require_uuids(*values: Optional[str], detail: str):
+    try:
+        [uuid.UUID(value) for value in values if value is not None]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=detail)
+
+
+def _job_response(job: Dict, label: str, unit: str) -> Dict:
+    return {
+        "job": job,
+        "status_endpoint": f"/api/jobs/{job['id']}",
+        "blocks": [job_status_block(job, label, unit)]
+    }
+
+
+@router.post("/terms/advance", status_code=202)
+async def advance_term(
+    request: AdvanceTermRequest,
+    school_id: str = Depends(require_school),
+    ctx = Depends(get_current_user)
+):
+    """Start the rollover from the active term to the next one (background job)"""
+    rules = request.promotion_rules or {}
+    _require_uuids(*rules.keys(), *rules.values(), detail="promotion_rules must map class UUIDs")
+
+    job = await run_blocking(
+        start_term_advance, school_id, str(ctx["user"].id),
+        request.force, request.promotion_rules, request.generate_invoices
+    )
+    return _job_response(job, "Term rollover", "students")
+
+
+@router.post("/terms/{term_id}/enrollments", status_code=202)
+async def bulk_enroll_for_term(
+    term_id: str,
+    request: BulkTermEnrollmentRequest,
+    school_id: str = Depends(require_school),
+    ctx = Depends(get_current_user)
+):
+    """Start enrolling students into classes for a term (background job)"""
+    if not request.enrollment_mappings:
+        raise HTTPException(status_code=400, detail="enrollment_mappings must not be empty")
+    _require_uuids(term_id, detail="term_id must be a UUID")
+    _require_uuids(
+        *[m.student_id for m in request.enrollment_mappings],
+        *[m.class_id for m in request.enrollment_mappings],
+        detail="student_id and class_id must be UUIDs"
+    )
+
+    job = await run_blocking(
+        start_bulk_term_enrollment, school_id, str(ctx["user"].id), term_id,
+        [m.model_dump() for m in request.enrollment_mappings], request.auto_generate_invoices
+    )
+    return _job_response(job, "Term enrollment", "students")
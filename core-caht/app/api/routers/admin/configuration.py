@@ -16,6 +16,7 @@ from app.models.intent_config import (
     ConfigStatus, PatternKind, TemplateType
 )
 from app.services.config_router import ConfigRouter
+from app.services.config_events import publish_config_change
 from .intent_config.shared import (
     VersionResponse, PatternResponse, TemplateResponse, safe_enum_value
 )
@@ -310,8 +311,8 @@ def reload_cache(
     """Force reload of configuration cache"""
     try:
         config_router = ConfigRouter(db)
-        config_router.reload_config()
-        stats = config_router.get_cache_stats()
+        publish_config_change(db, config_router.active_version_id, "manual_reload")
+        stats = ConfigRouter(db).get_cache_stats()
         return {
             "message": "Configuration cache reloaded successfully",
             "cache_stats": stats
@@ -13,7 +13,7 @@ from app.api.deps.auth import require_admin
 from app.models.intent_config import (
     IntentConfigVersion, IntentPattern, PatternKind, ConfigStatus
 )
-from app.services.config_router import ConfigRouter
+from app.services.config_events import publish_config_change
 from .shared import (
     PatternResponse, CreatePatternRequest, UpdatePatternRequest, safe_enum_value
 )
@@ -206,8 +206,7 @@ async def create_pattern(
         
         # Reload config if this is the active version
         if version.status == ConfigStatus.ACTIVE:
-            config_router = ConfigRouter(db)
-            config_router.reload_config()
+            publish_config_change(db, version.id, "pattern_created")
         
         return EnhancedPatternResponse(
             id=pattern.id,
@@ -324,8 +323,7 @@ async def update_pattern(
         
         # Reload config if this is the active version
         if version.status == ConfigStatus.ACTIVE:
-            config_router = ConfigRouter(db)
-            config_router.reload_config()
+            publish_config_change(db, version.id, "pattern_updated")
         
         return EnhancedPatternResponse(
             id=pattern.id,
@@ -375,8 +373,7 @@ def delete_pattern(
         
         # Reload config if this is the active version
         if version.status == ConfigStatus.ACTIVE:
-            config_router = ConfigRouter(db)
-            config_router.reload_config()
+            publish_config_change(db, version.id, "pattern_disabled")
         
         return {"message": "Pattern disabled"}
         
@@ -411,8 +408,7 @@ def enable_pattern(
         
         # Reload config if this is the active version
         if version.status == ConfigStatus.ACTIVE:
-            config_router = ConfigRouter(db)
-            config_router.reload_config()
+            publish_config_change(db, version.id, "pattern_enabled")
         
         return {"message": "Pattern enabled"}
         
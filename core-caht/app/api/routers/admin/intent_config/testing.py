@@ -7,7 +7,11 @@ from sqlalchemy.orm import Session
 from app.core.db import get_db
 from app.api.deps.auth import require_admin
 from app.services.config_router import ConfigRouter
+from app.services.config_events import publish_config_change
 from app.services.intent_classifier import IntentClassifier
+from app.services.classification_cache import get_classification_cache
+from app.services.routing_telemetry import get_routing_log_sink
+from app.services.conversation_state import get_conversation_state_cache
 from .shared import TestClassifyRequest, TestClassifyResponse
 
 router = APIRouter()
@@ -132,8 +136,8 @@ def reload_config(
     """Force reload of active configuration cache"""
     try:
         config_router = ConfigRouter(db)
-        config_router.reload_config()
-        stats = config_router.get_cache_stats()
+        publish_config_change(db, config_router.active_version_id, "manual_reload")
+        stats = ConfigRouter(db).get_cache_stats()
         return {
             "message": "Configuration cache reloaded",
             "cache_stats": stats
@@ -150,6 +154,9 @@ def get_cache_stats(
     try:
         config_router = ConfigRouter(db)
         stats = config_router.get_cache_stats()
+        stats["classification_cache"] = get_classification_cache().get_stats()
+        stats["routing_log_sink"] = get_routing_log_sink().get_stats()
+        stats["conversation_state_cache"] = get_conversation_state_cache().get_stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get cache stats: {str(e)}")
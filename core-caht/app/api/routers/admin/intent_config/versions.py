@@ -13,7 +13,7 @@ from app.models.intent_config import (
     IntentConfigVersion, IntentPattern, PromptTemplate,
     ConfigStatus
 )
-from app.services.config_router import ConfigRouter
+from app.services.config_events import publish_config_change
 from .shared import (
     VersionResponse, CreateVersionRequest, safe_enum_value
 )
@@ -179,9 +179,8 @@ def promote_version(
         
         db.commit()
         
-        # Force reload of configuration cache
-        config_router = ConfigRouter(db)
-        config_router.reload_config()
+        # Reload configuration cache in every worker
+        publish_config_change(db, version.id, "version_promoted")
         
         return {"message": f"Version '{version.name}' promoted to active"}
         
@@ -9,6 +9,7 @@ import uuid
 from pydantic import BaseModel, EmailStr
 
 from app.core.db import get_db
+from app.core.auth_cache import auth_cache
 from app.models.user import User, UserRole
 from app.models.school import SchoolMember
 from app.core.security import hash_password
@@ -353,6 +354,7 @@ def update_user(
         user.updated_at = datetime.utcnow()
         
         db.commit()
+        auth_cache.invalidate_user(user.id)
         db.refresh(user)
         
         # Get school count for response
@@ -416,6 +418,7 @@ def update_user_roles(
     try:
         user.set_roles(request.roles)
         db.commit()
+        auth_cache.invalidate_user(user.id)
         db.refresh(user)
         
         # Get school count for response
@@ -469,6 +472,7 @@ def deactivate_user(
         user.is_active = False
         user.updated_at = datetime.utcnow()
         db.commit()
+        auth_cache.invalidate_user(user.id)
         
         return {"message": f"User {user.email} has been deactivated"}
         
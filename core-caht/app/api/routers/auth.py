@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import select, delete, update
 from app.core.db import get_db
+from app.core.auth_cache import auth_cache
 from app.core.security import hash_password, verify_password, create_token
 from app.schemas.auth import (
     RegisterIn, LoginIn, LoginOut, SwitchSchoolIn, TokenOut,
@@ -160,6 +161,9 @@ def switch_school(
     if not is_member:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this school")
 
+    # Re-read membership/role for the new school on the next request
+    auth_cache.invalidate_user(user.id)
+
     roles = user.roles  # Get roles from user model
     token = create_token(
         sub=str(user.id),  # Convert UUID to string
@@ -305,6 +309,7 @@ def reset_password(data: ResetPasswordIn, request: Request, db: Session = Depend
     # Update user password
     user.password_hash = hash_password(data.password)
     user.updated_at = datetime.utcnow()
+    auth_cache.invalidate_user(user.id)
     
     # Mark token as used
     reset_token.mark_used(client_ip)
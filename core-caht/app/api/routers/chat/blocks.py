@@ -220,6 +220,34 @@ def status_item(label: str, state: str, detail: Optional[str] = None) -> Dict[st
         item["detail"] = detail
     return item
 
+def job_status_block(job: Dict[str, Any], label: str, unit: str = "items") -> Dict[str, Any]:
+    """Status block for a background job; carries a poll hint until the job finishes"""
+    job_state = {
+        "queued": "pending",
+        "running": "pending",
+        "succeeded": "success",
+        "failed": "failed"
+    }.get(job["status"], "unknown")
+
+    if job.get("total"):
+        detail = f"{job['done']} of {job['total']} {unit}"
+    else:
+        detail = job["status"].title()
+    if job.get("message"):
+        detail += f" - {job['message']}"
+
+    items = [
+        status_item(label, job_state, detail),
+        status_item("Job ID", job_state, job["id"])
+    ]
+    if job.get("error") and job["status"] == "failed":
+        items.append(status_item("Error", "failed", job["error"]))
+
+    block = status_block(items)
+    if job["status"] in ("queued", "running"):
+        block["poll"] = {"endpoint": f"/api/jobs/{job['id']}", "intervalMs": 2000}
+    return block
+
 def empty_state(title: str, hint: Optional[str] = None) -> Dict[str, Any]:
     """Create an empty state block"""
     block = {
@@ -1,11 +1,11 @@
 # app/api/routers/chat/deps.py
 from fastapi import Depends, Header, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 import jwt
 from jwt.exceptions import InvalidTokenError
 
 from app.core.db import get_db, set_rls_context
+from app.core.auth_cache import auth_cache, token_id
 
 def verify_auth_and_get_context(
     authorization: str = Header(...),
@@ -22,15 +22,7 @@ def verify_auth_and_get_context(
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        membership = db.execute(
-            text("""
-                SELECT sm.user_id, sm.school_id, sm.role, u.full_name
-                FROM schoolmember sm
-                JOIN users u ON sm.user_id = u.id
-                WHERE sm.user_id = :user_id AND sm.school_id = :school_id
-            """),
-            {"user_id": user_id, "school_id": x_school_id}
-        ).first()
+        membership = auth_cache.get_membership(db, user_id, x_school_id, token_id(payload, token))
 
         if not membership:
             raise HTTPException(status_code=403, detail="Access denied to this school")
@@ -40,8 +32,8 @@ def verify_auth_and_get_context(
         return {
             "user_id": user_id,
             "school_id": x_school_id,
-            "role": membership.role,
-            "full_name": membership.full_name
+            "role": membership["role"],
+            "full_name": membership["full_name"]
         }
     except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
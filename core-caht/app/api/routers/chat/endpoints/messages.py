@@ -5,8 +5,8 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.core.db import get_db
+from app.core.executor import run_blocking
 from app.services.chat_service import ChatService
-from app.models.chat import MessageType
 from app.schemas.chat import ChatMessage, ChatResponse, prepare_for_json_storage
 from ..deps import verify_auth_and_get_context
 from ..utils import serialize_blocks
@@ -30,36 +30,22 @@ async def chat_message(
             if action.get("type") == "query" and action.get("payload", {}).get("message"):
                 message.message = action["payload"]["message"]
 
-        # conversation
-        if message.conversation_id:
-            conversation = chat_service.get_conversation(message.conversation_id, ctx["user_id"], ctx["school_id"])
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-        else:
-            conversation = chat_service.create_conversation(ctx["user_id"], ctx["school_id"], message.message)
+        # conversation + stored context + recent messages in one query;
+        # nothing is written until the turn completes
+        turn = await run_blocking(chat_service.begin_turn, message.conversation_id, ctx["user_id"], ctx["school_id"], message.message)
+        if not turn:
+            raise HTTPException(status_code=404, detail="Conversation not found")
 
-        conversation_id = str(conversation.id)
-
-        # store user msg
-        user_message = chat_service.add_message(
-            conversation_id=conversation_id,
-            user_id=ctx["user_id"],
-            school_id=ctx["school_id"],
-            message_type=MessageType.USER,
-            content=message.message,
-            context_data=message.context
-        )
+        conversation_id = str(turn.conversation_id)
 
         # merge context with stored
         context = message.context or {}
-        if message.conversation_id or conversation.message_count > 0:
-            stored_context = chat_service.get_conversation_context(conversation_id, ctx["user_id"], ctx["school_id"])
-            if stored_context:
-                context = {**context, **stored_context}
+        if turn.context:
+            context = {**context, **turn.context}
 
         # process with updated processor (LLM + ConfigRouter architecture)
-        processor = IntentProcessor(db=db, user_id=ctx["user_id"], school_id=ctx["school_id"])
-        response = processor.process_message(message.message, context)
+        processor = await run_blocking(IntentProcessor, db=db, user_id=ctx["user_id"], school_id=ctx["school_id"])
+        response = await processor.process_message(message.message, context)
         
         processing_time = int((time.time() - start_time) * 1000)
 
@@ -68,23 +54,23 @@ async def chat_message(
         if getattr(response, "blocks", None):
             response_data["blocks"] = serialize_blocks(response.blocks)
 
-        # store assistant msg and get the created message object
-        assistant_message = chat_service.add_message(
-            conversation_id=conversation_id,
-            user_id=ctx["user_id"],
-            school_id=ctx["school_id"],
-            message_type=MessageType.ASSISTANT,
-            content=response.response,
+        # store user + assistant msgs and conversation counters in one statement
+        assistant_message_id = await run_blocking(
+            chat_service.complete_turn,
+            turn,
+            user_content=message.message,
+            assistant_content=response.response,
+            user_context=message.context,
             intent=response.intent,
             response_data=prepare_for_json_storage(response_data),
             processing_time_ms=processing_time
         )
 
-        db.commit()
+        await run_blocking(db.commit)
         
         # Set the conversation_id and message_id in the response
         response.conversation_id = conversation_id
-        response.message_id = str(assistant_message.id)  # Include the message ID for rating buttons
+        response.message_id = str(assistant_message_id)  # Include the message ID for rating buttons
         
         return response
 
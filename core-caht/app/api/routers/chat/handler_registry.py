@@ -0,0 +1,156 @@
+# app/api/routers/chat/handler_registry.py - Intent → handler map and lazy per-request handlers
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Type
+
+from .base import BaseHandler
+from .handlers.overview.handler import OverviewHandler
+from .handlers.academic.handler import AcademicHandler
+from .handlers.student.handler import StudentHandler
+from .handlers.classes.handler import ClassHandler
+from .handlers.enrollment.handler import EnrollmentHandler
+from .handlers.invoice.handler import InvoiceHandler
+from .handlers.fee.handler import FeeHandler
+from .handlers.payment.handler import PaymentHandler
+from .handlers.general.handler import GeneralHandler
+
+
+# Handler key → class; built on demand by HandlerRegistry
+HANDLER_CLASSES: Dict[str, Type[BaseHandler]] = {
+    "overview": OverviewHandler,
+    "academic": AcademicHandler,
+    "student": StudentHandler,
+    "class": ClassHandler,
+    "enrollment": EnrollmentHandler,
+    "invoice": InvoiceHandler,
+    "fee": FeeHandler,
+    "payment": PaymentHandler,
+    "general": GeneralHandler,
+}
+
+# Order legacy (can_handle) routing tries handlers in
+LEGACY_HANDLER_ORDER = (
+    "overview",
+    "academic",
+    "enrollment",
+    "invoice",
+    "payment",
+    "fee",
+    "student",
+    "class",
+    "general",
+)
+
+# Intent → Handler mapping - COMPLETE VERSION WITH ALL MIGRATED INTENTS
+INTENT_HANDLER_MAP: Dict[str, str] = {
+    # Student intents
+    "student_create": "student",
+    "student_search": "student",
+    "student_list": "student",
+    "student_details": "student",
+    "student_count": "student",
+    "unassigned_students": "student",
+
+    # Payment intents
+    "payment_record": "payment",
+    "payment_summary": "payment",
+    "payment_history": "payment",
+    "payment_pending": "payment",
+    "payment_status": "payment",
+
+    # Invoice intents
+    "invoice_generate_student": "invoice",
+    "invoice_generate_bulk": "invoice",
+    "invoice_pending": "invoice",
+    "invoice_show_student": "invoice",
+    "invoice_list": "invoice",
+    "invoice_overview": "invoice",
+
+    # Overview intents
+    "school_overview": "overview",
+    "dashboard": "overview",
+    "school_summary": "overview",
+
+    # General intents
+    "greeting": "general",
+    "casual_conversation": "general",
+    "school_registration": "general",
+    "getting_started": "general",
+    "system_capabilities": "general",
+    "help": "general",
+    "next_steps": "general",
+    "school_management": "general",
+    "system_introduction": "general",
+    "unknown": "general",
+
+    # Fee intents
+    "fee_structure": "fee",
+    "fee_overview": "fee",
+    "fee_grade_specific": "fee",
+    "fee_update": "fee",
+    "fee_items": "fee",
+    "fee_student_invoice": "fee",
+
+    # Class intents
+    "class_create": "class",
+    "grade_create": "class",
+    "class_details": "class",
+    "grade_list": "class",
+    "class_list": "class",
+    "class_count": "class",
+    "class_empty": "class",
+
+    # Enrollment intents
+    "enrollment_single": "enrollment",
+    "enrollment_bulk": "enrollment",
+    "enrollment_status": "enrollment",
+    "enrollment_list": "enrollment",
+
+    # Academic intents
+    "academic_current_term": "academic",
+    "academic_activate_term": "academic",
+    "academic_calendar": "academic",
+    "academic_setup": "academic",
+    "academic_overview": "academic",
+}
+
+ALLOWED_INTENTS: List[str] = list(INTENT_HANDLER_MAP.keys())
+
+
+class HandlerRegistry(Mapping):
+    """Read-only handler-key → handler mapping that builds each handler on first access.
+
+    A message is dispatched to one handler, so only that handler (and its
+    service/repo/views/flows) is constructed for the request.
+    """
+
+    def __init__(self, db, school_id: str, user_id: str):
+        self.db = db
+        self.school_id = school_id
+        self.user_id = user_id
+        self._built: Dict[str, BaseHandler] = {}
+
+    def __getitem__(self, key: str) -> BaseHandler:
+        handler = self._built.get(key)
+        if handler is None:
+            handler_class = HANDLER_CLASSES[key]
+            handler = handler_class(self.db, self.school_id, self.user_id)
+            self._built[key] = handler
+        return handler
+
+    def __contains__(self, key) -> bool:
+        return key in HANDLER_CLASSES
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(HANDLER_CLASSES)
+
+    def __len__(self) -> int:
+        return len(HANDLER_CLASSES)
+
+    def legacy_handlers(self) -> Iterator[BaseHandler]:
+        """Handlers in legacy routing order, built as the iteration reaches them"""
+        for key in LEGACY_HANDLER_ORDER:
+            yield self[key]
+
+    @property
+    def built_keys(self) -> List[str]:
+        return list(self._built)
@@ -1,9 +1,56 @@
 # app/api/routers/chat/handlers/flows/enrollment.py - Enrollment flow management
+import os
 import uuid
 import re
 from typing import Dict, List, Optional
 from datetime import datetime
 from ....base import ChatResponse, db_execute_safe, db_execute_non_select
+from ....blocks import text, job_status_block
+from app.services.jobs import enqueue_job
+from app.services.bulk_enrollment import BulkEnroller, FAILURE_MESSAGES
+from ..repo import EnrollmentRepo
+
+# Bulk enrollments of at least this many students run as a background job
+BULK_ENROLLMENT_BACKGROUND_THRESHOLD = int(os.getenv("BULK_ENROLLMENT_BACKGROUND_THRESHOLD", "500"))
+# Students written per INSERT statement (and per progress update in a job)
+BULK_ENROLLMENT_BATCH_SIZE = int(os.getenv("BULK_ENROLLMENT_BATCH_SIZE", "500"))
+
+
+def insert_bulk_enrollments(db, school_id: str, ready_students: list, term_id: str, on_progress=None):
+    """
+    Enroll the ready students in term_id with BulkEnroller, one statement per
+    BULK_ENROLLMENT_BATCH_SIZE students (status events included).
+    Returns (successful_enrollments, failed_enrollments) as used by the bulk views.
+    """
+    students_by_id = {str(student['id']): student for student in ready_students}
+    result = BulkEnroller(db, school_id).enroll(
+        term_id,
+        [{"student_id": student['id'], "class_id": student['class_id']} for student in ready_students],
+        reason="Bulk enrolled via chat",
+        batch_size=BULK_ENROLLMENT_BATCH_SIZE,
+        on_progress=on_progress
+    )
+    
+    def display_name(student_id):
+        student = students_by_id.get(student_id, {})
+        return f"{student.get('first_name', '')} {student.get('last_name', '')}".strip() or student_id
+    
+    successful_enrollments = [
+        {
+            "name": display_name(str(enrolled.student_id)),
+            "admission_no": students_by_id[str(enrolled.student_id)]['admission_no'],
+            "class": students_by_id[str(enrolled.student_id)].get('class_name', 'Unknown'),
+            "enrollment_id": str(enrolled.enrollment_id)
+        }
+        for enrolled in result.enrolled
+    ]
+    failed_enrollments = [
+        f"{display_name(student_id)} - {FAILURE_MESSAGES[reason]}"
+        for student_id, reason in result.failed.items()
+    ]
+    
+    return successful_enrollments, failed_enrollments
+
 
 class EnrollmentFlow:
     """Handles multi-step enrollment processes with context management"""
@@ -657,43 +704,15 @@ class EnrollmentFlow:
         """Execute bulk enrollment for multiple students"""
         try:
             term_id = term['id']
-            successful_enrollments = []
-            failed_enrollments = []
+            
+            if len(ready_students) >= BULK_ENROLLMENT_BACKGROUND_THRESHOLD:
+                return self._queue_bulk_enrollment(ready_students, term)
             
             response_text = f"Bulk Enrollment Progress - {term['title']}\n\n"
             
-            for student in ready_students:
-                try:
-                    student_id = student['id']
-                    class_id = student['class_id']
-                    enrollment_id = str(uuid.uuid4())
-                    
-                    # Create enrollment record
-                    affected_rows = db_execute_non_select(self.db,
-                        """INSERT INTO enrollments (id, school_id, student_id, class_id, term_id, status, created_at, updated_at)
-                           VALUES (:id, :school_id, :student_id, :class_id, :term_id, 'ENROLLED', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""",
-                        {
-                            "id": enrollment_id,
-                            "school_id": self.school_id,
-                            "student_id": student_id,
-                            "class_id": class_id,
-                            "term_id": term_id
-                        }
-                    )
-                    
-                    if affected_rows > 0:
-                        successful_enrollments.append({
-                            "name": f"{student['first_name']} {student['last_name']}",
-                            "admission_no": student['admission_no'],
-                            "class": student.get('class_name', 'Unknown'),
-                            "enrollment_id": enrollment_id
-                        })
-                    else:
-                        failed_enrollments.append(f"{student['first_name']} {student['last_name']} - No rows affected")
-                        
-                except Exception as e:
-                    failed_enrollments.append(f"{student['first_name']} {student['last_name']} - {str(e)}")
-                    continue
+            successful_enrollments, failed_enrollments = insert_bulk_enrollments(
+                self.db, self.school_id, ready_students, term_id
+            )
             
             if successful_enrollments:
                 # Commit successful enrollments
@@ -776,6 +795,46 @@ class EnrollmentFlow:
                 data={"context": {}}
             )
     
+    def _queue_bulk_enrollment(self, ready_students: list, term: dict) -> ChatResponse:
+        """Hand a large bulk enrollment to a background job and reply immediately"""
+        students = [
+            {
+                "id": student['id'],
+                "class_id": student['class_id'],
+                "first_name": student['first_name'],
+                "last_name": student['last_name'],
+                "admission_no": student['admission_no'],
+                "class_name": student.get('class_name', 'Unknown')
+            }
+            for student in ready_students
+        ]
+        job = enqueue_job(
+            "enrollment_bulk", self.school_id, self.user_id,
+            payload={"term_id": term['id'], "term_title": term['title'], "students": students},
+            total=len(students), idempotency_key=f"enrollment_bulk:{term['id']}"
+        )
+        
+        return ChatResponse(
+            response=f"Enrolling {len(students)} students in {term['title']} in the background",
+            intent="bulk_enrollment_queued",
+            data={
+                "term_id": term['id'],
+                "term_title": term['title'],
+                "job_id": job["id"],
+                "status_endpoint": f"/api/jobs/{job['id']}",
+                "context": {}  # Clear context - the job owns the enrollment now
+            },
+            blocks=[
+                text(f"**Bulk Enrollment Started ⏳**\n\nEnrolling {len(students)} students in {term['title']}. You can keep chatting while this runs."),
+                job_status_block(job, "Bulk enrollment", "students")
+            ],
+            suggestions=[
+                "Show enrollment status",
+                "Show class enrollments",
+                "Generate invoices for all students"
+            ]
+        )
+    
     # Helper methods
     def _extract_admission_number(self, message: str) -> Optional[str]:
         """Extract admission number from message"""
@@ -845,46 +904,7 @@ class EnrollmentFlow:
     def _find_students_by_name(self, name: str) -> List[dict]:
         """Find students by name (fuzzy matching)"""
         try:
-            # Split name for first/last matching
-            name_parts = name.split()
-            if len(name_parts) >= 2:
-                first_name = name_parts[0]
-                last_name = ' '.join(name_parts[1:])
-                
-                result = db_execute_safe(self.db,
-                    """SELECT s.id, s.first_name, s.last_name, s.admission_no, s.class_id,
-                              c.name as class_name, c.level
-                       FROM students s
-                       LEFT JOIN classes c ON s.class_id = c.id
-                       WHERE s.school_id = :school_id AND s.status = 'ACTIVE'
-                       AND (LOWER(s.first_name) LIKE :first_pattern 
-                            OR LOWER(s.last_name) LIKE :last_pattern
-                            OR LOWER(s.first_name || ' ' || s.last_name) LIKE :full_pattern)
-                       ORDER BY s.first_name, s.last_name
-                       LIMIT 10""",
-                    {
-                        "school_id": self.school_id,
-                        "first_pattern": f"%{first_name.lower()}%",
-                        "last_pattern": f"%{last_name.lower()}%", 
-                        "full_pattern": f"%{name.lower()}%"
-                    }
-                )
-            else:
-                # Single name - search both first and last
-                result = db_execute_safe(self.db,
-                    """SELECT s.id, s.first_name, s.last_name, s.admission_no, s.class_id,
-                              c.name as class_name, c.level
-                       FROM students s
-                       LEFT JOIN classes c ON s.class_id = c.id
-                       WHERE s.school_id = :school_id AND s.status = 'ACTIVE'
-                       AND (LOWER(s.first_name) LIKE :pattern OR LOWER(s.last_name) LIKE :pattern)
-                       ORDER BY s.first_name, s.last_name
-                       LIMIT 10""",
-                    {
-                        "school_id": self.school_id,
-                        "pattern": f"%{name.lower()}%"
-                    }
-                )
+            result = EnrollmentRepo(self.db, self.school_id).find_students_by_name(name)
             
             students = []
             for student in result:
@@ -1,5 +1,6 @@
 # handlers/enrollment/repo.py
 from ...base import db_execute_safe, db_execute_non_select
+from app.services.student_search import get_student_search, RANKED_IDS_JOIN
 import uuid
 from datetime import datetime
 
@@ -26,49 +27,24 @@ class EnrollmentRepo:
             "admission_no": admission_no
         })
     
-    def find_students_by_name(self, name):
-        """Find students by name (fuzzy matching)"""
-        name_parts = name.split()
-        
-        if len(name_parts) >= 2:
-            first_name = name_parts[0]
-            last_name = ' '.join(name_parts[1:])
-            
-            query = """
-                SELECT s.id, s.first_name, s.last_name, s.admission_no, s.class_id,
-                       c.name as class_name, c.level
-                FROM students s
-                LEFT JOIN classes c ON s.class_id = c.id
-                WHERE s.school_id = :school_id AND s.status = 'ACTIVE'
-                AND (LOWER(s.first_name) LIKE :first_pattern 
-                     OR LOWER(s.last_name) LIKE :last_pattern
-                     OR LOWER(s.first_name || ' ' || s.last_name) LIKE :full_pattern)
-                ORDER BY s.first_name, s.last_name
-                LIMIT 10
-            """
-            params = {
-                "school_id": self.school_id,
-                "first_pattern": f"%{first_name.lower()}%",
-                "last_pattern": f"%{last_name.lower()}%", 
-                "full_pattern": f"%{name.lower()}%"
-            }
-        else:
-            query = """
-                SELECT s.id, s.first_name, s.last_name, s.admission_no, s.class_id,
-                       c.name as class_name, c.level
-                FROM students s
-                LEFT JOIN classes c ON s.class_id = c.id
-                WHERE s.school_id = :school_id AND s.status = 'ACTIVE'
-                AND (LOWER(s.first_name) LIKE :pattern OR LOWER(s.last_name) LIKE :pattern)
-                ORDER BY s.first_name, s.last_name
-                LIMIT 10
-            """
-            params = {
-                "school_id": self.school_id,
-                "pattern": f"%{name.lower()}%"
-            }
-        
-        return db_execute_safe(self.db, query, params)
+    def find_students_by_name(self, name, limit=10):
+        """Find active students by name, best matches first (typo-tolerant)"""
+        ranked_ids = get_student_search(self.db, self.school_id).search_ids(name, limit=limit, status="ACTIVE")
+        if not ranked_ids:
+            return []
+        query = f"""
+            SELECT s.id, s.first_name, s.last_name, s.admission_no, s.class_id,
+                   c.name as class_name, c.level
+            FROM {RANKED_IDS_JOIN}
+            JOIN students s ON s.id = m.id
+            LEFT JOIN classes c ON s.class_id = c.id
+            WHERE s.school_id = :school_id
+            ORDER BY m.rank
+        """
+        return db_execute_safe(self.db, query, {
+            "school_id": self.school_id,
+            "ranked_ids": ranked_ids
+        })
     
     def get_active_term(self):
         """Get active academic term"""
@@ -148,7 +148,7 @@ class FeeRepo:
             SELECT i.id, i.total, i.status, i.created_at, i.due_date, i.term, i.year,
                    s.first_name, s.last_name, s.admission_no,
                    c.name as class_name, c.level as class_level,
-                   COALESCE(p.paid, 0) as paid_amount,
+                   i.amount_paid as paid_amount,
                    t.title as term_title
             FROM invoices i
             JOIN students s ON i.student_id = s.id
@@ -156,11 +156,6 @@ class FeeRepo:
             LEFT JOIN academic_terms t ON i.term = t.term AND i.year = (
                 SELECT year FROM academic_years WHERE id = t.year_id LIMIT 1
             )
-            LEFT JOIN (
-                SELECT invoice_id, SUM(amount) as paid
-                FROM payments
-                GROUP BY invoice_id
-            ) p ON i.id = p.invoice_id
             WHERE i.school_id = :school_id AND s.admission_no = :admission_no
         """
         
@@ -8,7 +8,7 @@ class InvoiceHandler(BaseHandler):
     
     def __init__(self, db, school_id: str, user_id: str):
         super().__init__(db, school_id, user_id)
-        self.service = InvoiceService(db, school_id, self.get_school_name)
+        self.service = InvoiceService(db, school_id, self.get_school_name, self.user_id)
     
     def handle_intent(self, intent: str, message: str, entities: Dict, context: Dict) -> ChatResponse:
         """
@@ -15,18 +15,13 @@ class InvoiceRepo:
         return db_execute_safe(self.db,
             """SELECT i.id, s.first_name, s.last_name, s.admission_no,
                       c.name as class_name, c.level as class_level, i.total, i.due_date, i.created_at,
-                      COALESCE(p.paid, 0) as paid_amount, i.status
+                      i.amount_paid as paid_amount, i.status
                FROM invoices i
                JOIN students s ON i.student_id = s.id
                JOIN classes c ON s.class_id = c.id
-               LEFT JOIN (
-                   SELECT invoice_id, SUM(amount) as paid
-                   FROM payments
-                   GROUP BY invoice_id
-               ) p ON i.id = p.invoice_id
                WHERE i.school_id = :school_id
                AND i.status IN ('ISSUED', 'PARTIAL')
-               AND (i.total - COALESCE(p.paid, 0)) > 0
+               AND i.total > i.amount_paid
                ORDER BY i.due_date ASC, s.first_name, s.last_name""",
             {"school_id": self.school_id}
         )
@@ -37,17 +32,12 @@ class InvoiceRepo:
             """SELECT i.id, i.total, i.status, i.created_at, i.due_date, i.term, i.year,
                       s.first_name, s.last_name, s.admission_no,
                       c.name as class_name, c.level as class_level,
-                      COALESCE(p.paid, 0) as paid_amount,
+                      i.amount_paid as paid_amount,
                       t.title as term_title
                FROM invoices i
                JOIN students s ON i.student_id = s.id
                JOIN classes c ON s.class_id = c.id
                JOIN academic_terms t ON i.term = t.term AND i.year = (SELECT year FROM academic_years WHERE id = t.year_id)
-               LEFT JOIN (
-                   SELECT invoice_id, SUM(amount) as paid
-                   FROM payments
-                   GROUP BY invoice_id
-               ) p ON i.id = p.invoice_id
                WHERE i.school_id = :school_id AND s.admission_no = :admission_no
                ORDER BY i.created_at DESC
                LIMIT 1""",
@@ -67,11 +57,11 @@ class InvoiceRepo:
     def get_invoice_payments(self, invoice_id):
         """Get payment history for an invoice"""
         return db_execute_safe(self.db,
-            """SELECT amount, created_at, payment_method, reference_no
+            """SELECT amount, created_at, method AS payment_method, txn_ref AS reference_no
                FROM payments
-               WHERE invoice_id = :invoice_id
+               WHERE school_id = :school_id AND invoice_id = :invoice_id
                ORDER BY created_at DESC""",
-            {"invoice_id": invoice_id}
+            {"school_id": self.school_id, "invoice_id": invoice_id}
         )
     
     def get_invoice_statistics(self):
@@ -83,16 +73,11 @@ class InvoiceRepo:
                 COUNT(*) FILTER (WHERE i.status = 'PARTIAL') as partial,
                 COUNT(*) FILTER (WHERE i.status = 'PAID') as paid,
                 COALESCE(SUM(i.total), 0) as total_value,
-                COALESCE(SUM(p.paid), 0) as total_paid,
+                COALESCE(SUM(i.amount_paid), 0) as total_paid,
                 COUNT(*) FILTER (WHERE i.due_date < CURRENT_DATE AND i.status IN ('ISSUED', 'PARTIAL')) as overdue
             FROM invoices i
             JOIN students s ON i.student_id = s.id
             JOIN classes c ON s.class_id = c.id
-            LEFT JOIN (
-                SELECT invoice_id, SUM(amount) as paid
-                FROM payments
-                GROUP BY invoice_id
-            ) p ON i.id = p.invoice_id
             WHERE i.school_id = :school_id
             AND EXISTS (
                 SELECT 1 FROM fee_structures fs
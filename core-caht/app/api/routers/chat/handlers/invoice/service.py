@@ -1,4 +1,5 @@
 # handlers/invoice/service.py
+import os
 import uuid
 from decimal import Decimal
 from datetime import date, timedelta
@@ -10,15 +11,24 @@ from .dataclasses import (
     row_to_payment_record, stats_row_to_dataclass, row_to_student_for_invoice
 )
 from ..shared.parsing import extract_admission_number
+from app.services.invoice_builder import InvoiceBuilder, BulkInvoiceResult, PlannedInvoice
+from app.services.jobs import enqueue_job
+from app.services.balance_ledger import get_balance_ledger
+
+# Bulk generation for at least this many students runs as a background job
+BULK_INVOICE_BACKGROUND_THRESHOLD = int(os.getenv("BULK_INVOICE_BACKGROUND_THRESHOLD", "1000"))
+# Invoices per INSERT statement inside a background job (one progress step each)
+BULK_INVOICE_BATCH_SIZE = int(os.getenv("BULK_INVOICE_BATCH_SIZE", "500"))
 
 class InvoiceService:
     """Business logic layer for invoice operations"""
     
-    def __init__(self, db, school_id, get_school_name):
+    def __init__(self, db, school_id, get_school_name, user_id=None):
         self.repo = InvoiceRepo(db, school_id)
         self.views = InvoiceViews(get_school_name)
         self.db = db
         self.school_id = school_id
+        self.user_id = user_id
     
     def show_pending_invoices(self):
         """Show all pending invoices"""
@@ -116,38 +126,24 @@ class InvoiceService:
                     suggestions=["Show pending invoices", "Show invoice summary", "Record payments"]
                 )
             
+            if len(students_rows) >= BULK_INVOICE_BACKGROUND_THRESHOLD:
+                # Large school: reply now, a job worker generates the invoices
+                job = enqueue_job(
+                    "invoice_generate_bulk", self.school_id, self.user_id,
+                    total=len(students_rows), idempotency_key="invoice_generate_bulk"
+                )
+                return self.views.bulk_generation_queued(job, len(students_rows))
+            
             students = [row_to_student_for_invoice(row) for row in students_rows]
+            generated_invoices, failed_invoices = self._run_bulk_generation(
+                self.repo, InvoiceBuilder(self.db, self.school_id), students
+            )
             
-            successful_invoices = 0
-            failed_invoices = []
-            generated_invoices = []
-            
-            for student in students:
-                try:
-                    result = self._generate_single_invoice(student)
-                    
-                    if result["success"]:
-                        successful_invoices += 1
-                        student_name = f"{student.first_name} {student.last_name}"
-                        generated_invoices.append({
-                            "name": student_name,
-                            "admission_no": student.admission_no,
-                            "class_name": student.class_name,
-                            "amount": result["amount"],
-                            "invoice_id": result["invoice_id"]
-                        })
-                    else:
-                        failed_invoices.append(f"{student.first_name} {student.last_name} - {result['error']}")
-                        
-                except Exception as e:
-                    failed_invoices.append(f"{student.first_name} {student.last_name} - {str(e)}")
-                    continue
-            
-            if successful_invoices > 0:
+            if generated_invoices:
                 self.db.commit()
                 total_value = sum(inv["amount"] for inv in generated_invoices)
                 return self.views.bulk_generation_success(
-                    successful_invoices, len(students), failed_invoices, generated_invoices, total_value
+                    len(generated_invoices), len(students), failed_invoices, generated_invoices, total_value
                 )
             else:
                 self.db.rollback()
@@ -161,6 +157,94 @@ class InvoiceService:
             self.db.rollback()
             return self.views.error("bulk invoice generation", str(e))
     
+    def run_bulk_invoice_job(self, job):
+        """Background job body (job kind invoice_generate_bulk): generate with progress reporting"""
+        students = [row_to_student_for_invoice(row) for row in self.repo.get_students_needing_invoices()]
+        job.progress(0, total=len(students), message="Planning invoices", force=True)
+        
+        generated_invoices, failed_invoices = self._run_bulk_generation(
+            self.repo, InvoiceBuilder(self.db, self.school_id), students,
+            batch_size=BULK_INVOICE_BATCH_SIZE,
+            on_progress=lambda done: job.progress(done, message="Writing invoices")
+        )
+        
+        return {
+            "successful_count": len(generated_invoices),
+            "failed_count": len(failed_invoices),
+            "total_value": sum(inv["amount"] for inv in generated_invoices),
+            "failed_invoices": failed_invoices[:50]
+        }
+    
+    def _run_bulk_generation(self, repo, builder, students, batch_size=None, on_progress=None):
+        """
+        Resolve fee lines once per (class level, term, year), then write every
+        invoice and its lines with InvoiceBuilder in batched statements.
+        Returns (generated_invoices, failed_invoices) for the bulk views.
+        """
+        lines_by_level = {}
+        results = {}
+        students_by_id = {}
+        failed_invoices = []
+        
+        for student in students:
+            if student.id in students_by_id:
+                continue  # enrolled twice in active terms; one invoice per term
+            students_by_id[student.id] = student
+            
+            key = (student.class_level, student.term_number, student.academic_year)
+            if key not in lines_by_level:
+                fee_rows = repo.get_fee_structure_for_student(*key)
+                lines = [(fee[2], Decimal(str(fee[3]))) for fee in fee_rows]
+                lines_by_level[key] = (fee_rows[0][0] if fee_rows else None, lines)
+            
+            structure_id, lines = lines_by_level[key]
+            total_amount = sum((amount for _, amount in lines), Decimal('0.00'))
+            if structure_id is None:
+                failed_invoices.append(f"{student.first_name} {student.last_name} - No active fee structure found")
+                continue
+            if total_amount <= 0:
+                failed_invoices.append(f"{student.first_name} {student.last_name} - Zero amount fees")
+                continue
+            
+            result = results.get((student.term_number, student.academic_year))
+            if result is None:
+                result = BulkInvoiceResult(term=student.term_number, year=student.academic_year, dry_run=False)
+                results[(student.term_number, student.academic_year)] = result
+            result.planned.append(PlannedInvoice(
+                invoice_id=uuid.uuid4(),
+                student_id=uuid.UUID(student.id),
+                class_id=uuid.UUID(student.class_id),
+                fee_structure_id=structure_id,
+                lines=lines,
+                total=total_amount
+            ))
+        
+        generated_invoices = []
+        written = 0
+        for result in results.values():
+            offset = written
+            builder.write(
+                result, due_date=date.today() + timedelta(days=30), batch_size=batch_size,
+                on_progress=(lambda done: on_progress(offset + done)) if on_progress else None
+            )
+            written += len(result.planned)
+            
+            for student_id in result.skipped:
+                student = students_by_id[student_id]
+                failed_invoices.append(f"{student.first_name} {student.last_name} - Invoice already exists")
+            
+            for plan in result.planned:
+                student = students_by_id[str(plan.student_id)]
+                generated_invoices.append({
+                    "name": f"{student.first_name} {student.last_name}",
+                    "admission_no": student.admission_no,
+                    "class_name": student.class_name,
+                    "amount": float(plan.total),
+                    "invoice_id": str(plan.invoice_id)
+                })
+        
+        return generated_invoices, failed_invoices
+    
     def _handle_existing_invoice(self, student, existing_invoice):
         """Handle case when invoice already exists"""
         student_name = f"{student.first_name} {student.last_name}"
@@ -236,6 +320,8 @@ class InvoiceService:
                 line_id = str(uuid.uuid4())
                 self.repo.create_invoice_line_item(line_id, invoice_id, line['item_name'], line['amount'])
             
+            get_balance_ledger(self.db, self.school_id).refresh_students([student.id])
+            
             # Commit changes
             self.db.commit()
             
@@ -258,42 +344,3 @@ class InvoiceService:
         except Exception as e:
             self.db.rollback()
             return self.views.error("generating invoice", str(e))
-    
-    def _generate_single_invoice(self, student):
-        """Generate single invoice for bulk processing"""
-        try:
-            # Get fee structure
-            fee_structure_rows = self.repo.get_fee_structure_for_student(
-                student.class_level, student.term_number, student.academic_year
-            )
-            
-            if not fee_structure_rows:
-                return {"success": False, "error": "No active fee structure found"}
-            
-            # Calculate total
-            total_amount = sum(Decimal(str(fee[3])) for fee in fee_structure_rows)
-            
-            if total_amount <= 0:
-                return {"success": False, "error": "Zero amount fees"}
-            
-            # Create invoice
-            invoice_id = str(uuid.uuid4())
-            due_date = date.today() + timedelta(days=30)
-            
-            self.repo.create_invoice(
-                invoice_id, student.id, student.term_number, student.academic_year, total_amount, due_date
-            )
-            
-            # Create line items
-            for fee in fee_structure_rows:
-                line_id = str(uuid.uuid4())
-                self.repo.create_invoice_line_item(line_id, invoice_id, fee[2], str(fee[3]))
-            
-            return {
-                "success": True,
-                "invoice_id": invoice_id,
-                "amount": float(total_amount)
-            }
-            
-        except Exception as e:
-            return {"success": False, "error": str(e)}
\ No newline at end of file
@@ -4,7 +4,7 @@ from decimal import Decimal
 from ...blocks import (
     text, kpis, count_kpi, currency_kpi, table, status_column, action_row, 
     chart_xy, empty_state, error_block, timeline, timeline_item, button_group, 
-    button_item, status_block, status_item
+    button_item, status_block, status_item, job_status_block
 )
 from ...base import ChatResponse
 from .dataclasses import InvoiceRow, StudentInvoiceDetail, InvoiceLineItem, PaymentRecord, InvoiceStatistics
@@ -635,6 +635,33 @@ class InvoiceViews:
             suggestions=["Show pending invoices", "Record payments", "Send notifications", "Invoice summary"]
         )
     
+    def bulk_generation_queued(self, job: dict, student_count: int):
+        """Bulk invoice generation handed to a background job"""
+        blocks = []
+
+        blocks.append(text(f"**Bulk Generation Started ⏳**\n\nGenerating invoices for {student_count} students in the background. You can keep chatting while this runs."))
+
+        blocks.append(job_status_block(job, "Invoice generation", "students"))
+
+        action_buttons = [
+            button_item("Show Pending Invoices", "query", {"message": "show pending invoices"}, "primary", "md", "list"),
+            button_item("Invoice Summary", "query", {"message": "show invoice summary"}, "outline", "md", "file-text")
+        ]
+        blocks.append(button_group(action_buttons, "horizontal", "center"))
+
+        return ChatResponse(
+            response=f"Generating invoices for {student_count} students in the background",
+            intent="bulk_invoice_generation_queued",
+            data={
+                "job_id": job["id"],
+                "job_status": job["status"],
+                "status_endpoint": f"/api/jobs/{job['id']}",
+                "student_count": student_count
+            },
+            blocks=blocks,
+            suggestions=["Show pending invoices", "Show invoice summary", "Record payments"]
+        )
+
     def student_not_found(self, identifier: str):
         """Student not found response"""
         return ChatResponse(
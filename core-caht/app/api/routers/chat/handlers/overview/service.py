@@ -28,32 +28,37 @@ class OverviewService:
             return self.views.error("getting school overview", str(e))
     
     def _compile_overview_data(self) -> OverviewData:
-        """Compile all overview data from repositories"""
-        # Get basic statistics
-        student_stats = create_student_stats(self.repo.get_student_statistics())
-        class_stats = create_class_stats(self.repo.get_class_statistics())
-        academic_stats = create_academic_stats(self.repo.get_academic_statistics())
+        """Compile all overview data from the school's dashboard snapshot"""
+        snapshot = self.repo.get_snapshot()
         
-        # Get current term enrollment
-        student_stats.enrolled_current_term = self.repo.get_current_term_enrollment()
+        # Get basic statistics
+        student_stats = create_student_stats((
+            snapshot["students_total"], snapshot["students_active"], snapshot["students_unassigned"]
+        ))
+        student_stats.enrolled_current_term = snapshot["enrolled_current_term"] or 0
+        class_stats = create_class_stats((snapshot["classes_total"], snapshot["classes_with_students"]))
+        academic_stats = create_academic_stats((
+            snapshot["academic_years"], snapshot["academic_terms"], snapshot["active_terms"]
+        ))
         
         # Get current term info
-        current_term_rows = self.repo.get_current_term_info()
-        current_term = create_current_term(current_term_rows)
+        term = snapshot["current_term"]
+        current_term = create_current_term(
+            [(term["id"], term["title"], term["state"], term["year"], term["year_title"])] if term else []
+        )
         
         # Get class breakdown
-        class_breakdown_rows = self.repo.get_class_breakdown()
-        class_breakdown = create_class_breakdown(class_breakdown_rows)
+        class_breakdown = create_class_breakdown([
+            (row["name"], row["level"], row["student_count"]) for row in snapshot["class_breakdown"]
+        ])
         
         # Get recent activity
-        recent_activity = self._compile_recent_activity()
+        recent_activity = self._compile_recent_activity(snapshot)
         
-        # Get fee statistics (optional)
-        try:
-            fee_stats_rows = self.repo.get_fee_statistics()
-            fee_stats = create_fee_stats(fee_stats_rows[0]) if fee_stats_rows else None
-        except Exception:
-            fee_stats = None
+        fee_stats = create_fee_stats((
+            snapshot["fee_structures"], snapshot["total_invoices"],
+            snapshot["pending_invoices"], snapshot["total_payments"]
+        ))
         
         return OverviewData(
             school_name=self.get_school_name(),
@@ -66,37 +71,33 @@ class OverviewService:
             recent_activity=recent_activity
         )
     
-    def _compile_recent_activity(self):
+    def _compile_recent_activity(self, snapshot):
         """Compile recent activity timeline"""
         recent_items = []
         
         try:
             # Recent enrollments
-            recent_enrollments = self.repo.get_recent_enrollments(7)
-            if recent_enrollments and recent_enrollments[0][0] > 0:
-                count, last_date = recent_enrollments[0]
-                if last_date:
-                    recent_items.append(create_activity_item(
-                        time=last_date.strftime("%Y-%m-%d"),
-                        icon="users",
-                        title=f"{count} students enrolled",
-                        subtitle="In the past 7 days"
-                    ))
+            recent_enrollments = snapshot["recent_enrollments"]
+            if recent_enrollments["count"] > 0 and recent_enrollments["last"]:
+                recent_items.append(create_activity_item(
+                    time=str(recent_enrollments["last"])[:10],
+                    icon="users",
+                    title=f"{recent_enrollments['count']} students enrolled",
+                    subtitle="In the past 7 days"
+                ))
             
             # Recent classes created
-            recent_classes = self.repo.get_recent_classes(7)
-            if recent_classes and recent_classes[0][0] > 0:
-                count, last_date = recent_classes[0]
-                if last_date:
-                    recent_items.append(create_activity_item(
-                        time=last_date.strftime("%Y-%m-%d"),
-                        icon="school",
-                        title=f"{count} classes created",
-                        subtitle="In the past 7 days"
-                    ))
+            recent_classes = snapshot["recent_classes"]
+            if recent_classes["count"] > 0 and recent_classes["last"]:
+                recent_items.append(create_activity_item(
+                    time=str(recent_classes["last"])[:10],
+                    icon="school",
+                    title=f"{recent_classes['count']} classes created",
+                    subtitle="In the past 7 days"
+                ))
             
             return recent_items[:5]  # Return max 5 items
             
         except Exception as e:
             print(f"Error compiling recent activity: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -46,6 +46,8 @@ class PaymentResult:
     payment_data: Optional[Dict] = None
     suggestion: Optional[str] = None
     student_data: Optional[Dict] = None
+    retryable: bool = False  # failed on an error, not on the payment itself
+    notifications: Optional["NotificationResult"] = None
 
 @dataclass
 class PaymentStats:
@@ -120,9 +122,9 @@ class PendingInvoice:
 
 @dataclass
 class NotificationResult:
-    """Notification sending result"""
-    email_sent: bool = False
-    whatsapp_sent: bool = False
+    """Guardian notifications queued in the outbox for a payment"""
+    email_queued: bool = False
+    whatsapp_queued: bool = False
     email_error: Optional[str] = None
     whatsapp_error: Optional[str] = None
 
@@ -1,6 +1,7 @@
 # handlers/payment/repo.py
 import uuid
 from decimal import Decimal
+from sqlalchemy import text
 from ...base import db_execute_safe, db_execute_non_select
 
 class PaymentRepo:
@@ -55,13 +56,16 @@ class PaymentRepo:
         })
     
     def get_invoice_balance(self, invoice_id):
-        """Get current balance for invoice"""
+        """Get amount paid so far on invoice"""
         query = """
-            SELECT COALESCE(SUM(amount), 0) 
-            FROM payments 
-            WHERE invoice_id = :invoice_id
+            SELECT amount_paid
+            FROM invoices
+            WHERE id = :invoice_id AND school_id = :school_id
         """
-        result = db_execute_safe(self.db, query, {"invoice_id": uuid.UUID(invoice_id)})
+        result = db_execute_safe(self.db, query, {
+            "invoice_id": uuid.UUID(invoice_id),
+            "school_id": self.school_uuid
+        })
         return result[0][0] if result else 0
     
     def create_payment_record(self, payment_id, invoice_id, amount, method, reference):
@@ -78,29 +82,12 @@ class PaymentRepo:
             "txn_ref": reference
         })
     
-    def update_invoice_status(self, invoice_id, status):
-        """Update invoice status"""
-        return db_execute_non_select(self.db, """
-            UPDATE invoices 
-            SET status = :status, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = :invoice_id
-        """, {
-            "status": status, 
-            "invoice_id": uuid.UUID(invoice_id)
-        })
-    
     def get_total_outstanding_for_student(self, student_id):
         """Get total outstanding balance for student"""
         query = """
-            SELECT COALESCE(SUM(i.total - COALESCE(p.paid, 0)), 0)
-            FROM invoices i
-            LEFT JOIN (
-                SELECT invoice_id, SUM(amount) as paid
-                FROM payments
-                GROUP BY invoice_id
-            ) p ON i.id = p.invoice_id
-            WHERE i.school_id = :school_id AND i.student_id = :student_id
-            AND i.status IN ('ISSUED', 'PARTIAL')
+            SELECT outstanding
+            FROM student_balances
+            WHERE school_id = :school_id AND student_id = :student_id
         """
         result = db_execute_safe(self.db, query, {
             "school_id": self.school_uuid, 
@@ -175,18 +162,13 @@ class PaymentRepo:
         query = """
             SELECT i.id, s.first_name, s.last_name, s.admission_no,
                    c.name as class_name, i.total, i.due_date, i.created_at,
-                   COALESCE(p.paid, 0) as paid_amount, i.status
+                   i.amount_paid as paid_amount, i.status
             FROM invoices i
             JOIN students s ON i.student_id = s.id
             JOIN classes c ON s.class_id = c.id
-            LEFT JOIN (
-                SELECT invoice_id, SUM(amount) as paid
-                FROM payments
-                GROUP BY invoice_id
-            ) p ON i.id = p.invoice_id
             WHERE i.school_id = :school_id
             AND i.status IN ('ISSUED', 'PARTIAL')
-            AND (i.total - COALESCE(p.paid, 0)) > 0
+            AND i.total > i.amount_paid
             ORDER BY i.due_date ASC, s.first_name, s.last_name
         """
         return db_execute_safe(self.db, query, {"school_id": self.school_uuid})
@@ -194,16 +176,9 @@ class PaymentRepo:
     def get_pending_payment_stats(self):
         """Get pending payment statistics"""
         query = """
-            SELECT COUNT(*), COALESCE(SUM(i.total - COALESCE(p.paid, 0)), 0)
-            FROM invoices i
-            LEFT JOIN (
-                SELECT invoice_id, SUM(amount) as paid
-                FROM payments
-                GROUP BY invoice_id
-            ) p ON i.id = p.invoice_id
-            WHERE i.school_id = :school_id
-            AND i.status IN ('ISSUED', 'PARTIAL')
-            AND (i.total - COALESCE(p.paid, 0)) > 0
+            SELECT COALESCE(SUM(open_invoices), 0), COALESCE(SUM(outstanding), 0)
+            FROM student_balances
+            WHERE school_id = :school_id AND outstanding > 0
         """
         return db_execute_safe(self.db, query, {"school_id": self.school_uuid})
     
@@ -219,39 +194,51 @@ class PaymentRepo:
         """
         return db_execute_safe(self.db, query, {"school_id": self.school_uuid})
     
-    def get_students_with_outstanding_balances(self, student_ids=None):
-        """Get students with outstanding balances for reminders"""
-        base_query = """
-            SELECT s.id, s.first_name, s.last_name, s.admission_no,
+    def _outstanding_balances_query(self, student_ids=None, select=None):
+        """Reminder targets: active students with an outstanding balance, optionally limited to student_ids"""
+        columns = select or """s.id, s.first_name, s.last_name, s.admission_no,
                    g.email as guardian_email, g.phone as guardian_phone,
-                   SUM(i.total - COALESCE(p.paid, 0)) as outstanding_amount
-            FROM students s
+                   sb.outstanding as outstanding_amount, g.id as guardian_id"""
+        query = f"""
+            SELECT {columns}
+            FROM student_balances sb
+            JOIN students s ON s.id = sb.student_id
             LEFT JOIN guardians g ON s.primary_guardian_id = g.id
-            JOIN invoices i ON s.id = i.student_id
-            LEFT JOIN (
-                SELECT invoice_id, SUM(amount) as paid
-                FROM payments
-                GROUP BY invoice_id
-            ) p ON i.id = p.invoice_id
-            WHERE s.school_id = :school_id 
+            WHERE sb.school_id = :school_id 
+            AND sb.outstanding > 0
             AND s.status = 'ACTIVE'
-            AND i.status IN ('ISSUED', 'PARTIAL')
-            AND (i.total - COALESCE(p.paid, 0)) > 0
         """
         
         params = {"school_id": self.school_uuid}
         
         if student_ids:
-            student_ids_formatted = ','.join([f"'{sid}'" for sid in student_ids])
-            base_query += f" AND s.id = ANY(ARRAY[{student_ids_formatted}]::uuid[])"
+            query += " AND sb.student_id = ANY(CAST(:student_ids AS uuid[]))"
+            params["student_ids"] = [str(sid) for sid in student_ids]
         
-        base_query += """
-            GROUP BY s.id, s.first_name, s.last_name, s.admission_no, g.email, g.phone
-            HAVING SUM(i.total - COALESCE(p.paid, 0)) > 0
-            ORDER BY outstanding_amount DESC
+        return query, params
+    
+    def get_students_with_outstanding_balances(self, student_ids=None):
+        """Get students with outstanding balances for reminders"""
+        query, params = self._outstanding_balances_query(student_ids)
+        return db_execute_safe(self.db, query + " ORDER BY sb.outstanding DESC", params)
+    
+    def count_students_with_outstanding_balances(self, student_ids=None):
+        query, params = self._outstanding_balances_query(student_ids, select="COUNT(*)")
+        rows = db_execute_safe(self.db, query, params)
+        return rows[0][0] if rows else 0
+    
+    def stream_students_with_outstanding_balances(self, student_ids=None, batch_size=500):
         """
-        
-        return db_execute_safe(self.db, base_query, params)
+        Reminder targets in batches of batch_size from a server-side cursor, so
+        a school's whole list is never in memory. The cursor lives in the
+        session's transaction; don't commit until the stream is exhausted.
+        """
+        query, params = self._outstanding_balances_query(student_ids)
+        result = self.db.execute(
+            text(query + " ORDER BY sb.outstanding DESC"), params,
+            execution_options={"yield_per": batch_size}
+        )
+        yield from result.partitions()
     
     def log_mpesa_transaction(self, transaction_id, amount, phone_number, account_number, status, error_message=None):
         """Log M-Pesa transaction"""
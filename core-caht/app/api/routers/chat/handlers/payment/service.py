@@ -6,6 +6,8 @@ from datetime import datetime
 from typing import Optional, Dict, List
 
 from ...base import ChatResponse
+from app.services.balance_ledger import get_balance_ledger
+from app.services.notifications import EMAIL, WHATSAPP, queue_payment_notifications
 from .repo import PaymentRepo
 from .views import PaymentViews
 from .dataclasses import (
@@ -19,13 +21,11 @@ from .dataclasses import (
 class PaymentService:
     """Business logic layer for payment operations"""
     
-    def __init__(self, db, school_id, get_school_name, whatsapp_service_fn, email_service_fn):
+    def __init__(self, db, school_id, get_school_name):
         self.repo = PaymentRepo(db, school_id)
         self.views = PaymentViews(get_school_name)
         self.db = db
         self.school_id = school_id
-        self.get_whatsapp_service = whatsapp_service_fn
-        self.send_email_notification = email_service_fn
     
     def record_payment(self, message: str, context: Optional[Dict] = None):
         """Record a new payment"""
@@ -51,6 +51,22 @@ class PaymentService:
         except Exception as e:
             return self.views.error("recording payment", str(e))
     
+    def post_mpesa_payment(self, amount: float, admission_no: str, reference: str,
+                           phone: Optional[str] = None) -> PaymentResult:
+        """Post an M-Pesa payment received outside chat (SMS inbox); the guardian's receipts are queued with it"""
+        payment_info = PaymentInfo(
+            method="MPESA",
+            amount=float(amount),
+            admission_no=admission_no,
+            reference=reference,
+            phone=phone
+        )
+        is_valid, errors = validate_payment_info(payment_info)
+        if not is_valid:
+            return PaymentResult(success=False, message=f"Invalid payment information: {', '.join(errors)}")
+        
+        return self._process_payment(payment_info)
+    
     def show_payment_summary(self):
         """Show payment summary"""
         try:
@@ -129,6 +145,18 @@ class PaymentService:
         except Exception as e:
             return self.views.error("processing M-Pesa callback", str(e))
     
+    def send_payment_reminders(self, student_ids: Optional[List[str]] = None, channels=("WHATSAPP", "EMAIL")):
+        """Queue a fee-reminder broadcast to guardians with a balance (background job)"""
+        try:
+            from app.services.fee_reminders import start_fee_reminder_broadcast
+            target_count = self.repo.count_students_with_outstanding_balances(student_ids)
+            if not target_count:
+                return self.views.no_reminder_targets()
+            job = start_fee_reminder_broadcast(self.school_id, None, channels, student_ids)
+            return self.views.reminders_queued(job, target_count)
+        except Exception as e:
+            return self.views.error("sending payment reminders", str(e))
+    
     def show_overview(self):
         """Show general payment overview"""
         return self.views.general_overview()
@@ -225,10 +253,13 @@ class PaymentService:
                                f"Please enroll the student first."
                     )
             
-            # Apply payment to invoices
+            # Apply payment to invoices; the balance row lock keeps concurrent
+            # payments for this student from reading the same balances
             outstanding_invoices = [row_to_outstanding_invoice(row) for row in invoice_rows]
             remaining_amount = Decimal(str(payment_info.amount))
             updated_invoices = []
+            ledger = get_balance_ledger(self.db, self.school_id)
+            ledger.lock_student(student.id)
             
             for invoice in outstanding_invoices:
                 if remaining_amount <= 0:
@@ -248,21 +279,19 @@ class PaymentService:
                         payment_info.method, payment_info.reference
                     )
                     
-                    # Update invoice status
-                    new_balance = invoice_balance - payment_for_invoice
-                    new_status = "PAID" if new_balance <= 0 else "PARTIAL"
-                    self.repo.update_invoice_status(invoice.id, new_status)
+                    # Update invoice paid amount and status
+                    applied = ledger.apply_payment(invoice.id, payment_for_invoice)
                     
                     updated_invoices.append({
                         "invoice_id": invoice.id,
                         "payment_applied": float(payment_for_invoice),
-                        "new_balance": float(new_balance),
-                        "status": new_status
+                        "new_balance": float(applied["balance"]),
+                        "status": applied["status"]
                     })
                     
                     remaining_amount -= payment_for_invoice
             
-            self.db.commit()
+            ledger.refresh_students([student.id])
             
             # Get total outstanding balance after payment
             total_outstanding = self.repo.get_total_outstanding_for_student(student.id)
@@ -274,25 +303,29 @@ class PaymentService:
                 updated_invoices, self.school_id, self.views.get_school_name()
             )
             
+            # Guardian receipts go to the notification outbox in the payment's own
+            # transaction; the notification dispatcher sends them after commit
+            queued = queue_payment_notifications(self.db, self.school_id, payment_data)
+            self.db.commit()
+            
             return PaymentResult(
                 success=True,
                 message=f"Payment processed successfully for {student.full_name}",
-                payment_data=payment_data
+                payment_data=payment_data,
+                notifications=self._notification_result(payment_data, queued)
             )
             
         except Exception as e:
             self.db.rollback()
             return PaymentResult(
                 success=False,
-                message=f"Error processing payment: {str(e)}"
+                message=f"Error processing payment: {str(e)}",
+                retryable=True
             )
     
     def _handle_payment_success(self, result: PaymentResult):
         """Handle successful payment processing"""
-        # Send notifications
-        notification_results = self._send_payment_notifications(result.payment_data)
-        
-        return self.views.payment_success(result.payment_data, notification_results)
+        return self.views.payment_success(result.payment_data, result.notifications or NotificationResult())
     
     def _handle_payment_failure(self, result: PaymentResult):
         """Handle failed payment processing"""
@@ -301,32 +334,13 @@ class PaymentService:
         else:
             return self.views.payment_failed_general(result.message)
     
-    def _send_payment_notifications(self, payment_data: Dict) -> NotificationResult:
-        """Send both email and WhatsApp notifications"""
-        results = NotificationResult()
-        
-        # Send email notification
-        try:
-            email_sent = self.send_email_notification(payment_data)
-            results.email_sent = email_sent
-            if not email_sent:
-                results.email_error = "No parent email found or email service unavailable"
-        except Exception as e:
-            results.email_error = str(e)
-        
-        # Send WhatsApp notification
-        try:
-            whatsapp_service = self.get_whatsapp_service()
-            if whatsapp_service and payment_data.get("guardian_phone"):
-                whatsapp_sent = whatsapp_service.send_payment_notification(payment_data)
-                results.whatsapp_sent = whatsapp_sent
-                if not whatsapp_sent:
-                    results.whatsapp_error = "WhatsApp service unavailable"
-            else:
-                results.whatsapp_error = "WhatsApp service not available or no phone number"
-        except Exception as e:
-            results.whatsapp_error = str(e)
-        
+    def _notification_result(self, payment_data: Dict, queued: Dict[str, bool]) -> NotificationResult:
+        """Which guardian receipts were queued for the dispatcher"""
+        results = NotificationResult(email_queued=queued[EMAIL], whatsapp_queued=queued[WHATSAPP])
+        if not results.email_queued:
+            results.email_error = "No parent email found" if "@" not in (payment_data.get("guardian_email") or "") else "Already queued"
+        if not results.whatsapp_queued:
+            results.whatsapp_error = "No parent phone number found" if not (payment_data.get("guardian_phone") or "").strip() else "Already queued"
         return results
     
     def _show_student_payment_history(self, admission_no: str):
@@ -3,7 +3,7 @@ from datetime import datetime, date
 from ...blocks import (
     text, kpis, count_kpi, currency_kpi, table, status_column, action_row,
     chart_xy, empty_state, error_block, timeline, timeline_item,
-    button_group, button_item, status_block, status_item
+    button_group, button_item, status_block, status_item, job_status_block
 )
 from ...base import ChatResponse
 from .dataclasses import (
@@ -52,6 +52,41 @@ class PaymentViews:
             ]
         )
     
+    def reminders_queued(self, job: dict, target_count: int):
+        """Fee-reminder broadcast handed to a background job"""
+        blocks = []
+        
+        blocks.append(text(f"**Payment Reminders Started ⏳**\n\nQueueing reminders for the guardians of {target_count} students with outstanding balances. Messages go out at the pace your WhatsApp connection allows."))
+        
+        blocks.append(job_status_block(job, "Queueing reminders", "students"))
+        
+        action_buttons = [
+            button_item("Show Pending Payments", "query", {"message": "show pending payments"}, "primary", "md", "list"),
+            button_item("Payment Summary", "query", {"message": "payment summary"}, "outline", "md", "bar-chart")
+        ]
+        blocks.append(button_group(action_buttons, "horizontal", "center"))
+        
+        return ChatResponse(
+            response=f"Sending payment reminders for {target_count} students in the background",
+            intent="payment_reminders_queued",
+            data={
+                "broadcast_id": job["id"],
+                "job_status": job["status"],
+                "status_endpoint": f"/api/whatsapp/reminders/{job['id']}",
+                "student_count": target_count
+            },
+            blocks=blocks,
+            suggestions=["Show pending payments", "Payment summary", "Record payment"]
+        )
+    
+    def no_reminder_targets(self):
+        """No student has an outstanding balance"""
+        return ChatResponse(
+            response="No students have outstanding balances - no reminders needed",
+            intent="no_reminder_targets",
+            suggestions=["Payment summary", "Show pending payments", "Record payment"]
+        )
+    
     def payment_success(self, payment_data, notification_results: NotificationResult):
         """Success response for payment recording"""
         blocks = []
@@ -102,13 +137,13 @@ class PaymentViews:
         
         # Notification status
         notification_status = []
-        if notification_results.email_sent:
-            notification_status.append(status_item("Email Notification", "ok", "Sent to parent"))
+        if notification_results.email_queued:
+            notification_status.append(status_item("Email Notification", "ok", "Queued for parent"))
         elif notification_results.email_error:
             notification_status.append(status_item("Email Notification", "warning", notification_results.email_error[:50]))
         
-        if notification_results.whatsapp_sent:
-            notification_status.append(status_item("WhatsApp Notification", "ok", "Sent to parent"))
+        if notification_results.whatsapp_queued:
+            notification_status.append(status_item("WhatsApp Notification", "ok", "Queued for parent"))
         elif notification_results.whatsapp_error:
             notification_status.append(status_item("WhatsApp Notification", "warning", notification_results.whatsapp_error[:50]))
         
@@ -134,13 +169,13 @@ class PaymentViews:
         
         # Build response message
         response_message = f"Payment recorded: {format_currency(payment_data['amount_paid'])} for {payment_data['student_name']}"
-        if notification_results.email_sent or notification_results.whatsapp_sent:
+        if notification_results.email_queued or notification_results.whatsapp_queued:
             channels = []
-            if notification_results.email_sent:
+            if notification_results.email_queued:
                 channels.append("email")
-            if notification_results.whatsapp_sent:
+            if notification_results.whatsapp_queued:
                 channels.append("WhatsApp")
-            response_message += f" - notifications sent via {' and '.join(channels)}"
+            response_message += f" - notifications queued via {' and '.join(channels)}"
         
         return ChatResponse(
             response=response_message,
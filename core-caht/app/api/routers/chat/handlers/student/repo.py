@@ -1,5 +1,6 @@
 # handlers/student/repo.py
 from ...base import db_execute_safe
+from app.services.student_search import get_student_search, RANKED_IDS_JOIN
 
 class StudentRepo:
     """Pure data access layer for student operations"""
@@ -25,26 +26,26 @@ class StudentRepo:
             "admission_no": admission_no
         })
     
-    def search_by_name(self, name):
-        """Search students by name pattern"""
-        query = """
+    def search_by_name(self, name, limit=50):
+        """Search students by name, best matches first (typo-tolerant)"""
+        ranked_ids = get_student_search(self.db, self.school_id).search_ids(name, limit=limit)
+        if not ranked_ids:
+            return []
+        query = f"""
             SELECT s.id, s.first_name, s.last_name, s.admission_no, s.status,
                    c.name as class_name, c.level,
                    g.first_name as guardian_first, g.last_name as guardian_last,
                    g.phone as guardian_phone, g.email as guardian_email, g.relationship
-            FROM students s
+            FROM {RANKED_IDS_JOIN}
+            JOIN students s ON s.id = m.id
             LEFT JOIN classes c ON s.class_id = c.id
             LEFT JOIN guardians g ON s.primary_guardian_id = g.id
-            WHERE s.school_id = :school_id 
-            AND (LOWER(s.first_name) LIKE :name_pattern 
-                 OR LOWER(s.last_name) LIKE :name_pattern
-                 OR LOWER(s.first_name || ' ' || s.last_name) LIKE :full_name_pattern)
-            ORDER BY s.first_name, s.last_name
+            WHERE s.school_id = :school_id
+            ORDER BY m.rank
         """
         return db_execute_safe(self.db, query, {
             "school_id": self.school_id,
-            "name_pattern": f"%{name.lower()}%",
-            "full_name_pattern": f"%{name.lower()}%"
+            "ranked_ids": ranked_ids
         })
     
     def list_50(self):
@@ -2,27 +2,31 @@
 
 import os
 import time
-import asyncio
+import uuid
 from typing import Optional, Dict, List
 from sqlalchemy.orm import Session
 from datetime import datetime
 
-from .base import ChatResponse, db_execute_non_select
-from .handlers.overview.handler import OverviewHandler
-from .handlers.academic.handler import AcademicHandler
-from .handlers.student.handler import StudentHandler
-from .handlers.classes.handler import ClassHandler
-from .handlers.enrollment.handler import EnrollmentHandler
-from .handlers.invoice.handler import InvoiceHandler
-from .handlers.fee.handler import FeeHandler
-from .handlers.payment.handler import PaymentHandler
-from .handlers.general.handler import GeneralHandler
+from .base import ChatResponse
+from .handler_registry import HandlerRegistry, INTENT_HANDLER_MAP, ALLOWED_INTENTS
 from .blocks import text
 
+from app.core.executor import run_blocking
 from app.services.config_router import ConfigRouter
 from app.services.intent_classifier import IntentClassifier
+from app.services.llm_client import get_llm_client
+from app.services.classification_cache import get_classification_cache
+from app.services.routing_telemetry import get_routing_log_sink
 from app.models.intent_config import RoutingLog
 
+# Messages shorter than this, or referring back with one of these words, are
+# classified with the recent conversation in the prompt
+CONTEXT_FREE_MIN_WORDS = 3
+CONTEXT_REFERENCE_WORDS = {
+    "yes", "no", "ok", "okay", "sure", "that", "this", "it", "them", "those",
+    "these", "same", "first", "second", "third", "last", "previous", "above", "again"
+}
+
 
 class IntentProcessor:
     """Intent-first processor using ConfigRouter + IntentClassifier pipeline"""
@@ -32,9 +36,8 @@ class IntentProcessor:
         self.user_id = user_id
         self.school_id = school_id
         
-        # Initialize routing services
+        # Initialize routing services (patterns come from the worker's shared index)
         self.config_router = ConfigRouter(db)
-        self.config_router.reload_config()  # Force initial load
         self.intent_classifier = IntentClassifier()
         
         # Feature flag for legacy fallback
@@ -43,111 +46,16 @@ class IntentProcessor:
         # Debug flag for verbose output
         self.debug_mode = os.getenv('DEBUG_ROUTING', 'false').lower() == 'true'
         
-        # Initialize handlers by key for direct lookup
-        self.handlers_by_key = {
-            "overview": OverviewHandler(db, school_id, user_id),
-            "academic": AcademicHandler(db, school_id, user_id),
-            "student": StudentHandler(db, school_id, user_id),
-            "class": ClassHandler(db, school_id, user_id),
-            "enrollment": EnrollmentHandler(db, school_id, user_id),
-            "invoice": InvoiceHandler(db, school_id, user_id),
-            "fee": FeeHandler(db, school_id, user_id),
-            "payment": PaymentHandler(db, school_id, user_id),
-            "general": GeneralHandler(db, school_id, user_id),
-        }
-        
-        # Intent → Handler mapping - COMPLETE VERSION WITH ALL MIGRATED INTENTS
-        self.intent_handler_map = {
-            # Student intents
-            "student_create": "student",
-            "student_search": "student", 
-            "student_list": "student",
-            "student_details": "student",
-            "student_count": "student",
-            "unassigned_students": "student",
-            
-            # Payment intents
-            "payment_record": "payment",
-            "payment_summary": "payment", 
-            "payment_history": "payment",
-            "payment_pending": "payment",
-            "payment_status": "payment",
-            
-            # Invoice intents
-            "invoice_generate_student": "invoice",
-            "invoice_generate_bulk": "invoice",
-            "invoice_pending": "invoice", 
-            "invoice_show_student": "invoice",
-            "invoice_list": "invoice",
-            "invoice_overview": "invoice",
-            
-            # Overview intents
-            "school_overview": "overview",
-            "dashboard": "overview",
-            "school_summary": "overview",
-            
-            # General intents
-            "greeting": "general",
-            "casual_conversation": "general",
-            "school_registration": "general",
-            "getting_started": "general", 
-            "system_capabilities": "general",
-            "help": "general",
-            "next_steps": "general",
-            "school_management": "general",
-            "system_introduction": "general",
-            "unknown": "general",
-            
-            # Fee intents
-            "fee_structure": "fee",
-            "fee_overview": "fee", 
-            "fee_grade_specific": "fee",
-            "fee_update": "fee",
-            "fee_items": "fee",
-            "fee_student_invoice": "fee",
-            
-            # Class intents
-            "class_create": "class",
-            "grade_create": "class",
-            "class_details": "class", 
-            "grade_list": "class",
-            "class_list": "class",
-            "class_count": "class",
-            "class_empty": "class",
-            
-            # Enrollment intents
-            "enrollment_single": "enrollment",
-            "enrollment_bulk": "enrollment", 
-            "enrollment_status": "enrollment",
-            "enrollment_list": "enrollment",
-            
-            # Academic intents
-            "academic_current_term": "academic",
-            "academic_activate_term": "academic",
-            "academic_calendar": "academic", 
-            "academic_setup": "academic",
-            "academic_overview": "academic",
-        }
-        
-        # Legacy handlers for fallback
-        self.legacy_handlers = [
-            self.handlers_by_key["overview"],
-            self.handlers_by_key["academic"], 
-            self.handlers_by_key["enrollment"],
-            self.handlers_by_key["invoice"],
-            self.handlers_by_key["payment"],
-            self.handlers_by_key["fee"],
-            self.handlers_by_key["student"],
-            self.handlers_by_key["class"],
-            self.handlers_by_key["general"],
-        ]
+        # Handlers are built on first dispatch; the intent map is shared module state
+        self.handlers_by_key = HandlerRegistry(db, school_id, user_id)
+        self.intent_handler_map = INTENT_HANDLER_MAP
         
         if self.debug_mode:
             print(f"IntentProcessor initialized for school_id: {school_id}, user_id: {user_id}")
             print(f"ConfigRouter cache stats: {self.config_router.get_cache_stats()}")
     
-    def process_message(self, message: str, context: Optional[Dict] = None) -> ChatResponse:
-        """Process message using intent-first pipeline"""
+    async def process_message(self, message: str, context: Optional[Dict] = None) -> ChatResponse:
+        """Process message using intent-first pipeline; DB-bound steps run on the shared executor"""
         
         print(f"\n{'='*60}")
         print(f"Processing message: '{message}'")
@@ -167,19 +75,19 @@ class IntentProcessor:
                 handler = self.handlers_by_key[handler_name]
                 # For flows, use handle_intent if available, otherwise fall back to handle
                 if hasattr(handler, 'handle_intent'):
-                    return handler.handle_intent("context_flow", message, {}, enhanced_context)
+                    return await run_blocking(handler.handle_intent, "context_flow", message, {}, enhanced_context)
                 else:
-                    return handler.handle(message, enhanced_context)
+                    return await run_blocking(handler.handle, message, enhanced_context)
         
         # Use legacy routing if feature flag is enabled
         if self.use_legacy_routing:
             print("Using legacy routing (feature flag enabled)")
-            return self._process_message_legacy(message, enhanced_context)
+            return await self._process_message_legacy(message, enhanced_context)
         
         # NEW: Intent-first pipeline
-        return self._process_message_intent_first(message, enhanced_context)
+        return await self._process_message_intent_first(message, enhanced_context)
     
-    def _process_message_intent_first(self, message: str, context: Dict) -> ChatResponse:
+    async def _process_message_intent_first(self, message: str, context: Dict) -> ChatResponse:
         """Process using ConfigRouter → IntentClassifier → Handler pipeline"""
         start_time = time.time()
         routing_data = {
@@ -197,7 +105,7 @@ class IntentProcessor:
         try:
             # Step 1: Try ConfigRouter first
             print("\n--- Step 1: ConfigRouter ---")
-            router_result = self.config_router.route(message, self.school_id)
+            router_result = await run_blocking(self.config_router.route, message, self.school_id)
             
             if router_result:
                 routing_data["router_intent"] = router_result.intent
@@ -227,8 +135,8 @@ class IntentProcessor:
                 recent_context = self._build_recent_context(context)
                 entity_schema = self._get_entity_schema_for_message(message)
                 
-                # Use synchronous wrapper for intent classification
-                llm_result = self._classify_intent_sync(
+                # Awaited on the event loop - a slow Ollama call only suspends this request
+                llm_result = await self._classify_intent(
                     message, allowed_intents, recent_context, entity_schema
                 )
                 
@@ -257,11 +165,16 @@ class IntentProcessor:
                 final_intent = llm_result.intent
                 final_entities = llm_result.entities
                 print(f"→ Using IntentClassifier result: {final_intent} (confidence: {llm_result.confidence:.3f})")
+            elif llm_result and llm_result.intent == "saturated":
+                # A generate call would wait in the same full queue - answer without the LLM
+                print("→ LLM queue saturated - using busy response")
+                routing_data["fallback_used"] = True
+                return self._handle_saturated_query(routing_data, start_time)
             else:
                 # Both failed or have low confidence
                 print("→ Both router and classifier failed/low confidence - using fallback")
                 routing_data["fallback_used"] = True
-                return self._handle_unhandled_query(message, context, routing_data, start_time)
+                return await self._handle_unhandled_query(message, context, routing_data, start_time)
             
             # Step 4: Map intent to handler
             handler_key = self._map_intent_to_handler(final_intent)
@@ -278,11 +191,11 @@ class IntentProcessor:
                 # Use handle_intent if available (new intent-first handlers)
                 if hasattr(handler, 'handle_intent'):
                     print(f"→ Calling {handler_key}.handle_intent()")
-                    response = handler.handle_intent(final_intent, message, final_entities, context)
+                    response = await run_blocking(handler.handle_intent, final_intent, message, final_entities, context)
                 else:
                     # Legacy handler - use old handle method
                     print(f"→ Calling {handler_key}.handle() [legacy]")
-                    response = handler.handle(message, context)
+                    response = await run_blocking(handler.handle, message, context)
                 
                 # Step 6: Log routing decision
                 self._log_routing_decision(routing_data, start_time)
@@ -292,7 +205,7 @@ class IntentProcessor:
             else:
                 print(f"✗ Handler '{handler_key}' not found - using general handler")
                 routing_data["final_handler"] = "general"
-                response = self.handlers_by_key["general"].handle(message, context)
+                response = await run_blocking(self.handlers_by_key["general"].handle, message, context)
                 self._log_routing_decision(routing_data, start_time)
                 return response
         
@@ -306,76 +219,51 @@ class IntentProcessor:
             routing_data["final_handler"] = "legacy_fallback"
             self._log_routing_decision(routing_data, start_time, error=str(e))
             
-            return self._process_message_legacy(message, context)
+            return await self._process_message_legacy(message, context)
     
-    def _classify_intent_sync(self, message: str, allowed_intents: List[str], 
-                             recent_context: str, entity_schema: Dict) -> Optional[object]:
-        """Synchronous wrapper for intent classification"""
+    async def _classify_intent(self, message: str, allowed_intents: List[str], 
+                               recent_context: str, entity_schema: Dict) -> Optional[object]:
+        """Run the LLM intent classifier behind the classification cache; never raises"""
         try:
-            # Try to use nest_asyncio if available
-            try:
-                import nest_asyncio
-                nest_asyncio.apply()
-                
-                # Now we can safely run async code even from within an existing loop
-                loop = asyncio.get_event_loop()
-                result = loop.run_until_complete(
-                    self.intent_classifier.classify(
-                        message, allowed_intents, recent_context, entity_schema
-                    )
-                )
-                return result
-                
-            except ImportError:
-                print("nest_asyncio not available, using threading approach")
-                
-                # Fall back to threading approach
-                import concurrent.futures
-                import threading
-                
-                result_container = {'result': None, 'error': None}
-                
-                def run_in_thread():
-                    try:
-                        # Create new event loop for this thread
-                        new_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(new_loop)
-                        
-                        # Run the async function
-                        result = new_loop.run_until_complete(
-                            self.intent_classifier.classify(
-                                message, allowed_intents, recent_context, entity_schema
-                            )
-                        )
-                        result_container['result'] = result
-                        
-                    except Exception as e:
-                        result_container['error'] = e
-                    finally:
-                        new_loop.close()
-                
-                # Run in thread with timeout
-                thread = threading.Thread(target=run_in_thread)
-                thread.start()
-                thread.join(timeout=1.0)  # 1 second timeout
-                
-                if thread.is_alive():
-                    print("IntentClassifier: Thread timeout")
-                    return None
-                
-                if result_container['error']:
-                    print(f"IntentClassifier error: {result_container['error']}")
-                    return None
-                    
-                return result_container['result']
-                
+            # Self-contained requests are classified without context, so "show pending
+            # invoices" shares one entry across conversations; short or referential
+            # replies ("yes", "the first one") keep context and key on its digest
+            if not self._needs_recent_context(message):
+                recent_context = ""
+            
+            cache = get_classification_cache()
+            cache_key = cache.make_key(
+                self.config_router.normalize_message(message, self.school_id),
+                self.config_router.active_version_id,
+                allowed_intents,
+                recent_context
+            )
+            
+            cached = await cache.get(cache_key)
+            if cached:
+                print(f"✓ Classification cache hit: {cached.intent}")
+                return cached
+            
+            result = await self.intent_classifier.classify(
+                message, allowed_intents, recent_context, entity_schema
+            )
+            if result:
+                await cache.set(cache_key, result)
+            return result
         except Exception as e:
-            print(f"Error in synchronous intent classification: {e}")
+            print(f"Error in intent classification: {e}")
             return None
     
+    def _needs_recent_context(self, message: str) -> bool:
+        """Whether a message only makes sense alongside the previous turns"""
+        words = [word.strip("?!.,;:'\"") for word in message.lower().split()]
+        if len(words) < CONTEXT_FREE_MIN_WORDS:
+            return True
+        return any(word in CONTEXT_REFERENCE_WORDS for word in words)
+    
     def _get_allowed_intents(self) -> List[str]:
         """Get list of all supported intents"""
-        return list(self.intent_handler_map.keys())
+        return ALLOWED_INTENTS
     
     def _build_recent_context(self, context: Dict) -> str:
         """Build recent context string for LLM classifier"""
@@ -436,24 +324,20 @@ class IntentProcessor:
         return "general"
     
     def _log_routing_decision(self, routing_data: Dict, start_time: float, error: str = None):
-        """Log routing decision to database for training"""
+        """Queue routing decision for the batched routing_logs writer"""
         try:
-            # Get active config version
-            from app.models.intent_config import IntentConfigVersion
-            active_version = self.db.query(IntentConfigVersion)\
-                .filter(IntentConfigVersion.status == 'active')\
-                .first()
+            # Active config version comes from the router's shared index, no extra query
+            version_id = self.config_router.active_version_id
             
-            # If no active version, create a temporary one or skip logging
-            if not active_version:
+            # If no active version, skip logging
+            if not version_id:
                 print("→ No active config version found, skipping routing log")
                 return
             
-            version_id = active_version.id
             latency_ms = int((time.time() - start_time) * 1000)
             
             log_data = {
-                "id": f"log_{int(time.time() * 1000)}_{hash(routing_data['message']) % 10000}",
+                "id": f"log_{uuid.uuid4().hex}",  # Unique within a bulk batch
                 "conversation_id": f"conv_{self.user_id}_{int(time.time() / 3600)}",  # Hourly conversation grouping
                 "message_id": f"msg_{int(time.time() * 1000)}",
                 "message": routing_data["message"][:1000],  # Truncate long messages
@@ -462,8 +346,9 @@ class IntentProcessor:
                 "llm_entities": routing_data.get("llm_entities"),
                 "router_intent": routing_data.get("router_intent"),
                 "router_reason": routing_data.get("router_reason"),
-                "final_intent": routing_data.get("final_intent", "unknown"),
-                "final_handler": routing_data.get("final_handler", "unknown"),
+                # Keys exist but are None when routing failed early; the columns are NOT NULL
+                "final_intent": routing_data.get("final_intent") or "unknown",
+                "final_handler": routing_data.get("final_handler") or "unknown",
                 "fallback_used": routing_data.get("fallback_used", False),
                 "latency_ms": latency_ms,
                 "version_id": version_id,  # Use actual version ID
@@ -476,35 +361,17 @@ class IntentProcessor:
             if error:
                 log_data["router_reason"] = f"error: {error[:200]}"
             
-            # Insert log record
-            db_execute_non_select(self.db, """
-                INSERT INTO routing_logs (
-                    id, conversation_id, message_id, message,
-                    llm_intent, llm_confidence, llm_entities,
-                    router_intent, router_reason,
-                    final_intent, final_handler, fallback_used,
-                    latency_ms, version_id, school_id, user_id, created_at
-                ) VALUES (
-                    :id, :conversation_id, :message_id, :message,
-                    :llm_intent, :llm_confidence, :llm_entities,
-                    :router_intent, :router_reason,
-                    :final_intent, :final_handler, :fallback_used,
-                    :latency_ms, :version_id, :school_id, :user_id, :created_at
-                )
-            """, log_data)
-            
-            self.db.commit()
-            print(f"→ Logged routing: {routing_data.get('final_intent')} → {routing_data.get('final_handler')} ({latency_ms}ms)")
+            # Buffered; the sink bulk-inserts on its own session so a telemetry
+            # failure can never roll back the chat request's transaction
+            if get_routing_log_sink().record(log_data):
+                print(f"→ Queued routing log: {routing_data.get('final_intent')} → {routing_data.get('final_handler')} ({latency_ms}ms)")
+            else:
+                print("→ Routing log buffer full, dropped entry")
             
         except Exception as e:
             print(f"✗ Error logging routing decision: {e}")
-            # Don't let logging errors break the main flow
-            try:
-                self.db.rollback()
-            except:
-                pass
     
-    def _handle_unhandled_query(self, message: str, context: Dict, routing_data: Dict, start_time: float) -> ChatResponse:
+    async def _handle_unhandled_query(self, message: str, context: Dict, routing_data: Dict, start_time: float) -> ChatResponse:
         """Handle queries that couldn't be routed"""
         print("\n--- Fallback: Unhandled Query ---")
         
@@ -513,14 +380,18 @@ class IntentProcessor:
         routing_data["final_handler"] = "ollama_fallback"
         self._log_routing_decision(routing_data, start_time)
         
+        if get_llm_client().is_saturated():
+            print("→ LLM queue saturated - skipping Ollama fallback")
+            return self._unhandled_response()
+        
         # Try Ollama as last resort, then fall back to generic response
         try:
             from app.services.ollama_service import OllamaService
             ollama_service = OllamaService()
             
             print(f"Attempting Ollama fallback for: '{message}'")
-            school_context_prompt = self._build_school_context_prompt(message, context)
-            ollama_result = ollama_service.generate_response_sync(school_context_prompt)
+            school_context_prompt = await run_blocking(self._build_school_context_prompt, message, context)
+            ollama_result = await ollama_service.generate_response(school_context_prompt)
             
             if ollama_result.get("response") and ollama_result.get("success", True):
                 print(f"✓ Ollama fallback successful")
@@ -545,8 +416,27 @@ class IntentProcessor:
         
         # Final fallback
         print("→ Using generic fallback response")
+        return self._unhandled_response()
+    
+    def _handle_saturated_query(self, routing_data: Dict, start_time: float) -> ChatResponse:
+        """Answer without any LLM call while the LLM queue is full"""
+        print("\n--- Fallback: LLM Saturated ---")
+        
+        routing_data["final_intent"] = "unhandled"
+        routing_data["final_handler"] = "saturated_fallback"
+        self._log_routing_decision(routing_data, start_time)
+        
+        return self._unhandled_response(busy=True)
+    
+    def _unhandled_response(self, busy: bool = False) -> ChatResponse:
+        """Generic response for messages no router, classifier or LLM could answer"""
+        if busy:
+            response = "I'm handling a lot of requests right now and couldn't work out that one. Could you try again in a moment, or phrase it as a specific request?"
+        else:
+            response = "I'm not sure how to help with that specific request. Could you try rephrasing or let me know what you'd like to do?"
+        
         return ChatResponse(
-            response="I'm not sure how to help with that specific request. Could you try rephrasing or let me know what you'd like to do?",
+            response=response,
             intent="unhandled",
             suggestions=[
                 "What can you help me with?",
@@ -563,8 +453,7 @@ class IntentProcessor:
         """Build school context prompt for Ollama fallback"""
         try:
             school_name = "the school"
-            if self.handlers_by_key.get("overview") and hasattr(self.handlers_by_key["overview"], 'get_school_name'):
-                school_name = self.handlers_by_key["overview"].get_school_name()
+            school_name = self.handlers_by_key["overview"].get_school_name()
         except:
             school_name = "the school"
         
@@ -620,12 +509,22 @@ Response:"""
         
         return enhanced_context
     
-    def _process_message_legacy(self, message: str, context: Dict) -> ChatResponse:
+    async def _process_message_legacy(self, message: str, context: Dict) -> ChatResponse:
         """Legacy handler-based processing (fallback)"""
+        response = await run_blocking(self._run_legacy_handlers, message, context)
+        if response is not None:
+            return response
+        
+        # Final fallback
+        print("✗ No legacy handler could handle the message")
+        return await self._handle_unhandled_query(message, context, {"fallback_used": True}, time.time())
+    
+    def _run_legacy_handlers(self, message: str, context: Dict) -> Optional[ChatResponse]:
+        """Try each legacy handler in order; blocking, run on the shared executor"""
         print("\n--- Legacy Handler-Based Routing ---")
         
         # Try each handler in order
-        for i, handler in enumerate(self.legacy_handlers):
+        for i, handler in enumerate(self.handlers_by_key.legacy_handlers()):
             handler_name = handler.__class__.__name__
             
             try:
@@ -641,6 +540,4 @@ Response:"""
                 print(f"✗ Handler {handler_name} failed: {e}")
                 continue
         
-        # Final fallback
-        print("✗ No legacy handler could handle the message")
-        return self._handle_unhandled_query(message, context, {"fallback_used": True}, time.time())
\ No newline at end of file
+        return None
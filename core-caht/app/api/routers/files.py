@@ -8,6 +8,7 @@ from jwt.exceptions import InvalidTokenError
 from typing import Optional
 
 from app.core.db import get_db, set_rls_context
+from app.core.auth_cache import auth_cache, token_id
 from app.services.file_service import FileService
 from app.schemas.chat import prepare_for_json_storage
 
@@ -30,16 +31,7 @@ def verify_auth_and_get_context(
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        from sqlalchemy import text
-        membership = db.execute(
-            text("""
-                SELECT sm.user_id, sm.school_id, sm.role, u.full_name
-                FROM schoolmember sm
-                JOIN users u ON sm.user_id = u.id
-                WHERE sm.user_id = :user_id AND sm.school_id = :school_id
-            """),
-            {"user_id": user_id, "school_id": x_school_id}
-        ).first()
+        membership = auth_cache.get_membership(db, user_id, x_school_id, token_id(payload, token))
         
         if not membership:
             raise HTTPException(status_code=403, detail="Access denied to this school")
@@ -49,8 +41,8 @@ def verify_auth_and_get_context(
         return {
             "user_id": user_id,
             "school_id": x_school_id,
-            "role": membership.role,
-            "full_name": membership.full_name
+            "role": membership["role"],
+            "full_name": membership["full_name"]
         }
         
     except InvalidTokenError:
@@ -0,0 +1,26 @@
+# app/api/routers/jobs.py - Status of background school operations
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.deps.tenancy import require_school
+from app.services.jobs import get_job
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+def get_job_status(
+    job_id: str,
+    school_id: str = Depends(require_school)
+):
+    """Progress and result of a background job started for the active school"""
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    job = get_job(job_id, school_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -45,7 +45,7 @@ async def public_chat(
         prompt = build_public_chat_prompt(message.message, history)
         
         # Get AI response
-        ollama_response = ollama_service.generate_response_sync(prompt)
+        ollama_response = await ollama_service.generate_response(prompt)
         
         if not ollama_response.get("success", True):
             ai_response = "I'm having some technical difficulties right now. Please try again in a moment!"
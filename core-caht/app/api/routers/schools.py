@@ -9,11 +9,10 @@ from app.api.deps.auth import get_current_user
 from app.api.deps.tenancy import require_school
 from app.core.db import get_db, set_rls_context
 from app.models.school import School, SchoolMember
-from app.models.student import Student
 from app.models.class_model import Class
-from app.models.payment import Payment, Invoice
 from app.schemas.school import SchoolCreate, SchoolOut, SchoolLite, SchoolOverview, SchoolMineItem
 from app.services.helpers.bootstrap_school import bootstrap_school
+from app.services.schools import get_school_overview
 
 router = APIRouter(prefix="/schools", tags=["Schools"])
 
@@ -137,38 +136,7 @@ def overview(
     school_id: str = Depends(require_school),
     db: Session = Depends(get_db),
 ):
-    # Convert school_id string to UUID for queries
-    from uuid import UUID
-    school_uuid = UUID(school_id)
-    
-    # counts
-    total_students = db.execute(
-        select(func.count()).select_from(Student).where(Student.school_id == school_uuid)
-    ).scalar_one()
-    total_classes = db.execute(
-        select(func.count()).select_from(Class).where(Class.school_id == school_uuid)
-    ).scalar_one()
-
-    # fees collected (sum of payments)
-    fees_collected = db.execute(
-        select(func.coalesce(func.sum(Payment.amount), 0)).where(Payment.school_id == school_uuid)
-    ).scalar_one()
-    fees_collected_int = int(fees_collected)  # as per spec (int)
-
-    # pending invoices count (ISSUED or PARTIAL)
-    pending_invoices = db.execute(
-        select(func.count()).select_from(Invoice).where(
-            Invoice.school_id == school_uuid,
-            Invoice.status.in_(["ISSUED", "PARTIAL"])
-        )
-    ).scalar_one()
-
-    return SchoolOverview(
-        students=int(total_students),
-        classes=int(total_classes),
-        feesCollected=fees_collected_int,
-        pendingInvoices=int(pending_invoices),
-    )
+    return SchoolOverview(**get_school_overview(db, school_id))
 
 
 # [Rest of the endpoints remain the same...]
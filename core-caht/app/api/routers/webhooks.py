@@ -1,16 +1,18 @@
 # app/api/routers/webhooks.py
 
-from fastapi import APIRouter, Request, HTTPException, Depends, status
+from fastapi import APIRouter, Request, HTTPException, Depends, Query, Body, status
 from sqlalchemy.orm import Session
 import hmac
 import hashlib
 import json
+import uuid
 from typing import Dict, Any, Optional
 import logging
-from datetime import datetime, timezone
 
 from app.core.db import get_db
+from app.core.executor import run_blocking
 from app.api.deps.auth import get_current_user
+from app.api.deps.tenancy import require_school
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Webhooks"])
@@ -64,6 +66,11 @@ async def receive_sms_webhook(
         "message": "SMS message content..."
     }
     
+    The SMS is appended to the durable SMS inbox and acknowledged at once;
+    M-Pesa payments in it are posted by the inbox workers (see
+    app/services/sms_inbox.py). Resending the same SMS is acknowledged again
+    without queueing it twice.
+    
     Security:
     - Requires valid JWT token in Authorization header
     - Requires valid HMAC-SHA256 signature in X-Webhook-Signature header
@@ -112,89 +119,33 @@ async def receive_sms_webhook(
                 detail="Missing 'source' or 'message' fields"
             )
         
-        # Print the received message
-        print(f"SMS received: {message}")
-        
         # Get user info from JWT context
         user = ctx["user"]
         claims = ctx["claims"]
         school_id = claims.get("active_school_id")
         
-        # Process the SMS message with enhanced processor
-        try:
-            from app.services.sms_processor import SMSProcessor
-            
-            sms_processor = SMSProcessor(db, user.id, school_id)
-            processing_result = await sms_processor.process_sms_message(source, message)
-            
-            sms_record = processing_result["sms_record"]
-            payment_result = processing_result.get("payment_result")
-            
-            # Log payment processing result
-            if payment_result:
-                if payment_result.get("success"):
-                    print(f"M-Pesa payment processed: Student {payment_result.get('student_name')} paid KES {payment_result.get('amount')}")
-                else:
-                    print(f"M-Pesa payment failed: {payment_result.get('error')}")
-            
-        except Exception as e:
-            print(f"SMS processing error: {e}")
-            # Fallback to basic processing
-            sms_record = {
-                "id": f"sms_{int(datetime.now(timezone.utc).timestamp())}",
-                "user_id": str(user.id),
-                "school_id": school_id,
-                "source": source,
-                "message": message,
-                "processed_at": datetime.now(timezone.utc).isoformat(),
-                "user_email": user.email,
-                "user_name": user.full_name,
-                "processing_error": str(e)
-            }
+        if not school_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No active school in token"
+            )
+        
+        # Store and acknowledge; parsing and payment posting run in the SMS inbox workers
+        from app.services.sms_inbox import append_sms
+        
+        inbox_record = await run_blocking(append_sms, school_id, str(user.id), str(source), str(message))
+        print(f"SMS queued: {inbox_record['id']} ({'already received' if inbox_record['duplicate'] else 'new'})")
         
-        # Build response based on processing results
         response_data = {
             "success": True,
-            "message": "SMS processed successfully",
-            "record_id": sms_record["id"],
+            "message": "SMS received" if not inbox_record["duplicate"] else "SMS already received",
+            "record_id": inbox_record["id"],
+            "status": inbox_record["status"],
+            "duplicate": inbox_record["duplicate"],
             "user_id": str(user.id),
             "school_id": school_id
         }
         
-        # Add payment processing info if available
-        if payment_result:
-            response_data["payment_processed"] = payment_result.get("success", False)
-            if payment_result.get("success"):
-                response_data["payment_info"] = {
-                    "student_id": payment_result.get("student_id"),
-                    "student_name": payment_result.get("student_name"),
-                    "amount": payment_result.get("amount"),
-                    "reference": payment_result.get("reference")
-                }
-                
-                # Add notification status
-                notifications = payment_result.get("notifications", {})
-                if notifications:
-                    response_data["notifications"] = {
-                        "email_sent": notifications.get("email_sent", False),
-                        "sms_sent": notifications.get("sms_sent", False),
-                        "whatsapp_sent": notifications.get("whatsapp_sent", False)
-                    }
-                    
-                    # Log notification summary
-                    sent_channels = []
-                    if notifications.get("email_sent"): sent_channels.append("Email")
-                    if notifications.get("sms_sent"): sent_channels.append("SMS")
-                    if notifications.get("whatsapp_sent"): sent_channels.append("WhatsApp")
-                    
-                    if sent_channels:
-                        print(f"Parent notifications sent via: {', '.join(sent_channels)}")
-                    else:
-                        print("No parent notifications were sent")
-                        
-            else:
-                response_data["payment_error"] = payment_result.get("error")
-        
         return response_data
         
     except HTTPException:
@@ -207,6 +158,52 @@ async def receive_sms_webhook(
         )
 
 
+@router.get("/sms/inbox")
+def get_sms_inbox(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=500),
+    school_id: str = Depends(require_school)
+):
+    """Recent SMS inbox messages of the active school (e.g. ?status=dead) and counts by status"""
+    from app.services.sms_inbox import list_inbox, inbox_stats, SMS_STATUSES
+    
+    if status_filter and status_filter not in SMS_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown status; expected one of: {', '.join(SMS_STATUSES)}"
+        )
+    
+    return {
+        "stats": inbox_stats(school_id),
+        "messages": list_inbox(school_id, status_filter, limit)
+    }
+
+
+@router.post("/sms/inbox/replay")
+def replay_sms_inbox(
+    body: Optional[Dict[str, Any]] = Body(None),
+    school_id: str = Depends(require_school)
+):
+    """
+    Requeue dead-lettered SMS of the active school, e.g. after adding the
+    missing student or invoice. {"ids": [...]} replays only those messages
+    (dead or ignored ones).
+    """
+    from app.services.sms_inbox import replay_sms
+    
+    ids = (body or {}).get("ids") or None
+    if ids is not None:
+        try:
+            ids = [str(uuid.UUID(str(message_id))) for message_id in ids]
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids must be SMS inbox message ids"
+            )
+    
+    return {"success": True, "replayed": replay_sms(school_id, ids)}
+
+
 @router.post("/sms/test")
 async def test_sms_webhook(
     request: Request,
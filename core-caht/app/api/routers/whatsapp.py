@@ -10,7 +10,8 @@ from datetime import datetime
 from app.api.deps.auth import get_current_user
 from app.api.deps.tenancy import require_school
 from app.core.db import get_db, set_rls_context
-from app.services.whatsapp_service import WhatsAppService
+from app.core.executor import run_blocking
+from app.services.whatsapp_service import WhatsAppService, get_whatsapp_client
 from app.models.school import SchoolWhatsAppSettings
 
 router = APIRouter(prefix="/whatsapp", tags=["WhatsApp"])
@@ -56,20 +57,20 @@ class BulkReminderRequest(BaseModel):
     reminder_type: str  # 'fee_reminder', 'attendance', 'announcement'
     message: Optional[str] = None
     student_ids: Optional[List[str]] = None  # If None, send to all
+    channels: List[str] = ["WHATSAPP"]  # WHATSAPP and/or EMAIL
 
-def get_school_whatsapp_service(school_id: str, db: Session) -> WhatsAppService:
-    """Get WhatsApp service instance for the given school WITH database session"""
-    return WhatsAppService.for_school(school_id, db_session=db)
+def get_school_whatsapp_service(school_id: str) -> WhatsAppService:
+    """The school's shared WhatsApp client (keep-alive connection, cached status)"""
+    return get_whatsapp_client(school_id)
 
 @router.get("/status", response_model=WhatsAppConnectionStatus)
 async def get_whatsapp_status(
     school_id: str = Depends(require_school),
-    ctx = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    ctx = Depends(get_current_user)
 ):
-    """Check WhatsApp connection status for this school"""
+    """Check WhatsApp connection status for this school (cached for WHATSAPP_STATUS_TTL_SECONDS)"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         health_check = whatsapp_service.check_bridge_health()
         
         return WhatsAppConnectionStatus(
@@ -95,7 +96,7 @@ async def initialize_whatsapp_connection(
 ):
     """Initialize WhatsApp connection for this school"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         
         print(f"Initializing WhatsApp connection for school: {school_id}")
         print(f"Connection token: {whatsapp_service.connection_token}")
@@ -158,7 +159,7 @@ async def connect_whatsapp(
 ):
     """Connect WhatsApp for this school (alias for /init endpoint)"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         
         print(f"Connecting WhatsApp for school: {school_id}")
         print(f"Connection token: {whatsapp_service.connection_token}")
@@ -216,16 +217,14 @@ async def connect_whatsapp(
 @router.get("/qr")
 async def get_whatsapp_qr(
     school_id: str = Depends(require_school),
-    ctx = Depends(get_current_user),
-    db: Session = Depends(get_db)  # FIXED: Added database session dependency
+    ctx = Depends(get_current_user)
 ):
     """Get current QR code for this school's WhatsApp instance"""
     try:
         print(f"=== QR CODE ENDPOINT ===")
         print(f"School ID: {school_id}")
         
-        # FIXED: Pass database session to service
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         print(f"Service connection token: {whatsapp_service.connection_token}")
         
         qr_result = whatsapp_service.get_qr_code()
@@ -273,7 +272,7 @@ async def check_whatsapp_connection_status(
 ):
     """Check if WhatsApp has been connected (QR code scanned) and update database accordingly"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         
         print(f"Checking connection status for school: {school_id}")
         
@@ -366,7 +365,7 @@ async def send_whatsapp_message(
         print(f"Message: '{request.message[:50]}...'")
         print(f"Student ID: {request.student_id}")
         
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         print(f"Using connection token: {whatsapp_service.connection_token}")
         
         # Verify phone number format and clean it
@@ -447,7 +446,7 @@ async def verify_whatsapp_number(
 ):
     """Verify if a phone number is registered on WhatsApp"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         is_registered = whatsapp_service.verify_whatsapp_registration(phone_number)
         
         return {
@@ -466,7 +465,7 @@ async def test_bridge_direct(
 ):
     """Direct bridge connectivity test for debugging"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         
         # Test bridge health directly
         import requests
@@ -550,7 +549,7 @@ async def test_bridge_direct(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Bridge test failed: {str(e)}")
 
-# ... [rest of the endpoints remain the same but updated to use get_school_whatsapp_service(school_id, db)]
+# ... [rest of the endpoints remain the same but updated to use get_school_whatsapp_service(school_id)]
 
 @router.post("/disconnect") 
 async def disconnect_whatsapp(
@@ -560,7 +559,7 @@ async def disconnect_whatsapp(
 ):
     """Disconnect WhatsApp Web session for this school"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         disconnect_result = whatsapp_service.logout()
         
         # Update using SQLAlchemy model
@@ -589,6 +588,58 @@ async def disconnect_whatsapp(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Disconnect failed: {str(e)}")
 
+@router.post("/reminders")
+async def send_bulk_reminders(
+    request: BulkReminderRequest,
+    school_id: str = Depends(require_school),
+    ctx = Depends(get_current_user)
+):
+    """Start a fee-reminder broadcast to the guardians of students with a balance (background job)"""
+    from app.services.fee_reminders import start_fee_reminder_broadcast
+
+    if request.reminder_type != "fee_reminder":
+        raise HTTPException(status_code=400, detail=f"Unsupported reminder type: {request.reminder_type}")
+    if request.student_ids:
+        try:
+            [uuid.UUID(student_id) for student_id in request.student_ids]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="student_ids must be UUIDs")
+    try:
+        job = await run_blocking(
+            start_fee_reminder_broadcast, school_id, str(ctx["user"].id), request.channels,
+            request.student_ids, request.message
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "broadcast_id": job["id"],
+        "job": job,
+        "status_endpoint": f"/api/whatsapp/reminders/{job['id']}"
+    }
+
+@router.get("/reminders/{broadcast_id}")
+async def get_bulk_reminder_status(
+    broadcast_id: str,
+    school_id: str = Depends(require_school)
+):
+    """Queueing progress and delivery counts of a fee-reminder broadcast"""
+    from app.services.fee_reminders import broadcast_status
+    from app.services.jobs import get_job
+
+    try:
+        uuid.UUID(broadcast_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    job = await run_blocking(get_job, broadcast_id, school_id)
+    if not job or job["kind"] != "fee_reminder_broadcast":
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return {
+        "broadcast_id": broadcast_id,
+        "job": job,
+        "delivery": await run_blocking(broadcast_status, school_id, broadcast_id)
+    }
+
 @router.get("/debug/connection-info")
 async def get_connection_debug_info(
     school_id: str = Depends(require_school),
@@ -597,7 +648,7 @@ async def get_connection_debug_info(
 ):
     """Get connection debug information for this school"""
     try:
-        whatsapp_service = get_school_whatsapp_service(school_id, db)
+        whatsapp_service = get_school_whatsapp_service(school_id)
         health_check = whatsapp_service.check_bridge_health()
         
         return {
@@ -622,8 +673,8 @@ async def get_request_format():
             "4": "POST /whatsapp/send - Send messages once connected"
         },
         "qr_code_lifecycle": {
-            "generated": "QR code is stored in database when fetched from bridge",
+            "generated": "QR code is fetched from the bridge",
             "scanned": "When scanned, connection becomes 'ready' and QR code is cleared",
-            "persistent": "QR codes are cached for 10 minutes to avoid repeated bridge calls"
+            "cached": "QR code and status are reused for a few seconds (WHATSAPP_QR_TTL_SECONDS / WHATSAPP_STATUS_TTL_SECONDS) so polling does not hit the bridge each time"
         }
     }
\ No newline at end of file
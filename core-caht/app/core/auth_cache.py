@@ -0,0 +1,130 @@
+# app/core/auth_cache.py - Short-TTL cache of authenticated users and school memberships
+"""
+Every authenticated request used to re-read the same rows: get_current_user
+selects the User, and the chat/files dependencies join schoolmember to users.
+Both are cached here for AUTH_CACHE_TTL_SECONDS (default 30), keyed by
+(user_id, school_id, token id), so a new token never reuses another token's
+entry.
+
+Role/active changes (admin user management) and school switches call
+invalidate_user(). Other workers see such changes once their TTL runs out.
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.models.user import User
+
+
+def token_id(claims: Dict[str, Any], token: str) -> str:
+    """jti when the token has one, otherwise a digest of the token itself"""
+    return claims.get("jti") or hashlib.sha1(token.encode()).hexdigest()[:20]
+
+
+class AuthContextCache:
+    """TTL map of user snapshots and membership rows, invalidated per user"""
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[str, Hashable, str], Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _get(self, key):
+        if self.ttl_seconds <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.stats["misses"] += 1
+        return None
+
+    def _put(self, key, value):
+        if self.ttl_seconds <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest if still full
+                for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl_seconds, value)
+
+    # === USERS ===
+
+    def get_user(self, db: Session, user_id: str, tid: str) -> Optional[User]:
+        """Cached User attached to db without a query, or None on a miss"""
+        snapshot = self._get((user_id, "user", tid))
+        if snapshot is None:
+            return None
+        # load=False copies the cached state into the session without SELECT
+        return db.merge(snapshot, load=False)
+
+    def put_user(self, user: User, tid: str):
+        """Store a detached copy of user's columns; the request's instance stays untouched"""
+        mapper = inspect(User)
+        snapshot = User(**{attr.key: getattr(user, attr.key) for attr in mapper.column_attrs})
+        make_transient_to_detached(snapshot)
+        self._put((str(user.id), "user", tid), snapshot)
+
+    # === MEMBERSHIPS ===
+
+    def get_membership(self, db: Session, user_id: str, school_id: str, tid: str) -> Optional[Dict[str, Any]]:
+        """role/full_name for a school member, from cache or one query; None if not a member"""
+        key = (user_id, school_id, tid)
+        membership = self._get(key)
+        if membership is not None:
+            return membership
+
+        row = db.execute(
+            text("""
+                SELECT sm.role, u.full_name
+                FROM schoolmember sm
+                JOIN users u ON sm.user_id = u.id
+                WHERE sm.user_id = :user_id AND sm.school_id = :school_id
+            """),
+            {"user_id": user_id, "school_id": school_id}
+        ).first()
+        if not row:
+            return None
+
+        membership = {"role": row.role, "full_name": row.full_name}
+        self._put(key, membership)
+        return membership
+
+    # === INVALIDATION ===
+
+    def invalidate_user(self, user_id):
+        """Forget everything cached for a user (roles, active flag, memberships)"""
+        user_id = str(user_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "ttl_seconds": self.ttl_seconds}
+
+
+auth_cache = AuthContextCache(
+    ttl_seconds=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30")),
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+)
@@ -29,6 +29,14 @@ def get_db():
 
 def set_rls_context(db, *, user_id: str | None = None, school_id: str | None = None):
     """Set RLS context variables for the current transaction"""
+    if user_id and school_id:
+        # Both in one round-trip
+        db.execute(
+            text("SELECT set_config('app.current_user_id', :u, true), "
+                 "set_config('app.current_school_id', :s, true)"),
+            {"u": str(user_id), "s": str(school_id)},
+        )
+        return
     if user_id:
         user_id_str = str(user_id)
         db.execute(
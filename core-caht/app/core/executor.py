@@ -0,0 +1,29 @@
+# app/core/executor.py - Bounded shared executor for blocking work called from async code
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Sized below the SQLAlchemy pool (5 + 10 overflow) so queued work waits here,
+# not on a connection checkout inside a thread
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_EXECUTOR_WORKERS", "12"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking-io")
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """The process-wide executor for sync DB / SDK calls"""
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable on the shared executor without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_blocking_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,6 +1,7 @@
 # app/core/security.py
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
+import uuid
 import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
@@ -21,6 +22,7 @@ def create_token(sub: str, roles: list[str], active_school_id: Optional[str], mi
         "roles": roles,
         "active_school_id": active_school_id,
         "iat": int(now.timestamp()),
+        "jti": uuid.uuid4().hex,
         "exp": int((now + timedelta(minutes=minutes)).timestamp()),
     }
     
@@ -12,6 +12,8 @@ from app.api.routers import webhooks as webhooks_router
 from app.api.routers import mobile as mobile_router
 from app.api.routers import test_file as test_router
 from app.api.routers import public as public_router
+from app.api.routers import jobs as jobs_router
+from app.api.routers import academics as academics_router
 from app.api.routers.admin.intent_config import router as intent_config_router
 from app.api.routers.admin import suggestion_management as suggestion_router
 from app.api.routers.admin import tester_queue as tester_router
@@ -187,6 +189,50 @@ def create_app() -> FastAPI:
                 import traceback
                 traceback.print_exc()
             
+            # Keep this worker's pattern index in sync with admin changes
+            try:
+                from app.services.config_events import config_listener
+                await config_listener.start()
+            except Exception as e:
+                print(f"⚠️  Config change listener not started: {e}")
+            
+            # Evict this worker's cached conversation state when another worker commits a turn
+            try:
+                from app.services.conversation_state import conversation_state_listener
+                await conversation_state_listener.start()
+            except Exception as e:
+                print(f"⚠️  Conversation state listener not started: {e}")
+            
+            # Routing telemetry is written in batches off the request path
+            try:
+                from app.services.routing_telemetry import get_routing_log_sink
+                await get_routing_log_sink().start()
+            except Exception as e:
+                print(f"⚠️  Routing log flusher not started: {e}")
+            
+            # Background job workers (bulk invoicing, bulk enrollment, term rollover)
+            try:
+                from app.services.jobs import get_embedded_job_workers
+                get_embedded_job_workers().start()
+            except Exception as e:
+                print(f"⚠️  Embedded job workers not started: {e}")
+            
+            # SMS inbox workers post the M-Pesa payments the SMS webhook queues
+            try:
+                from app.services.sms_inbox import get_embedded_sms_inbox_workers
+                get_embedded_sms_inbox_workers().start()
+            except Exception as e:
+                print(f"⚠️  Embedded SMS inbox workers not started: {e}")
+            
+            # Notification dispatchers send the guardian emails/WhatsApp messages payments queue
+            from app.services.notification_dispatcher import get_embedded_notification_dispatchers
+            for dispatchers in get_embedded_notification_dispatchers():
+                # One channel's missing settings (e.g. SMTP credentials) must not stop the other
+                try:
+                    dispatchers.start()
+                except Exception as e:
+                    print(f"⚠️  Embedded {dispatchers.label} dispatchers not started: {e}")
+            
             # Test other critical services
             print("\n🔧 Testing critical services...")
             
@@ -236,6 +282,29 @@ def create_app() -> FastAPI:
             traceback.print_exc()
             print("\n⚠️  Application may not function correctly!")
 
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        """Stop background services on shutdown"""
+        from app.services.config_events import config_listener
+        await config_listener.stop()
+        from app.services.conversation_state import conversation_state_listener
+        await conversation_state_listener.stop()
+        from app.services.routing_telemetry import get_routing_log_sink
+        await get_routing_log_sink().stop()
+        from app.services.llm_client import get_llm_client
+        await get_llm_client().close()
+        from app.services.jobs import get_embedded_job_workers
+        get_embedded_job_workers().stop()
+        from app.services.sms_inbox import get_embedded_sms_inbox_workers
+        get_embedded_sms_inbox_workers().stop()
+        from app.services.notification_dispatcher import get_embedded_notification_dispatchers
+        for dispatchers in get_embedded_notification_dispatchers():
+            dispatchers.stop()
+        from app.services.whatsapp_service import close_whatsapp_clients
+        close_whatsapp_clients()
+        from app.core.executor import shutdown_blocking_executor
+        shutdown_blocking_executor()
+
     # Include routers
     app.include_router(auth_router.router, prefix="/api")
     app.include_router(schools_router.router, prefix="/api")
@@ -245,6 +314,8 @@ def create_app() -> FastAPI:
     app.include_router(mobile_router.router, prefix="/api")
     app.include_router(test_router.router, prefix="/api")
     app.include_router(public_router.router)
+    app.include_router(jobs_router.router, prefix="/api")
+    app.include_router(academics_router.router, prefix="/api")
     app.include_router(intent_config_router, prefix="/api")
     app.include_router(suggestion_router.router, prefix="/api")
     app.include_router(tester_router.router, prefix="/api")
@@ -299,9 +370,8 @@ def create_app() -> FastAPI:
     async def whatsapp_health():
         """Quick health check endpoint for WhatsApp bridge"""
         try:
-            from app.services.whatsapp_service import WhatsAppService
-            whatsapp_service = WhatsAppService()
-            health_check = whatsapp_service.check_bridge_health()
+            from app.services.whatsapp_service import get_whatsapp_client
+            health_check = get_whatsapp_client().check_bridge_health()
             return {
                 "whatsapp_ready": health_check.get("ready", False),
                 "error": health_check.get("error")
@@ -379,10 +449,12 @@ def create_app() -> FastAPI:
                 from app.services.ollama_service import OllamaService
                 ollama_service = OllamaService()
                 is_healthy = ollama_service.health_check_sync()
+                from app.services.llm_client import get_llm_client
                 health["services"]["ollama"] = {
                     "status": "healthy" if is_healthy else "unhealthy",
                     "model": ollama_service.model,
-                    "base_url": ollama_service.base_url
+                    "base_url": ollama_service.base_url,
+                    "client": get_llm_client().get_stats()
                 }
             except Exception as e:
                 health["services"]["ollama"] = {"status": "unhealthy", "error": str(e)}
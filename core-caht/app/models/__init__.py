@@ -10,11 +10,13 @@ from app.models.class_model import Class
 from app.models.guardian import Guardian, StudentGuardian
 from app.models.academic import AcademicYear, AcademicTerm, Enrollment, EnrollmentStatusEvent
 from app.models.fee import FeeStructure, FeeItem
-from app.models.payment import Invoice, InvoiceLine, Payment
+from app.models.payment import Invoice, InvoiceLine, Payment, StudentBalance
 from app.models.chat import ChatConversation, ChatMessage
 from app.models.accounting import GLAccount, JournalEntry, JournalLine
 from app.models.cbc_level import CbcLevel
 from app.models.notification import Notification
+from app.models.job import BackgroundJob
+from app.models.sms_inbox import SmsInboxMessage
 
 # Import forward references for proper relationship configuration
 from typing import TYPE_CHECKING
@@ -40,6 +42,7 @@ __all__ = [
     "Invoice",
     "InvoiceLine",
     "Payment",
+    "StudentBalance",
     "ChatConversation",
     "ChatMessage",
     "GLAccount",
@@ -47,4 +50,6 @@ __all__ = [
     "JournalLine",
     "CbcLevel",
     "Notification",
+    "BackgroundJob",
+    "SmsInboxMessage",
 ]
\ No newline at end of file
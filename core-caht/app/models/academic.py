@@ -84,6 +84,7 @@ class Enrollment(Base):
     
     __table_args__ = (
         Index("uq_enrollment_student_term", "school_id", "student_id", "term_id", unique=True),
+        Index("ix_enrollments_school_term_status", "school_id", "term_id", "status"),
         CheckConstraint("status IN ('ENROLLED','TRANSFERRED_OUT','SUSPENDED','DROPPED','GRADUATED')", name="ck_enrollment_status"),
     )
 
@@ -1,6 +1,6 @@
 # app/models/chat.py - Updated ChatMessage model with rating support
 import uuid
-from sqlalchemy import Column, String, DateTime, Text, Integer, Boolean, UUID, Enum, JSON, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, Integer, Boolean, UUID, Enum, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
@@ -66,5 +66,9 @@ class ChatMessage(Base):
     # Relationships
     conversation = relationship("ChatConversation", back_populates="messages")
     
+    __table_args__ = (
+        Index("ix_chat_messages_type_created_intent", "message_type", "created_at", "intent"),
+    )
+    
     def __repr__(self):
         return f"<ChatMessage(id='{self.id}', type='{self.message_type}', rating='{self.rating}')>"
\ No newline at end of file
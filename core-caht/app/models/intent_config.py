@@ -2,7 +2,7 @@
 import uuid
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Column, String, Text, Integer, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Text, Integer, Float, Boolean, DateTime, ForeignKey, JSON, Index, text
 from sqlalchemy.dialects.postgresql import ENUM as PgEnum, ARRAY
 from sqlalchemy.orm import relationship
 
@@ -176,5 +176,13 @@ class RoutingLog(Base):
     # Relationships
     version = relationship("IntentConfigVersion", back_populates="routing_logs")
 
+    __table_args__ = (
+        Index("ix_routing_logs_created_fallback_intent", "created_at", "fallback_used", "final_intent"),
+        Index(
+            "ix_routing_logs_problems", "created_at",
+            postgresql_where=text("fallback_used OR final_intent IN ('unhandled', 'unknown', 'ollama_fallback')")
+        ),
+    )
+
     def __repr__(self):
         return f"<RoutingLog(final_handler={self.final_handler}, final_intent={self.final_intent}, fallback={self.fallback_used})>"
\ No newline at end of file
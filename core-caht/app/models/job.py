@@ -0,0 +1,63 @@
+# app/models/job.py - Postgres-backed background job queue
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import String, Integer, Text, DateTime, Index, CheckConstraint, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    school_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False, index=True)
+    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+
+    kind: Mapped[str] = mapped_column(String(64), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")  # queued|running|succeeded|failed
+    payload: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False, default=dict)
+    result: Mapped[Optional[dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Same (school, kind, key) can't be queued/running twice
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=3)
+
+    # Progress, written by the worker outside the job's own transaction
+    progress_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    progress_total: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    progress_message: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+
+    # Scheduling / leasing
+    run_after: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('queued','running','succeeded','failed')", name="status"),
+        # Workers claim with: status = 'queued' AND run_after <= now() ORDER BY run_after
+        Index("ix_background_jobs_claim", "run_after", postgresql_where=text("status = 'queued'")),
+        # Expired leases are reclaimed from here
+        Index("ix_background_jobs_running", "locked_at", postgresql_where=text("status = 'running'")),
+        Index(
+            "uq_background_jobs_active_key", "school_id", "kind", "idempotency_key",
+            unique=True,
+            postgresql_where=text("idempotency_key IS NOT NULL AND status IN ('queued','running')")
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return f"<BackgroundJob id={self.id} kind={self.kind} status={self.status}>"
@@ -1,18 +1,49 @@
 # app/models/notification.py - Fixed to use correct Base import
-from sqlalchemy import String, Boolean, DateTime
+from typing import Any, Optional
+
+from sqlalchemy import String, Integer, Text, DateTime, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime, timezone
 from app.models.base import Base  # 🔧 FIXED: Import from models.base
 import uuid
 
 class Notification(Base):
+    """A guardian/user message; EMAIL and WHATSAPP rows form the outbox the notification dispatcher sends"""
     __tablename__ = "notification"  # Keep existing table name if it exists
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     school_id: Mapped[str] = mapped_column(String(36), index=True, nullable=False)
-    type: Mapped[str] = mapped_column(String(16), nullable=False)  # IN_APP / EMAIL
+    type: Mapped[str] = mapped_column(String(16), nullable=False)  # IN_APP / EMAIL / WHATSAPP
+    kind: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)  # payment_receipt / invoice_notice
+    recipient: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)  # email address or phone
     subject: Mapped[str] = mapped_column(String(255), nullable=True)
-    body: Mapped[str] = mapped_column(String(2000), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    payload: Mapped[Optional[dict[str, Any]]] = mapped_column(JSONB, nullable=True)
     to_guardian_id: Mapped[str | None] = mapped_column(String(36), index=True)
     to_user_id: Mapped[str | None] = mapped_column(String(36), index=True)
-    status: Mapped[str] = mapped_column(String(16), default="QUEUED")  # QUEUED/SENT/FAILED
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    status: Mapped[str] = mapped_column(String(16), default="QUEUED")  # QUEUED/SENDING/SENT/FAILED
+    # One message per (school, type, key), e.g. a receipt per payment reference
+    dedupe_key: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    # Fee-reminder broadcast (its job id) the message belongs to
+    broadcast_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    run_after: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Dispatchers claim with: status = 'QUEUED' AND type = ANY(...) AND run_after <= now()
+        Index("ix_notification_claim", "type", "run_after", postgresql_where=text("status = 'QUEUED'")),
+        # Expired leases are reclaimed from here
+        Index("ix_notification_sending", "locked_at", postgresql_where=text("status = 'SENDING'")),
+        Index("uq_notification_dedupe", "school_id", "type", "dedupe_key", unique=True,
+              postgresql_where=text("dedupe_key IS NOT NULL")),
+        # Delivery counts of a broadcast
+        Index("ix_notification_broadcast", "broadcast_id", "type", "status",
+              postgresql_where=text("broadcast_id IS NOT NULL")),
+    )
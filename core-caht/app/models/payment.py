@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from datetime import date, datetime
 from decimal import Decimal
-from sqlalchemy import String, Integer, Numeric, Date, DateTime, ForeignKey, CheckConstraint, Index
+from sqlalchemy import String, Integer, Numeric, Date, DateTime, ForeignKey, CheckConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.models.base import Base
@@ -20,6 +20,8 @@ class Invoice(Base):
     total: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False, default=Decimal('0.00'))
     status: Mapped[str] = mapped_column(String(16), nullable=False, default="DRAFT")  # DRAFT|ISSUED|PAID|PARTIAL
     due_date: Mapped[date | None] = mapped_column(Date)
+    # Sum of this invoice's payments, kept by app/services/balance_ledger.py
+    amount_paid: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False, default=Decimal('0.00'), server_default="0")
     
     # Add required timestamp fields
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
@@ -33,6 +35,11 @@ class Invoice(Base):
         CheckConstraint("status IN ('DRAFT','ISSUED','PAID','PARTIAL')", name="ck_invoice_status"),
         CheckConstraint("total >= 0", name="ck_invoice_total_positive"),
         Index("ix_invoices_school_student_term", "school_id", "student_id", "term", "year"),
+        Index(
+            "ix_invoices_open_balance", "school_id", "student_id",
+            postgresql_include=["total", "amount_paid", "due_date"],
+            postgresql_where=text("status IN ('ISSUED', 'PARTIAL')")
+        ),
     )
 
 
@@ -59,6 +66,9 @@ class Payment(Base):
         CheckConstraint("method IN ('CASH','BANK','MPESA')", name="ck_payment_method"),
         CheckConstraint("amount > 0", name="ck_payment_amount_positive"),
         Index("ix_payments_school_invoice", "school_id", "invoice_id"),
+        Index("ix_payments_invoice", "invoice_id"),
+        # Duplicate M-Pesa transaction checks (SMS inbox)
+        Index("ix_payments_school_txn_ref", "school_id", "txn_ref"),
     )
 
 
@@ -82,4 +92,28 @@ class InvoiceLine(Base):
     __table_args__ = (
         CheckConstraint("amount >= 0", name="ck_invoiceline_amount_positive"),
         Index("ix_invoiceline_school_invoice", "school_id", "invoice_id"),
-    )
\ No newline at end of file
+    )
+
+class StudentBalance(Base):
+    """
+    Running balance per student over their open (ISSUED/PARTIAL) invoices.
+    Maintained by app/services/balance_ledger.py on every payment and new
+    invoice; reconcile_balances() rebuilds it from invoices and payments.
+    """
+    __tablename__ = "student_balances"
+
+    school_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    student_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    outstanding: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False, default=Decimal('0.00'), server_default="0")
+    open_invoices: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    total_paid: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False, default=Decimal('0.00'), server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # "Who owes money" lists read only this index
+        Index(
+            "ix_student_balances_owing", "school_id", "outstanding",
+            postgresql_include=["student_id", "open_invoices"],
+            postgresql_where=text("outstanding > 0")
+        ),
+    )
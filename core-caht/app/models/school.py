@@ -91,6 +91,8 @@ class SchoolWhatsAppSettings(Base):
     
     # Optional: Store bridge URL if different per school
     bridge_url: Mapped[str | None] = mapped_column(String(256))
+    # Send rate this school's bridge instance tolerates; NOTIFY_WHATSAPP_PER_MINUTE when unset
+    messages_per_minute: Mapped[int | None] = mapped_column(Integer)
     
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
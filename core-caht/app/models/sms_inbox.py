@@ -0,0 +1,63 @@
+# app/models/sms_inbox.py - Durable inbox of SMS forwarded by the Android webhook
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import BigInteger, Identity, String, Integer, Text, DateTime, Index, CheckConstraint, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class SmsInboxMessage(Base):
+    __tablename__ = "sms_inbox"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Arrival order; a school's messages are processed strictly in this order
+    seq: Mapped[int] = mapped_column(BigInteger, Identity(), nullable=False, unique=True)
+    school_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+
+    source: Mapped[str] = mapped_column(String(64), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    # sha256 of the body; a forwarder retry of the same SMS is acknowledged, not stored twice
+    body_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")  # pending|processing|processed|duplicate|ignored|dead
+    message_type: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    reference: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # M-Pesa transaction code
+    parsed: Mapped[Optional[dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    result: Mapped[Optional[dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    run_after: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    received_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('pending','processing','processed','duplicate','ignored','dead')",
+            name="status"
+        ),
+        Index("uq_sms_inbox_body", "school_id", "body_hash", unique=True),
+        # A transaction reference is posted at most once per school
+        Index(
+            "uq_sms_inbox_processed_reference", "school_id", "reference",
+            unique=True, postgresql_where=text("status = 'processed' AND reference IS NOT NULL")
+        ),
+        # Head of each school's queue: its oldest open message
+        Index("ix_sms_inbox_open", "school_id", "seq", postgresql_where=text("status IN ('pending','processing')")),
+        Index("ix_sms_inbox_school_status", "school_id", "status", "seq"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<SmsInboxMessage seq={self.seq} school_id={self.school_id} status={self.status}>"
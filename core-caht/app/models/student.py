@@ -2,8 +2,8 @@
 from __future__ import annotations
 import uuid
 from datetime import date, datetime
-from sqlalchemy import String, Date, ForeignKey, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import String, Text, Date, ForeignKey, DateTime, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.models.base import Base
 
@@ -24,5 +24,22 @@ class Student(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Name search (app/services/student_search.py). The trigram index on
+    # search_name needs pg_trgm and is created by migration f1a7c3b92d06 only
+    search_name: Mapped[str | None] = mapped_column(
+        Text, Computed("lower(first_name || ' ' || last_name)", persisted=True)
+    )
+    name_tsv = mapped_column(
+        TSVECTOR, Computed("to_tsvector('simple', first_name || ' ' || last_name)", persisted=True),
+        deferred=True
+    )
+
     # Add the enrollments relationship back
-    enrollments: Mapped[list["Enrollment"]] = relationship("Enrollment", back_populates="student", cascade="all, delete-orphan")
\ No newline at end of file
+    enrollments: Mapped[list["Enrollment"]] = relationship("Enrollment", back_populates="student", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_students_name_tsv", "name_tsv", postgresql_using="gin"),
+        Index("ix_students_school_status", "school_id", "status"),
+        Index("ix_students_class_status", "class_id", "status"),
+        Index("ix_students_school_admission", "school_id", "admission_no"),
+    )
\ No newline at end of file
@@ -120,9 +120,15 @@ class StatusItem(BaseModel):
     state: Literal["ok", "warning", "error", "unknown", "success", "complete", "active", "ready", "good", "missing", "critical", "failed", "pending", "needs_setup", "inactive"]
     detail: Optional[str] = None
 
+class StatusPoll(BaseModel):
+    # Client re-fetches endpoint every intervalMs until the job finishes
+    endpoint: str
+    intervalMs: int = 2000
+
 class StatusBlock(BaseModel):
     type: Literal["status"]
     items: List[StatusItem]
+    poll: Optional[StatusPoll] = None
 
 # Button and confirmation block types
 
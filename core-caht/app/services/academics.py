@@ -6,16 +6,79 @@ Integrates academic year/term management with enrollment system.
 Provides unified workflows for academic progression and enrollment management.
 """
 
+import uuid
 from datetime import date, datetime, timedelta
 from typing import Optional, List, Dict, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, func, or_
+from sqlalchemy import select, and_, func, or_, text
 
 from app.models.academic import AcademicYear, AcademicTerm, Enrollment, EnrollmentStatusEvent
 from app.models.student import Student
 from app.models.class_model import Class
 
 
+# Term rollover in one statement. Students in a class with a promotion rule
+# move to the rule's class (a NULL target graduates them); everyone else stays
+# in their class. Students already enrolled in the next term are left alone.
+_ROLLOVER_ENROLLMENTS_SQL = text("""
+    WITH rules AS (
+        SELECT r.from_class_id, r.to_class_id
+        FROM unnest(
+            CAST(:rule_from AS uuid[]),
+            CAST(:rule_to AS uuid[])
+        ) AS r(from_class_id, to_class_id)
+    ), previous AS (
+        SELECT e.id, e.student_id, e.class_id AS from_class_id,
+               CASE WHEN r.from_class_id IS NULL THEN e.class_id ELSE r.to_class_id END AS to_class_id
+        FROM enrollments e
+        LEFT JOIN rules r ON r.from_class_id = e.class_id
+        WHERE e.school_id = :school_id
+          AND e.term_id = :from_term_id
+          AND e.status = 'ENROLLED'
+    ), carried AS (
+        INSERT INTO enrollments (id, school_id, student_id, class_id, term_id, status, joined_on, created_at, updated_at)
+        SELECT gen_random_uuid(), :school_id, p.student_id, p.to_class_id, :to_term_id, 'ENROLLED', :today, :now, :now
+        FROM previous p
+        WHERE p.to_class_id IS NOT NULL
+        ON CONFLICT (school_id, student_id, term_id) DO NOTHING
+        RETURNING id, student_id, class_id
+    ), graduated AS (
+        UPDATE enrollments e
+        SET status = 'GRADUATED', left_on = :today, updated_at = :now
+        FROM previous p
+        WHERE e.id = p.id AND p.to_class_id IS NULL
+        RETURNING e.id, e.student_id
+    ), moved_students AS (
+        UPDATE students s
+        SET class_id = c.class_id, updated_at = :now
+        FROM carried c
+        WHERE s.id = c.student_id AND s.class_id IS DISTINCT FROM c.class_id
+        RETURNING s.id
+    ), graduated_students AS (
+        UPDATE students s
+        SET status = 'GRADUATED', updated_at = :now
+        FROM graduated g
+        WHERE s.id = g.student_id
+        RETURNING s.id
+    ), events AS (
+        INSERT INTO enrollment_status_events (id, school_id, enrollment_id, prev_status, new_status, reason, event_date, created_at, updated_at)
+        SELECT gen_random_uuid(), :school_id, c.id, NULL, 'ENROLLED', 'Auto-enrolled from previous term', :today, :now, :now
+        FROM carried c
+        UNION ALL
+        SELECT gen_random_uuid(), :school_id, g.id, 'ENROLLED', 'GRADUATED', 'Graduated at term rollover', :today, :now, :now
+        FROM graduated g
+        RETURNING id
+    )
+    SELECT
+        (SELECT count(*) FROM previous) AS previous_count,
+        (SELECT count(*) FROM carried) AS carried_count,
+        (SELECT count(*) FROM carried c JOIN previous p ON p.student_id = c.student_id
+          WHERE c.class_id <> p.from_class_id) AS promoted_count,
+        (SELECT count(*) FROM graduated) AS graduated_count,
+        (SELECT count(*) FROM events) AS event_count
+""")
+
+
 class AcademicManagementService:
     """Unified academic and enrollment management"""
     
@@ -189,10 +252,22 @@ class AcademicManagementService:
                       (f" and {activated_term.title}" if activated_term else "")
         }
     
-    def advance_to_next_term(self, force: bool = False) -> Dict:
+    def advance_to_next_term(
+        self,
+        force: bool = False,
+        promotion_rules: Optional[Dict[str, Optional[str]]] = None,
+        generate_invoices: bool = False
+    ) -> Dict:
         """
         Advance from current active term to the next term.
         Handles enrollment status updates and term transitions.
+        
+        Args:
+            force: Close the term even if it has unfinished business
+            promotion_rules: {"from_class_id": "to_class_id"} for students moving
+                class (e.g. at year end); a None target graduates the class.
+                Classes without a rule carry over unchanged.
+            generate_invoices: Invoice the carried-over students for the new term
         """
         
         # Get current active term
@@ -267,11 +342,17 @@ class AcademicManagementService:
         # Handle enrollment transitions
         enrollment_transitions = self._handle_term_transition_enrollments(
             current_term_obj.id, 
-            next_term.id
+            next_term.id,
+            promotion_rules=promotion_rules
         )
         
         self.db.flush()
         
+        invoices = None
+        if generate_invoices:
+            from app.services.fees import get_fees_service
+            invoices = get_fees_service(self.db, self.school_id).generate_invoices_bulk(next_term.id).to_dict()
+        
         return {
             "success": True,
             "previous_term": {
@@ -286,6 +367,7 @@ class AcademicManagementService:
                 "year": next_term.year_id
             },
             "enrollment_transitions": enrollment_transitions,
+            "invoices": invoices,
             "message": f"Advanced from {current_term_obj.title} to {next_term.title}"
         }
     
@@ -410,39 +492,51 @@ class AcademicManagementService:
             auto_generate_invoices: Whether to generate invoices automatically
         """
         
-        from app.services.enrollment import get_enrollment_service
-        enrollment_service = get_enrollment_service(self.db, self.school_id)
-        
-        successful_enrollments = []
-        failed_enrollments = []
+        from app.services.bulk_enrollment import BulkEnroller, FAILURE_MESSAGES
         
-        for mapping in enrollment_mappings:
-            try:
-                result = enrollment_service.enroll_student(
-                    student_id=mapping["student_id"],
-                    class_id=mapping["class_id"],
-                    term_id=term_id,
-                    auto_generate_invoice=auto_generate_invoices
+        term = self.db.execute(
+            select(AcademicTerm).where(
+                and_(
+                    AcademicTerm.id == term_id,
+                    AcademicTerm.school_id == self.school_id
                 )
-                successful_enrollments.append(result)
-                
-            except Exception as e:
-                failed_enrollments.append({
-                    "student_id": mapping["student_id"],
-                    "class_id": mapping["class_id"],
-                    "error": str(e)
-                })
-        
-        self.db.flush()
+            )
+        ).scalar_one_or_none()
+        if not term:
+            raise ValueError("Term not found")
+        
+        class_by_student = {str(m["student_id"]): m["class_id"] for m in enrollment_mappings}
+        result = BulkEnroller(self.db, self.school_id).enroll(
+            term_id,
+            enrollment_mappings,
+            reason=f"Bulk enrolled for {term.title}",
+            generate_invoices=auto_generate_invoices
+        )
         
         return {
             "term_id": term_id,
-            "successful_enrollments": len(successful_enrollments),
-            "failed_enrollments": len(failed_enrollments),
-            "success_details": successful_enrollments,
-            "failure_details": failed_enrollments,
+            "successful_enrollments": result.enrolled_count,
+            "failed_enrollments": result.failed_count,
+            "success_details": [
+                {
+                    "enrollment_id": str(enrolled.enrollment_id),
+                    "student_id": str(enrolled.student_id),
+                    "class_id": str(enrolled.class_id)
+                }
+                for enrolled in result.enrolled
+            ],
+            "failure_details": [
+                {
+                    "student_id": student_id,
+                    "class_id": class_by_student.get(student_id),
+                    "error": FAILURE_MESSAGES[reason],
+                    "reason": reason
+                }
+                for student_id, reason in result.failed.items()
+            ],
             "invoices_generated": auto_generate_invoices,
-            "message": f"Enrolled {len(successful_enrollments)} students successfully"
+            "invoices": result.invoices.to_dict() if result.invoices else None,
+            "message": f"Enrolled {result.enrolled_count} students successfully"
         }
     
     def _get_default_term_structure(self, start_date: date, end_date: date) -> List[Dict]:
@@ -511,59 +605,72 @@ class AcademicManagementService:
         
         return warnings
     
-    def _handle_term_transition_enrollments(self, from_term_id: str, to_term_id: str) -> Dict:
-        """Handle enrollment transitions between terms"""
-        
-        # Get students enrolled in previous term
-        previous_enrollments = self.db.execute(
-            select(Enrollment, Student, Class).join(
-                Student, Student.id == Enrollment.student_id
-            ).join(
-                Class, Class.id == Enrollment.class_id
-            ).where(
-                and_(
-                    Enrollment.school_id == self.school_id,
-                    Enrollment.term_id == from_term_id,
-                    Enrollment.status == "ENROLLED"
-                )
-            )
-        ).all()
+    def _handle_term_transition_enrollments(
+        self,
+        from_term_id: str,
+        to_term_id: str,
+        promotion_rules: Optional[Dict[str, Optional[str]]] = None
+    ) -> Dict:
+        """
+        Carry the previous term's ENROLLED students into the next term with
+        one INSERT ... SELECT; status events, student class moves and
+        graduations are written by the same statement.
+        """
         
-        transitioned = 0
-        
-        # Auto-enroll students in next term (same class by default)
-        for enrollment, student, class_obj in previous_enrollments:
-            try:
-                new_enrollment = Enrollment(
-                    school_id=self.school_id,
-                    student_id=student.id,
-                    class_id=class_obj.id,  # Same class by default
-                    term_id=to_term_id,
-                    status="ENROLLED",
-                    joined_on=date.today()
-                )
-                self.db.add(new_enrollment)
-                
-                # Create transition event
-                self.db.add(EnrollmentStatusEvent(
-                    school_id=self.school_id,
-                    enrollment_id=new_enrollment.id,
-                    prev_status=None,
-                    new_status="ENROLLED",
-                    reason=f"Auto-enrolled from previous term",
-                    event_date=date.today()
-                ))
-                
-                transitioned += 1
-                
-            except Exception as e:
-                print(f"Failed to transition student {student.id}: {e}")
+        rule_from, rule_to = self._resolve_promotion_rules(promotion_rules)
+        now = datetime.utcnow()
+        
+        counts = self.db.execute(_ROLLOVER_ENROLLMENTS_SQL, {
+            "school_id": self.school_id,
+            "from_term_id": from_term_id,
+            "to_term_id": to_term_id,
+            "rule_from": rule_from,
+            "rule_to": rule_to,
+            "today": date.today(),
+            "now": now
+        }).mappings().one()
         
         return {
-            "students_transitioned": transitioned,
-            "total_previous_enrollments": len(previous_enrollments)
+            "students_transitioned": counts["carried_count"],
+            "students_promoted": counts["promoted_count"],
+            "students_graduated": counts["graduated_count"],
+            "already_enrolled": counts["previous_count"] - counts["carried_count"] - counts["graduated_count"],
+            "total_previous_enrollments": counts["previous_count"]
         }
     
+    def _resolve_promotion_rules(
+        self, promotion_rules: Optional[Dict[str, Optional[str]]]
+    ) -> Tuple[List[str], List[Optional[str]]]:
+        """Validate {from_class_id: to_class_id or None} against the school's classes"""
+        
+        if not promotion_rules:
+            return [], []
+        
+        try:
+            rules = {
+                str(uuid.UUID(str(from_id))): str(uuid.UUID(str(to_id))) if to_id else None
+                for from_id, to_id in promotion_rules.items()
+            }
+        except ValueError:
+            raise ValueError("Promotion rules must map class IDs to class IDs (or None to graduate)")
+        
+        referenced = set(rules) | {to_id for to_id in rules.values() if to_id}
+        known = {
+            str(class_id) for class_id in self.db.execute(
+                select(Class.id).where(
+                    and_(
+                        Class.school_id == self.school_id,
+                        Class.id.in_(referenced)
+                    )
+                )
+            ).scalars()
+        }
+        unknown = referenced - known
+        if unknown:
+            raise ValueError(f"Unknown classes in promotion rules: {', '.join(sorted(unknown))}")
+        
+        return list(rules.keys()), list(rules.values())
+    
     def _get_setup_recommendations(
         self, 
         total_students: int, 
@@ -595,4 +702,58 @@ class AcademicManagementService:
 
 def get_academic_service(db: Session, school_id: str) -> AcademicManagementService:
     """Factory function to get academic management service"""
-    return AcademicManagementService(db, school_id)
\ No newline at end of file
+    return AcademicManagementService(db, school_id)
+
+
+def start_term_advance(
+    school_id: str,
+    user_id: Optional[str],
+    force: bool = False,
+    promotion_rules: Optional[Dict[str, Optional[str]]] = None,
+    generate_invoices: bool = False
+) -> Dict:
+    """Queue advance_to_next_term as a background job; returns the job (the one already running, if any)"""
+    from app.services.jobs import enqueue_job
+    return enqueue_job(
+        "academic_advance_term", school_id, user_id,
+        payload={
+            "force": force,
+            "promotion_rules": promotion_rules,
+            "generate_invoices": generate_invoices
+        },
+        idempotency_key="academic_advance_term"
+    )
+
+
+def start_bulk_term_enrollment(
+    school_id: str,
+    user_id: Optional[str],
+    term_id: str,
+    enrollment_mappings: List[Dict],
+    auto_generate_invoices: bool = True
+) -> Dict:
+    """
+    Queue bulk_enroll_students_for_term as a background job. Resubmitting the
+    same mappings for the term returns the job already queued or running.
+    """
+    import json
+    import hashlib
+    from app.services.jobs import enqueue_job
+
+    mappings = [
+        {"student_id": str(m["student_id"]), "class_id": str(m["class_id"])}
+        for m in enrollment_mappings
+    ]
+    digest = hashlib.sha1(json.dumps(
+        sorted((m["student_id"], m["class_id"]) for m in mappings)
+    ).encode()).hexdigest()
+    return enqueue_job(
+        "academic_bulk_enroll", school_id, user_id,
+        payload={
+            "term_id": str(term_id),
+            "enrollment_mappings": mappings,
+            "auto_generate_invoices": auto_generate_invoices
+        },
+        total=len(mappings),
+        idempotency_key=f"{term_id}:{digest}"
+    )
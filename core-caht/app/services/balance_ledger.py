@@ -0,0 +1,191 @@
+# app/services/balance_ledger.py
+"""
+Materialized fee balances.
+
+Every invoice carries amount_paid (the sum of its payments) and every student
+with invoices has a student_balances row with their outstanding total and
+open invoice count. Payment paths move amount_paid forward with a single
+UPDATE and refresh the student's row from their own invoices, so balance
+reads never aggregate the payments table and their cost does not grow with
+payment history.
+
+Writes join the caller's transaction. A payment first locks the student's
+balance row, so concurrent payments for one student apply one after the
+other. reconcile() recomputes everything from payments to repair drift from
+writers that bypass the ledger.
+"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Locks (creating if needed) a student's balance row
+_LOCK_STUDENT_SQL = text("""
+    INSERT INTO student_balances (school_id, student_id, outstanding, open_invoices, total_paid, updated_at)
+    VALUES (:school_id, :student_id, 0, 0, 0, :now)
+    ON CONFLICT (school_id, student_id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+""")
+
+_APPLY_PAYMENT_SQL = text("""
+    UPDATE invoices
+    SET amount_paid = amount_paid + :amount,
+        status = CASE WHEN amount_paid + :amount >= total THEN 'PAID' ELSE 'PARTIAL' END,
+        updated_at = :now
+    WHERE id = :invoice_id AND school_id = :school_id
+    RETURNING id, student_id, total, amount_paid, status
+""")
+
+_REFRESH_STUDENTS_SQL = text("""
+    INSERT INTO student_balances (school_id, student_id, outstanding, open_invoices, total_paid, updated_at)
+    SELECT :school_id, s.student_id,
+           COALESCE(SUM(i.total - i.amount_paid) FILTER (WHERE i.status IN ('ISSUED', 'PARTIAL')), 0),
+           COUNT(i.id) FILTER (WHERE i.status IN ('ISSUED', 'PARTIAL')),
+           COALESCE(SUM(i.amount_paid), 0),
+           :now
+    FROM unnest(CAST(:student_ids AS uuid[])) AS s(student_id)
+    LEFT JOIN invoices i ON i.school_id = :school_id AND i.student_id = s.student_id
+    GROUP BY s.student_id
+    ON CONFLICT (school_id, student_id) DO UPDATE
+    SET outstanding = EXCLUDED.outstanding,
+        open_invoices = EXCLUDED.open_invoices,
+        total_paid = EXCLUDED.total_paid,
+        updated_at = EXCLUDED.updated_at
+""")
+
+# Reconciliation: amount_paid from payments (fixing the paid/partial status of
+# invoices whose amount_paid had drifted), then every student row from
+# invoices. Only rows that differ are written; their count is the drift report.
+_RECONCILE_INVOICES_SQL = text("""
+    WITH paid AS (
+        SELECT i.id, COALESCE(SUM(p.amount), 0) AS amount_paid
+        FROM invoices i
+        LEFT JOIN payments p ON p.invoice_id = i.id
+        WHERE i.school_id = :school_id
+        GROUP BY i.id
+    )
+    UPDATE invoices i
+    SET amount_paid = paid.amount_paid,
+        status = CASE
+            WHEN i.status NOT IN ('ISSUED', 'PARTIAL', 'PAID') THEN i.status
+            WHEN paid.amount_paid >= i.total THEN 'PAID'
+            WHEN paid.amount_paid > 0 THEN 'PARTIAL'
+            ELSE 'ISSUED'
+        END,
+        updated_at = :now
+    FROM paid
+    WHERE i.id = paid.id AND i.amount_paid <> paid.amount_paid
+    RETURNING i.id
+""")
+
+_RECONCILE_STUDENTS_SQL = text("""
+    WITH expected AS (
+        SELECT i.student_id,
+               COALESCE(SUM(i.total - i.amount_paid) FILTER (WHERE i.status IN ('ISSUED', 'PARTIAL')), 0) AS outstanding,
+               COUNT(*) FILTER (WHERE i.status IN ('ISSUED', 'PARTIAL')) AS open_invoices,
+               COALESCE(SUM(i.amount_paid), 0) AS total_paid
+        FROM invoices i
+        WHERE i.school_id = :school_id
+        GROUP BY i.student_id
+    ), stale AS (
+        DELETE FROM student_balances sb
+        WHERE sb.school_id = :school_id
+          AND NOT EXISTS (SELECT 1 FROM expected e WHERE e.student_id = sb.student_id)
+        RETURNING sb.student_id
+    ), upserted AS (
+        INSERT INTO student_balances (school_id, student_id, outstanding, open_invoices, total_paid, updated_at)
+        SELECT :school_id, e.student_id, e.outstanding, e.open_invoices, e.total_paid, :now
+        FROM expected e
+        ON CONFLICT (school_id, student_id) DO UPDATE
+        SET outstanding = EXCLUDED.outstanding,
+            open_invoices = EXCLUDED.open_invoices,
+            total_paid = EXCLUDED.total_paid,
+            updated_at = EXCLUDED.updated_at
+        WHERE (student_balances.outstanding, student_balances.open_invoices, student_balances.total_paid)
+              IS DISTINCT FROM (EXCLUDED.outstanding, EXCLUDED.open_invoices, EXCLUDED.total_paid)
+        RETURNING student_id
+    )
+    SELECT (SELECT COUNT(*) FROM upserted) AS corrected, (SELECT COUNT(*) FROM stale) AS removed
+""")
+
+
+class BalanceLedger:
+    """Keeps invoices.amount_paid and student_balances in step with payments"""
+
+    def __init__(self, db: Session, school_id: str):
+        self.db = db
+        self.school_id = school_id
+
+    def lock_student(self, student_id) -> None:
+        """Serialize balance changes for one student until the transaction ends"""
+        self.db.execute(_LOCK_STUDENT_SQL, {
+            "school_id": self.school_id,
+            "student_id": student_id,
+            "now": datetime.utcnow()
+        })
+
+    def apply_payment(self, invoice_id, amount) -> Optional[Dict]:
+        """
+        Add a payment (already inserted into payments) to its invoice and set
+        the invoice's PAID/PARTIAL status. Call lock_student first and
+        refresh_students afterwards; record_payment does all three.
+        Returns the invoice's new {student_id, total, amount_paid, balance, status}.
+        """
+        row = self.db.execute(_APPLY_PAYMENT_SQL, {
+            "school_id": self.school_id,
+            "invoice_id": invoice_id,
+            "amount": Decimal(str(amount)),
+            "now": datetime.utcnow()
+        }).mappings().first()
+        if not row:
+            return None
+        return {
+            "invoice_id": row["id"],
+            "student_id": row["student_id"],
+            "total": row["total"],
+            "amount_paid": row["amount_paid"],
+            "balance": row["total"] - row["amount_paid"],
+            "status": row["status"]
+        }
+
+    def record_payment(self, student_id, invoice_id, amount) -> Optional[Dict]:
+        """Apply one payment and refresh the student's balance row"""
+        self.lock_student(student_id)
+        applied = self.apply_payment(invoice_id, amount)
+        self.refresh_students([student_id])
+        return applied
+
+    def refresh_students(self, student_ids: Iterable) -> None:
+        """Recompute the balance rows of these students from their invoices"""
+        ids = list({uuid.UUID(str(student_id)) for student_id in student_ids})
+        if not ids:
+            return
+        self.db.execute(_REFRESH_STUDENTS_SQL, {
+            "school_id": self.school_id,
+            "student_ids": ids,
+            "now": datetime.utcnow()
+        })
+
+    def reconcile(self) -> Dict:
+        """Rebuild the school's balances from payments; returns what had drifted"""
+        now = datetime.utcnow()
+        params = {"school_id": self.school_id, "now": now}
+        invoices_corrected = len(self.db.execute(_RECONCILE_INVOICES_SQL, params).all())
+        students = self.db.execute(_RECONCILE_STUDENTS_SQL, params).mappings().one()
+
+        result = {
+            "invoices_corrected": invoices_corrected,
+            "students_corrected": students["corrected"],
+            "students_removed": students["removed"]
+        }
+        if any(result.values()):
+            print(f"Balance drift corrected for school {self.school_id}: {result}")
+        return result
+
+
+def get_balance_ledger(db: Session, school_id: str) -> BalanceLedger:
+    """Factory function to get the balance ledger for a school"""
+    return BalanceLedger(db, school_id)
@@ -0,0 +1,207 @@
+# app/services/bulk_enrollment.py
+"""
+Set-based enrollment of many students into a term.
+
+Enrolling row by row costs a round-trip (and, on any error, the whole
+transaction) per student. BulkEnroller instead writes each batch with one
+statement that:
+
+  1. inserts the enrollments from unnest(...) arrays, skipping students
+     already enrolled in the term (ON CONFLICT DO NOTHING ... RETURNING)
+  2. records an ENROLLED status event for every new enrollment
+  3. moves each newly enrolled student's current class to the enrolled class
+
+and reports per student why a row was not enrolled. Invoices for the newly
+enrolled set can be generated in the same pass through InvoiceBuilder.
+Nothing is committed here; the writes join the caller's transaction.
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.invoice_builder import BulkInvoiceResult
+
+# Reasons a requested row was not enrolled, reported per student
+FAIL_INVALID_ID = "invalid_id"
+FAIL_DUPLICATE_STUDENT = "duplicate_student"
+FAIL_UNKNOWN_STUDENT = "unknown_student"
+FAIL_UNKNOWN_CLASS = "unknown_class"
+FAIL_ALREADY_ENROLLED = "already_enrolled"
+
+FAILURE_MESSAGES = {
+    FAIL_INVALID_ID: "Invalid student or class ID",
+    FAIL_DUPLICATE_STUDENT: "Listed more than once",
+    FAIL_UNKNOWN_STUDENT: "Student not found",
+    FAIL_UNKNOWN_CLASS: "Class not found",
+    FAIL_ALREADY_ENROLLED: "Already enrolled for this term",
+}
+
+
+@dataclass
+class EnrolledStudent:
+    enrollment_id: uuid.UUID
+    student_id: uuid.UUID
+    class_id: uuid.UUID
+
+
+@dataclass
+class BulkEnrollmentResult:
+    term_id: str
+    enrolled: List[EnrolledStudent] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # student_id -> reason
+    invoices: Optional[BulkInvoiceResult] = None
+
+    @property
+    def enrolled_count(self) -> int:
+        return len(self.enrolled)
+
+    @property
+    def failed_count(self) -> int:
+        return len(self.failed)
+
+    def failure_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for reason in self.failed.values():
+            counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "term_id": self.term_id,
+            "enrolled_count": self.enrolled_count,
+            "failed_count": self.failed_count,
+            "failed": self.failed,
+            "failure_counts": self.failure_counts(),
+            "invoices": self.invoices.to_dict() if self.invoices else None
+        }
+
+
+# One statement per batch. The final SELECT returns every requested row with
+# its new enrollment id (NULL when skipped) and whether the student and class
+# belong to the school, so skips can be explained without another query.
+_ENROLL_BATCH_SQL = text("""
+    WITH requested AS (
+        SELECT r.student_id, r.class_id
+        FROM unnest(
+            CAST(:student_ids AS uuid[]),
+            CAST(:class_ids AS uuid[])
+        ) AS r(student_id, class_id)
+    ), checked AS (
+        SELECT r.student_id, r.class_id,
+               s.id IS NOT NULL AS student_found,
+               c.id IS NOT NULL AS class_found
+        FROM requested r
+        LEFT JOIN students s ON s.id = r.student_id AND s.school_id = :school_id
+        LEFT JOIN classes c ON c.id = r.class_id AND c.school_id = :school_id
+    ), new_enrollments AS (
+        INSERT INTO enrollments (id, school_id, student_id, class_id, term_id, status, joined_on, created_at, updated_at)
+        SELECT gen_random_uuid(), :school_id, k.student_id, k.class_id, :term_id, 'ENROLLED', :today, :now, :now
+        FROM checked k
+        WHERE k.student_found AND k.class_found
+        ON CONFLICT (school_id, student_id, term_id) DO NOTHING
+        RETURNING id, student_id, class_id
+    ), events AS (
+        INSERT INTO enrollment_status_events (id, school_id, enrollment_id, prev_status, new_status, reason, event_date, created_at, updated_at)
+        SELECT gen_random_uuid(), :school_id, n.id, NULL, 'ENROLLED', :reason, :today, :now, :now
+        FROM new_enrollments n
+        RETURNING id
+    ), moved_students AS (
+        UPDATE students s
+        SET class_id = n.class_id, updated_at = :now
+        FROM new_enrollments n
+        WHERE :update_student_class
+          AND s.id = n.student_id
+          AND s.class_id IS DISTINCT FROM n.class_id
+        RETURNING s.id
+    )
+    SELECT k.student_id, k.class_id, k.student_found, k.class_found, n.id AS enrollment_id
+    FROM checked k
+    LEFT JOIN new_enrollments n ON n.student_id = k.student_id
+""")
+
+
+class BulkEnroller:
+    """Enrolls many students into one term with a statement per batch"""
+
+    def __init__(self, db: Session, school_id: str):
+        self.db = db
+        self.school_id = school_id
+
+    def enroll(
+        self,
+        term_id: str,
+        mappings: Iterable[Dict[str, Any]],
+        reason: str = "Bulk enrollment",
+        update_student_class: bool = True,
+        generate_invoices: bool = False,
+        include_optional: Optional[Dict[str, bool]] = None,
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[int], None]] = None
+    ) -> BulkEnrollmentResult:
+        """
+        Enroll each {"student_id": ..., "class_id": ...} mapping into term_id.
+        With generate_invoices the newly enrolled students are invoiced for
+        the term afterwards (same transaction). batch_size splits the writes
+        into one statement per batch with on_progress(rows_done) after each.
+        """
+        result = BulkEnrollmentResult(term_id=str(term_id))
+
+        student_ids: List[uuid.UUID] = []
+        class_ids: List[uuid.UUID] = []
+        seen = set()
+        for mapping in mappings:
+            raw_student_id = str(mapping.get("student_id"))
+            try:
+                student_id = uuid.UUID(raw_student_id)
+                class_id = uuid.UUID(str(mapping.get("class_id")))
+            except ValueError:
+                result.failed[raw_student_id] = FAIL_INVALID_ID
+                continue
+            if student_id in seen:
+                result.failed[str(student_id)] = FAIL_DUPLICATE_STUDENT
+                continue
+            seen.add(student_id)
+            student_ids.append(student_id)
+            class_ids.append(class_id)
+
+        batch_size = batch_size or len(student_ids) or 1
+        params = {
+            "school_id": self.school_id,
+            "term_id": term_id,
+            "reason": reason,
+            "update_student_class": update_student_class,
+            "today": date.today(),
+            "now": datetime.utcnow()
+        }
+        for start in range(0, len(student_ids), batch_size):
+            rows = self.db.execute(_ENROLL_BATCH_SQL, {
+                **params,
+                "student_ids": student_ids[start:start + batch_size],
+                "class_ids": class_ids[start:start + batch_size]
+            }).all()
+            for row in rows:
+                if row.enrollment_id:
+                    result.enrolled.append(EnrolledStudent(row.enrollment_id, row.student_id, row.class_id))
+                elif not row.student_found:
+                    result.failed[str(row.student_id)] = FAIL_UNKNOWN_STUDENT
+                elif not row.class_found:
+                    result.failed[str(row.student_id)] = FAIL_UNKNOWN_CLASS
+                else:
+                    result.failed[str(row.student_id)] = FAIL_ALREADY_ENROLLED
+            if on_progress:
+                on_progress(min(start + batch_size, len(student_ids)))
+
+        if generate_invoices and result.enrolled:
+            from app.services.fees import get_fees_service
+            result.invoices = get_fees_service(self.db, self.school_id).generate_invoices_bulk(
+                term_id,
+                include_optional=include_optional,
+                student_ids=[enrolled.student_id for enrolled in result.enrolled]
+            )
+
+        return result
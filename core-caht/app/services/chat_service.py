@@ -2,12 +2,35 @@
 import uuid
 import re
 from datetime import datetime, timedelta
+from dataclasses import dataclass, field
 from typing import Optional, List, Dict, Any, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, text
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import (
+    Boolean, DateTime, String, case, cast, column, desc, func, insert, literal, select, text, true, update, values
+)
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models.chat import ChatConversation, ChatMessage, MessageType
+from app.services.conversation_state import STATE_CHANNEL, get_conversation_state_cache
+
+
+@dataclass
+class ChatTurn:
+    """A conversation loaded (or staged) for one /chat/message turn.
+    
+    conversation is only set for new (not yet inserted) conversations; existing
+    ones are described by the state snapshot and its version stamp, so a
+    handler committing mid-turn (which expires ORM objects) costs no reload.
+    """
+    conversation: Optional[ChatConversation]
+    conversation_id: uuid.UUID
+    is_new: bool
+    context: Dict[str, Any] = field(default_factory=dict)
+    stored_context: Dict[str, Any] = field(default_factory=dict)
+    version: int = 0
+    snapshot: Dict[str, Any] = field(default_factory=dict)
+    user_id: str = ""
+    school_id: str = ""
 
 class ChatService:
     """Enhanced service for managing chat conversations with context cleanup"""
@@ -130,6 +153,7 @@ class ChatService:
             conversation.updated_at = datetime.utcnow()
             
             self.db.flush()
+            get_conversation_state_cache().invalidate(conversation_id)
             print(f"Context updated successfully in database")
             return True
             
@@ -157,65 +181,13 @@ class ChatService:
                 print(f"No conversation found for ID: {conversation_id}")
                 return {}
             
-            # DEBUG: Check what's stored in database
-            print(f"Raw conversation context_data from DB: {conversation.context_data}")
-            
-            # CRITICAL: Start with stored context as primary source
-            context = conversation.context_data or {}
-            print(f"Parsed stored context: {context}")
-            
-            # Add conversation metadata
-            context.update({
-                "conversation_id": conversation_id,
-                "conversation_title": conversation.title,
-                "message_count": conversation.message_count
-            })
-            
-            # Include recent messages for reference only
+            recent_messages = []
             if include_recent_messages:
                 recent_messages = self.get_conversation_messages(
                     conversation_id, user_id, school_id, limit=5
                 )
-                
-                if recent_messages:
-                    context["recent_messages"] = [
-                        {
-                            "type": msg.message_type.value,
-                            "content": msg.content,
-                            "intent": msg.intent,
-                            "timestamp": msg.created_at.isoformat()
-                        }
-                        for msg in recent_messages[-5:]
-                    ]
-                    
-                    # CRITICAL FIX: DO NOT override database context with message context
-                    # Database context is authoritative for flow state
-                    last_assistant_msg = next(
-                        (msg for msg in reversed(recent_messages) 
-                         if msg.message_type == MessageType.ASSISTANT),
-                        None
-                    )
-                    
-                    if last_assistant_msg and last_assistant_msg.response_data:
-                        print(f"Last assistant response_data: {last_assistant_msg.response_data}")
-                        response_context = last_assistant_msg.response_data.get('context', {})
-                        if response_context:
-                            print(f"Available response context: {response_context}")
-                            
-                            # ONLY merge NON-PROTECTED fields from response context
-                            # NEVER override: handler, flow, step, selected_grade, class_name, grade_name
-                            protected_fields = [
-                                'handler', 'flow', 'step', 
-                                'selected_grade', 'class_name', 'grade_name', 'selected_group'
-                            ]
-                            
-                            for key, value in response_context.items():
-                                if key not in protected_fields and key not in context:
-                                    # Only add if not already in database context
-                                    context[key] = value
-                                    print(f"Added non-protected field from response: {key}")
-                                elif key in protected_fields:
-                                    print(f"Skipped protected field from response: {key}")
+            
+            context = self._build_context(self._snapshot(conversation, recent_messages), conversation_id)
             
             print(f"Final retrieved context (database takes precedence): {context}")
             return context
@@ -243,6 +215,7 @@ class ChatService:
             conversation.updated_at = datetime.utcnow()
             
             self.db.flush()
+            get_conversation_state_cache().invalidate(conversation_id)
             print(f"Cleared conversation context for: {conversation_id}")
             return True
             
@@ -317,6 +290,9 @@ class ChatService:
             if affected_rows == 0:
                 print(f"Warning: Conversation update affected 0 rows for ID: {conversation_id}")
             
+            # message_count moved, so any cached snapshot's version is stale
+            get_conversation_state_cache().invalidate(conversation_id)
+            
             # CRITICAL: Handle context management for assistant messages
             if (message_type == MessageType.ASSISTANT and 
                 response_data and 
@@ -453,6 +429,7 @@ class ChatService:
                 conversation.is_archived = is_archived
             
             conversation.updated_at = datetime.utcnow()
+            get_conversation_state_cache().invalidate(conversation_id)
             return conversation
             
         except SQLAlchemyError as e:
@@ -480,6 +457,7 @@ class ChatService:
                 return False
             
             self.db.delete(conversation)
+            get_conversation_state_cache().invalidate(conversation_id)
             return True
             
         except SQLAlchemyError as e:
@@ -542,6 +520,409 @@ class ChatService:
             print(f"Error searching conversations: {e}")
             return []
     
+    # === SINGLE ROUND-TRIP TURN API ===
+    
+    def begin_turn(
+        self,
+        conversation_id: Optional[str],
+        user_id: str,
+        school_id: str,
+        message: str
+    ) -> Optional[ChatTurn]:
+        """Load a conversation's state for one turn, or stage a new conversation.
+        
+        State comes from the conversation state cache when warm, otherwise from
+        one query (conversation + last 5 messages). Cached snapshots are only
+        checked against the stored message_count while no shared tier or pushed
+        versions keep them current. Nothing is written here;
+        complete_turn() persists the whole turn.
+        Returns None when conversation_id is given but not accessible.
+        """
+        try:
+            if not conversation_id:
+                conversation = ChatConversation(
+                    id=uuid.uuid4(),
+                    user_id=uuid.UUID(user_id),
+                    school_id=uuid.UUID(school_id),
+                    title=self.generate_conversation_title(message),
+                    first_message=message,
+                    message_count=0,
+                    context_data={}
+                )
+                snapshot = self._snapshot(conversation, [])
+                return ChatTurn(
+                    conversation=conversation,
+                    conversation_id=conversation.id,
+                    is_new=True,
+                    context={},
+                    stored_context={},
+                    version=0,
+                    snapshot=snapshot,
+                    user_id=user_id,
+                    school_id=school_id
+                )
+            
+            if not self.is_valid_uuid(conversation_id):
+                print(f"Invalid UUID format: {conversation_id}")
+                return None
+            
+            state_cache = get_conversation_state_cache()
+            snapshot = state_cache.get(conversation_id)
+            if snapshot and (snapshot["user_id"] != user_id or snapshot["school_id"] != school_id):
+                snapshot = None
+            if (snapshot is not None and state_cache.needs_version_check()
+                    and self._stored_version(conversation_id) != snapshot["version"]):
+                # Another worker advanced the conversation since this snapshot was cached
+                state_cache.record_stale()
+                snapshot = None
+            if snapshot is None:
+                snapshot = self._load_snapshot(conversation_id, user_id, school_id)
+                if snapshot is None:
+                    return None
+                state_cache.put(conversation_id, snapshot)
+            
+            return self._turn_from_snapshot(conversation_id, snapshot, user_id, school_id)
+            
+        except SQLAlchemyError as e:
+            print(f"Database error beginning turn: {e}")
+            self._rollback_safe()
+            return None
+    
+    def complete_turn(
+        self,
+        turn: ChatTurn,
+        user_content: str,
+        assistant_content: str,
+        user_context: Optional[Dict[str, Any]] = None,
+        intent: Optional[str] = None,
+        response_data: Optional[Dict[str, Any]] = None,
+        processing_time_ms: Optional[int] = None
+    ) -> uuid.UUID:
+        """Write both messages and the conversation row in one statement.
+        
+        The conversation insert/update runs as a data-modifying CTE and the
+        messages are only inserted if it matched. Existing conversations must
+        still be at turn.version. If another turn got there first, the handlers
+        have already committed this turn's side effects, so its messages are
+        still appended, but its context merge (built on the older state) is
+        dropped and the stored flow context is left as the other turn wrote it.
+        Returns the assistant message ID.
+        """
+        state_cache = get_conversation_state_cache()
+        conversation_key = str(turn.conversation_id)
+        response_context = (response_data or {}).get('context') if response_data else None
+        assistant_message_id = uuid.uuid4()
+        
+        # Same rules add_message() applies for assistant context
+        context_data = None
+        if response_data and 'context' in response_data:
+            if response_context == {}:
+                context_data = {}
+            else:
+                context_data = {**turn.stored_context, **response_context}
+        
+        notify = not state_cache.shared
+        conflicted = False
+        try:
+            written = self.db.execute(self._turn_statement(
+                turn, assistant_message_id, user_content, assistant_content,
+                user_context, intent, response_data, processing_time_ms, context_data,
+                check_version=True, notify=notify
+            )).all()
+            if not written:
+                # Version moved on (another worker / tab answered first)
+                print(f"Conversation {conversation_key} changed since v{turn.version}, "
+                      "appending turn without its context update")
+                state_cache.record_conflict()
+                conflicted = True
+                written = self.db.execute(self._turn_statement(
+                    turn, assistant_message_id, user_content, assistant_content,
+                    user_context, intent, response_data, processing_time_ms, None,
+                    check_version=False, notify=notify
+                )).all()
+        except SQLAlchemyError as e:
+            print(f"Database error completing turn: {e}")
+            self._rollback_safe()
+            raise
+        
+        if not written:
+            raise ValueError(f"Conversation {conversation_key} no longer exists")
+        
+        if conflicted:
+            # This worker doesn't know the other turn's state; reload on the next turn
+            state_cache.invalidate(conversation_key)
+        else:
+            # Next snapshot becomes visible to begin_turn once this transaction commits
+            now = datetime.utcnow().isoformat()
+            snapshot = dict(turn.snapshot)
+            snapshot["version"] = turn.version + 2
+            if context_data is not None:
+                snapshot["context_data"] = context_data
+            snapshot["recent_messages"] = (snapshot["recent_messages"] + [
+                {"type": MessageType.USER.value, "content": user_content, "intent": None,
+                 "timestamp": now, "response_context": None},
+                {"type": MessageType.ASSISTANT.value, "content": assistant_content, "intent": intent,
+                 "timestamp": now, "response_context": response_context}
+            ])[-5:]
+            state_cache.stage(self.db, conversation_key, snapshot)
+        
+        print(f"Persisted turn for conversation {conversation_key} (assistant message {assistant_message_id})")
+        return assistant_message_id
+    
+    def _turn_statement(
+        self,
+        turn: ChatTurn,
+        assistant_message_id: uuid.UUID,
+        user_content: str,
+        assistant_content: str,
+        user_context: Optional[Dict[str, Any]],
+        intent: Optional[str],
+        response_data: Optional[Dict[str, Any]],
+        processing_time_ms: Optional[int],
+        context_data: Optional[Dict[str, Any]],
+        check_version: bool = True,
+        notify: bool = False
+    ):
+        """WITH conversation upsert, INSERT both messages only if it matched.
+        
+        With notify, the new version is also sent on STATE_CHANNEL; Postgres
+        delivers it when the transaction commits.
+        """
+        conversations = ChatConversation.__table__
+        messages = ChatMessage.__table__
+        now = datetime.utcnow()
+        
+        if turn.is_new:
+            conversation = turn.conversation
+            conversation_stmt = insert(conversations).values(
+                id=turn.conversation_id,
+                user_id=conversation.user_id,
+                school_id=conversation.school_id,
+                title=conversation.title,
+                first_message=conversation.first_message,
+                last_activity=now,
+                message_count=2,
+                is_archived=False,
+                context_data=context_data if context_data is not None else {},
+                created_at=now,
+                updated_at=now
+            )
+        else:
+            conversation_values = {
+                "last_activity": now,
+                "message_count": conversations.c.message_count + 2,
+                "updated_at": now
+            }
+            if context_data is not None:
+                conversation_values["context_data"] = context_data
+            conversation_stmt = update(conversations).where(conversations.c.id == turn.conversation_id)
+            if check_version:
+                conversation_stmt = conversation_stmt.where(conversations.c.message_count == turn.version)
+            conversation_stmt = conversation_stmt.values(**conversation_values)
+        
+        turn_conversation = conversation_stmt.returning(
+            conversations.c.id, conversations.c.message_count
+        ).cte("turn_conversation")
+        
+        turn_messages = values(
+            column("id", messages.c.id.type),
+            column("message_type", messages.c.message_type.type),
+            column("content", messages.c.content.type),
+            column("intent", messages.c.intent.type),
+            column("context_data", messages.c.context_data.type),
+            column("response_data", messages.c.response_data.type),
+            column("processing_time_ms", messages.c.processing_time_ms.type),
+            column("is_reply", Boolean),
+            name="turn_messages"
+        ).data([
+            (uuid.uuid4(), MessageType.USER, user_content, None, user_context, None, None, False),
+            (assistant_message_id, MessageType.ASSISTANT, assistant_content, intent,
+             None, response_data, processing_time_ms, True)
+        ])
+        
+        source = turn_messages.join(turn_conversation, true())
+        if notify:
+            # Referenced by the SELECT so it runs; one row per matched conversation
+            turn_notify = select(func.pg_notify(
+                STATE_CHANNEL,
+                func.concat(cast(turn_conversation.c.id, String), ":", turn_conversation.c.message_count)
+            ).label("sent")).select_from(turn_conversation).cte("turn_notify")
+            source = source.join(turn_notify, true())
+        
+        return insert(messages).from_select(
+            ["id", "conversation_id", "user_id", "school_id", "message_type", "content",
+             "intent", "context_data", "response_data", "processing_time_ms", "created_at"],
+            select(
+                turn_messages.c.id,
+                turn_conversation.c.id,
+                literal(uuid.UUID(turn.user_id), messages.c.user_id.type),
+                literal(uuid.UUID(turn.school_id), messages.c.school_id.type),
+                cast(turn_messages.c.message_type, messages.c.message_type.type),
+                turn_messages.c.content,
+                turn_messages.c.intent,
+                turn_messages.c.context_data,
+                turn_messages.c.response_data,
+                # VALUES types a column from its rows; all-NULL columns come out as text
+                cast(turn_messages.c.processing_time_ms, messages.c.processing_time_ms.type),
+                # User message at transaction start (when the turn was loaded), reply now
+                case(
+                    (turn_messages.c.is_reply, cast(func.clock_timestamp(), DateTime)),
+                    else_=func.now()
+                )
+            ).select_from(source)
+        ).add_cte(turn_conversation).returning(messages.c.id)
+    
+    def _stored_version(self, conversation_id: str) -> Optional[int]:
+        """The conversation's current message_count (its snapshot version)"""
+        row = self.db.execute(
+            select(ChatConversation.message_count)
+            .where(ChatConversation.id == uuid.UUID(conversation_id))
+        ).first()
+        return (row[0] or 0) if row else None
+    
+    def _load_snapshot(
+        self,
+        conversation_id: str,
+        user_id: str,
+        school_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Conversation + its last 5 messages in one LATERAL query"""
+        recent = (
+            select(ChatMessage)
+            .where(ChatMessage.conversation_id == ChatConversation.id)
+            .order_by(desc(ChatMessage.created_at))
+            .limit(5)
+            .lateral("recent")
+        )
+        recent_message = aliased(ChatMessage, recent)
+        
+        rows = self.db.execute(
+            select(ChatConversation, recent_message)
+            .outerjoin(recent, true())
+            .where(
+                ChatConversation.id == uuid.UUID(conversation_id),
+                ChatConversation.user_id == uuid.UUID(user_id),
+                ChatConversation.school_id == uuid.UUID(school_id)
+            )
+            # Refresh objects already in the identity map; their counters may be stale
+            .execution_options(populate_existing=True)
+        ).all()
+        
+        if not rows:
+            return None
+        
+        recent_messages = sorted(
+            (row[1] for row in rows if row[1] is not None),
+            key=lambda msg: msg.created_at
+        )
+        return self._snapshot(rows[0][0], recent_messages)
+    
+    def _snapshot(
+        self,
+        conversation: ChatConversation,
+        recent_messages: List[ChatMessage]
+    ) -> Dict[str, Any]:
+        """JSON-safe copy of the state a turn needs from a conversation"""
+        return {
+            "version": conversation.message_count or 0,
+            "user_id": str(conversation.user_id),
+            "school_id": str(conversation.school_id),
+            "title": conversation.title,
+            "context_data": dict(conversation.context_data or {}),
+            "recent_messages": [
+                {
+                    "type": msg.message_type.value,
+                    "content": msg.content,
+                    "intent": msg.intent,
+                    "timestamp": msg.created_at.isoformat(),
+                    "response_context": (msg.response_data or {}).get('context')
+                }
+                for msg in recent_messages[-5:]
+            ]
+        }
+    
+    def _turn_from_snapshot(
+        self,
+        conversation_id: str,
+        snapshot: Dict[str, Any],
+        user_id: str,
+        school_id: str
+    ) -> ChatTurn:
+        return ChatTurn(
+            conversation=None,
+            conversation_id=uuid.UUID(conversation_id),
+            is_new=False,
+            context=self._build_context(snapshot, conversation_id),
+            stored_context=dict(snapshot["context_data"]),
+            version=snapshot["version"],
+            snapshot=snapshot,
+            user_id=user_id,
+            school_id=school_id
+        )
+    
+    def _build_context(
+        self,
+        snapshot: Dict[str, Any],
+        conversation_id: str
+    ) -> Dict[str, Any]:
+        """Stored context + conversation metadata + recent message summary"""
+        # DEBUG: Check what's stored in database
+        print(f"Raw conversation context_data from DB: {snapshot['context_data']}")
+        
+        # CRITICAL: Start with stored context as primary source
+        context = dict(snapshot["context_data"] or {})
+        print(f"Parsed stored context: {context}")
+        
+        # Add conversation metadata
+        context.update({
+            "conversation_id": conversation_id,
+            "conversation_title": snapshot["title"],
+            "message_count": snapshot["version"]
+        })
+        
+        # Include recent messages for reference only
+        recent_messages = snapshot["recent_messages"]
+        if recent_messages:
+            context["recent_messages"] = [
+                {
+                    "type": msg["type"],
+                    "content": msg["content"],
+                    "intent": msg["intent"],
+                    "timestamp": msg["timestamp"]
+                }
+                for msg in recent_messages[-5:]
+            ]
+            
+            # CRITICAL FIX: DO NOT override database context with message context
+            # Database context is authoritative for flow state
+            last_assistant_msg = next(
+                (msg for msg in reversed(recent_messages) 
+                 if msg["type"] == MessageType.ASSISTANT.value),
+                None
+            )
+            
+            if last_assistant_msg:
+                response_context = last_assistant_msg["response_context"]
+                if response_context:
+                    print(f"Available response context: {response_context}")
+                    
+                    # ONLY merge NON-PROTECTED fields from response context
+                    # NEVER override: handler, flow, step, selected_grade, class_name, grade_name
+                    protected_fields = [
+                        'handler', 'flow', 'step', 
+                        'selected_grade', 'class_name', 'grade_name', 'selected_group'
+                    ]
+                    
+                    for key, value in response_context.items():
+                        if key not in protected_fields and key not in context:
+                            # Only add if not already in database context
+                            context[key] = value
+                            print(f"Added non-protected field from response: {key}")
+                        elif key in protected_fields:
+                            print(f"Skipped protected field from response: {key}")
+        
+        return context
+    
     def _rollback_safe(self):
         """Safely rollback transaction"""
         try:
@@ -0,0 +1,147 @@
+# app/services/classification_cache.py
+"""Cache of LLM intent classifications.
+
+Keys combine the synonym-normalized message, the active config version and the
+allowed-intent list, so "show pending invoices" is classified once per version
+no matter how many users type it. Short or referential replies ("yes", "the
+first one") are classified with recent messages in the prompt; their keys also
+include a digest of that context, so they are only reused within the same
+conversation state. Entries live in a bounded in-process
+LRU with TTL; when CLASSIFICATION_CACHE_REDIS_URL is set (and the redis
+package is installed) a shared Redis tier sits behind it.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.intent_classifier import ClassificationResult
+
+
+class ClassificationCache:
+    """Two-tier (LRU + optional Redis) cache of ClassificationResult"""
+
+    def __init__(self,
+                 max_entries: int = 5000,
+                 ttl_seconds: int = 3600,
+                 redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "redis_hits": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+        if redis_url:
+            try:
+                import redis.asyncio as redis
+                self._redis = redis.from_url(redis_url, decode_responses=True)
+            except ImportError:
+                print("ClassificationCache: redis package not installed, using in-process tier only")
+
+    @staticmethod
+    def make_key(normalized_message: str, version_id: Optional[str], allowed_intents: List[str],
+                 recent_context: Optional[str] = None) -> str:
+        key_parts = [normalized_message, version_id, sorted(allowed_intents)]
+        if recent_context:
+            key_parts.append(recent_context)
+        raw = json.dumps(key_parts)
+        digest = hashlib.sha1(raw.encode()).hexdigest()
+        return f"intent_cls:{version_id or 'none'}:{digest}"
+
+    async def get(self, key: str) -> Optional[ClassificationResult]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return ClassificationResult(**entry[1])
+            if entry:
+                del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(key)
+                if raw:
+                    data = json.loads(raw)
+                    self._store_local(key, data)
+                    with self._lock:
+                        self.stats["hits"] += 1
+                        self.stats["redis_hits"] += 1
+                    return ClassificationResult(**data)
+            except Exception as e:
+                print(f"ClassificationCache: Redis get failed: {e}")
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, result: ClassificationResult):
+        # Errors, timeouts and saturation are transient - never cache them
+        if result.error:
+            return
+
+        data = asdict(result)
+        data["latency_ms"] = None
+        self._store_local(key, data)
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, json.dumps(data), ex=self.ttl_seconds)
+            except Exception as e:
+                print(f"ClassificationCache: Redis set failed: {e}")
+
+    def _store_local(self, key: str, data: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, data)
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self):
+        """Drop every in-process entry; Redis keys are version-scoped and simply expire"""
+        with self._lock:
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "redis_enabled": self._redis is not None
+            }
+
+
+_classification_cache: Optional[ClassificationCache] = None
+
+
+def get_classification_cache() -> ClassificationCache:
+    """The worker's shared classification cache"""
+    global _classification_cache
+    if _classification_cache is None:
+        _classification_cache = ClassificationCache(
+            max_entries=int(os.getenv("CLASSIFICATION_CACHE_SIZE", "5000")),
+            ttl_seconds=int(os.getenv("CLASSIFICATION_CACHE_TTL_SECONDS", "3600")),
+            redis_url=os.getenv("CLASSIFICATION_CACHE_REDIS_URL")
+        )
+    return _classification_cache
@@ -0,0 +1,205 @@
+# app/services/config_events.py
+"""Push-based invalidation of the intent config cache across uvicorn workers.
+
+Admin endpoints call publish_config_change() when the active configuration
+changes. On Postgres this is a NOTIFY on CONFIG_CHANNEL, delivered to every
+worker's ConfigChangeListener, which rebuilds the shared pattern index in the
+background. Without Postgres (tests, local tooling) an in-process channel
+stands in for LISTEN/NOTIFY; it cannot reach other processes, so TTL polling
+stays on there.
+
+Notifications carry the publishing worker's WORKER_ID so the publisher, which
+already reloaded synchronously, can skip its own echo. Pids are not used for
+this because they repeat across containers and hosts.
+"""
+
+import os
+import json
+import uuid
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.services import config_router
+
+
+CONFIG_CHANNEL = "intent_config_changed"
+RECONNECT_DELAY_SECONDS = 5
+
+# Random per-process id; unlike os.getpid() it is unique across replicas
+WORKER_ID = uuid.uuid4().hex
+
+
+def _use_local_channel() -> bool:
+    backend = os.getenv("INTENT_CONFIG_BUS", "postgres").lower()
+    return backend == "local" or not settings.DATABASE_URL.startswith("postgresql")
+
+
+def _listener_dsn() -> str:
+    """Plain libpq DSN for psycopg from the SQLAlchemy URL"""
+    return settings.DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)\
+        .replace("postgresql+psycopg2://", "postgresql://", 1)
+
+
+class LocalConfigChannel:
+    """In-process stand-in for Postgres LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, payload: Dict[str, Any]):
+        for callback in list(self._subscribers):
+            callback(payload)
+
+
+local_channel = LocalConfigChannel()
+
+
+def publish_config_change(db: Session, version_id: Optional[str], reason: str,
+                          origin: str = WORKER_ID):
+    """
+    Reload this worker's pattern index and tell every other worker to do the same.
+
+    The notification is committed on the given session, so call this after the
+    change itself has been committed. ``origin`` identifies the publishing
+    worker; listeners with the same id skip the notification.
+    """
+    payload = {"version_id": version_id, "reason": reason, "origin": origin}
+
+    # Read-your-writes for the admin request; our own listener skips the echo
+    config_router.ConfigRouter(db).reload_config()
+
+    if _use_local_channel():
+        local_channel.publish(payload)
+        return
+
+    try:
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CONFIG_CHANNEL, "payload": json.dumps(payload)}
+        )
+        db.commit()
+        print(f"ConfigEvents: Published {reason} for version {version_id}")
+    except Exception as e:
+        print(f"ConfigEvents: Failed to publish config change: {e}")
+        db.rollback()
+
+
+def refresh_shared_index():
+    """Rebuild the worker's shared pattern index with a short-lived session"""
+    db = SessionLocal()
+    try:
+        config_router.ConfigRouter(db).reload_config()
+    finally:
+        db.close()
+
+
+class ConfigChangeListener:
+    """Background task keeping this worker's pattern index in sync with admin changes"""
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refreshing = False
+        self._refresh_pending = False
+        self.notifications_received = 0
+
+    async def start(self):
+        """Start listening; safe to call once per worker at startup"""
+        self._loop = asyncio.get_running_loop()
+
+        if _use_local_channel():
+            # Other processes are out of reach, so keep TTL polling on
+            local_channel.subscribe(self._on_payload)
+            print("ConfigEvents: Listening on local config channel")
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        local_channel.unsubscribe(self._on_payload)
+        config_router.set_push_invalidation(False)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen_forever(self):
+        import psycopg
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(_listener_dsn(), autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CONFIG_CHANNEL}")
+                    print(f"ConfigEvents: Listening on Postgres channel '{CONFIG_CHANNEL}'")
+
+                    # Anything published while we were disconnected was missed
+                    await self._refresh()
+                    config_router.set_push_invalidation(True)
+
+                    async for notify in conn.notifies():
+                        self._handle_payload(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ConfigEvents: Listener error, falling back to polling: {e}")
+
+            config_router.set_push_invalidation(False)
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def _handle_payload(self, raw_payload: str):
+        try:
+            payload = json.loads(raw_payload) if raw_payload else {}
+        except ValueError:
+            payload = {}
+        self._on_payload(payload)
+
+    def _on_payload(self, payload: Dict[str, Any]):
+        self.notifications_received += 1
+
+        # The publishing worker already reloaded synchronously
+        if payload.get("origin") == self.worker_id:
+            return
+
+        print(f"ConfigEvents: Config change '{payload.get('reason')}' received, refreshing index")
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._refresh()))
+        else:
+            refresh_shared_index()
+
+    async def _refresh(self):
+        # Coalesce bursts of notifications into back-to-back rebuilds
+        if self._refreshing:
+            self._refresh_pending = True
+            return
+        self._refreshing = True
+        try:
+            while True:
+                self._refresh_pending = False
+                await asyncio.to_thread(refresh_shared_index)
+                if not self._refresh_pending:
+                    break
+        except Exception as e:
+            print(f"ConfigEvents: Index refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+
+config_listener = ConfigChangeListener()
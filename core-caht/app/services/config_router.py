@@ -1,11 +1,32 @@
 # app/services/config_router.py
+import os
 import re
 import time
-from typing import Dict, List, Optional, Tuple, Any
+import threading
+from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from sqlalchemy.orm import Session
 
-from app.models.intent_config import IntentConfigVersion, IntentPattern, PatternKind
+from app.models.intent_config import IntentConfigVersion, IntentPattern
+from app.services.pattern_index import PatternIndex
+from app.services.classification_cache import get_classification_cache
+
+
+# Process-wide compiled index, rebuilt only when the active version stamp changes
+_shared_index: Optional[PatternIndex] = None
+_shared_index_lock = threading.Lock()
+
+# While a ConfigChangeListener is connected, admin changes are pushed to this worker
+# and route() never queries the active version. Otherwise fall back to polling it.
+_push_invalidation = False
+_last_version_check = 0.0
+VERSION_POLL_SECONDS = float(os.getenv("INTENT_CONFIG_POLL_SECONDS", "5"))
+
+
+def set_push_invalidation(enabled: bool):
+    """Called by the config change listener when it (dis)connects"""
+    global _push_invalidation
+    _push_invalidation = enabled
 
 
 @dataclass
@@ -19,13 +40,21 @@ class RouterResult:
 
 
 class ConfigRouter:
-    """Database-driven pattern-based intent router"""
+    """Database-driven pattern-based intent router backed by a shared PatternIndex"""
     
     def __init__(self, db: Session):
         self.db = db
-        self._cache = {}
-        self._cache_version = None
-        self._load_active_config()
+        self._index: Optional[PatternIndex] = _shared_index
+        if self._index is None:
+            self._load_active_config()
+    
+    @property
+    def _cache(self) -> Dict[str, List[Dict]]:
+        return self._index.by_kind if self._index else {}
+    
+    @property
+    def _cache_version(self) -> Optional[str]:
+        return self._index.version_id if self._index else None
     
     def route(self, message: str, school_id: Optional[str] = None) -> Optional[RouterResult]:
         """
@@ -41,15 +70,9 @@ class ConfigRouter:
         # Ensure we have latest config
         self._ensure_cache_current()
         
-        if not self._cache:
-            print(f"ConfigRouter: Cache is empty! Attempting to load...")
-            self._load_active_config()
-            if not self._cache:
-                print(f"ConfigRouter: Still no cache after reload attempt")
-                return None
-        
-        # Debug: Show cache stats
-        print(f"ConfigRouter cache stats: {self.get_cache_stats()}")
+        if not self._index:
+            print(f"ConfigRouter: No compiled pattern index available")
+            return None
         
         message_lower = message.lower().strip()
         print(f"ConfigRouter: Processing message: '{message_lower}'")
@@ -86,106 +109,136 @@ class ConfigRouter:
         print(f"ConfigRouter: No pattern matched for '{message_lower}'")
         return None
     
+    def normalize_message(self, message: str, school_id: Optional[str] = None) -> str:
+        """Lowercase and apply synonyms, as route() does, without touching the database"""
+        message_lower = message.lower().strip()
+        if not self._index:
+            return message_lower
+        return self._apply_synonyms(message_lower, school_id)
+    
     def reload_config(self):
-        """Force reload of configuration from database"""
+        """Force rebuild of the shared pattern index from the database"""
         print("ConfigRouter: Force reloading configuration...")
-        self._cache = {}
-        self._cache_version = None
-        self._load_active_config()
+        self._load_active_config(force=True)
+    
+    @property
+    def active_version_id(self) -> Optional[str]:
+        """Id of the config version the shared index was built from"""
+        return self._cache_version
     
     def _ensure_cache_current(self):
-        """Check if cache is current and reload if needed"""
-        # Get current active version
-        current_version = self.db.query(IntentConfigVersion)\
+        """Use the shared index; poll the active version stamp only without push invalidation"""
+        global _last_version_check
+        
+        shared = _shared_index
+        if shared is not None and (
+            _push_invalidation or time.time() - _last_version_check < VERSION_POLL_SECONDS
+        ):
+            self._index = shared
+            return
+        
+        _last_version_check = time.time()
+        current = self.db.query(IntentConfigVersion.id, IntentConfigVersion.updated_at)\
             .filter(IntentConfigVersion.status == 'active')\
             .first()
         
-        current_version_id = current_version.id if current_version else None
+        current_stamp = (current.id, current.updated_at) if current else None
         
-        if self._cache_version != current_version_id:
-            print(f"ConfigRouter: Version changed from {self._cache_version} to {current_version_id}, reloading...")
-            self._load_active_config()
+        if shared is not None and shared.version_stamp == current_stamp:
+            self._index = shared
+            return
+        
+        if current_stamp is None:
+            self._index = None
+            return
+        
+        print(f"ConfigRouter: Version changed from {self._cache_version} to {current.id}, rebuilding index...")
+        self._load_active_config()
     
-    def _load_active_config(self):
-        """Load active configuration from database into memory cache"""
-        try:
-            # Get active version
-            active_version = self.db.query(IntentConfigVersion)\
-                .filter(IntentConfigVersion.status == 'active')\
-                .first()
-            
-            if not active_version:
-                print("ConfigRouter: No active intent config version found in database")
-                self._cache = {}
-                self._cache_version = None
-                return
-            
-            print(f"ConfigRouter: Loading patterns from version '{active_version.name}' (ID: {active_version.id})")
-            
-            # Load all patterns for active version
-            patterns = self.db.query(IntentPattern)\
-                .filter(
-                    IntentPattern.version_id == active_version.id,
-                    IntentPattern.enabled == True
-                )\
-                .order_by(IntentPattern.priority.desc(), IntentPattern.created_at)\
-                .all()
-            
-            print(f"ConfigRouter: Found {len(patterns)} enabled patterns in database")
-            
-            # Organize patterns by type
-            cache = {
-                "positive": [],
-                "negative": [],
-                "synonyms": []
-            }
-            
-            compilation_errors = 0
-            
-            for pattern in patterns:
-                compiled_pattern = self._compile_pattern(pattern.pattern)
-                if compiled_pattern:
-                    pattern_data = {
-                        "id": pattern.id,
-                        "handler": pattern.handler,
-                        "intent": pattern.intent,
-                        "pattern": compiled_pattern,
-                        "raw_pattern": pattern.pattern,
-                        "priority": pattern.priority,
-                        "scope_school_id": pattern.scope_school_id
-                    }
-                    
-                    if pattern.kind == PatternKind.POSITIVE:
-                        cache["positive"].append(pattern_data)
-                    elif pattern.kind == PatternKind.NEGATIVE:
-                        cache["negative"].append(pattern_data)
-                    elif pattern.kind == PatternKind.SYNONYM:
-                        cache["synonyms"].append(pattern_data)
-                else:
-                    compilation_errors += 1
-                    print(f"ConfigRouter: Failed to compile pattern for {pattern.intent}: {pattern.pattern[:50]}...")
-            
-            self._cache = cache
-            self._cache_version = active_version.id
-            
-            print(f"ConfigRouter: Successfully loaded {len(cache['positive'])} positive, "
-                  f"{len(cache['negative'])} negative, {len(cache['synonyms'])} synonym patterns")
-            
-            if compilation_errors > 0:
-                print(f"ConfigRouter: Warning - {compilation_errors} patterns failed to compile")
-            
-            # Debug: List some loaded patterns for verification
-            if cache["positive"]:
-                print("ConfigRouter: Sample loaded patterns:")
-                for p in cache["positive"][:5]:  # Show first 5
-                    print(f"  - {p['intent']} (priority {p['priority']}): {p['raw_pattern'][:60]}...")
-            
-        except Exception as e:
-            print(f"ConfigRouter: Error loading config: {e}")
-            import traceback
-            traceback.print_exc()
-            self._cache = {}
-            self._cache_version = None
+    def _load_active_config(self, force: bool = False):
+        """Build the shared pattern index for the active version, once per worker"""
+        global _shared_index
+        
+        with _shared_index_lock:
+            try:
+                active_version = self.db.query(IntentConfigVersion)\
+                    .filter(IntentConfigVersion.status == 'active')\
+                    .first()
+                
+                if not active_version:
+                    print("ConfigRouter: No active intent config version found in database")
+                    _shared_index = None
+                    self._index = None
+                    return
+                
+                version_stamp = (active_version.id, active_version.updated_at)
+                
+                # Another request may have rebuilt the index while we waited on the lock
+                if not force and _shared_index is not None and _shared_index.version_stamp == version_stamp:
+                    self._index = _shared_index
+                    return
+                
+                previous_version_id = _shared_index.version_id if _shared_index else None
+                _shared_index = self._build_index(active_version, version_stamp)
+                self._index = _shared_index
+                
+                # LLM classifications are only valid for the version they were made under
+                if previous_version_id != active_version.id:
+                    get_classification_cache().invalidate()
+                
+            except Exception as e:
+                print(f"ConfigRouter: Error loading config: {e}")
+                import traceback
+                traceback.print_exc()
+                self._index = _shared_index
+    
+    def _build_index(self, active_version: IntentConfigVersion, version_stamp: Any) -> PatternIndex:
+        """Query and compile all enabled patterns of a version into a PatternIndex"""
+        print(f"ConfigRouter: Loading patterns from version '{active_version.name}' (ID: {active_version.id})")
+        
+        patterns = self.db.query(IntentPattern)\
+            .filter(
+                IntentPattern.version_id == active_version.id,
+                IntentPattern.enabled == True
+            )\
+            .order_by(IntentPattern.priority.desc(), IntentPattern.created_at)\
+            .all()
+        
+        print(f"ConfigRouter: Found {len(patterns)} enabled patterns in database")
+        
+        compiled_patterns = []
+        compilation_errors = 0
+        
+        for order, pattern in enumerate(patterns):
+            compiled_pattern = self._compile_pattern(pattern.pattern)
+            if compiled_pattern:
+                compiled_patterns.append({
+                    "id": pattern.id,
+                    "handler": pattern.handler,
+                    "intent": pattern.intent,
+                    "kind": pattern.kind,
+                    "pattern": compiled_pattern,
+                    "raw_pattern": pattern.pattern,
+                    "priority": pattern.priority,
+                    "scope_school_id": pattern.scope_school_id,
+                    "order": order
+                })
+            else:
+                compilation_errors += 1
+                print(f"ConfigRouter: Failed to compile pattern for {pattern.intent}: {pattern.pattern[:50]}...")
+        
+        index = PatternIndex(active_version.id, version_stamp, compiled_patterns, compilation_errors)
+        stats = index.get_stats()
+        
+        print(f"ConfigRouter: Successfully loaded {len(index.by_kind['positive'])} positive, "
+              f"{len(index.by_kind['negative'])} negative, {len(index.by_kind['synonyms'])} synonym patterns")
+        print(f"ConfigRouter: Indexed {stats['keywords']} keywords across {stats['scopes']} scopes "
+              f"({stats['unindexed_patterns']} patterns without keywords)")
+        
+        if compilation_errors > 0:
+            print(f"ConfigRouter: Warning - {compilation_errors} patterns failed to compile")
+        
+        return index
     
     def _compile_pattern(self, pattern: str) -> Optional[re.Pattern]:
         """Compile regex pattern with error handling"""
@@ -210,11 +263,7 @@ class ConfigRouter:
         """Apply synonym replacements to normalize message"""
         normalized = message
         
-        for synonym in self._cache.get("synonyms", []):
-            # Check school scope
-            if synonym["scope_school_id"] and synonym["scope_school_id"] != school_id:
-                continue
-            
+        for synonym in self._index.synonyms_for(school_id):
             try:
                 if synonym["pattern"].search(normalized):
                     # For synonyms, the "intent" field contains the replacement text
@@ -228,28 +277,13 @@ class ConfigRouter:
         return normalized
     
     def _find_best_pattern(self, message: str, school_id: Optional[str]) -> Optional[Dict]:
-        """Find the best matching positive pattern"""
+        """Find the best matching positive pattern among the index's keyword candidates"""
         matches = []
         
-        # Debug: Track what patterns we're checking
-        patterns_checked = 0
-        patterns_skipped_scope = 0
-        
-        positive_patterns = self._cache.get("positive", [])
-        print(f"ConfigRouter: Checking {len(positive_patterns)} positive patterns...")
+        candidates = self._index.candidates_for(message.casefold(), school_id)
+        print(f"ConfigRouter: Prefilter kept {len(candidates)} of {len(self._cache.get('positive', []))} positive patterns")
         
-        for pattern in positive_patterns:
-            patterns_checked += 1
-            
-            # Check school scope
-            if pattern["scope_school_id"] and pattern["scope_school_id"] != school_id:
-                patterns_skipped_scope += 1
-                continue
-            
-            # Debug: Show pattern being checked (for high-priority or relevant patterns)
-            if pattern["priority"] >= 100 or "student" in pattern["intent"]:
-                print(f"  Checking [{pattern['priority']}] {pattern['intent']}: {pattern['raw_pattern'][:50]}...")
-            
+        for pattern in candidates:
             try:
                 match = pattern["pattern"].search(message)
                 if match:
@@ -263,8 +297,7 @@ class ConfigRouter:
                     confidence = (coverage * 0.7) + (priority_score * 0.3)
                     confidence = min(1.0, confidence)  # Cap at 1.0
                     
-                    print(f"    ✓ MATCHED! Coverage: {coverage:.2f}, Priority: {pattern['priority']}, Confidence: {confidence:.2f}")
-                    print(f"      Match text: '{match.group(0)}'")
+                    print(f"    ✓ MATCHED [{pattern['priority']}] {pattern['intent']}: coverage {coverage:.2f}, confidence {confidence:.2f}")
                     
                     matches.append({
                         **pattern,
@@ -275,7 +308,6 @@ class ConfigRouter:
             except Exception as e:
                 print(f"  Error testing pattern {pattern['intent']}: {e}")
         
-        print(f"ConfigRouter: Checked {patterns_checked} patterns ({patterns_skipped_scope} skipped for school scope)")
         print(f"ConfigRouter: Found {len(matches)} matching patterns")
         
         if not matches:
@@ -293,17 +325,7 @@ class ConfigRouter:
     
     def _has_negative_match(self, message: str, handler: str, school_id: Optional[str]) -> bool:
         """Check if message matches any negative patterns for this handler"""
-        negative_patterns = self._cache.get("negative", [])
-        
-        for pattern in negative_patterns:
-            # Only check negative patterns for the same handler
-            if pattern["handler"] != handler:
-                continue
-            
-            # Check school scope
-            if pattern["scope_school_id"] and pattern["scope_school_id"] != school_id:
-                continue
-            
+        for pattern in self._index.negatives_for(handler, school_id):
             try:
                 if pattern["pattern"].search(message):
                     print(f"ConfigRouter: Negative pattern matched: {pattern['raw_pattern'][:50]}...")
@@ -366,7 +388,8 @@ class ConfigRouter:
             "version": self._cache_version,
             "positive_patterns": len(self._cache.get("positive", [])),
             "negative_patterns": len(self._cache.get("negative", [])),
-            "synonyms": len(self._cache.get("synonyms", []))
+            "synonyms": len(self._cache.get("synonyms", [])),
+            "index": self._index.get_stats()
         }
     
     def test_pattern(self, message: str, pattern_str: str) -> bool:
@@ -0,0 +1,308 @@
+# app/services/conversation_state.py
+"""Hot cache of conversation flow state.
+
+Multi-step flows (student creation, enrollment, fee update, class creation)
+keep their step state in ChatConversation.context_data and read it back on
+every message. This cache holds a snapshot of each active conversation -
+owner, title, context_data, last few messages - so ChatService.begin_turn
+can build the handler context without touching Postgres.
+
+Every snapshot carries a version stamp: the conversation's message_count,
+which each persisted turn advances. Snapshots are written through on commit:
+complete_turn stages the new snapshot on the session and it only becomes
+visible once the transaction commits; a rollback evicts the conversation
+instead.
+
+Keeping workers in sync without a per-turn read:
+- With CONVERSATION_STATE_REDIS_URL every worker shares one tier, written on
+  commit by whichever worker ran the turn.
+- Otherwise each persisted turn also NOTIFYs STATE_CHANNEL with the new
+  version (delivered on commit), and every worker's ConversationStateListener
+  evicts older local snapshots. Until the listener is connected, begin_turn
+  falls back to comparing the stamp with the stored message_count.
+
+A turn that still races another one (two tabs) is written anyway - its
+messages are appended - but its flow-context merge, built on the older
+state, is dropped (see ChatService.complete_turn).
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+_PENDING_KEY = "conversation_state_pending"
+
+STATE_CHANNEL = "conversation_state_changed"
+RECONNECT_DELAY_SECONDS = 5
+
+
+class ConversationStateCache:
+    """Two-tier (LRU + optional Redis) cache of conversation snapshots"""
+
+    def __init__(self,
+                 max_entries: int = 2000,
+                 ttl_seconds: int = 1800,
+                 redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._push_invalidation = False
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "redis_hits": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "stale": 0,
+            "conflicts": 0,
+            "pushed_evictions": 0
+        }
+
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.from_url(redis_url, decode_responses=True)
+            except ImportError:
+                print("ConversationStateCache: redis package not installed, using in-process tier only")
+
+    @staticmethod
+    def _key(conversation_id: str) -> str:
+        return f"chat_state:{conversation_id}"
+
+    @property
+    def shared(self) -> bool:
+        """True when all workers read and write one Redis tier"""
+        return self._redis is not None
+
+    def needs_version_check(self) -> bool:
+        """Whether a cached snapshot must be checked against the stored message_count"""
+        return self._redis is None and not self._push_invalidation
+
+    def set_push_invalidation(self, enabled: bool):
+        """Trust local snapshots while the version listener is connected"""
+        self._push_invalidation = enabled
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        key = self._key(conversation_id)
+
+        if self._redis is not None:
+            # Shared tier is authoritative when configured
+            try:
+                raw = self._redis.get(key)
+                if raw:
+                    with self._lock:
+                        self.stats["hits"] += 1
+                        self.stats["redis_hits"] += 1
+                    return json.loads(raw)
+            except Exception as e:
+                print(f"ConversationStateCache: Redis get failed: {e}")
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                # Callers merge into context; never hand out the cached dicts
+                return json.loads(json.dumps(entry[1]))
+            if entry:
+                del self._entries[key]
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, conversation_id: str, snapshot: Dict[str, Any]):
+        key = self._key(conversation_id)
+        # Round-trip through JSON so the cached copy matches what Redis holds
+        snapshot = json.loads(json.dumps(snapshot, default=str))
+
+        if self._redis is not None:
+            try:
+                self._redis.set(key, json.dumps(snapshot), ex=self.ttl_seconds)
+            except Exception as e:
+                print(f"ConversationStateCache: Redis set failed: {e}")
+            with self._lock:
+                self.stats["stores"] += 1
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, snapshot)
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, conversation_id: str):
+        key = self._key(conversation_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self.stats["invalidations"] += 1
+        if self._redis is not None:
+            try:
+                self._redis.delete(key)
+            except Exception as e:
+                print(f"ConversationStateCache: Redis delete failed: {e}")
+
+    def apply_pushed_version(self, conversation_id: str, version: int):
+        """Evict a local snapshot older than a version committed by any worker"""
+        key = self._key(conversation_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1].get("version", 0) < version:
+                del self._entries[key]
+                self.stats["pushed_evictions"] += 1
+
+    def clear_local(self):
+        """Drop every in-process snapshot (versions pushed while disconnected were missed)"""
+        with self._lock:
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def record_stale(self):
+        with self._lock:
+            self.stats["stale"] += 1
+
+    def record_conflict(self):
+        with self._lock:
+            self.stats["conflicts"] += 1
+
+    # === COMMIT-BOUND WRITES ===
+
+    def stage(self, db: Session, conversation_id: str, snapshot: Dict[str, Any]):
+        """Publish snapshot once db commits; evict the conversation if it rolls back"""
+        db.info.setdefault(_PENDING_KEY, {})[conversation_id] = snapshot
+
+    def _on_commit(self, session: Session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if pending:
+            for conversation_id, snapshot in pending.items():
+                self.put(conversation_id, snapshot)
+
+    def _on_rollback(self, session: Session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if pending:
+            for conversation_id in pending:
+                self.invalidate(conversation_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "redis_enabled": self._redis is not None,
+                "push_invalidation": self._push_invalidation
+            }
+
+
+_conversation_state_cache: Optional[ConversationStateCache] = None
+
+
+def get_conversation_state_cache() -> ConversationStateCache:
+    """The worker's shared conversation state cache"""
+    global _conversation_state_cache
+    if _conversation_state_cache is None:
+        _conversation_state_cache = ConversationStateCache(
+            max_entries=int(os.getenv("CONVERSATION_STATE_CACHE_SIZE", "2000")),
+            ttl_seconds=int(os.getenv("CONVERSATION_STATE_TTL_SECONDS", "1800")),
+            redis_url=os.getenv("CONVERSATION_STATE_REDIS_URL")
+        )
+    return _conversation_state_cache
+
+
+def _listener_dsn() -> str:
+    """Plain libpq DSN for psycopg from the SQLAlchemy URL"""
+    return settings.DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)\
+        .replace("postgresql+psycopg2://", "postgresql://", 1)
+
+
+class ConversationStateListener:
+    """Background task evicting this worker's snapshots when another worker commits a turn"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start listening; safe to call once per worker at startup"""
+        if get_conversation_state_cache().shared:
+            return  # Redis tier is already shared by every worker
+        if not settings.DATABASE_URL.startswith("postgresql"):
+            print("ConversationState: No Postgres LISTEN/NOTIFY, checking versions per turn")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        get_conversation_state_cache().set_push_invalidation(False)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen_forever(self):
+        import psycopg
+
+        state_cache = get_conversation_state_cache()
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(_listener_dsn(), autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {STATE_CHANNEL}")
+                    print(f"ConversationState: Listening on Postgres channel '{STATE_CHANNEL}'")
+
+                    # Turns committed while we were disconnected were missed
+                    state_cache.clear_local()
+                    state_cache.set_push_invalidation(True)
+
+                    async for notify in conn.notifies():
+                        self._on_payload(state_cache, notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ConversationState: Listener error, checking versions per turn: {e}")
+
+            state_cache.set_push_invalidation(False)
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def _on_payload(self, state_cache: ConversationStateCache, payload: str):
+        # "<conversation_id>:<message_count>"
+        conversation_id, _, version = (payload or "").partition(":")
+        try:
+            state_cache.apply_pushed_version(conversation_id, int(version))
+        except ValueError:
+            state_cache.invalidate(conversation_id)
+
+
+conversation_state_listener = ConversationStateListener()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged_state(session: Session):
+    if _PENDING_KEY in session.info:
+        get_conversation_state_cache()._on_commit(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_state(session: Session):
+    if _PENDING_KEY in session.info:
+        get_conversation_state_cache()._on_rollback(session)
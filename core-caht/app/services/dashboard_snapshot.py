@@ -0,0 +1,296 @@
+# app/services/dashboard_snapshot.py
+"""Cached per-school dashboard snapshot.
+
+The school overview (chat "dashboard" intents and GET /schools/overview) is
+one snapshot per school: student, class, academic, enrollment and fee counts,
+the current term, the class breakdown and recent activity, all computed by a
+single combined query.
+
+Snapshots are served from cache until either
+  - the school's data changes: a session listener notices writes to the
+    tables the snapshot reads (ORM flushes and raw SQL alike) and drops the
+    school's snapshot once the transaction commits, so the next read
+    recomputes it; or
+  - they are older than DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS, which bounds
+    staleness for writes this worker cannot see (other workers or processes
+    without a shared Redis tier).
+
+With several workers set DASHBOARD_SNAPSHOT_REDIS_URL so invalidations and
+snapshots are shared.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+_PENDING_KEY = "dashboard_snapshot_pending"
+
+# Tables the snapshot reads; a write to any of them invalidates the school
+TRACKED_TABLES = frozenset({
+    "students", "classes", "enrollments", "academic_years", "academic_terms",
+    "fee_structures", "invoices", "payments",
+})
+
+_DML_TABLE_RE = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+(" + "|".join(sorted(TRACKED_TABLES)) + r")\b",
+    re.IGNORECASE
+)
+
+RECENT_ACTIVITY_DAYS = 7
+
+_SNAPSHOT_SQL = text("""
+    WITH student_stats AS (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'ACTIVE') AS active,
+               COUNT(*) FILTER (WHERE class_id IS NULL AND status = 'ACTIVE') AS unassigned
+        FROM students
+        WHERE school_id = :school_id
+    ), class_counts AS (
+        SELECT c.id, c.name, c.level, c.created_at, COUNT(s.id) AS student_count
+        FROM classes c
+        LEFT JOIN students s ON s.class_id = c.id AND s.status = 'ACTIVE'
+        WHERE c.school_id = :school_id
+        GROUP BY c.id, c.name, c.level, c.created_at
+    ), current_term AS (
+        SELECT t.id, t.title, t.state, y.year, y.title AS year_title
+        FROM academic_terms t
+        JOIN academic_years y ON t.year_id = y.id
+        WHERE t.school_id = :school_id AND t.state = 'ACTIVE'
+        LIMIT 1
+    ), invoice_stats AS (
+        SELECT COUNT(*) AS total_invoices,
+               COUNT(*) FILTER (WHERE status = 'PENDING') AS pending_invoices,
+               COUNT(*) FILTER (WHERE status IN ('ISSUED', 'PARTIAL')) AS open_invoices,
+               COALESCE(SUM(amount_paid), 0) AS total_payments
+        FROM invoices
+        WHERE school_id = :school_id
+    )
+    SELECT
+        ss.total AS students_total, ss.active AS students_active, ss.unassigned AS students_unassigned,
+        (SELECT COUNT(*) FROM class_counts) AS classes_total,
+        (SELECT COUNT(*) FROM class_counts WHERE student_count > 0) AS classes_with_students,
+        (SELECT COUNT(*) FROM academic_years WHERE school_id = :school_id) AS academic_years,
+        (SELECT COUNT(*) FROM academic_terms WHERE school_id = :school_id) AS academic_terms,
+        (SELECT COUNT(*) FROM academic_terms WHERE school_id = :school_id AND state = 'ACTIVE') AS active_terms,
+        (SELECT COUNT(DISTINCT e.student_id)
+           FROM enrollments e
+           JOIN academic_terms t ON e.term_id = t.id
+          WHERE e.school_id = :school_id AND t.state = 'ACTIVE') AS enrolled_current_term,
+        (SELECT row_to_json(ct) FROM current_term ct) AS current_term,
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'name', cc.name, 'level', cc.level, 'student_count', cc.student_count
+                ) ORDER BY cc.level, cc.name), '[]'::json)
+           FROM class_counts cc) AS class_breakdown,
+        (SELECT json_build_object('count', COUNT(*), 'last', MAX(e.created_at))
+           FROM enrollments e
+          WHERE e.school_id = :school_id AND e.created_at >= NOW() - make_interval(days => :recent_days)) AS recent_enrollments,
+        (SELECT json_build_object('count', COUNT(*), 'last', MAX(cc.created_at))
+           FROM class_counts cc
+          WHERE cc.created_at >= NOW() - make_interval(days => :recent_days)) AS recent_classes,
+        (SELECT COUNT(*) FROM fee_structures WHERE school_id = :school_id) AS fee_structures,
+        inv.total_invoices, inv.pending_invoices, inv.open_invoices, inv.total_payments
+    FROM student_stats ss, invoice_stats inv
+""")
+
+
+def compute_dashboard_snapshot(db: Session, school_id: str) -> Dict[str, Any]:
+    """Run the combined overview query for one school"""
+    row = db.execute(_SNAPSHOT_SQL, {
+        "school_id": school_id,
+        "recent_days": RECENT_ACTIVITY_DAYS
+    }).mappings().one()
+    snapshot = dict(row)
+    snapshot["total_payments"] = float(snapshot["total_payments"] or 0)
+    snapshot["computed_at"] = time.time()
+    return snapshot
+
+
+class DashboardSnapshotCache:
+    """Two-tier (LRU + optional Redis) cache of per-school dashboard snapshots"""
+
+    def __init__(self,
+                 max_entries: int = 5000,
+                 max_age_seconds: int = 60,
+                 redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "redis_hits": 0,
+            "refreshes": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.from_url(redis_url, decode_responses=True)
+            except ImportError:
+                print("DashboardSnapshotCache: redis package not installed, using in-process tier only")
+
+    @staticmethod
+    def _key(school_id: str) -> str:
+        return f"dashboard_snapshot:{school_id}"
+
+    def get(self, school_id: str) -> Optional[Dict[str, Any]]:
+        key = self._key(school_id)
+
+        if self._redis is not None:
+            # Shared tier is authoritative when configured; Redis expiry is the staleness bound
+            try:
+                raw = self._redis.get(key)
+                if raw:
+                    with self._lock:
+                        self.stats["hits"] += 1
+                        self.stats["redis_hits"] += 1
+                    return json.loads(raw)
+            except Exception as e:
+                print(f"DashboardSnapshotCache: Redis get failed: {e}")
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, school_id: str, snapshot: Dict[str, Any]):
+        key = self._key(school_id)
+        # Round-trip through JSON so the cached copy matches what Redis holds
+        snapshot = json.loads(json.dumps(snapshot, default=str))
+
+        if self._redis is not None:
+            try:
+                self._redis.set(key, json.dumps(snapshot), ex=self.max_age_seconds)
+            except Exception as e:
+                print(f"DashboardSnapshotCache: Redis set failed: {e}")
+            with self._lock:
+                self.stats["refreshes"] += 1
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.max_age_seconds, snapshot)
+            self._entries.move_to_end(key)
+            self.stats["refreshes"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, school_id: str):
+        key = self._key(school_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self.stats["invalidations"] += 1
+        if self._redis is not None:
+            try:
+                self._redis.delete(key)
+            except Exception as e:
+                print(f"DashboardSnapshotCache: Redis delete failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_age_seconds": self.max_age_seconds,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "redis_enabled": self._redis is not None
+            }
+
+
+_dashboard_snapshot_cache: Optional[DashboardSnapshotCache] = None
+
+
+def get_dashboard_snapshot_cache() -> DashboardSnapshotCache:
+    """The worker's shared dashboard snapshot cache"""
+    global _dashboard_snapshot_cache
+    if _dashboard_snapshot_cache is None:
+        _dashboard_snapshot_cache = DashboardSnapshotCache(
+            max_entries=int(os.getenv("DASHBOARD_SNAPSHOT_CACHE_SIZE", "5000")),
+            max_age_seconds=int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS", "60")),
+            redis_url=os.getenv("DASHBOARD_SNAPSHOT_REDIS_URL")
+        )
+    return _dashboard_snapshot_cache
+
+
+def get_dashboard_snapshot(db: Session, school_id: str) -> Dict[str, Any]:
+    """The school's snapshot from cache, recomputed when missing, changed or too old"""
+    # A session that changed the school reads its own uncommitted writes, uncached
+    if str(school_id) in db.info.get(_PENDING_KEY, ()):
+        return compute_dashboard_snapshot(db, school_id)
+
+    cache = get_dashboard_snapshot_cache()
+    snapshot = cache.get(str(school_id))
+    if snapshot is None:
+        snapshot = compute_dashboard_snapshot(db, school_id)
+        cache.put(str(school_id), snapshot)
+    return snapshot
+
+
+# === CHANGE TRACKING ===
+
+def mark_school_data_changed(db: Session, school_id):
+    """Drop the school's snapshot once db commits (writers outside Session.execute call this)"""
+    if school_id:
+        db.info.setdefault(_PENDING_KEY, set()).add(str(school_id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(orm_execute_state):
+    statement = orm_execute_state.statement
+    if isinstance(statement, TextClause):
+        if not _DML_TABLE_RE.search(statement.text):
+            return
+    elif not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    elif getattr(statement, "table", None) is None or statement.table.name not in TRACKED_TABLES:
+        return
+
+    params = orm_execute_state.parameters
+    if isinstance(params, (list, tuple)):
+        params = params[0] if params else {}
+    mark_school_data_changed(orm_execute_state.session, (params or {}).get("school_id"))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in TRACKED_TABLES:
+            mark_school_data_changed(session, getattr(obj, "school_id", None))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_schools(session: Session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        cache = get_dashboard_snapshot_cache()
+        for school_id in changed:
+            cache.invalidate(school_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_schools(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,196 @@
+# app/services/fee_reminders.py
+"""Fee-reminder broadcasts to the guardians of every student with a balance.
+
+A broadcast is a background job (kind fee_reminder_broadcast) whose id is
+the broadcast id. The job does not send anything: it queues one outbox row
+per guardian and channel, and the notification dispatchers deliver them
+(app/services/notification_dispatcher.py).
+
+- Targets stream from a server-side cursor over student_balances in batches
+  of REMINDER_BATCH_SIZE; each batch becomes one INSERT per channel.
+- Each channel's template is filled with the school's parts once per
+  broadcast; per guardian only the student fields are substituted.
+- WhatsApp rows are scheduled (run_after) at the school's bridge rate and
+  email rows at NOTIFY_EMAIL_PER_MINUTE, so dispatchers find them due at the
+  pace they may be sent instead of claiming and deferring thousands at once.
+- Rows carry the broadcast id and a per-student dedupe key: a retried job
+  skips what it already queued, and broadcast_status() counts delivery
+  outcomes from the outbox.
+"""
+
+import os
+import html
+from string import Template
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+
+from app.core.db import engine
+from app.services.jobs import enqueue_job, _UTC_NOW
+from app.services.notifications import (
+    NOTIFICATION_CHANNEL, EMAIL, WHATSAPP, KIND_FEE_REMINDER,
+    FEE_REMINDER_WHATSAPP, FEE_REMINDER_EMAIL, FEE_REMINDER_EMAIL_SUBJECT,
+    fee_reminder_fields, whatsapp_messages_per_minute
+)
+
+REMINDER_CHANNELS = (WHATSAPP, EMAIL)
+
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+
+
+def compile_reminder_templates(school_name: str, channels: Sequence[str],
+                               message: Optional[str] = None) -> Dict[str, Dict[str, Optional[Template]]]:
+    """
+    Subject/body templates per channel with the school's parts already filled
+    in. A custom message replaces the WhatsApp text and heads the email; it may
+    use $student_name, $admission_no and $outstanding_amount.
+    """
+    templates: Dict[str, Dict[str, Optional[Template]]] = {}
+    if WHATSAPP in channels:
+        body = message or Template(FEE_REMINDER_WHATSAPP).safe_substitute(school_name=school_name)
+        templates[WHATSAPP] = {"subject": None, "body": Template(body)}
+    if EMAIL in channels:
+        message_html = f"<p>{html.escape(message)}</p>" if message else ""
+        templates[EMAIL] = {
+            "subject": Template(FEE_REMINDER_EMAIL_SUBJECT),
+            "body": Template(Template(FEE_REMINDER_EMAIL).safe_substitute(
+                school_name=html.escape(school_name), message_html=message_html
+            ))
+        }
+    return templates
+
+
+def start_fee_reminder_broadcast(school_id: str, user_id: Optional[str], channels: Sequence[str],
+                                 student_ids: Optional[List[str]] = None,
+                                 message: Optional[str] = None) -> Dict[str, Any]:
+    """Queue a broadcast job; returns the job (the one already running for the school, if any)"""
+    channels = [channel.upper() for channel in channels]
+    unknown = [channel for channel in channels if channel not in REMINDER_CHANNELS]
+    if unknown or not channels:
+        raise ValueError(f"Reminder channels must be among {', '.join(REMINDER_CHANNELS)}")
+    return enqueue_job(
+        "fee_reminder_broadcast", school_id, user_id,
+        payload={"channels": channels, "student_ids": student_ids, "message": message},
+        idempotency_key="fee_reminder_broadcast"
+    )
+
+
+def run_fee_reminder_broadcast(ctx, db, payload):
+    """Job body (job kind fee_reminder_broadcast): queue the reminders in the outbox batch by batch"""
+    from app.api.routers.chat.handlers.payment.repo import PaymentRepo
+
+    channels = payload["channels"]
+    student_ids = payload.get("student_ids")
+    repo = PaymentRepo(db, ctx.school_id)
+
+    total = repo.count_students_with_outstanding_balances(student_ids)
+    ctx.progress(0, total=total, message="Queueing reminders", force=True)
+
+    school_name = db.execute(text("SELECT name FROM schools WHERE id = CAST(:id AS uuid)"),
+                             {"id": ctx.school_id}).scalar() or "School"
+    templates = compile_reminder_templates(school_name, channels, payload.get("message"))
+
+    # Seconds between consecutive messages of a channel, and the slot of the next one
+    interval = {
+        WHATSAPP: 60.0 / whatsapp_messages_per_minute(db, ctx.school_id),
+        EMAIL: 60.0 / max(int(os.getenv("NOTIFY_EMAIL_PER_MINUTE", "60")), 1)
+    }
+    slot = {channel: 0 for channel in channels}
+    queued = {channel: 0 for channel in channels}
+    no_contact = {channel: 0 for channel in channels}
+    done = 0
+
+    for batch in repo.stream_students_with_outstanding_balances(student_ids, REMINDER_BATCH_SIZE):
+        for channel in channels:
+            rows = _render_batch(channel, templates[channel], batch)
+            no_contact[channel] += len(batch) - len(rows)
+            if not rows:
+                continue
+            queued[channel] += _insert_batch(db, ctx, channel, rows, slot[channel], interval[channel])
+            slot[channel] += len(rows)
+        done += len(batch)
+        ctx.progress(done, message="Queueing reminders")
+
+    for channel in channels:
+        if queued[channel]:
+            db.execute(text("SELECT pg_notify(:channel, :type)"),
+                       {"channel": NOTIFICATION_CHANNEL, "type": channel})
+
+    return {
+        "broadcast_id": ctx.id,
+        "channels": channels,
+        "targets": done,
+        "queued": queued,
+        "no_contact": no_contact
+    }
+
+
+def _render_batch(channel: str, template: Dict[str, Optional[Template]], batch) -> List[Dict[str, Any]]:
+    """Outbox values for the guardians in a batch who can be reached on the channel"""
+    rows = []
+    for row in batch:
+        recipient = (row.guardian_phone if channel == WHATSAPP else row.guardian_email) or ""
+        recipient = recipient.strip()
+        if not recipient or (channel == EMAIL and "@" not in recipient):
+            continue
+        fields = fee_reminder_fields({
+            "student_name": f"{row.first_name} {row.last_name}",
+            "admission_no": row.admission_no,
+            "outstanding_amount": row.outstanding_amount
+        })
+        body_fields = {key: html.escape(value) for key, value in fields.items()} if channel == EMAIL else fields
+        rows.append({
+            "student_id": str(row.id),
+            "guardian_id": str(row.guardian_id) if row.guardian_id else None,
+            "recipient": recipient,
+            "subject": template["subject"].safe_substitute(fields) if template["subject"] else None,
+            "body": template["body"].safe_substitute(body_fields)
+        })
+    return rows
+
+
+def _insert_batch(db, ctx, channel: str, rows: List[Dict[str, Any]], first_slot: int, interval: float) -> int:
+    """One INSERT for a batch of a channel's reminders; how many were new"""
+    result = db.execute(text(f"""
+        INSERT INTO notification (id, school_id, type, kind, recipient, subject, body, payload,
+                                  to_guardian_id, to_user_id, status, dedupe_key, broadcast_id,
+                                  attempts, max_attempts, run_after, created_at, updated_at)
+        SELECT gen_random_uuid()::text, :school_id, :type, :kind, r.recipient, r.subject, r.body,
+               jsonb_build_object('student_id', r.student_id, 'broadcast_id', CAST(:broadcast_id AS text)),
+               r.guardian_id, :user_id, 'QUEUED', 'reminder:' || :broadcast_id || ':' || r.student_id,
+               :broadcast_id, 0, 5,
+               {_UTC_NOW} + make_interval(secs => (:first_slot + r.ord - 1) * :interval),
+               {_UTC_NOW}, {_UTC_NOW}
+        FROM unnest(CAST(:recipients AS text[]), CAST(:subjects AS text[]), CAST(:bodies AS text[]),
+                    CAST(:student_ids AS text[]), CAST(:guardian_ids AS text[]))
+             WITH ORDINALITY AS r(recipient, subject, body, student_id, guardian_id, ord)
+        ON CONFLICT (school_id, type, dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+    """), {
+        "school_id": ctx.school_id,
+        "type": channel,
+        "kind": KIND_FEE_REMINDER,
+        "user_id": ctx.user_id,
+        "broadcast_id": ctx.id,
+        "first_slot": first_slot,
+        "interval": interval,
+        "recipients": [row["recipient"] for row in rows],
+        "subjects": [row["subject"] for row in rows],
+        "bodies": [row["body"] for row in rows],
+        "student_ids": [row["student_id"] for row in rows],
+        "guardian_ids": [row["guardian_id"] for row in rows]
+    })
+    return result.rowcount
+
+
+def broadcast_status(school_id: str, broadcast_id: str) -> Dict[str, Dict[str, int]]:
+    """Outbox counts of a broadcast by channel and status (QUEUED/SENDING/SENT/FAILED)"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT type, status, COUNT(*) FROM notification
+            WHERE broadcast_id = :broadcast_id AND school_id = :school_id
+            GROUP BY type, status
+        """), {"broadcast_id": broadcast_id, "school_id": str(school_id)}).all()
+    status: Dict[str, Dict[str, int]] = {}
+    for channel, state, count in rows:
+        status.setdefault(channel, {})[state] = count
+    return status
@@ -8,7 +8,8 @@ enhanced enrollment system.
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from datetime import date, timedelta
 from typing import List, Dict, Optional
 
@@ -17,6 +18,8 @@ from app.models.student import Student
 from app.models.class_model import Class
 from app.models.academic import Enrollment, AcademicTerm, AcademicYear
 from app.models.payment import Invoice, InvoiceLine
+from app.services.invoice_builder import InvoiceBuilder, BulkInvoiceResult, should_include_fee_item
+from app.services.balance_ledger import get_balance_ledger
 
 
 class FeesService:
@@ -37,10 +40,48 @@ class FeesService:
         """
         Generate invoices based on active enrollments for a term.
         This replaces the legacy fee generation logic.
+        Runs on the set-based builder; see generate_invoices_bulk.
         """
-        include_optional = include_optional or {}
+        return self._load_invoices(
+            self.generate_invoices_bulk(
+                term_id=term_id,
+                include_optional=include_optional,
+                due_date=due_date,
+                class_ids=class_ids,
+                student_ids=student_ids
+            ).created_invoice_ids
+        )
+    
+    def generate_invoices_bulk(
+        self,
+        term_id: str,
+        include_optional: Dict[str, bool] = None,
+        due_date: Optional[date] = None,
+        class_ids: Optional[List[str]] = None,
+        student_ids: Optional[List[str]] = None,
+        dry_run: bool = False
+    ) -> BulkInvoiceResult:
+        """
+        Generate a term's invoices set-based: one enrollment query, one fee
+        structure/item query and one INSERT for all invoices and lines.
+        Reports per-student skips; with dry_run nothing is written and the
+        result carries the planned invoices and total.
+        """
+        term_obj, year_obj = self._get_term_and_year(term_id)
         
-        # Get term and year details
+        builder = InvoiceBuilder(self.db, self.school_id)
+        enrollments = builder.load_enrollments(
+            term_id, term_obj.term, year_obj.year,
+            class_ids=class_ids, student_ids=student_ids
+        )
+        result = builder.plan(
+            enrollments, term_obj.term, year_obj.year,
+            include_optional=include_optional, dry_run=dry_run
+        )
+        builder.write(result, due_date=due_date)
+        return result
+    
+    def _get_term_and_year(self, term_id: str):
         term_data = self.db.execute(
             select(AcademicTerm, AcademicYear).join(
                 AcademicYear, AcademicYear.id == AcademicTerm.year_id
@@ -55,78 +96,17 @@ class FeesService:
         if not term_data:
             raise ValueError(f"Term {term_id} not found in school {self.school_id}")
         
-        term_obj, year_obj = term_data
-        
-        # Build enrollment query - only ENROLLED students
-        enrollment_query = select(Enrollment, Student, Class).join(
-            Student, Student.id == Enrollment.student_id
-        ).join(
-            Class, Class.id == Enrollment.class_id
-        ).where(
-            and_(
-                Enrollment.school_id == self.school_id,
-                Enrollment.term_id == term_id,
-                Enrollment.status == "ENROLLED"
+        return term_data
+    
+    def _load_invoices(self, invoice_ids: List) -> List[Invoice]:
+        if not invoice_ids:
+            return []
+        # = ANY(array) keeps this one bind parameter however many invoices were created
+        return list(self.db.execute(
+            select(Invoice).where(
+                Invoice.id == any_(bindparam("invoice_ids", list(invoice_ids), type_=ARRAY(UUID(as_uuid=True))))
             )
-        )
-        
-        # Apply filters
-        if class_ids:
-            enrollment_query = enrollment_query.where(Enrollment.class_id.in_(class_ids))
-        
-        if student_ids:
-            enrollment_query = enrollment_query.where(Enrollment.student_id.in_(student_ids))
-        
-        enrollments = self.db.execute(enrollment_query).all()
-        
-        created_invoices = []
-        
-        for enrollment, student, class_obj in enrollments:
-            try:
-                # Check if invoice already exists
-                existing_invoice = self.db.execute(
-                    select(Invoice).where(
-                        and_(
-                            Invoice.school_id == self.school_id,
-                            Invoice.student_id == student.id,
-                            Invoice.term == term_obj.term,
-                            Invoice.year == year_obj.year
-                        )
-                    )
-                ).scalar_one_or_none()
-                
-                if existing_invoice:
-                    continue
-                
-                # Get appropriate fee structure for this student's class
-                fee_structure = self._get_fee_structure_for_enrollment(
-                    enrollment, class_obj, term_obj.term, year_obj.year
-                )
-                
-                if not fee_structure:
-                    continue
-                
-                # Create invoice
-                invoice = self._create_invoice_for_enrollment(
-                    enrollment=enrollment,
-                    student=student,
-                    class_obj=class_obj,
-                    fee_structure=fee_structure,
-                    term=term_obj.term,
-                    year=year_obj.year,
-                    include_optional=include_optional,
-                    due_date=due_date
-                )
-                
-                if invoice:
-                    created_invoices.append(invoice)
-                    
-            except Exception as e:
-                # Log error but continue with other students
-                print(f"Error creating invoice for student {student.id}: {e}")
-                continue
-        
-        return created_invoices
+        ).scalars().all())
     
     def get_billable_students_for_term(
         self,
@@ -377,19 +357,14 @@ class FeesService:
             self.db.expunge(invoice)
             return None
         
+        self.db.flush()
+        get_balance_ledger(self.db, self.school_id).refresh_students([student.id])
+        
         return invoice
     
     def _should_include_fee_item(self, fee_item: FeeItem, current_term: int) -> bool:
         """Determine if a fee item should be included based on billing cycle"""
-        
-        if fee_item.billing_cycle == "TERM":
-            return True
-        elif fee_item.billing_cycle == "ANNUAL":
-            return current_term == 1  # Only charge annual fees in first term
-        elif fee_item.billing_cycle == "ONE_OFF":
-            return True
-        
-        return False
+        return should_include_fee_item(fee_item, current_term)
     
     def get_student_invoice_summary(self, student_id: str) -> Dict:
         """
@@ -409,18 +384,7 @@ class FeesService:
         # Calculate totals
         total_invoiced = sum(float(inv.total) for inv in invoices)
         
-        # Get payments
-        from app.models.payment import Payment
-        total_paid = self.db.execute(
-            select(func.coalesce(func.sum(Payment.amount), 0)).where(
-                and_(
-                    Payment.school_id == self.school_id,
-                    Payment.invoice_id.in_([inv.id for inv in invoices])
-                )
-            )
-        ).scalar() or 0
-        
-        total_paid = float(total_paid)
+        total_paid = sum(float(inv.amount_paid) for inv in invoices)
         balance = total_invoiced - total_paid
         
         return {
@@ -500,19 +464,7 @@ class FeesService:
         
         total_invoiced = sum(float(inv.total) for inv in invoices)
         
-        # Get payments
-        if invoices:
-            from app.models.payment import Payment
-            total_collected = self.db.execute(
-                select(func.coalesce(func.sum(Payment.amount), 0)).where(
-                    and_(
-                        Payment.school_id == self.school_id,
-                        Payment.invoice_id.in_([inv.id for inv in invoices])
-                    )
-                )
-            ).scalar() or 0
-        else:
-            total_collected = 0
+        total_collected = sum(float(inv.amount_paid) for inv in invoices)
         
         return {
             "class_id": class_id,
@@ -674,6 +626,10 @@ def _legacy_generate_invoices_for_students(
         inv.total = total
         created.append(inv)
 
+    if created:
+        db.flush()
+        get_balance_ledger(db, school_id).refresh_students(inv.student_id for inv in created)
+
     return created
 
 
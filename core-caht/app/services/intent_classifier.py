@@ -6,6 +6,7 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
 from app.services.ollama_service import OllamaService
+from app.services.llm_client import get_llm_client, LLMSaturatedError
 
 
 @dataclass
@@ -66,6 +67,10 @@ class IntentClassifier:
         """
         start_time = time.time()
         
+        # Skip the LLM instead of queueing behind busy slots only to time out
+        if get_llm_client().is_saturated():
+            return self._saturated_result(start_time)
+        
         try:
             # Build the prompt
             system_prompt = self._build_system_prompt()
@@ -85,6 +90,8 @@ class IntentClassifier:
             
             return result
             
+        except LLMSaturatedError:
+            return self._saturated_result(start_time)
         except asyncio.TimeoutError:
             return ClassificationResult(
                 intent="timeout",
@@ -104,6 +111,16 @@ class IntentClassifier:
                 latency_ms=int((time.time() - start_time) * 1000)
             )
     
+    def _saturated_result(self, start_time: float) -> ClassificationResult:
+        return ClassificationResult(
+            intent="saturated",
+            confidence=0.0,
+            entities={},
+            alternatives=[],
+            error="LLM queue saturated",
+            latency_ms=int((time.time() - start_time) * 1000)
+        )
+    
     def _build_system_prompt(self) -> str:
         """Build the system prompt for classification"""
         return """You are an intent classifier for a school management assistant. 
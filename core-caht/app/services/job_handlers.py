@@ -0,0 +1,78 @@
+# app/services/job_handlers.py
+"""Job functions for the background queue, one per job kind.
+
+Each runs in the worker's transaction for the job (committed together with
+the job's completion) and reports progress through ctx. Service imports are
+local so loading this module in a worker stays cheap.
+"""
+
+from app.services.jobs import register_job
+
+
+@register_job("invoice_generate_bulk")
+def invoice_generate_bulk(ctx, db, payload):
+    """Chat "generate invoices for all students" for a large school"""
+    from app.api.routers.chat.handlers.invoice.service import InvoiceService
+    service = InvoiceService(db, ctx.school_id, lambda: "", ctx.user_id)
+    return service.run_bulk_invoice_job(ctx)
+
+
+@register_job("enrollment_bulk")
+def enrollment_bulk(ctx, db, payload):
+    """Chat bulk enrollment confirmation for a large set of ready students"""
+    from app.api.routers.chat.handlers.enrollment.flows.enrollment import insert_bulk_enrollments
+    students = payload["students"]
+    ctx.progress(0, total=len(students), message="Enrolling students", force=True)
+    successful, failed = insert_bulk_enrollments(
+        db, ctx.school_id, students, payload["term_id"],
+        on_progress=lambda done: ctx.progress(done, message="Enrolling students")
+    )
+    return {
+        "term_id": payload["term_id"],
+        "term_title": payload.get("term_title"),
+        "successful_count": len(successful),
+        "failed_count": len(failed),
+        "failed_enrollments": failed[:50]
+    }
+
+
+@register_job("academic_bulk_enroll")
+def academic_bulk_enroll(ctx, db, payload):
+    """AcademicManagementService.bulk_enroll_students_for_term off the request path"""
+    from app.services.academics import get_academic_service
+    mappings = payload["enrollment_mappings"]
+    ctx.progress(0, total=len(mappings), message="Enrolling students", force=True)
+    result = get_academic_service(db, ctx.school_id).bulk_enroll_students_for_term(
+        term_id=payload["term_id"],
+        enrollment_mappings=mappings,
+        auto_generate_invoices=payload.get("auto_generate_invoices", True)
+    )
+    result.pop("success_details", None)  # per-row ORM details don't belong in the job row
+    return result
+
+
+@register_job("academic_advance_term")
+def academic_advance_term(ctx, db, payload):
+    """Term rollover (AcademicManagementService.advance_to_next_term) off the request path"""
+    from app.services.academics import get_academic_service
+    ctx.progress(0, message="Advancing term", force=True)
+    return get_academic_service(db, ctx.school_id).advance_to_next_term(
+        force=payload.get("force", False),
+        promotion_rules=payload.get("promotion_rules"),
+        generate_invoices=payload.get("generate_invoices", False)
+    )
+
+
+@register_job("balance_reconcile")
+def balance_reconcile(ctx, db, payload):
+    """Rebuild a school's invoice and student balances from payments, reporting drift"""
+    from app.services.balance_ledger import get_balance_ledger
+    ctx.progress(0, message="Reconciling balances", force=True)
+    return get_balance_ledger(db, ctx.school_id).reconcile()
+
+
+@register_job("fee_reminder_broadcast")
+def fee_reminder_broadcast(ctx, db, payload):
+    """Queue fee reminders for every guardian with a balance; the notification dispatchers send them"""
+    from app.services.fee_reminders import run_fee_reminder_broadcast
+    return run_fee_reminder_broadcast(ctx, db, payload)
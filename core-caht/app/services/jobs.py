@@ -0,0 +1,424 @@
+# app/services/jobs.py
+"""Postgres-backed background jobs for school operations too large for a request.
+
+A request enqueues a job row (kind + JSON payload) and replies at once with
+the job id; GET /api/jobs/{id} and the chat job status block poll the row.
+Workers - threads embedded in the API process (JOB_EMBEDDED_WORKERS) and/or
+separate processes started with scripts/run_job_worker.py - claim rows with
+FOR UPDATE SKIP LOCKED, so any number of them can share the queue without a
+broker.
+
+- Job functions are registered by kind with @register_job in
+  app/services/job_handlers.py and run in their own transaction with the
+  job's RLS context. Marking the job succeeded is part of that transaction.
+- Progress is written on a separate connection so it is visible while the
+  job's transaction is still open; each write also renews the lease.
+- A claimed job holds a lease of JOB_LEASE_SECONDS. A worker that dies
+  mid-job leaves the lease to expire and another worker re-runs the job.
+- Failures are retried with exponential backoff up to max_attempts.
+- An idempotency key makes enqueue return the job already queued/running
+  for the same (school, kind, key) instead of starting a second one.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import traceback
+import importlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.db import SessionLocal, engine, set_rls_context
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+JOB_CHANNEL = "background_jobs"
+
+# Modules whose import registers job functions
+JOB_HANDLER_MODULES = ("app.services.job_handlers",)
+
+# fn(ctx, db, payload) -> JSON-serializable result
+JobFunction = Callable[["JobContext", Any, Dict[str, Any]], Optional[Dict[str, Any]]]
+
+JOB_HANDLERS: Dict[str, JobFunction] = {}
+
+_UTC_NOW = "timezone('utc', now())"
+
+_JOB_COLUMNS = """id, school_id, user_id, kind, status, payload, result, error, attempts,
+    max_attempts, progress_done, progress_total, progress_message, run_after,
+    started_at, finished_at, created_at, updated_at"""
+
+
+def register_job(kind: str):
+    """Decorator registering fn(ctx, db, payload) as the function for a job kind"""
+    def decorator(fn: JobFunction) -> JobFunction:
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def load_job_handlers():
+    for module in JOB_HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def _listener_dsn() -> str:
+    """Plain libpq DSN for psycopg from the SQLAlchemy URL"""
+    return settings.DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)\
+        .replace("postgresql+psycopg2://", "postgresql://", 1)
+
+
+def job_to_dict(row) -> Dict[str, Any]:
+    job = dict(row._mapping)
+    total = job["progress_total"]
+    return {
+        "id": str(job["id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "done": job["progress_done"],
+        "total": total,
+        "percent": round(min(job["progress_done"] / total, 1.0) * 100, 1) if total else None,
+        "message": job["progress_message"],
+        "result": job["result"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "started_at": job["started_at"].isoformat() if job["started_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None
+    }
+
+
+# === PRODUCER SIDE ===
+
+def enqueue_job(
+    kind: str,
+    school_id: str,
+    user_id: Optional[str],
+    payload: Optional[Dict[str, Any]] = None,
+    total: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+    max_attempts: int = 3
+) -> Dict[str, Any]:
+    """
+    Queue a job in its own committed transaction and wake idle workers.
+    With an idempotency key, returns the queued/running job for the same
+    (school, kind, key) if there is one.
+    """
+    if kind not in JOB_HANDLERS:
+        load_job_handlers()
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+    params = {
+        "id": str(uuid.uuid4()),
+        "school_id": str(school_id),
+        "user_id": str(user_id) if user_id else None,
+        "kind": kind,
+        "payload": json.dumps(payload or {}, default=str),
+        "total": total,
+        "key": idempotency_key,
+        "max_attempts": max_attempts
+    }
+    with engine.begin() as conn:
+        row = conn.execute(text(f"""
+            INSERT INTO background_jobs (id, school_id, user_id, kind, status, payload, idempotency_key,
+                                         attempts, max_attempts, progress_done, progress_total,
+                                         run_after, created_at, updated_at)
+            VALUES (:id, :school_id, :user_id, :kind, 'queued', CAST(:payload AS jsonb), :key,
+                    0, :max_attempts, 0, :total, {_UTC_NOW}, {_UTC_NOW}, {_UTC_NOW})
+            ON CONFLICT (school_id, kind, idempotency_key)
+                WHERE idempotency_key IS NOT NULL AND status IN ('queued', 'running')
+                DO NOTHING
+            RETURNING {_JOB_COLUMNS}
+        """), params).first()
+
+        if row is None:
+            row = conn.execute(text(f"""
+                SELECT {_JOB_COLUMNS} FROM background_jobs
+                WHERE school_id = :school_id AND kind = :kind AND idempotency_key = :key
+                  AND status IN ('queued', 'running')
+            """), params).first()
+        else:
+            conn.execute(text("SELECT pg_notify(:channel, :kind)"), {"channel": JOB_CHANNEL, "kind": kind})
+
+    return job_to_dict(row)
+
+
+def get_job(job_id: str, school_id: str) -> Optional[Dict[str, Any]]:
+    """The job as a dict, or None if it doesn't exist for this school"""
+    with engine.connect() as conn:
+        row = conn.execute(text(f"""
+            SELECT {_JOB_COLUMNS} FROM background_jobs
+            WHERE id = CAST(:id AS uuid) AND school_id = :school_id
+        """), {"id": job_id, "school_id": str(school_id)}).first()
+    return job_to_dict(row) if row else None
+
+
+# === WORKER SIDE ===
+
+@dataclass
+class JobContext:
+    """What a job function gets besides its session: identity and progress reporting"""
+    id: str
+    kind: str
+    school_id: str
+    user_id: Optional[str]
+    attempt: int
+    worker: str
+    progress_interval: float = 0.5
+    _last_write: float = field(default=0.0, repr=False)
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None,
+                 force: bool = False):
+        """Record progress (throttled to one write per progress_interval) and renew the lease"""
+        now = time.monotonic()
+        if not force and now - self._last_write < self.progress_interval:
+            return
+        self._last_write = now
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"""
+                    UPDATE background_jobs
+                    SET progress_done = :done,
+                        progress_total = COALESCE(:total, progress_total),
+                        progress_message = COALESCE(:message, progress_message),
+                        locked_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                    WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+                """), {"done": done, "total": total, "message": message and message[:256],
+                       "id": self.id, "worker": self.worker})
+        except Exception as e:
+            print(f"Job {self.kind} {self.id}: progress update failed: {e}")
+
+
+class JobWorker:
+    """Claims and runs queued jobs one at a time"""
+
+    channel = JOB_CHANNEL
+
+    def __init__(self, name: Optional[str] = None, poll_seconds: float = 2.0,
+                 lease_seconds: int = 300, retry_base_seconds: int = 10):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.stats = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0, "lease_lost": 0}
+
+    def claim(self):
+        """Lease the next runnable job (an expired lease first, then the oldest queued one)"""
+        with engine.begin() as conn:
+            return conn.execute(text(f"""
+                UPDATE background_jobs
+                SET status = 'running', locked_by = :worker, locked_at = {_UTC_NOW},
+                    attempts = attempts + 1, started_at = COALESCE(started_at, {_UTC_NOW}),
+                    updated_at = {_UTC_NOW}
+                WHERE id = COALESCE(
+                    (SELECT id FROM background_jobs
+                     WHERE status = 'running'
+                       AND locked_at < {_UTC_NOW} - make_interval(secs => :lease)
+                     ORDER BY locked_at
+                     FOR UPDATE SKIP LOCKED LIMIT 1),
+                    (SELECT id FROM background_jobs
+                     WHERE status = 'queued' AND run_after <= {_UTC_NOW}
+                     ORDER BY run_after
+                     FOR UPDATE SKIP LOCKED LIMIT 1)
+                )
+                RETURNING {_JOB_COLUMNS}
+            """), {"worker": self.name, "lease": self.lease_seconds}).first()
+
+    def run_one(self) -> bool:
+        """Run one job if any is runnable; False when the queue was empty"""
+        row = self.claim()
+        if row is None:
+            return False
+        self.stats["claimed"] += 1
+        self._execute(row)
+        return True
+
+    def _execute(self, row):
+        job = row._mapping
+        job_id = str(job["id"])
+        started = time.perf_counter()
+
+        if job["attempts"] > job["max_attempts"]:
+            # Reclaimed after its last attempt's worker died
+            self._finish_failed(job_id, "Lease expired on the final attempt", retry=False)
+            return
+
+        handler = JOB_HANDLERS.get(job["kind"])
+        if handler is None:
+            self._finish_failed(job_id, f"No handler registered for job kind {job['kind']}", retry=False)
+            return
+
+        ctx = JobContext(
+            id=job_id,
+            kind=job["kind"],
+            school_id=str(job["school_id"]),
+            user_id=str(job["user_id"]) if job["user_id"] else None,
+            attempt=job["attempts"],
+            worker=self.name
+        )
+
+        db = SessionLocal()
+        try:
+            set_rls_context(db, user_id=ctx.user_id, school_id=ctx.school_id)
+            result = handler(ctx, db, job["payload"] or {})
+
+            # Completion commits atomically with the job's own writes
+            marked = db.execute(text(f"""
+                UPDATE background_jobs
+                SET status = 'succeeded', result = CAST(:result AS jsonb), error = NULL,
+                    progress_done = COALESCE(progress_total, progress_done),
+                    locked_by = NULL, locked_at = NULL,
+                    finished_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+                RETURNING id
+            """), {"result": json.dumps(result or {}, default=str), "id": job_id,
+                   "worker": self.name}).first()
+
+            if marked is None:
+                # Lease expired and another worker took the job over; drop our writes
+                db.rollback()
+                self.stats["lease_lost"] += 1
+                print(f"Job {ctx.kind} {job_id}: lease lost, discarding this attempt")
+                return
+
+            db.commit()
+            self.stats["succeeded"] += 1
+            print(f"Job {ctx.kind} {job_id} succeeded in {(time.perf_counter() - started):.2f}s")
+
+        except Exception as e:
+            db.rollback()
+            print(f"Job {ctx.kind} {job_id} attempt {ctx.attempt} failed: {e}")
+            traceback.print_exc()
+            self._finish_failed(job_id, str(e), retry=ctx.attempt < job["max_attempts"],
+                                attempt=ctx.attempt)
+        finally:
+            db.close()
+
+    def _finish_failed(self, job_id: str, error: str, retry: bool, attempt: int = 1):
+        with engine.begin() as conn:
+            if retry:
+                conn.execute(text(f"""
+                    UPDATE background_jobs
+                    SET status = 'queued', error = :error, locked_by = NULL, locked_at = NULL,
+                        run_after = {_UTC_NOW} + make_interval(secs => :delay),
+                        updated_at = {_UTC_NOW}
+                    WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+                """), {"error": error, "delay": self.retry_base_seconds * 2 ** (attempt - 1),
+                       "id": job_id, "worker": self.name})
+                self.stats["retried"] += 1
+            else:
+                conn.execute(text(f"""
+                    UPDATE background_jobs
+                    SET status = 'failed', error = :error, locked_by = NULL, locked_at = NULL,
+                        finished_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                    WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+                """), {"error": error, "id": job_id, "worker": self.name})
+                self.stats["failed"] += 1
+
+    def run_forever(self, stop: threading.Event):
+        """Drain the queue, then wait for a NOTIFY (or the poll interval) and repeat"""
+        listener = self._listen()
+        try:
+            while not stop.is_set():
+                try:
+                    if self.run_one():
+                        continue
+                except Exception as e:
+                    print(f"JobWorker {self.name}: claim failed: {e}")
+                    stop.wait(self.poll_seconds)
+                    continue
+                self._wait(listener, stop)
+        finally:
+            if listener is not None:
+                listener.close()
+
+    def _listen(self):
+        try:
+            import psycopg
+            conn = psycopg.connect(_listener_dsn(), autocommit=True)
+            conn.execute(f"LISTEN {self.channel}")
+            return conn
+        except Exception as e:
+            print(f"JobWorker {self.name}: LISTEN unavailable, polling every {self.poll_seconds}s ({e})")
+            return None
+
+    def _wait(self, listener, stop: threading.Event):
+        if listener is None:
+            stop.wait(self.poll_seconds)
+            return
+        try:
+            for _ in listener.notifies(timeout=self.poll_seconds, stop_after=1):
+                pass
+        except Exception:
+            stop.wait(self.poll_seconds)
+
+
+def new_job_worker(name: Optional[str] = None) -> JobWorker:
+    return JobWorker(
+        name=name,
+        poll_seconds=float(os.getenv("JOB_POLL_SECONDS", "2")),
+        lease_seconds=int(os.getenv("JOB_LEASE_SECONDS", "300")),
+        retry_base_seconds=int(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+    )
+
+
+# === EMBEDDED WORKERS ===
+
+class EmbeddedJobWorkers:
+    """Worker threads inside the API process, so a single-process deploy still runs jobs"""
+
+    def __init__(self, count: int, factory: Optional[Callable[[str], JobWorker]] = None, label: str = "job"):
+        self.count = count
+        self.factory = factory or new_job_worker
+        self.label = label
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._workers: List[JobWorker] = []
+
+    def start(self):
+        if self._threads or self.count <= 0:
+            return
+        load_job_handlers()
+        self._stop.clear()
+        for i in range(self.count):
+            worker = self.factory(f"{socket.gethostname()}:{os.getpid()}:api-{self.label}-{i}")
+            thread = threading.Thread(target=worker.run_forever, args=(self._stop,),
+                                      name=f"{self.label}-worker-{i}", daemon=True)
+            self._workers.append(worker)
+            self._threads.append(thread)
+            thread.start()
+        print(f"Started {self.count} embedded {self.label} worker(s)")
+
+    def stop(self):
+        self._stop.set()
+        self._threads.clear()
+        self._workers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        totals: Dict[str, int] = {}
+        for worker in self._workers:
+            for key, value in worker.stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return {**totals, "workers": len(self._workers)}
+
+
+_embedded_workers: Optional[EmbeddedJobWorkers] = None
+
+
+def get_embedded_job_workers() -> EmbeddedJobWorkers:
+    """The API process's embedded job workers (JOB_EMBEDDED_WORKERS, default 1)"""
+    global _embedded_workers
+    if _embedded_workers is None:
+        _embedded_workers = EmbeddedJobWorkers(int(os.getenv("JOB_EMBEDDED_WORKERS", "1")))
+    return _embedded_workers
@@ -0,0 +1,204 @@
+# app/services/llm_client.py
+"""Process-wide pooled client for the Ollama HTTP API.
+
+Every Ollama call in the worker goes through one LLMClient:
+- one keep-alive aiohttp session (connection pool) per event loop
+- a semaphore sized to the model server's parallelism (OLLAMA_NUM_PARALLEL)
+- a bounded wait queue; callers are rejected with LLMSaturatedError once it is full
+- identical requests already in flight are coalesced into a single HTTP call
+- per-model timeouts (OLLAMA_MODEL_TIMEOUTS="llama3.2:latest=60,qwen2.5:3b=20")
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import weakref
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+
+class LLMSaturatedError(Exception):
+    """Raised when the in-flight queue is full and the request was not sent"""
+
+
+def _parse_model_timeouts(raw: str) -> Dict[str, float]:
+    timeouts = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        model, seconds = item.rsplit("=", 1)
+        try:
+            timeouts[model.strip()] = float(seconds)
+        except ValueError:
+            print(f"LLMClient: Ignoring invalid timeout '{item}'")
+    return timeouts
+
+
+class _LoopState:
+    """Session, slots and in-flight map bound to one event loop"""
+
+    def __init__(self, max_parallel: int, connector_limit: int, keepalive_seconds: float):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=connector_limit, keepalive_timeout=keepalive_seconds)
+        )
+        self.slots = asyncio.Semaphore(max_parallel)
+        self.inflight: Dict[str, asyncio.Task] = {}
+        # Callers still awaiting each in-flight task
+        self.waiters: Dict[asyncio.Task, int] = {}
+        self.active = 0
+        self.waiting = 0
+
+
+class LLMClient:
+    """Shared, bounded, coalescing Ollama client"""
+
+    def __init__(self,
+                 base_url: Optional[str] = None,
+                 max_parallel: Optional[int] = None,
+                 max_queue: Optional[int] = None,
+                 default_timeout: float = 120,
+                 model_timeouts: Optional[Dict[str, float]] = None):
+        self.base_url = (base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")).rstrip("/")
+        self.max_parallel = max_parallel or int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("OLLAMA_MAX_QUEUE", "16"))
+        self.default_timeout = default_timeout
+        self.model_timeouts = model_timeouts if model_timeouts is not None else \
+            _parse_model_timeouts(os.getenv("OLLAMA_MODEL_TIMEOUTS", ""))
+        self.keepalive_seconds = float(os.getenv("OLLAMA_KEEPALIVE_SECONDS", "60"))
+
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self.stats = {"requests": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    # === STATE ===
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None or state.session.closed:
+            state = _LoopState(self.max_parallel, self.max_parallel * 2, self.keepalive_seconds)
+            self._states[loop] = state
+        return state
+
+    def _current_state(self) -> Optional[_LoopState]:
+        try:
+            return self._states.get(asyncio.get_running_loop())
+        except RuntimeError:
+            return None
+
+    def timeout_for(self, model: Optional[str], default: Optional[float] = None) -> float:
+        if model and model in self.model_timeouts:
+            return self.model_timeouts[model]
+        return default if default is not None else self.default_timeout
+
+    def is_saturated(self) -> bool:
+        """True when every slot is busy, so a new request would have to queue"""
+        state = self._current_state()
+        if state is None:
+            return False
+        return state.active >= self.max_parallel
+
+    def get_stats(self) -> Dict[str, Any]:
+        state = self._current_state()
+        return {
+            **self.stats,
+            "max_parallel": self.max_parallel,
+            "max_queue": self.max_queue,
+            "active": state.active if state else 0,
+            "waiting": state.waiting if state else 0,
+            "inflight_keys": len(state.inflight) if state else 0
+        }
+
+    # === REQUESTS ===
+
+    async def post_json(self, path: str, payload: Dict[str, Any],
+                        timeout: Optional[float] = None, coalesce: bool = True) -> Dict[str, Any]:
+        """POST a JSON payload and return the decoded response"""
+        state = self._state()
+        timeout = timeout if timeout is not None else self.timeout_for(payload.get("model"))
+
+        if not coalesce:
+            return await self._send(state, "POST", path, payload, timeout)
+
+        key = hashlib.sha1(f"{path}:{json.dumps(payload, sort_keys=True, default=str)}".encode()).hexdigest()
+        task = state.inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._send(state, "POST", path, payload, timeout))
+            state.inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: state.inflight.pop(k, None))
+
+        state.waiters[task] = state.waiters.get(task, 0) + 1
+        try:
+            # Shielded so one caller timing out does not cancel the request for the others
+            return await asyncio.shield(task)
+        finally:
+            remaining = state.waiters.get(task, 1) - 1
+            if remaining > 0:
+                state.waiters[task] = remaining
+            else:
+                state.waiters.pop(task, None)
+                if not task.done():
+                    # The last caller gave up: abort the request and free its slot
+                    task.cancel()
+
+    async def get_json(self, path: str, timeout: float = 10,
+                       payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GET a JSON endpoint (tags, show) through the shared pool"""
+        return await self._send(self._state(), "GET", path, payload, timeout)
+
+    async def _send(self, state: _LoopState, method: str, path: str,
+                    payload: Optional[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+        if state.active >= self.max_parallel and state.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise LLMSaturatedError(
+                f"Ollama queue full ({state.active} active, {state.waiting} waiting)"
+            )
+
+        state.waiting += 1
+        try:
+            await state.slots.acquire()
+        finally:
+            state.waiting -= 1
+
+        state.active += 1
+        self.stats["requests"] += 1
+        try:
+            async with state.session.request(
+                method,
+                f"{self.base_url}{path}",
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"Ollama API error {response.status}: {error_text}")
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            state.active -= 1
+            state.slots.release()
+
+    async def close(self):
+        """Close the session bound to the current loop"""
+        state = self._current_state()
+        if state and not state.session.closed:
+            await state.session.close()
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """The worker's shared LLM client"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
@@ -0,0 +1,163 @@
+# app/services/mpesa_parser.py
+"""Table-driven parser for the M-Pesa and bank SMS schools forward to us.
+
+Every known confirmation layout is one SmsTemplate: a family (paybill, till,
+bank) and format version, the literal words a message cannot match it
+without, and one precompiled regex whose named groups are the fields. A
+message is case-folded once; templates whose words are missing are skipped
+without running their regex, and the first template that matches yields all
+fields in that single search. Messages no template matches are still
+classified (mpesa_transaction, bank_notification, unknown) so callers can
+ignore them.
+
+A new layout is a new template, placed before any template it could be
+mistaken for, plus corpus lines in scripts/data/mpesa_sms_corpus.jsonl;
+scripts/bench_mpesa_parser.py checks accuracy and throughput over the corpus.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Pattern, Tuple
+
+_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Field fragments shared by the templates
+_REFERENCE = r"(?P<reference>[A-Z0-9]{8,12})"
+_AMOUNT = r"(?:ksh|kes)\.?\s*(?P<amount>\d[\d,]*(?:\.\d{1,2})?)"
+_PHONE = r"(?P<payer_phone>(?:\+?254|0)[\d*]{9})"
+# Payer followed by a fixed phrase, which ends the (lazy) name; the phone may be missing
+_PAYER = rf"(?P<payer_name>[A-Z][A-Z.'\- ]*?)(?:\s+{_PHONE})?"
+# Payer with nothing fixed after it: the phone ends the name
+_PAYER_WITH_PHONE = rf"(?P<payer_name>[A-Z][A-Z.'\- ]*?)\s+{_PHONE}"
+# "CIRCULARITY SPACE 8014934#1738" (business account # admission number) or a bare "1738"
+_ACCOUNT = r"(?:(?P<account_number>[^#\n]*?)\s*#\s*)?(?P<student_id>[A-Z0-9][A-Z0-9/\-]*)"
+_WHEN = r"(?:.*?\bon\s+(?P<date>\d{1,2}/\d{1,2}/\d{2,4})\s+at\s+(?P<time>\d{1,2}:\d{2}\s*[AP]M))?"
+
+# Words that mark an SMS as money-related at all; anything else skips the templates
+MONEY_WORDS = ("ksh", "kes", "m-pesa", "mpesa")
+BANK_WORDS = ("kcb", "equity", "co-op", "bank")
+KEYWORDS = ("sent", "received", "paid", "transaction", "balance", "deposit",
+            "withdrawal", "transfer", "charge", "fee", "completed")
+
+_GENERIC_AMOUNT = re.compile(r"k(?:sh|es)\.?\s*(\d[\d,]*(?:\.\d{1,2})?)", _FLAGS)
+_GENERIC_REFERENCE = re.compile(r"^\s*([A-Z0-9]{8,12})\s+(?:completed|confirmed)|\bref\.?:?\s+([A-Z0-9]{8,12})", _FLAGS)
+
+
+@dataclass(frozen=True)
+class SmsTemplate:
+    family: str                # paybill | till | bank
+    version: int
+    requires: Tuple[str, ...]  # case-folded words every match contains
+    pattern: Pattern
+
+    @property
+    def name(self) -> str:
+        return f"{self.family}_v{self.version}"
+
+
+def _template(family: str, version: int, requires: Tuple[str, ...], pattern: str) -> SmsTemplate:
+    return SmsTemplate(family, version, requires, re.compile(pattern, _FLAGS))
+
+
+# Tried in order; the first match wins
+TEMPLATES: Tuple[SmsTemplate, ...] = (
+    # "THQ42AWKZU completed. You have received KES 1 from ERIC MWIRICHIA 254722517627
+    #  for account CIRCULARITY SPACE 8014934#1738 on 12/3/25 at 9:02 AM"
+    _template("paybill", 2, ("completed", "received", "account"),
+              rf"\b{_REFERENCE}\s+completed\.?\s+you\s+have\s+received\s+{_AMOUNT}\s+from\s+{_PAYER}"
+              rf"\s+for\s+account(?:\s+(?:number|no)\b\.?)?\s*:?\s*{_ACCOUNT}{_WHEN}"),
+    # "RKT7ABC123 Confirmed. You have received Ksh5,000.00 from JANE WANJIKU 0712345678
+    #  for account 1738 on 12/3/24 at 9:02 AM"
+    _template("paybill", 1, ("confirmed", "from", "account"),
+              rf"\b{_REFERENCE}\s+confirmed\.?\s+(?:you\s+have\s+received\s+)?{_AMOUNT}\s+(?:received\s+)?"
+              rf"from\s+{_PAYER}\s+for\s+account(?:\s+(?:number|no)\b\.?)?\s*:?\s*{_ACCOUNT}{_WHEN}"),
+    # "THN4KIK5Y2 Confirmed. Ksh1,500.00 sent to KCB account CIRCULARITY SPACE 8014934#1738
+    #  on 12/3/24 at 9:02 AM" (the payer's copy of a payment into the school's bank account)
+    _template("bank", 1, ("sent to", "account"),
+              rf"(?:\b{_REFERENCE}\s+confirmed\.?\s+)?{_AMOUNT}\s+sent\s+to\s+(?P<bank>[A-Z][A-Z&.\- ]*?)"
+              rf"\s+account\s+{_ACCOUNT}{_WHEN}(?:.*?\bref\.?:?\s+(?P<ref>[A-Z0-9]{{8,12}}))?"),
+    # "Your account 11XXXX4521 has been credited with KES 2,000.00 via M-PESA. Ref RKT7ABC123
+    #  from JOHN DOE 254712345678. Account ref 8014934#1738" (the bank's alert for an M-Pesa deposit)
+    _template("bank", 2, ("credited", "pesa"),
+              rf"\bcredited\s+with\s+{_AMOUNT}{_WHEN}.*?\bm-?pesa\b.*?\bref\.?:?\s+{_REFERENCE}"
+              rf"(?:.*?\bfrom\s+{_PAYER_WITH_PHONE})?(?:.*?\b(?:account|acc|bill)\s+ref\.?:?\s*{_ACCOUNT})?"),
+    # "SFG3HJK456 Confirmed. Ksh450.00 received from PETER OTIENO 254733000111 on 7/2/25 at 3:15 PM"
+    _template("till", 1, ("confirmed", "from"),
+              rf"\b{_REFERENCE}\s+confirmed\.?\s+(?:you\s+have\s+received\s+)?{_AMOUNT}\s+(?:received\s+)?"
+              rf"from\s+{_PAYER}\s+on\s+(?P<date>\d{{1,2}}/\d{{1,2}}/\d{{2,4}})\s+at\s+(?P<time>\d{{1,2}}:\d{{2}}\s*[AP]M)"),
+)
+
+_OPTIONAL_FIELDS = ("payer_name", "payer_phone", "date", "time", "bank")
+
+
+def _amount(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_sms(message: str) -> Dict[str, Any]:
+    """
+    Structured fields of an SMS. message_type is 'mpesa_payment' when an
+    admission number (student_id) was found, otherwise 'mpesa_transaction',
+    'bank_notification' or 'unknown'; format names the template that matched.
+    """
+    folded = message.casefold()
+    info: Dict[str, Any] = {
+        "message_type": "unknown",
+        "format": None,
+        "amount": None,
+        "currency": None,
+        "reference": None,
+        "student_id": None,
+        "account_number": None,
+        "timestamp": None,
+        "sender": None,
+        "keywords": [keyword for keyword in KEYWORDS if keyword in folded]
+    }
+
+    if not any(word in folded for word in MONEY_WORDS):
+        if any(word in folded for word in BANK_WORDS):
+            info["message_type"] = "bank_notification"
+        return info
+
+    for template in TEMPLATES:
+        if not all(word in folded for word in template.requires):
+            continue
+        match = template.pattern.search(message)
+        if match is None:
+            continue
+
+        fields = match.groupdict()
+        info.update({
+            "message_type": "mpesa_payment" if fields.get("student_id") else "mpesa_transaction",
+            "format": template.name,
+            "amount": _amount(fields["amount"]),
+            "currency": "KES",
+            "reference": (fields.get("reference") or fields.get("ref") or "").upper() or None,
+            "student_id": fields.get("student_id"),
+            "account_number": (fields.get("account_number") or "").strip() or None,
+            "sender": "M-PESA"
+        })
+        for field in _OPTIONAL_FIELDS:
+            if fields.get(field):
+                info[field] = " ".join(fields[field].split())
+        return info
+
+    # Money traffic in no known layout (balances, airtime, transfers out, bank alerts)
+    if "pesa" in folded or not any(word in folded for word in BANK_WORDS):
+        info["message_type"] = "mpesa_transaction"
+        info["sender"] = "M-PESA"
+    else:
+        info["message_type"] = "bank_notification"
+    amount_match = _GENERIC_AMOUNT.search(message)
+    if amount_match:
+        info["amount"] = _amount(amount_match.group(1))
+        info["currency"] = "KES" if info["amount"] is not None else None
+    reference_match = _GENERIC_REFERENCE.search(message)
+    if reference_match:
+        info["reference"] = (reference_match.group(1) or reference_match.group(2)).upper()
+    return info
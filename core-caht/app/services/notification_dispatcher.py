@@ -0,0 +1,448 @@
+# app/services/notification_dispatcher.py
+"""Delivers the guardian emails and WhatsApp messages queued in the notification outbox.
+
+Payments (and anything else that notifies guardians) only insert QUEUED
+rows in their own transaction; see app/services/notifications.py.
+NotificationDispatcher claims them in batches (NOTIFY_BATCH_SIZE) with FOR
+UPDATE SKIP LOCKED on JobWorker's lease, wake-up and backoff machinery, so
+any number of dispatcher threads (embedded in the API) and processes
+(scripts/run_job_worker.py --queue notifications) share the outbox. A
+batch's delivery statuses are written together, one UPDATE per outcome.
+
+- Each dispatcher keeps one SMTP session open and sends consecutive emails
+  over it; a dropped session is reopened once per send, and a session idle
+  for SMTP_IDLE_SECONDS is closed. SMTP_USERNAME and SMTP_PASSWORD have
+  no defaults; a dispatcher handling email refuses to start without them.
+- WhatsApp goes through the process's shared per-school bridge clients
+  (get_whatsapp_client, keep-alive connections); a batch's messages for a
+  school are sent with one bridge call where the bridge supports it.
+- Token buckets cap the send rate per channel: NOTIFY_EMAIL_PER_MINUTE for
+  the SMTP relay and, per school (each school is its own bridge
+  instance/number), school_whatsapp_settings.messages_per_minute or
+  NOTIFY_WHATSAPP_PER_MINUTE. The buckets are per process. A message over
+  the limit is put back with a later run_after, not counted as an attempt.
+- Failures are retried with exponential backoff up to max_attempts; a
+  recipient the channel rejects outright fails at once. After a transport
+  failure the rest of the batch for that relay/bridge waits for the retry
+  instead of timing out one by one.
+"""
+
+import os
+import time
+import smtplib
+import threading
+from dataclasses import dataclass, field
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from app.core.db import engine
+from app.services.jobs import JobWorker, EmbeddedJobWorkers, _UTC_NOW
+from app.services.notifications import NOTIFICATION_CHANNEL, EMAIL, WHATSAPP, whatsapp_messages_per_minute
+from app.services.whatsapp_service import get_whatsapp_client
+
+_NOTIFICATION_COLUMNS = "id, school_id, type, kind, recipient, subject, body, attempts, max_attempts, run_after"
+
+# How long a school's bridge rate (school_whatsapp_settings.messages_per_minute) is cached
+RATE_REFRESH_SECONDS = 300
+
+
+class PermanentDeliveryError(Exception):
+    """The message can never be delivered as queued (no or rejected recipient); not retried"""
+
+
+class RateLimiter:
+    """Token buckets keyed by channel (and school), shared by a process's dispatchers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}
+
+    def acquire(self, key: Hashable, per_minute: int) -> float:
+        """
+        Take a token from the key's bucket. Returns 0.0 when taken, otherwise
+        the seconds until one is available. A bucket holds ten seconds' worth
+        of tokens, so an idle channel can burst that much.
+        """
+        if per_minute <= 0:
+            return 0.0
+        rate = per_minute / 60.0
+        capacity = max(1.0, rate * 10)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1.0 - tokens) / rate
+
+
+_rate_limiter = RateLimiter()
+
+
+class SmtpConnection:
+    """One authenticated SMTP session reused across emails"""
+
+    def __init__(self, server: str, port: int, username: Optional[str], password: Optional[str],
+                 from_email: str, timeout: int = 30, idle_seconds: int = 60, starttls: bool = True):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.from_email = from_email
+        self.timeout = timeout
+        self.idle_seconds = idle_seconds
+        self.starttls = starttls
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def send(self, to_email: str, subject: str, html_body: str):
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg.attach(MIMEText(html_body, 'html'))
+
+        try:
+            try:
+                self._connection().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The relay closed the kept-alive session; one fresh session per send
+                self.close()
+                self._connection().send_message(msg)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentDeliveryError(f"Recipient refused: {e.recipients}")
+        self._last_used = time.monotonic()
+
+    def _connection(self) -> smtplib.SMTP:
+        self.close_if_idle()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username and self.password:
+                    smtp.login(self.username, self.password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self._last_used = time.monotonic()
+        return self._smtp
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_seconds:
+            self.close()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+
+def smtp_connection_from_env() -> SmtpConnection:
+    """SMTP session for the configured relay (Brevo unless SMTP_SERVER is set); credentials are required"""
+    missing = [name for name in ("SMTP_USERNAME", "SMTP_PASSWORD") if not os.getenv(name)]
+    if missing:
+        raise RuntimeError(f"Email notifications need {' and '.join(missing)} set in the environment")
+    return SmtpConnection(
+        server=os.getenv("SMTP_SERVER", "smtp-relay.brevo.com"),
+        port=int(os.getenv("SMTP_PORT", "587")),
+        username=os.getenv("SMTP_USERNAME"),
+        password=os.getenv("SMTP_PASSWORD"),
+        from_email=os.getenv("SMTP_FROM_EMAIL", "no.reply@olaji.co"),
+        timeout=int(os.getenv("SMTP_TIMEOUT", "30")),
+        idle_seconds=int(os.getenv("SMTP_IDLE_SECONDS", "60")),
+        starttls=os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+    )
+
+
+@dataclass
+class DeliveryOutcomes:
+    """What happened to a claimed batch, recorded with one statement per outcome"""
+    sent: List[str] = field(default_factory=list)
+    retry: List[Tuple[str, float, str]] = field(default_factory=list)     # id, delay, error
+    deferred: List[Tuple[str, float]] = field(default_factory=list)       # id, delay
+    failed: List[Tuple[str, str]] = field(default_factory=list)           # id, error
+
+
+class NotificationDispatcher(JobWorker):
+    """Claims due outbox rows of its channels in batches and delivers them"""
+
+    channel = NOTIFICATION_CHANNEL
+
+    def __init__(self, name: Optional[str] = None, types: Sequence[str] = (EMAIL, WHATSAPP),
+                 poll_seconds: float = 2.0, lease_seconds: int = 120, retry_base_seconds: int = 30,
+                 email_per_minute: int = 60, whatsapp_per_minute: int = 20, batch_size: int = 10,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(name, poll_seconds, lease_seconds, retry_base_seconds)
+        self.types = list(types)
+        self.email_per_minute = email_per_minute
+        self.whatsapp_per_minute = whatsapp_per_minute
+        self.batch_size = batch_size
+        self.rate_limiter = rate_limiter or _rate_limiter
+        self.stats = {"claimed": 0, "sent": 0, "deferred": 0, "retried": 0, "failed": 0, "lease_lost": 0}
+
+        # Built up front so a dispatcher without SMTP credentials fails at start, not per email
+        self._smtp: Optional[SmtpConnection] = smtp_connection_from_env() if EMAIL in self.types else None
+        # school_id -> (messages per minute, monotonic time it was read)
+        self._whatsapp_rates: Dict[str, Tuple[int, float]] = {}
+
+    def claim(self):
+        """Lease up to batch_size due messages of this dispatcher's channels (expired leases first)"""
+        params = {"worker": self.name, "lease": self.lease_seconds, "types": self.types}
+        lease = f"""
+            UPDATE notification
+            SET status = 'SENDING', locked_by = :worker, locked_at = {_UTC_NOW},
+                attempts = attempts + 1, updated_at = {_UTC_NOW}
+            WHERE id IN ({{candidates}})
+            RETURNING {_NOTIFICATION_COLUMNS}
+        """
+        with engine.begin() as conn:
+            rows = conn.execute(text(lease.format(candidates=f"""
+                SELECT id FROM notification
+                WHERE status = 'SENDING' AND type = ANY(:types)
+                  AND locked_at < {_UTC_NOW} - make_interval(secs => :lease)
+                ORDER BY locked_at
+                FOR UPDATE SKIP LOCKED LIMIT :limit
+            """)), {**params, "limit": self.batch_size}).all()
+            if len(rows) < self.batch_size:
+                rows += conn.execute(text(lease.format(candidates=f"""
+                    SELECT id FROM notification
+                    WHERE status = 'QUEUED' AND type = ANY(:types) AND run_after <= {_UTC_NOW}
+                    ORDER BY run_after
+                    FOR UPDATE SKIP LOCKED LIMIT :limit
+                """)), {**params, "limit": self.batch_size - len(rows)}).all()
+        return sorted(rows, key=lambda row: row.run_after)
+
+    def run_one(self) -> bool:
+        """Deliver one claimed batch; False when nothing was due"""
+        rows = self.claim()
+        if not rows:
+            return False
+        self.stats["claimed"] += len(rows)
+
+        outcomes = DeliveryOutcomes()
+        # Rate buckets whose channel failed in this batch; their other rows wait for the retry
+        unavailable: Dict[Hashable, float] = {}
+        # school_id -> WhatsApp messages admitted by the rate limiter, sent together below
+        whatsapp: Dict[str, list] = {}
+        for row in rows:
+            message = row._mapping
+            if not self._admit(message, outcomes, unavailable):
+                continue
+            if message["type"] == WHATSAPP:
+                whatsapp.setdefault(message["school_id"], []).append(message)
+            else:
+                self._deliver(message, outcomes, unavailable)
+        for school_id, messages in whatsapp.items():
+            self._deliver_whatsapp(school_id, messages, outcomes)
+        self._record(outcomes)
+        return True
+
+    def _bucket(self, message) -> Tuple[Hashable, int]:
+        """Rate bucket of a message and its messages per minute"""
+        if message["type"] == EMAIL:
+            return (EMAIL,), self.email_per_minute
+        return (WHATSAPP, message["school_id"]), self._whatsapp_rate(message["school_id"])
+
+    def _admit(self, message, outcomes: DeliveryOutcomes, unavailable: Dict[Hashable, float]) -> bool:
+        """Whether a message may be sent now; otherwise it is failed or deferred in outcomes"""
+        message_id = str(message["id"])
+
+        if message["attempts"] > message["max_attempts"]:
+            # Reclaimed after its last attempt's dispatcher died
+            outcomes.failed.append((message_id, "Lease expired on the final attempt"))
+            return False
+        if not message["recipient"]:
+            outcomes.failed.append((message_id, "No recipient"))
+            return False
+
+        bucket, per_minute = self._bucket(message)
+        if bucket in unavailable:
+            outcomes.deferred.append((message_id, unavailable[bucket]))
+            return False
+        wait = self.rate_limiter.acquire(bucket, per_minute)
+        if wait > 0:
+            outcomes.deferred.append((message_id, wait))
+            return False
+        return True
+
+    def _deliver(self, message, outcomes: DeliveryOutcomes, unavailable: Dict[Hashable, float]):
+        message_id = str(message["id"])
+        try:
+            if message["type"] == EMAIL:
+                self._send_email(message)
+            else:
+                raise PermanentDeliveryError(f"No delivery channel for type {message['type']}")
+        except PermanentDeliveryError as e:
+            print(f"Notification {message_id} ({message['type']}): {e}")
+            outcomes.failed.append((message_id, str(e)))
+            return
+        except Exception as e:
+            print(f"Notification {message_id} ({message['type']}) attempt {message['attempts']} failed: {e}")
+            delay = self._retry_or_fail(message, str(e), outcomes)
+            if delay is not None:
+                unavailable[self._bucket(message)[0]] = delay
+            return
+
+        outcomes.sent.append(message_id)
+
+    def _deliver_whatsapp(self, school_id: str, messages: list, outcomes: DeliveryOutcomes):
+        """Send a school's admitted WhatsApp messages in one go (the bridge's batch endpoint)"""
+        service = get_whatsapp_client(school_id)
+        sendable = []
+        for message in messages:
+            if service.clean_phone_number(message["recipient"]):
+                sendable.append(message)
+            else:
+                print(f"Notification {message['id']} (WHATSAPP): Invalid phone number: {message['recipient']}")
+                outcomes.failed.append((str(message["id"]), f"Invalid phone number: {message['recipient']}"))
+
+        results = service.send_whatsapp_messages([(message["recipient"], message["body"]) for message in sendable])
+        for message, sent in zip(sendable, results):
+            if sent:
+                outcomes.sent.append(str(message["id"]))
+            else:
+                print(f"Notification {message['id']} (WHATSAPP) attempt {message['attempts']} failed")
+                self._retry_or_fail(message, "WhatsApp bridge did not accept the message", outcomes)
+
+    def _retry_or_fail(self, message, error: str, outcomes: DeliveryOutcomes) -> Optional[float]:
+        """Back off for another attempt, or fail on the last one; the retry delay, if any"""
+        message_id = str(message["id"])
+        if message["attempts"] < message["max_attempts"]:
+            delay = self.retry_base_seconds * 2 ** (message["attempts"] - 1)
+            outcomes.retry.append((message_id, delay, error))
+            return delay
+        outcomes.failed.append((message_id, error))
+        return None
+
+    def _send_email(self, message):
+        self._smtp.send(message["recipient"].strip(), message["subject"] or "", message["body"])
+
+    def _whatsapp_rate(self, school_id: str) -> int:
+        """The school's bridge rate, re-read every RATE_REFRESH_SECONDS"""
+        cached = self._whatsapp_rates.get(school_id)
+        if cached and time.monotonic() - cached[1] < RATE_REFRESH_SECONDS:
+            return cached[0]
+        try:
+            with engine.connect() as conn:
+                rate = whatsapp_messages_per_minute(conn, school_id)
+        except Exception as e:
+            print(f"Notification dispatcher: WhatsApp rate for school {school_id} unavailable: {e}")
+            rate = self.whatsapp_per_minute
+        self._whatsapp_rates[school_id] = (rate, time.monotonic())
+        return rate
+
+    def _record(self, outcomes: DeliveryOutcomes):
+        """Write a batch's delivery statuses in bulk; rows whose lease was lost are left alone"""
+        params = {"worker": self.name}
+        with engine.begin() as conn:
+            if outcomes.sent:
+                marked = conn.execute(text(f"""
+                    UPDATE notification
+                    SET status = 'SENT', error = NULL, locked_by = NULL, locked_at = NULL,
+                        sent_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                    WHERE id = ANY(:ids) AND locked_by = :worker
+                """), {**params, "ids": outcomes.sent}).rowcount
+                self.stats["sent"] += marked
+                if marked < len(outcomes.sent):
+                    # Leases expired mid-send; other dispatchers may send those again
+                    self.stats["lease_lost"] += len(outcomes.sent) - marked
+                    print(f"Notification dispatcher {self.name}: {len(outcomes.sent) - marked} lease(s) lost after sending")
+
+            if outcomes.retry or outcomes.deferred:
+                # Deferred rows were never attempted, so they get their attempt back
+                requeue = [(message_id, delay, error, 0) for message_id, delay, error in outcomes.retry] + \
+                          [(message_id, delay, None, 1) for message_id, delay in outcomes.deferred]
+                conn.execute(text(f"""
+                    UPDATE notification n
+                    SET status = 'QUEUED', attempts = n.attempts - u.refund,
+                        error = COALESCE(u.error, n.error), locked_by = NULL, locked_at = NULL,
+                        run_after = {_UTC_NOW} + make_interval(secs => u.delay),
+                        updated_at = {_UTC_NOW}
+                    FROM unnest(CAST(:ids AS text[]), CAST(:delays AS float8[]), CAST(:errors AS text[]),
+                                CAST(:refunds AS int[])) AS u(id, delay, error, refund)
+                    WHERE n.id = u.id AND n.locked_by = :worker
+                """), {**params,
+                       "ids": [entry[0] for entry in requeue],
+                       "delays": [float(entry[1]) for entry in requeue],
+                       "errors": [entry[2] for entry in requeue],
+                       "refunds": [entry[3] for entry in requeue]})
+                self.stats["retried"] += len(outcomes.retry)
+                self.stats["deferred"] += len(outcomes.deferred)
+
+            if outcomes.failed:
+                conn.execute(text(f"""
+                    UPDATE notification n
+                    SET status = 'FAILED', error = u.error, locked_by = NULL, locked_at = NULL,
+                        updated_at = {_UTC_NOW}
+                    FROM unnest(CAST(:ids AS text[]), CAST(:errors AS text[])) AS u(id, error)
+                    WHERE n.id = u.id AND n.locked_by = :worker
+                """), {**params,
+                       "ids": [message_id for message_id, _ in outcomes.failed],
+                       "errors": [error for _, error in outcomes.failed]})
+                self.stats["failed"] += len(outcomes.failed)
+
+    def _wait(self, listener, stop: threading.Event):
+        # The outbox is drained; don't hold an SMTP session the relay will time out anyway
+        if self._smtp is not None:
+            self._smtp.close_if_idle()
+        super()._wait(listener, stop)
+
+    def run_forever(self, stop: threading.Event):
+        try:
+            super().run_forever(stop)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            self._smtp.close()
+
+
+def new_notification_dispatcher(name: Optional[str] = None,
+                                types: Sequence[str] = (EMAIL, WHATSAPP)) -> NotificationDispatcher:
+    return NotificationDispatcher(
+        name=name,
+        types=types,
+        poll_seconds=float(os.getenv("NOTIFY_POLL_SECONDS", "2")),
+        lease_seconds=int(os.getenv("NOTIFY_LEASE_SECONDS", "120")),
+        retry_base_seconds=int(os.getenv("NOTIFY_RETRY_BASE_SECONDS", "30")),
+        email_per_minute=int(os.getenv("NOTIFY_EMAIL_PER_MINUTE", "60")),
+        whatsapp_per_minute=int(os.getenv("NOTIFY_WHATSAPP_PER_MINUTE", "20")),
+        batch_size=int(os.getenv("NOTIFY_BATCH_SIZE", "10"))
+    )
+
+
+_embedded_dispatchers: Optional[Tuple[EmbeddedJobWorkers, EmbeddedJobWorkers]] = None
+
+
+def get_embedded_notification_dispatchers() -> Tuple[EmbeddedJobWorkers, EmbeddedJobWorkers]:
+    """
+    The API process's embedded dispatchers: email (NOTIFY_EMAIL_EMBEDDED_WORKERS,
+    default 1) and WhatsApp (NOTIFY_WHATSAPP_EMBEDDED_WORKERS, default 2)
+    """
+    global _embedded_dispatchers
+    if _embedded_dispatchers is None:
+        _embedded_dispatchers = (
+            EmbeddedJobWorkers(
+                int(os.getenv("NOTIFY_EMAIL_EMBEDDED_WORKERS", "1")),
+                factory=lambda name: new_notification_dispatcher(name, (EMAIL,)),
+                label="notify-email"
+            ),
+            EmbeddedJobWorkers(
+                int(os.getenv("NOTIFY_WHATSAPP_EMBEDDED_WORKERS", "2")),
+                factory=lambda name: new_notification_dispatcher(name, (WHATSAPP,)),
+                label="notify-whatsapp"
+            )
+        )
+    return _embedded_dispatchers
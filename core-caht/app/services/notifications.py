@@ -1,6 +1,40 @@
+# app/services/notifications.py
+"""Guardian notifications, queued in the notification table (the outbox).
+
+Producers render the message and insert its row inside their own
+transaction, so a receipt exists exactly when the payment it describes
+commits; nothing here talks to SMTP or the WhatsApp bridge.
+NotificationDispatcher (app/services/notification_dispatcher.py) delivers
+the QUEUED EMAIL/WHATSAPP rows afterwards.
+
+- A dedupe key (e.g. the payment reference) makes re-queueing the same
+  message for a school and channel a no-op.
+- The pg_notify that wakes idle dispatchers is part of the producer's
+  transaction and only fires when it commits.
+"""
+
+import json
+import uuid
+import os
+from datetime import datetime
+from string import Template
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.models.notification import Notification
 
+NOTIFICATION_CHANNEL = "notifications"
+
+EMAIL = "EMAIL"
+WHATSAPP = "WHATSAPP"
+
+KIND_PAYMENT_RECEIPT = "payment_receipt"
+KIND_FEE_REMINDER = "fee_reminder"
+
+_UTC_NOW = "timezone('utc', now())"
+
+
 def queue_notification(
     db: Session,
     *,
@@ -26,4 +60,224 @@ def queue_notification(
 # For alpha: immediately mark IN_APP as SENT; EMAIL stays QUEUED (stub)
 def deliver_if_possible(db: Session, n: Notification) -> None:
     if n.type == "IN_APP":
-        n.status = "SENT"
\ No newline at end of file
+        n.status = "SENT"
+
+
+# === RENDERING ===
+
+def render_payment_email(payment_data: Dict[str, Any]) -> Tuple[str, str]:
+    """Subject and HTML body of the guardian's payment confirmation email"""
+    subject = f"Payment Confirmation - {payment_data['student_name']}"
+    remaining_balance = float(payment_data['remaining_balance'])
+    html_body = f"""
+            <html>
+            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                <div style="background: #f8f9fa; padding: 20px; border-radius: 8px;">
+                    <h2 style="color: #28a745; margin-bottom: 20px;">Payment Received</h2>
+
+                    <div style="background: white; padding: 20px; border-radius: 5px; margin-bottom: 20px;">
+                        <h3 style="color: #333; margin-top: 0;">Payment Details</h3>
+                        <p><strong>Student:</strong> {payment_data['student_name']} (#{payment_data['admission_no']})</p>
+                        <p><strong>Amount Paid:</strong> KES {float(payment_data['amount_paid']):,.2f}</p>
+                        <p><strong>Payment Method:</strong> {payment_data['method']}</p>
+                        <p><strong>Reference:</strong> {payment_data['reference']}</p>
+                        <p><strong>Date:</strong> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
+                    </div>
+
+                    <div style="background: white; padding: 20px; border-radius: 5px;">
+                        <h3 style="color: #333; margin-top: 0;">Account Summary</h3>
+                        <p><strong>Remaining Balance:</strong> KES {remaining_balance:,.2f}</p>
+                        {'<p style="color: #28a745;"><strong>Account Status:</strong> Fully Paid</p>' if remaining_balance == 0 else f'<p style="color: #ffc107;"><strong>Outstanding Amount:</strong> KES {remaining_balance:,.2f}</p>'}
+                    </div>
+
+                    <div style="margin-top: 20px; padding: 15px; background: #e3f2fd; border-radius: 5px;">
+                        <p style="margin: 0; font-size: 14px; color: #666;">
+                            Thank you for your payment. If you have any questions, please contact the school administration.
+                        </p>
+                    </div>
+                </div>
+            </body>
+            </html>
+            """
+    return subject, html_body
+
+
+def render_payment_whatsapp(payment_data: Dict[str, Any]) -> str:
+    """WhatsApp text of the guardian's payment confirmation"""
+    school_name = payment_data.get('school_name', 'School')
+    student_name = payment_data.get('student_name', 'Student')
+    admission_no = payment_data.get('admission_no', 'N/A')
+    amount_paid = payment_data.get('amount_paid', 0)
+    method = payment_data.get('method', 'Payment')
+    reference = payment_data.get('reference', 'N/A')
+    remaining_balance = payment_data.get('remaining_balance', 0)
+
+    message = f"*{school_name}* - Payment Received\n\n"
+    message += f"*Student:* {student_name} (#{admission_no})\n"
+    message += f"*Amount:* KES {float(amount_paid):,.2f}\n"
+    message += f"*Method:* {method}\n"
+
+    if reference and reference != 'N/A':
+        message += f"*Reference:* {reference}\n"
+
+    if remaining_balance and float(remaining_balance) > 0:
+        message += f"*Remaining Balance:* KES {float(remaining_balance):,.2f}\n"
+    else:
+        message += "*Status:* Fully Paid\n"
+
+    message += f"\nPayment recorded on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}\n"
+    message += "\nThank you for your payment!"
+    return message
+
+
+# Fee reminders are string.Template layouts so a broadcast fills the school's
+# parts in once and only substitutes the student fields per guardian
+FEE_REMINDER_WHATSAPP = (
+    "*$school_name* - Fee Reminder\n\n"
+    "*Student:* $student_name (#$admission_no)\n"
+    "*Outstanding Balance:* KES $outstanding_amount\n"
+    "\nPlease make payment as soon as possible.\n"
+    "Contact the school for payment methods.\n"
+    "\nThank you for your attention."
+)
+
+FEE_REMINDER_EMAIL_SUBJECT = "Fee Reminder - $student_name"
+
+FEE_REMINDER_EMAIL = """
+            <html>
+            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                <div style="background: #f8f9fa; padding: 20px; border-radius: 8px;">
+                    <h2 style="color: #ffc107; margin-bottom: 20px;">$school_name - Fee Reminder</h2>
+                    <div style="background: white; padding: 20px; border-radius: 5px;">
+                        $message_html
+                        <p><strong>Student:</strong> $student_name (#$admission_no)</p>
+                        <p><strong>Outstanding Balance:</strong> KES $outstanding_amount</p>
+                    </div>
+                    <div style="margin-top: 20px; padding: 15px; background: #e3f2fd; border-radius: 5px;">
+                        <p style="margin: 0; font-size: 14px; color: #666;">
+                            Please make payment as soon as possible. Contact the school for payment methods.
+                        </p>
+                    </div>
+                </div>
+            </body>
+            </html>
+            """
+
+
+def fee_reminder_fields(invoice_data: Dict[str, Any]) -> Dict[str, str]:
+    """Per-student placeholder values of the fee reminder templates"""
+    return {
+        "student_name": invoice_data.get('student_name') or 'Student',
+        "admission_no": invoice_data.get('admission_no') or 'N/A',
+        "outstanding_amount": f"{float(invoice_data.get('outstanding_amount') or 0):,.2f}"
+    }
+
+
+def render_fee_reminder_whatsapp(invoice_data: Dict[str, Any]) -> str:
+    """WhatsApp text reminding a guardian of an outstanding balance"""
+    return Template(FEE_REMINDER_WHATSAPP).safe_substitute(
+        school_name=invoice_data.get('school_name', 'School'), **fee_reminder_fields(invoice_data)
+    )
+
+
+def render_fee_reminder_email(invoice_data: Dict[str, Any]) -> Tuple[str, str]:
+    """Subject and HTML body of a fee reminder email"""
+    fields = fee_reminder_fields(invoice_data)
+    subject = Template(FEE_REMINDER_EMAIL_SUBJECT).safe_substitute(fields)
+    html_body = Template(FEE_REMINDER_EMAIL).safe_substitute(
+        school_name=invoice_data.get('school_name', 'School'), message_html="", **fields
+    )
+    return subject, html_body
+
+
+# === OUTBOX ===
+
+def queue_outbound_notification(
+    db: Session,
+    *,
+    school_id: str,
+    typ: str,
+    kind: str,
+    recipient: str,
+    body: str,
+    subject: Optional[str] = None,
+    payload: Optional[Dict[str, Any]] = None,
+    dedupe_key: Optional[str] = None,
+    broadcast_id: Optional[str] = None,
+    to_guardian_id: Optional[str] = None,
+    to_user_id: Optional[str] = None,
+    max_attempts: int = 5
+) -> bool:
+    """
+    Queue an EMAIL/WHATSAPP message in the caller's transaction. False when a
+    message with the same dedupe key is already queued or sent.
+    """
+    inserted = db.execute(text(f"""
+        INSERT INTO notification (id, school_id, type, kind, recipient, subject, body, payload,
+                                  to_guardian_id, to_user_id, status, dedupe_key, broadcast_id,
+                                  attempts, max_attempts, run_after, created_at, updated_at)
+        VALUES (:id, :school_id, :type, :kind, :recipient, :subject, :body, CAST(:payload AS jsonb),
+                :to_guardian_id, :to_user_id, 'QUEUED', :dedupe_key, :broadcast_id,
+                0, :max_attempts, {_UTC_NOW}, {_UTC_NOW}, {_UTC_NOW})
+        ON CONFLICT (school_id, type, dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+        RETURNING id
+    """), {
+        "id": str(uuid.uuid4()),
+        "school_id": str(school_id),
+        "type": typ,
+        "kind": kind,
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "payload": json.dumps(payload, default=str) if payload is not None else None,
+        "to_guardian_id": to_guardian_id,
+        "to_user_id": to_user_id,
+        "dedupe_key": dedupe_key and dedupe_key[:128],
+        "broadcast_id": broadcast_id,
+        "max_attempts": max_attempts
+    }).first()
+
+    if inserted is None:
+        return False
+    db.execute(text("SELECT pg_notify(:channel, :type)"), {"channel": NOTIFICATION_CHANNEL, "type": typ})
+    return True
+
+
+def queue_payment_notifications(db: Session, school_id: str, payment_data: Dict[str, Any]) -> Dict[str, bool]:
+    """Queue the guardian's email and WhatsApp receipts for a payment; which channels were queued"""
+    queued = {EMAIL: False, WHATSAPP: False}
+    dedupe_key = f"payment:{payment_data.get('reference')}:{payment_data.get('admission_no')}"
+    payload = {
+        "student_id": payment_data.get("student_id"),
+        "admission_no": payment_data.get("admission_no"),
+        "reference": payment_data.get("reference"),
+        "amount_paid": payment_data.get("amount_paid")
+    }
+
+    guardian_email = (payment_data.get("guardian_email") or "").strip()
+    if "@" in guardian_email:
+        subject, html_body = render_payment_email(payment_data)
+        queued[EMAIL] = queue_outbound_notification(
+            db, school_id=school_id, typ=EMAIL, kind=KIND_PAYMENT_RECEIPT,
+            recipient=guardian_email, subject=subject, body=html_body,
+            payload=payload, dedupe_key=dedupe_key
+        )
+
+    guardian_phone = (payment_data.get("guardian_phone") or "").strip()
+    if guardian_phone:
+        queued[WHATSAPP] = queue_outbound_notification(
+            db, school_id=school_id, typ=WHATSAPP, kind=KIND_PAYMENT_RECEIPT,
+            recipient=guardian_phone, body=render_payment_whatsapp(payment_data),
+            payload=payload, dedupe_key=dedupe_key
+        )
+
+    return queued
+
+
+def whatsapp_messages_per_minute(conn, school_id: str) -> int:
+    """Send rate of the school's bridge instance (school_whatsapp_settings), else NOTIFY_WHATSAPP_PER_MINUTE"""
+    rate = conn.execute(text("""
+        SELECT messages_per_minute FROM school_whatsapp_settings
+        WHERE school_id = CAST(:school_id AS uuid)
+    """), {"school_id": str(school_id)}).scalar()
+    return rate or int(os.getenv("NOTIFY_WHATSAPP_PER_MINUTE", "20"))
@@ -10,6 +10,9 @@ import asyncio
 import aiohttp
 import concurrent.futures
 
+from app.core.executor import get_blocking_executor
+from app.services.llm_client import get_llm_client, LLMSaturatedError
+
 
 class OllamaBaseService:
     """Base service for Ollama API communication and core functionality"""
@@ -19,57 +22,54 @@ class OllamaBaseService:
         self.model = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
         self.timeout = 120  # 2 minutes timeout for AI processing
     
-    # === SYNCHRONOUS WRAPPER METHODS ===
+    # === REQUEST-FACING METHODS ===
     
-    def generate_response_sync(self, prompt: str) -> Dict[str, Any]:
-        """Synchronous wrapper for async Ollama calls - used for fallback queries"""
+    async def generate_response(self, prompt: str) -> Dict[str, Any]:
+        """Generate a response without raising - used for fallback queries from async endpoints"""
         try:
-            # Try to get existing event loop
-            try:
-                loop = asyncio.get_running_loop()
-                print("Found running event loop, using executor")
-                
-                # Running loop exists, use thread executor to avoid blocking
-                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                    # Create a new event loop in the thread
-                    future = executor.submit(self._run_async_in_thread, prompt)
-                    result = future.result(timeout=self.timeout)
-                    return result
-                    
-            except RuntimeError:
-                # No running loop, create new one
-                print("No running event loop, creating new one")
-                return asyncio.run(self._call_ollama(prompt))
-                
-        except concurrent.futures.TimeoutError:
-            return {
-                "response": "I apologize, but the request took too long to process. Please try asking something else or rephrase your question.",
-                "success": False,
-                "error": "Request timeout"
-            }
+            return await self._call_ollama(prompt)
         except Exception as e:
-            print(f"Sync Ollama call error: {e}")
+            print(f"Ollama call error: {e}")
             return {
                 "response": "I encountered an error while processing your request. Could you try rephrasing your question?",
                 "success": False,
                 "error": str(e)
             }
     
-    def _run_async_in_thread(self, prompt: str) -> Dict[str, Any]:
-        """Helper to run async code in a separate thread with its own event loop"""
+    async def generate_with_system(self, system_prompt: str, user_prompt: str) -> str:
+        """Generate raw text for a system + user prompt pair - used by IntentClassifier"""
+        result = await self._call_ollama(user_prompt, system=system_prompt)
+        return result.get("response", "")
+    
+    def generate_response_sync(self, prompt: str) -> Dict[str, Any]:
+        """Blocking wrapper for callers without an event loop (scripts, executor threads)"""
         try:
-            return asyncio.run(self._call_ollama(prompt))
-        except Exception as e:
-            print(f"Async in thread error: {e}")
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._generate_on_private_loop(prompt))
+        
+        # Called on a running loop: run on the shared executor instead of a fresh pool per call
+        print("Found running event loop, prefer 'await generate_response()'")
+        future = get_blocking_executor().submit(asyncio.run, self._generate_on_private_loop(prompt))
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
             return {
-                "response": f"I encountered an error processing your request: {str(e)}",
+                "response": "I apologize, but the request took too long to process. Please try asking something else or rephrase your question.",
                 "success": False,
-                "error": str(e)
+                "error": "Request timeout"
             }
     
+    async def _generate_on_private_loop(self, prompt: str) -> Dict[str, Any]:
+        """generate_response for a short-lived loop; closes the pool session bound to it"""
+        try:
+            return await self.generate_response(prompt)
+        finally:
+            await get_llm_client().close()
+    
     # === CORE OLLAMA API COMMUNICATION ===
     
-    async def _call_ollama(self, prompt: str) -> Dict[str, Any]:
+    async def _call_ollama(self, prompt: str, system: Optional[str] = None) -> Dict[str, Any]:
         """Make async request to Ollama API with enhanced error handling"""
         try:
             payload = {
@@ -85,30 +85,27 @@ class OllamaBaseService:
                 }
             }
             
+            if system:
+                payload["system"] = system
+            
             print(f"Sending request to Ollama: {len(prompt)} characters")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout)
-                ) as response:
-                    
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"Ollama API error {response.status}: {error_text}")
-                        raise Exception(f"Ollama API error {response.status}: {error_text}")
-                    
-                    result = await response.json()
-                    response_length = len(result.get('response', ''))
-                    print(f"Ollama response received: {response_length} characters")
-                    
-                    # Validate response
-                    if not result.get('response'):
-                        raise Exception("Empty response from Ollama")
-                    
-                    return result
+            result = await get_llm_client().post_json(
+                "/api/generate",
+                payload,
+                timeout=get_llm_client().timeout_for(self.model, self.timeout)
+            )
+            response_length = len(result.get('response', ''))
+            print(f"Ollama response received: {response_length} characters")
+            
+            # Validate response
+            if not result.get('response'):
+                raise Exception("Empty response from Ollama")
+            
+            return result
                     
+        except LLMSaturatedError:
+            raise
         except asyncio.TimeoutError:
             raise Exception(f"Ollama request timed out after {self.timeout} seconds")
         except aiohttp.ClientError as e:
@@ -133,25 +130,16 @@ class OllamaBaseService:
             start_time = datetime.utcnow()
             
             # Check if service is available
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    
-                    if response.status == 200:
-                        health_status["service_available"] = True
-                        
-                        # Check if our model is available
-                        data = await response.json()
-                        models = [model.get("name", "") for model in data.get("models", [])]
-                        
-                        if self.model in models:
-                            health_status["model_loaded"] = True
-                        else:
-                            health_status["error"] = f"Model '{self.model}' not found. Available: {models}"
-                    else:
-                        health_status["error"] = f"Service returned status {response.status}"
+            data = await get_llm_client().get_json("/api/tags", timeout=10)
+            health_status["service_available"] = True
+            
+            # Check if our model is available
+            models = [model.get("name", "") for model in data.get("models", [])]
+            
+            if self.model in models:
+                health_status["model_loaded"] = True
+            else:
+                health_status["error"] = f"Model '{self.model}' not found. Available: {models}"
             
             # Calculate response time
             end_time = datetime.utcnow()
@@ -177,18 +165,7 @@ class OllamaBaseService:
     async def get_model_info(self) -> Dict[str, Any]:
         """Get information about the current model"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/api/show",
-                    json={"name": self.model},
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return {"error": f"Failed to get model info: {response.status}"}
-                        
+            return await get_llm_client().get_json("/api/show", timeout=30, payload={"name": self.model})
         except Exception as e:
             return {"error": str(e)}
     
@@ -0,0 +1,266 @@
+# app/services/pattern_index.py
+"""Compiled, scope-grouped pattern index shared by every ConfigRouter in a worker.
+
+Patterns are compiled once per active config version. Each positive pattern is
+reduced to the literal keywords it cannot match without; all keywords of a
+school scope are loaded into one Aho-Corasick automaton so a single pass over
+the message yields the handful of patterns that can possibly match. Only those
+candidates (plus patterns without a usable keyword) run their full regex.
+"""
+
+import re
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse
+    import sre_constants
+
+from app.models.intent_config import PatternKind
+
+
+# Keywords shorter than this match almost every message and are not worth indexing
+MIN_KEYWORD_LENGTH = 2
+
+GLOBAL_SCOPE = None
+
+
+def _normalize(text: str) -> str:
+    """Case-fold text so literal keywords compare the way re.IGNORECASE does"""
+    return text.casefold()
+
+
+def _required_literals(parsed) -> Optional[FrozenSet[str]]:
+    """
+    Return a set of literals, at least one of which occurs in every match of
+    the parsed regex, or None when no such set can be derived.
+    """
+    requirements: List[FrozenSet[str]] = []
+    run: List[str] = []
+
+    def flush():
+        if run:
+            requirements.append(frozenset(["".join(run)]))
+            run.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+        elif op is sre_constants.AT:
+            # Zero-width anchors (\b, ^, $) do not break a literal run
+            continue
+        elif op is sre_constants.SUBPATTERN:
+            flush()
+            sub = _required_literals(av[-1])
+            if sub:
+                requirements.append(sub)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            flush()
+            min_count, _max_count, sub_pattern = av
+            if min_count >= 1:
+                sub = _required_literals(sub_pattern)
+                if sub:
+                    requirements.append(sub)
+        elif op is sre_constants.BRANCH:
+            flush()
+            alternatives = [_required_literals(alt) for alt in av[1]]
+            if alternatives and all(alternatives):
+                requirements.append(frozenset().union(*alternatives))
+        else:
+            flush()
+    flush()
+
+    if not requirements:
+        return None
+
+    # Prefer the requirement whose weakest keyword is longest, then fewest keywords
+    return max(requirements, key=lambda req: (min(len(k) for k in req), -len(req)))
+
+
+def extract_keywords(raw_pattern: str) -> Optional[FrozenSet[str]]:
+    """Derive prefilter keywords for a regex; None means it must always be checked"""
+    try:
+        parsed = sre_parse.parse(raw_pattern, re.IGNORECASE)
+        literals = _required_literals(parsed)
+    except Exception:
+        return None
+
+    if not literals:
+        return None
+
+    keywords = frozenset(_normalize(literal) for literal in literals)
+    if min(len(keyword) for keyword in keywords) < MIN_KEYWORD_LENGTH:
+        return None
+    return keywords
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting which keywords occur in a text in one pass"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[str, ...]] = [()]
+
+        for keyword in keywords:
+            self._add(keyword)
+        self._build_failure_links()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if keyword not in self._output[state]:
+            self._output[state] = self._output[state] + (keyword,)
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def scan(self, text: str) -> set:
+        """Return the set of keywords found anywhere in text"""
+        found = set()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    @property
+    def state_count(self) -> int:
+        return len(self._goto)
+
+
+class ScopeGroup:
+    """Positive patterns of one school scope with their keyword prefilter"""
+
+    def __init__(self, patterns: List[Dict[str, Any]]):
+        self.patterns = patterns
+        self.always_check: List[int] = []
+        self.keyword_to_patterns: Dict[str, List[int]] = {}
+
+        for position, pattern in enumerate(patterns):
+            keywords = pattern.get("keywords")
+            if not keywords:
+                self.always_check.append(position)
+                continue
+            for keyword in keywords:
+                self.keyword_to_patterns.setdefault(keyword, []).append(position)
+
+        self.automaton = KeywordAutomaton(self.keyword_to_patterns.keys())
+
+    def candidates(self, normalized_text: str) -> List[Dict[str, Any]]:
+        """Patterns that may match text, in their original priority order"""
+        positions = set(self.always_check)
+        for keyword in self.automaton.scan(normalized_text):
+            positions.update(self.keyword_to_patterns[keyword])
+        return [self.patterns[position] for position in sorted(positions)]
+
+
+class PatternIndex:
+    """Immutable compiled view of one IntentConfigVersion's enabled patterns"""
+
+    def __init__(self, version_id: str, version_stamp: Any, patterns: List[Dict[str, Any]],
+                 compilation_errors: int = 0):
+        self.version_id = version_id
+        self.version_stamp = version_stamp
+        self.compilation_errors = compilation_errors
+        self.built_at = time.time()
+
+        self.by_kind: Dict[str, List[Dict[str, Any]]] = {
+            "positive": [],
+            "negative": [],
+            "synonyms": []
+        }
+        for pattern in patterns:
+            if pattern["kind"] == PatternKind.POSITIVE:
+                pattern["keywords"] = extract_keywords(pattern["raw_pattern"])
+                self.by_kind["positive"].append(pattern)
+            elif pattern["kind"] == PatternKind.NEGATIVE:
+                self.by_kind["negative"].append(pattern)
+            elif pattern["kind"] == PatternKind.SYNONYM:
+                self.by_kind["synonyms"].append(pattern)
+
+        # Positive patterns grouped by scope: global ones plus one group per school
+        positives_by_scope: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for pattern in self.by_kind["positive"]:
+            positives_by_scope.setdefault(pattern["scope_school_id"] or GLOBAL_SCOPE, []).append(pattern)
+        self.positive_groups: Dict[Optional[str], ScopeGroup] = {
+            scope: ScopeGroup(group) for scope, group in positives_by_scope.items()
+        }
+
+        # Negative patterns grouped by (scope, handler)
+        self.negative_groups: Dict[Tuple[Optional[str], str], List[Dict[str, Any]]] = {}
+        for pattern in self.by_kind["negative"]:
+            key = (pattern["scope_school_id"] or GLOBAL_SCOPE, pattern["handler"])
+            self.negative_groups.setdefault(key, []).append(pattern)
+
+        # Synonyms keep their global order; per-school views are memoized
+        self._synonyms_by_school: Dict[Optional[str], List[Dict[str, Any]]] = {}
+
+    def candidates_for(self, normalized_text: str, school_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Positive patterns in scope for school_id that may match the text"""
+        candidates = []
+        global_group = self.positive_groups.get(GLOBAL_SCOPE)
+        if global_group:
+            candidates.extend(global_group.candidates(normalized_text))
+        if school_id:
+            school_group = self.positive_groups.get(school_id)
+            if school_group:
+                candidates.extend(school_group.candidates(normalized_text))
+                candidates.sort(key=lambda p: p["order"])
+        return candidates
+
+    def negatives_for(self, handler: str, school_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Negative patterns for handler in scope for school_id"""
+        negatives = list(self.negative_groups.get((GLOBAL_SCOPE, handler), []))
+        if school_id:
+            negatives.extend(self.negative_groups.get((school_id, handler), []))
+        return negatives
+
+    def synonyms_for(self, school_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Synonyms in scope for school_id, in priority order"""
+        synonyms = self._synonyms_by_school.get(school_id)
+        if synonyms is None:
+            synonyms = [
+                s for s in self.by_kind["synonyms"]
+                if not s["scope_school_id"] or s["scope_school_id"] == school_id
+            ]
+            self._synonyms_by_school[school_id] = synonyms
+        return synonyms
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Index shape, for cache stats endpoints"""
+        return {
+            "scopes": len(self.positive_groups),
+            "keywords": sum(len(g.keyword_to_patterns) for g in self.positive_groups.values()),
+            "unindexed_patterns": sum(len(g.always_check) for g in self.positive_groups.values()),
+            "automaton_states": sum(g.automaton.state_count for g in self.positive_groups.values()),
+            "compilation_errors": self.compilation_errors,
+            "built_at": self.built_at
+        }
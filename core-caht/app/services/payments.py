@@ -3,6 +3,7 @@ from datetime import date
 
 from app.models.payment import Payment, Invoice
 from app.models.accounting import JournalEntry, JournalLine, GLAccount
+from app.services.balance_ledger import get_balance_ledger
 
 def _get_account(db: Session, school_id: str, code: str) -> str:
     acc = db.query(GLAccount).filter(GLAccount.school_id == school_id, GLAccount.code == code).first()
@@ -33,22 +34,11 @@ def post_payment(
         posted_at=posted_at or date.today(),
     )
     db.add(p)
+    db.flush()
 
-    # Update invoice status/total paid
-    # For alpha, compute paid so far
-    paid_sum = (
-        db.query(Payment)
-        .filter(Payment.school_id == school_id, Payment.invoice_id == inv.id)
-        .with_entities((Payment.amount))
-        .all()
-    )
-    already = sum(float(x[0]) for x in paid_sum) if paid_sum else 0.0
-    new_total_paid = already + float(amount)
-
-    if new_total_paid >= float(inv.total):
-        inv.status = "PAID"
-    else:
-        inv.status = "PARTIAL"
+    # Update invoice paid amount/status and the student's balance
+    get_balance_ledger(db, school_id).record_payment(inv.student_id, inv.id, amount)
+    db.expire(inv, ["amount_paid", "status"])
 
     # GL posting (minimal)
     # Cash/Bank (1000) DR, A/R (1100) CR
@@ -0,0 +1,170 @@
+# app/services/routing_telemetry.py
+"""Buffered, off-request writer for RoutingLog rows.
+
+IntentProcessor hands each routing decision to RoutingLogSink.record(), which
+only appends to an in-memory buffer. A background task flushes the buffer in
+one multi-row INSERT on its own session whenever it reaches the batch size or
+the flush interval elapses. If that INSERT fails the batch is retried row by
+row, so one bad row does not take the rest with it. When the buffer is full
+new rows are dropped and counted rather than blocking the chat request.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.db import SessionLocal
+from app.core.executor import run_blocking
+from app.models.intent_config import RoutingLog
+
+
+class RoutingLogSink:
+    """In-memory buffer of routing_logs rows with a periodic bulk flusher"""
+
+    def __init__(self,
+                 batch_size: int = 200,
+                 flush_interval: float = 2.0,
+                 max_buffer: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "recorded": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_flush_ms": None
+        }
+
+    # === PRODUCER SIDE ===
+
+    def record(self, row: Dict[str, Any]) -> bool:
+        """Queue one routing_logs row; returns False if it was dropped"""
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.stats["dropped"] += 1
+                return False
+            self._buffer.append(row)
+            self.stats["recorded"] += 1
+            buffered = len(self._buffer)
+
+        if buffered >= self.batch_size:
+            self._request_flush()
+        return True
+
+    def _request_flush(self):
+        if self._loop is not None and self._wakeup is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        elif self._task is None:
+            # No background flusher (scripts, benchmarks) - flush inline
+            self.flush()
+
+    # === CONSUMER SIDE ===
+
+    def flush(self) -> int:
+        """Write everything buffered in one multi-row INSERT; blocking"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+
+            started = time.time()
+            db = SessionLocal()
+            try:
+                db.execute(insert(RoutingLog.__table__), rows)
+                db.commit()
+                self.stats["flushed"] += len(rows)
+                self.stats["batches"] += 1
+                self.stats["last_flush_ms"] = int((time.time() - started) * 1000)
+                return len(rows)
+            except Exception as e:
+                db.rollback()
+                print(f"RoutingLogSink: Batch of {len(rows)} routing logs failed ({e}), retrying row by row")
+                return self._flush_rows(db, rows)
+            finally:
+                db.close()
+
+    def _flush_rows(self, db, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows one at a time so a bad row only loses itself"""
+        written = 0
+        for row in rows:
+            try:
+                db.execute(insert(RoutingLog.__table__), row)
+                db.commit()
+                written += 1
+            except Exception as e:
+                db.rollback()
+                self.stats["failed"] += 1
+                print(f"RoutingLogSink: Dropped routing log {row.get('id')}: {e}")
+        self.stats["flushed"] += written
+        return written
+
+    async def start(self):
+        """Start the background flusher on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is left"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_blocking(self.flush)
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await run_blocking(self.flush)
+            except Exception as e:
+                print(f"RoutingLogSink: Flush loop error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            **self.stats,
+            "buffered": buffered,
+            "max_buffer": self.max_buffer,
+            "batch_size": self.batch_size,
+            "flusher_running": self._task is not None and not self._task.done()
+        }
+
+
+_routing_log_sink: Optional[RoutingLogSink] = None
+
+
+def get_routing_log_sink() -> RoutingLogSink:
+    """The worker's shared routing telemetry sink"""
+    global _routing_log_sink
+    if _routing_log_sink is None:
+        _routing_log_sink = RoutingLogSink(
+            batch_size=int(os.getenv("ROUTING_LOG_BATCH_SIZE", "200")),
+            flush_interval=float(os.getenv("ROUTING_LOG_FLUSH_SECONDS", "2")),
+            max_buffer=int(os.getenv("ROUTING_LOG_MAX_BUFFER", "10000"))
+        )
+    return _routing_log_sink
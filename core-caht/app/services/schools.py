@@ -1,10 +1,8 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 from app.models.school import School
-from app.models.student import Student
-from app.models.class_model import Class
-from app.models.payment import Payment, Invoice
+from app.services.dashboard_snapshot import get_dashboard_snapshot
 
 
 def get_school_name(db: Session, school_id: str) -> str | None:
@@ -19,34 +17,16 @@ def get_school_name(db: Session, school_id: str) -> str | None:
 
 def get_school_overview(db: Session, school_id: str) -> dict:
     """
-    Return key stats for dashboards/chat answers:
+    Return key stats for dashboards/chat answers (from the cached dashboard snapshot):
       - students: count of students
       - classes: count of classes
       - feesCollected: sum of all payments (int)
       - pendingInvoices: count of invoices with status ISSUED/PARTIAL
     """
-    students = db.execute(
-        select(func.count()).select_from(Student).where(Student.school_id == school_id)
-    ).scalar_one() or 0
-
-    classes = db.execute(
-        select(func.count()).select_from(Class).where(Class.school_id == school_id)
-    ).scalar_one() or 0
-
-    fees_collected = db.execute(
-        select(func.coalesce(func.sum(Payment.amount), 0)).where(Payment.school_id == school_id)
-    ).scalar_one() or 0
-
-    pending_invoices = db.execute(
-        select(func.count()).select_from(Invoice).where(
-            Invoice.school_id == school_id,
-            Invoice.status.in_(["ISSUED", "PARTIAL"])
-        )
-    ).scalar_one() or 0
-
+    snapshot = get_dashboard_snapshot(db, school_id)
     return {
-        "students": int(students),
-        "classes": int(classes),
-        "feesCollected": int(fees_collected),
-        "pendingInvoices": int(pending_invoices),
-    }
\ No newline at end of file
+        "students": int(snapshot["students_total"] or 0),
+        "classes": int(snapshot["classes_total"] or 0),
+        "feesCollected": int(snapshot["total_payments"] or 0),
+        "pendingInvoices": int(snapshot["open_invoices"] or 0),
+    }
@@ -0,0 +1,387 @@
+# app/services/sms_inbox.py
+"""Durable inbox for SMS forwarded by the Android webhook.
+
+The webhook only verifies the forwarder's signature, appends the raw SMS to
+the sms_inbox table and acknowledges; parsing, payment posting and guardian
+notifications happen in SmsInboxWorker, off the request. A burst of M-Pesa
+confirmations on a fee deadline therefore no longer times the forwarder out
+into retries.
+
+- A forwarder retry of the same SMS hits the (school, body hash) unique
+  index and is acknowledged with the row already stored.
+- Each school's messages are posted strictly in arrival order: a worker only
+  claims the oldest open message of a school, so different schools proceed
+  in parallel while one school's payments never overtake each other.
+- A transaction reference is posted once per school. A reference already
+  posted from the inbox (or already on a payment) marks the message
+  'duplicate'; the processed mark commits together with the payment.
+- Errors are retried with exponential backoff. A message that cannot be
+  posted (unknown student, no invoice) or exhausts its attempts is
+  dead-lettered with the error and can be replayed once fixed.
+"""
+
+import os
+import json
+import hashlib
+import traceback
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.db import SessionLocal, engine, set_rls_context
+from app.services.jobs import JobWorker, EmbeddedJobWorkers, _UTC_NOW
+
+SMS_PENDING = "pending"
+SMS_PROCESSING = "processing"
+SMS_PROCESSED = "processed"
+SMS_DUPLICATE = "duplicate"
+SMS_IGNORED = "ignored"
+SMS_DEAD = "dead"
+
+SMS_STATUSES = (SMS_PENDING, SMS_PROCESSING, SMS_PROCESSED, SMS_DUPLICATE, SMS_IGNORED, SMS_DEAD)
+
+SMS_INBOX_CHANNEL = "sms_inbox"
+
+_INBOX_COLUMNS = """id, seq, school_id, user_id, source, body, status, message_type, reference,
+    parsed, result, error, attempts, max_attempts, run_after, processed_at, received_at, updated_at"""
+
+
+def body_hash(message: str) -> str:
+    return hashlib.sha256(message.strip().encode("utf-8")).hexdigest()
+
+
+def inbox_message_to_dict(row) -> Dict[str, Any]:
+    message = dict(row._mapping)
+    return {
+        "id": str(message["id"]),
+        "seq": message["seq"],
+        "source": message["source"],
+        "body": message["body"],
+        "status": message["status"],
+        "message_type": message["message_type"],
+        "reference": message["reference"],
+        "parsed": message["parsed"],
+        "result": message["result"],
+        "error": message["error"],
+        "attempts": message["attempts"],
+        "max_attempts": message["max_attempts"],
+        "received_at": message["received_at"].isoformat() if message["received_at"] else None,
+        "processed_at": message["processed_at"].isoformat() if message["processed_at"] else None
+    }
+
+
+# === PRODUCER SIDE ===
+
+def append_sms(school_id: str, user_id: Optional[str], source: str, message: str,
+               max_attempts: int = 5) -> Dict[str, Any]:
+    """
+    Store a verified SMS in its own committed transaction and wake the inbox
+    workers. A message already in the inbox is returned with duplicate=True.
+    """
+    params = {
+        "school_id": str(school_id),
+        "user_id": str(user_id) if user_id else None,
+        "source": source[:64],
+        "body": message,
+        "body_hash": body_hash(message),
+        "max_attempts": max_attempts
+    }
+    with engine.begin() as conn:
+        row = conn.execute(text(f"""
+            INSERT INTO sms_inbox (id, school_id, user_id, source, body, body_hash, status,
+                                   attempts, max_attempts, run_after, received_at, updated_at)
+            VALUES (gen_random_uuid(), :school_id, :user_id, :source, :body, :body_hash, 'pending',
+                    0, :max_attempts, {_UTC_NOW}, {_UTC_NOW}, {_UTC_NOW})
+            ON CONFLICT (school_id, body_hash) DO NOTHING
+            RETURNING id, status
+        """), params).first()
+
+        duplicate = row is None
+        if duplicate:
+            row = conn.execute(text("""
+                SELECT id, status FROM sms_inbox WHERE school_id = :school_id AND body_hash = :body_hash
+            """), params).first()
+        else:
+            conn.execute(text("SELECT pg_notify(:channel, :school_id)"),
+                         {"channel": SMS_INBOX_CHANNEL, "school_id": params["school_id"]})
+
+    return {"id": str(row.id), "status": row.status, "duplicate": duplicate}
+
+
+def list_inbox(school_id: str, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """The school's most recent inbox messages, optionally of one status"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT {_INBOX_COLUMNS} FROM sms_inbox
+            WHERE school_id = :school_id AND (CAST(:status AS varchar) IS NULL OR status = :status)
+            ORDER BY seq DESC
+            LIMIT :limit
+        """), {"school_id": str(school_id), "status": status, "limit": limit}).all()
+    return [inbox_message_to_dict(row) for row in rows]
+
+
+def inbox_stats(school_id: str) -> Dict[str, Any]:
+    """Message counts by status and the age of the oldest open message"""
+    with engine.connect() as conn:
+        counts = dict(conn.execute(text("""
+            SELECT status, COUNT(*) FROM sms_inbox WHERE school_id = :school_id GROUP BY status
+        """), {"school_id": str(school_id)}).all())
+        oldest = conn.execute(text(f"""
+            SELECT EXTRACT(EPOCH FROM {_UTC_NOW} - MIN(received_at)) FROM sms_inbox
+            WHERE school_id = :school_id AND status IN ('pending', 'processing')
+        """), {"school_id": str(school_id)}).scalar()
+    return {
+        **{status: counts.get(status, 0) for status in SMS_STATUSES},
+        "oldest_open_seconds": round(float(oldest), 1) if oldest is not None else None
+    }
+
+
+def replay_sms(school_id: str, ids: Optional[List[str]] = None) -> int:
+    """
+    Queue dead-lettered (or, by id, ignored) messages again with fresh
+    attempts; returns how many were requeued. Without ids every dead message
+    of the school is replayed. They keep their place in the school's order.
+    """
+    with engine.begin() as conn:
+        if ids:
+            result = conn.execute(text(f"""
+                UPDATE sms_inbox
+                SET status = 'pending', attempts = 0, error = NULL, locked_by = NULL, locked_at = NULL,
+                    run_after = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                WHERE school_id = :school_id AND id = ANY(CAST(:ids AS uuid[]))
+                  AND status IN ('dead', 'ignored')
+            """), {"school_id": str(school_id), "ids": [str(i) for i in ids]})
+        else:
+            result = conn.execute(text(f"""
+                UPDATE sms_inbox
+                SET status = 'pending', attempts = 0, error = NULL, locked_by = NULL, locked_at = NULL,
+                    run_after = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                WHERE school_id = :school_id AND status = 'dead'
+            """), {"school_id": str(school_id)})
+        if result.rowcount:
+            conn.execute(text("SELECT pg_notify(:channel, :school_id)"),
+                         {"channel": SMS_INBOX_CHANNEL, "school_id": str(school_id)})
+    return result.rowcount
+
+
+# === WORKER SIDE ===
+
+class SmsInboxWorker(JobWorker):
+    """Claims the head of a school's inbox queue and posts it; shares JobWorker's leases and wake-ups"""
+
+    channel = SMS_INBOX_CHANNEL
+
+    # Heads of the schools' queues considered per claim
+    claim_candidates = 8
+
+    def __init__(self, name: Optional[str] = None, poll_seconds: float = 2.0,
+                 lease_seconds: int = 120, retry_base_seconds: int = 10):
+        super().__init__(name, poll_seconds, lease_seconds, retry_base_seconds)
+        self.stats = {"claimed": 0, "processed": 0, "duplicate": 0, "ignored": 0,
+                      "retried": 0, "dead": 0, "lease_lost": 0}
+
+    def claim(self):
+        """
+        Lease the oldest open message of a school whose head is runnable
+        (pending and due, or processing with an expired lease). A school
+        whose head is leased or backing off waits; its later messages are
+        never claimed ahead of it.
+        """
+        params = {"worker": self.name, "lease": self.lease_seconds}
+        claimable = f"""(status = 'pending' AND run_after <= {_UTC_NOW})
+                         OR (status = 'processing' AND locked_at < {_UTC_NOW} - make_interval(secs => :lease))"""
+        with engine.begin() as conn:
+            candidates = conn.execute(text(f"""
+                SELECT id FROM (
+                    SELECT DISTINCT ON (school_id) id, status, run_after, locked_at
+                    FROM sms_inbox
+                    WHERE status IN ('pending', 'processing')
+                    ORDER BY school_id, seq
+                ) heads
+                WHERE {claimable}
+                ORDER BY run_after
+                LIMIT :limit
+            """), {**params, "limit": self.claim_candidates}).scalars().all()
+
+            for message_id in candidates:
+                # Another worker may have claimed the same head meanwhile
+                row = conn.execute(text(f"""
+                    UPDATE sms_inbox
+                    SET status = 'processing', locked_by = :worker, locked_at = {_UTC_NOW},
+                        attempts = attempts + 1, updated_at = {_UTC_NOW}
+                    WHERE id = (SELECT id FROM sms_inbox
+                                WHERE id = :id AND ({claimable})
+                                FOR UPDATE SKIP LOCKED)
+                    RETURNING {_INBOX_COLUMNS}, body_hash
+                """), {**params, "id": message_id}).first()
+                if row is not None:
+                    return row
+        return None
+
+    def _execute(self, row):
+        message = row._mapping
+        message_id = str(message["id"])
+
+        if message["attempts"] > message["max_attempts"]:
+            # Reclaimed after its last attempt's worker died
+            self._finish_failed(message_id, "Lease expired on the final attempt", retry=False)
+            return
+
+        school_id = str(message["school_id"])
+        user_id = str(message["user_id"]) if message["user_id"] else None
+
+        db = SessionLocal()
+        try:
+            set_rls_context(db, user_id=user_id, school_id=school_id)
+            self._post(db, message, message_id, school_id, user_id)
+        except Exception as e:
+            db.rollback()
+            print(f"SMS inbox {message_id} attempt {message['attempts']} failed: {e}")
+            traceback.print_exc()
+            self._finish_failed(message_id, str(e), retry=message["attempts"] < message["max_attempts"],
+                                attempt=message["attempts"])
+        finally:
+            db.close()
+
+    def _post(self, db, message, message_id: str, school_id: str, user_id: Optional[str]):
+        from app.services.mpesa_parser import parse_sms
+        from app.api.routers.chat.handlers.payment.handler import PaymentHandler
+
+        info = parse_sms(message["body"])
+        if info.get("message_type") != "mpesa_payment" or not info.get("student_id") or not info.get("amount"):
+            self._finish(message_id, SMS_IGNORED, info)
+            return
+
+        # Old-format confirmations may carry no code; the body identifies the payment instead
+        reference = info.get("reference") or f"SMS-{message['body_hash'][:16].upper()}"
+        info["reference"] = reference
+
+        already_posted = db.execute(text("""
+            SELECT 'inbox' FROM sms_inbox
+            WHERE school_id = :school_id AND reference = :reference AND status = 'processed'
+            UNION ALL
+            SELECT 'payment' FROM payments
+            WHERE school_id = :school_id AND txn_ref = :reference
+            LIMIT 1
+        """), {"school_id": school_id, "reference": reference}).scalar()
+        if already_posted:
+            db.rollback()
+            self._finish(message_id, SMS_DUPLICATE, info, result={"already_posted_by": already_posted})
+            return
+
+        # Marked first so the mark commits with the payment (PaymentService commits
+        # its own transaction); the processed-reference index rejects a double post
+        marked = db.execute(text(f"""
+            UPDATE sms_inbox
+            SET status = 'processed', message_type = :message_type, reference = :reference,
+                parsed = CAST(:parsed AS jsonb), error = NULL, locked_by = NULL, locked_at = NULL,
+                processed_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+            WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+            RETURNING id
+        """), {"message_type": info["message_type"], "reference": reference,
+               "parsed": json.dumps(info, default=str), "id": message_id, "worker": self.name}).first()
+        if marked is None:
+            db.rollback()
+            self.stats["lease_lost"] += 1
+            print(f"SMS inbox {message_id}: lease lost, discarding this attempt")
+            return
+
+        service = PaymentHandler(db, school_id, user_id).service
+        result = service.post_mpesa_payment(
+            amount=info["amount"],
+            admission_no=info["student_id"],
+            reference=reference,
+            phone=info.get("payer_phone")
+        )
+
+        if not result.success:
+            db.rollback()
+            if result.retryable:
+                raise RuntimeError(result.message)
+            self._finish_failed(message_id, result.message, retry=False, parsed=info)
+            return
+
+        notifications = result.notifications
+        payment = result.payment_data or {}
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                UPDATE sms_inbox SET result = CAST(:result AS jsonb), updated_at = {_UTC_NOW}
+                WHERE id = CAST(:id AS uuid)
+            """), {"id": message_id, "result": json.dumps({
+                "student_name": payment.get("student_name"),
+                "amount": info["amount"],
+                "remaining_balance": payment.get("remaining_balance"),
+                "email_queued": bool(notifications and notifications.email_queued),
+                "whatsapp_queued": bool(notifications and notifications.whatsapp_queued)
+            }, default=str)})
+        self.stats["processed"] += 1
+        print(f"SMS inbox {message_id}: posted {reference} KES {info['amount']} for #{info['student_id']}")
+
+    def _finish(self, message_id: str, status: str, info: Dict[str, Any],
+                result: Optional[Dict[str, Any]] = None):
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                UPDATE sms_inbox
+                SET status = :status, message_type = :message_type, reference = :reference,
+                    parsed = CAST(:parsed AS jsonb), result = CAST(:result AS jsonb), error = NULL,
+                    locked_by = NULL, locked_at = NULL,
+                    processed_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+            """), {"status": status, "message_type": info.get("message_type"),
+                   "reference": info.get("reference"), "parsed": json.dumps(info, default=str),
+                   "result": json.dumps(result) if result else None,
+                   "id": message_id, "worker": self.name})
+        self.stats[status] += 1
+
+    def _finish_failed(self, message_id: str, error: str, retry: bool, attempt: int = 1,
+                       parsed: Optional[Dict[str, Any]] = None):
+        with engine.begin() as conn:
+            if retry:
+                conn.execute(text(f"""
+                    UPDATE sms_inbox
+                    SET status = 'pending', error = :error, locked_by = NULL, locked_at = NULL,
+                        run_after = {_UTC_NOW} + make_interval(secs => :delay),
+                        updated_at = {_UTC_NOW}
+                    WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+                """), {"error": error, "delay": self.retry_base_seconds * 2 ** (attempt - 1),
+                       "id": message_id, "worker": self.name})
+                self.stats["retried"] += 1
+            else:
+                conn.execute(text(f"""
+                    UPDATE sms_inbox
+                    SET status = 'dead', error = :error, locked_by = NULL, locked_at = NULL,
+                        message_type = COALESCE(:message_type, message_type),
+                        reference = COALESCE(:reference, reference),
+                        parsed = COALESCE(CAST(:parsed AS jsonb), parsed),
+                        processed_at = {_UTC_NOW}, updated_at = {_UTC_NOW}
+                    WHERE id = CAST(:id AS uuid) AND locked_by = :worker
+                """), {"error": error, "id": message_id, "worker": self.name,
+                       "message_type": parsed and parsed.get("message_type"),
+                       "reference": parsed and parsed.get("reference"),
+                       "parsed": json.dumps(parsed, default=str) if parsed else None})
+                self.stats["dead"] += 1
+                print(f"SMS inbox {message_id}: dead-lettered ({error.splitlines()[0] if error else ''})")
+
+
+def new_sms_inbox_worker(name: Optional[str] = None) -> SmsInboxWorker:
+    return SmsInboxWorker(
+        name=name,
+        poll_seconds=float(os.getenv("SMS_INBOX_POLL_SECONDS", "2")),
+        lease_seconds=int(os.getenv("SMS_INBOX_LEASE_SECONDS", "120")),
+        retry_base_seconds=int(os.getenv("SMS_INBOX_RETRY_BASE_SECONDS", "10"))
+    )
+
+
+_embedded_workers: Optional[EmbeddedJobWorkers] = None
+
+
+def get_embedded_sms_inbox_workers() -> EmbeddedJobWorkers:
+    """The API process's embedded SMS inbox workers (SMS_INBOX_EMBEDDED_WORKERS, default 2)"""
+    global _embedded_workers
+    if _embedded_workers is None:
+        _embedded_workers = EmbeddedJobWorkers(
+            int(os.getenv("SMS_INBOX_EMBEDDED_WORKERS", "2")),
+            factory=new_sms_inbox_worker,
+            label="sms-inbox"
+        )
+    return _embedded_workers
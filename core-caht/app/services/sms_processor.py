@@ -5,7 +5,6 @@ from sqlalchemy import select
 from datetime import datetime, timezone, date
 from typing import Dict, Any, Optional
 import logging
-import re
 import uuid
 
 from app.models.user import User
@@ -13,10 +12,12 @@ from app.models.school import School
 from app.models.student import Student
 from app.models.guardian import Guardian
 from app.models.payment import Payment, Invoice
-from app.api.routers.chat.handlers.payment import PaymentHandler
+from app.api.routers.chat.handlers.payment.handler import PaymentHandler
+from app.services.mpesa_parser import parse_sms
 
 logger = logging.getLogger(__name__)
 
+
 class SMSProcessor:
     """Service for processing SMS messages from webhooks, especially M-Pesa payments."""
     
@@ -99,159 +100,8 @@ class SMSProcessor:
             raise
     
     def _extract_sms_info(self, message: str) -> Dict[str, Any]:
-        """
-        Extract structured information from SMS message.
-        Enhanced to handle both M-Pesa payment formats with student ID extraction.
-        """
-        info = {
-            "message_type": "unknown",
-            "amount": None,
-            "currency": None,
-            "reference": None,
-            "student_id": None,
-            "account_number": None,
-            "timestamp": None,
-            "sender": None,
-            "keywords": []
-        }
-        
-        # Convert to lowercase for pattern matching
-        msg_lower = message.lower()
-        
-        # Try NEW FORMAT first: "THQ42AWKZU completed. You have received KES 1 from ERIC MWIRICHIA 254722517627 for account CIRCULARITY SPACE 8014934#1738"
-        new_format_pattern = r'([A-Z0-9]+)\s+completed.*?you\s+have\s+received\s+kes\s*([\d,]+(?:\.\d{2})?)\s+from.*?for\s+account.*?#(\d+)'
-        new_format_match = re.search(new_format_pattern, message, re.IGNORECASE)
-        
-        if new_format_match:
-            info["message_type"] = "mpesa_payment"
-            info["sender"] = "M-PESA"
-            info["currency"] = "KES"
-            
-            # Extract reference (transaction ID at the beginning)
-            info["reference"] = new_format_match.group(1)
-            
-            # Extract amount
-            amount_str = new_format_match.group(2).replace(',', '')
-            try:
-                info["amount"] = float(amount_str)
-            except ValueError:
-                logger.warning(f"Could not parse amount: {amount_str}")
-            
-            # Extract student ID (number after #)
-            info["student_id"] = new_format_match.group(3)
-            
-            # Extract payer name and phone
-            payer_match = re.search(r'from\s+([A-Z\s]+)\s+(\d{12})', message, re.IGNORECASE)
-            if payer_match:
-                info["payer_name"] = payer_match.group(1).strip()
-                info["payer_phone"] = payer_match.group(2)
-            
-            # Extract account identifier before #
-            account_match = re.search(r'account\s+([^#]+)#', message, re.IGNORECASE)
-            if account_match:
-                info["account_number"] = account_match.group(1).strip()
-            
-            # Extract timestamp
-            time_match = re.search(r'(\d{2}/\d{2}/\d{4})\s+at\s+(\d{1,2}:\d{2}\s*[AP]M)', message, re.IGNORECASE)
-            if time_match:
-                info["date"] = time_match.group(1)
-                info["time"] = time_match.group(2)
-            
-            logger.info(f"Extracted M-Pesa payment (NEW FORMAT): Amount={info['amount']}, Student ID={info['student_id']}, Ref={info['reference']}, Payer={info.get('payer_name')}")
-        
-        # Try OLD FORMAT: "Ksh X.XX sent to KCB account CIRCULARITY SPACE XXXXX#STUDENT_ID"
-        if not info["student_id"]:  # Only try if new format didn't match
-            mpesa_payment_pattern = r'ksh\s*([\d,]+\.?\d*)\s+sent\s+to.*?#(\d+)'
-            mpesa_match = re.search(mpesa_payment_pattern, message, re.IGNORECASE)
-            
-            if mpesa_match:
-                info["message_type"] = "mpesa_payment"
-                info["sender"] = "M-PESA"
-                info["currency"] = "KES"
-                
-                # Extract amount
-                amount_str = mpesa_match.group(1).replace(',', '')
-                try:
-                    info["amount"] = float(amount_str)
-                except ValueError:
-                    logger.warning(f"Could not parse amount: {amount_str}")
-                
-                # Extract student ID (number after #)
-                info["student_id"] = mpesa_match.group(2)
-                
-                # Extract M-Pesa reference (e.g., "THN4KIK5Y2")
-                ref_match = re.search(r'ref\s+([A-Z0-9]{8,})', message, re.IGNORECASE)
-                if ref_match:
-                    info["reference"] = ref_match.group(1)
-                
-                # Extract account number/identifier before #
-                account_match = re.search(r'account\s+([^#]+)#', message, re.IGNORECASE)
-                if account_match:
-                    info["account_number"] = account_match.group(1).strip()
-                
-                # Extract timestamp
-                time_match = re.search(r'(\d{2}/\d{2}/\d{4})\s+at\s+(\d{1,2}:\d{2}\s*[AP]M)', message, re.IGNORECASE)
-                if time_match:
-                    info["date"] = time_match.group(1)
-                    info["time"] = time_match.group(2)
-                
-                logger.info(f"Extracted M-Pesa payment (OLD FORMAT): Amount={info['amount']}, Student ID={info['student_id']}, Ref={info['reference']}")
-        
-        # Fallback: Detect general M-PESA transactions (if no specific payment pattern matched)
-        if not info["student_id"] and ("m-pesa" in msg_lower or "mpesa" in msg_lower or "kes" in msg_lower):
-            info["message_type"] = "mpesa_transaction"
-            info["sender"] = "M-PESA"
-            
-            # Extract amount (e.g., "Ksh 20.00" or "KES 1")
-            amount_match = re.search(r'k(?:sh|es)\s*([\d,]+\.?\d*)', msg_lower)
-            if amount_match:
-                amount_str = amount_match.group(1).replace(',', '')
-                try:
-                    info["amount"] = float(amount_str)
-                    info["currency"] = "KES"
-                except ValueError:
-                    pass
-            
-            # Extract M-PESA reference (at start or with ref keyword)
-            ref_patterns = [
-                r'^([A-Z0-9]{8,})\s+completed',  # New format: starts with ref
-                r'ref\s+([A-Z0-9]{8,})'          # Old format: "ref XXXXX"
-            ]
-            
-            for pattern in ref_patterns:
-                ref_match = re.search(pattern, message, re.IGNORECASE)
-                if ref_match:
-                    info["reference"] = ref_match.group(1)
-                    break
-        
-        # Detect bank SMS (if not already identified as M-Pesa)
-        elif not info["message_type"] == "mpesa_payment" and any(bank in msg_lower for bank in ["kcb", "equity", "co-op", "bank"]):
-            info["message_type"] = "bank_notification"
-            
-            # Extract amount for bank transactions
-            amount_match = re.search(r'k(?:sh|es)\s*([\d,]+\.?\d*)', msg_lower)
-            if amount_match:
-                amount_str = amount_match.group(1).replace(',', '')
-                try:
-                    info["amount"] = float(amount_str)
-                    info["currency"] = "KES"
-                except ValueError:
-                    pass
-        
-        # Extract keywords
-        keywords = []
-        keyword_patterns = [
-            "sent", "received", "paid", "transaction", "balance", 
-            "deposit", "withdrawal", "transfer", "charge", "fee", "completed"
-        ]
-        
-        for keyword in keyword_patterns:
-            if keyword in msg_lower:
-                keywords.append(keyword)
-        
-        info["keywords"] = keywords
-        
-        return info
+        """Structured fields of the SMS (see app/services/mpesa_parser.py)"""
+        return parse_sms(message)
     
     async def _process_mpesa_payment(self, sms_info: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -278,42 +128,18 @@ class SMSProcessor:
                     "student_id": student_id
                 }
             
-            # Use PaymentHandler to process the payment
+            # Post through the payment service (ledger, receipts, guardian notifications)
             payment_handler = PaymentHandler(self.db, self.school_id, str(self.user_id))
-            
-            # Create payment context for SMS - this matches the expected format
-            payment_context = {
-                "mpesa_payment": {
-                    "amount": amount,
-                    "transaction_id": reference,
-                    "account_number": student_id,
-                    "phone_number": sms_info.get("payer_phone"),  # Available in new format
-                    "payer_name": sms_info.get("payer_name")      # Available in new format
-                }
-            }
-            
-            # Process the payment using the correct handle() method
-            # Format the message to match what the handler expects
-            payment_message = f"Record M-Pesa payment of {amount} for student {student_id}"
-            
-            payment_result = payment_handler.handle(
-                message=payment_message,
-                context=payment_context
+            payment_result = payment_handler.service.post_mpesa_payment(
+                amount=amount,
+                admission_no=student_id,
+                reference=reference,
+                phone=sms_info.get("payer_phone")
             )
             
-            # Check if the payment was successful
-            if payment_result.intent == "payment_recorded":
+            if payment_result.success:
                 logger.info(f"Successfully processed M-Pesa payment for student {student_id}: KES {amount}")
-                
-                # Extract payment data from the ChatResponse
-                payment_data = payment_result.data if hasattr(payment_result, 'data') else {}
-                
-                # Notifications are already handled by PaymentHandler
-                notification_result = {
-                    "email_sent": True,  # Handled by PaymentHandler
-                    "whatsapp_sent": True,  # Handled by PaymentHandler
-                    "sms_sent": False  # Not implemented
-                }
+                notifications = payment_result.notifications
                 
                 return {
                     "success": True,
@@ -321,20 +147,22 @@ class SMSProcessor:
                     "student_name": f"{student.first_name} {student.last_name}",
                     "amount": amount,
                     "reference": reference,
-                    "payment_data": payment_data,
-                    "message": payment_result.response,
-                    "notifications": notification_result
+                    "payment_data": payment_result.payment_data,
+                    "message": payment_result.message,
+                    "notifications": {
+                        "email_queued": bool(notifications and notifications.email_queued),
+                        "whatsapp_queued": bool(notifications and notifications.whatsapp_queued),
+                        "sms_sent": False  # Not implemented
+                    }
                 }
             else:
-                # Payment failed
-                error_message = payment_result.response if hasattr(payment_result, 'response') else "Unknown payment processing error"
-                logger.warning(f"Payment processing failed for student {student_id}: {error_message}")
+                logger.warning(f"Payment processing failed for student {student_id}: {payment_result.message}")
                 return {
                     "success": False,
                     "student_id": student_id,
                     "amount": amount,
                     "reference": reference,
-                    "error": error_message
+                    "error": payment_result.message
                 }
                 
         except Exception as e:
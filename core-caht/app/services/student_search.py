@@ -0,0 +1,280 @@
+# app/services/student_search.py
+"""
+Ranked, typo-tolerant student name search shared by every handler.
+
+Two backends answer StudentSearch.search():
+
+  postgres  students.search_name (lowercased "first last") has a pg_trgm GIN
+            index and students.name_tsv a tsvector GIN index, so substring
+            (LIKE), fuzzy (word similarity) and word-prefix (tsquery) matches
+            are all index scans, whatever the school's size.
+  memory    a per-school trigram index of names held in process, for servers
+            without pg_trgm and for tests. It is rebuilt when the school's
+            student count or latest update changes.
+
+STUDENT_SEARCH_BACKEND picks one (postgres | memory); by default postgres is
+used when pg_trgm and the search columns are installed. Both rank a match by
+word similarity plus bonuses for word-prefix and substring matches.
+"""
+
+import os
+import re
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Minimum word similarity for a fuzzy (non-substring, non-prefix) match
+SIMILARITY_THRESHOLD = float(os.getenv("STUDENT_SEARCH_SIMILARITY_THRESHOLD", "0.3"))
+PREFIX_BONUS = 1.0
+SUBSTRING_BONUS = 0.5
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+_BACKEND_SQL = text("""
+    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+       AND EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'students' AND column_name = 'search_name')
+""")
+
+_SET_THRESHOLD_SQL = text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)")
+
+_SEARCH_SQL = text("""
+    SELECT s.id, s.first_name, s.last_name, s.admission_no, s.status, s.class_id,
+           word_similarity(:query, s.search_name)
+           + CASE WHEN :prefix_query <> '' AND s.name_tsv @@ to_tsquery('simple', :prefix_query)
+                  THEN :prefix_bonus ELSE 0 END
+           + CASE WHEN s.search_name LIKE :contains THEN :substring_bonus ELSE 0 END AS score
+    FROM students s
+    WHERE s.school_id = :school_id
+      AND (CAST(:status AS text) IS NULL OR s.status = :status)
+      AND (s.search_name LIKE :contains
+           OR :query <% s.search_name
+           OR (:prefix_query <> '' AND s.name_tsv @@ to_tsquery('simple', :prefix_query)))
+    ORDER BY score DESC, s.first_name, s.last_name
+    LIMIT :limit
+""")
+
+_SCHOOL_NAMES_SQL = text("""
+    SELECT id, first_name, last_name, admission_no, status, class_id
+    FROM students
+    WHERE school_id = :school_id
+""")
+
+_SCHOOL_SIGNATURE_SQL = text("""
+    SELECT COUNT(*), MAX(updated_at) FROM students WHERE school_id = :school_id
+""")
+
+
+@dataclass
+class StudentMatch:
+    student_id: uuid.UUID
+    first_name: str
+    last_name: str
+    admission_no: str
+    status: str
+    class_id: Optional[uuid.UUID]
+    score: float
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}"
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase and collapse whitespace, as students.search_name stores names"""
+    return " ".join((name or "").lower().split())
+
+
+def _tokens(name: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_name(name))
+
+
+def _prefix_tsquery(name: str) -> str:
+    """'jo kam' -> 'jo:* & kam:*' (tokens are word characters only, so always valid)"""
+    return " & ".join(f"{token}:*" for token in _tokens(name))
+
+
+# === IN-MEMORY BACKEND ===
+
+def _trigrams(word: str) -> frozenset:
+    """pg_trgm's trigrams of one word (padded with two spaces before, one after)"""
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class _SchoolNameIndex:
+    """
+    One school's names with trigram postings. Students sharing a name are
+    scored once; a name's word similarity is the share of the query's
+    trigrams it contains (approximating pg_trgm word_similarity), counted
+    straight from the postings.
+    """
+
+    def __init__(self, rows, signature):
+        self.signature = signature
+        self.names: List[str] = []
+        self.words: List[List[str]] = []
+        self.students: List[List[StudentMatch]] = []
+        self.postings: Dict[str, List[int]] = {}
+        positions: Dict[str, int] = {}
+        for row in rows:
+            search_name = normalize_name(f"{row[1]} {row[2]}")
+            position = positions.get(search_name)
+            if position is None:
+                position = positions[search_name] = len(self.names)
+                self.names.append(search_name)
+                self.words.append(_tokens(search_name))
+                self.students.append([])
+                for gram in frozenset().union(*(_trigrams(word) for word in self.words[position])):
+                    self.postings.setdefault(gram, []).append(position)
+            self.students[position].append(StudentMatch(row[0], row[1], row[2], row[3], row[4], row[5], 0.0))
+
+    def search(self, name: str, limit: int, status: Optional[str]) -> List[StudentMatch]:
+        query = normalize_name(name)
+        query_words = _tokens(query)
+        if not query_words:
+            return []
+
+        query_grams = frozenset().union(*(_trigrams(word) for word in query_words))
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+
+        # A substring or word-prefix match lacks at most the query's padded edge
+        # trigrams (three per word); anything sharing fewer can only match fuzzily
+        min_fuzzy = SIMILARITY_THRESHOLD * len(query_grams)
+        min_partial = len(query_grams) - 3 * len(query_words)
+        candidates = shared.items() if min_partial > 0 else (
+            (position, shared.get(position, 0)) for position in range(len(self.names))
+        )
+
+        ranked = []
+        for position, count in candidates:
+            if count < min_fuzzy and count < min_partial:
+                continue
+            similarity = count / len(query_grams)
+            words = self.words[position]
+            prefix = all(any(word.startswith(q) for word in words) for q in query_words)
+            substring = query in self.names[position]
+            if similarity < SIMILARITY_THRESHOLD and not prefix and not substring:
+                continue
+            score = round(similarity + (PREFIX_BONUS if prefix else 0) + (SUBSTRING_BONUS if substring else 0), 4)
+            ranked.append((-score, self.names[position], position))
+
+        matches = []
+        for negative_score, _, position in sorted(ranked):
+            students = [student for student in self.students[position] if not status or student.status == status]
+            students.sort(key=lambda m: (m.first_name, m.last_name))
+            matches.extend(replace(student, score=-negative_score) for student in students[:limit - len(matches)])
+            if len(matches) >= limit:
+                break
+        return matches
+
+
+class StudentNameIndexCache:
+    """LRU of per-school in-memory name indexes"""
+
+    def __init__(self, max_schools: int = 200):
+        self.max_schools = max_schools
+        self._indexes: "OrderedDict[str, _SchoolNameIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "rebuilds": 0, "evictions": 0}
+
+    def get_index(self, db: Session, school_id: str) -> _SchoolNameIndex:
+        key = str(school_id)
+        signature = tuple(db.execute(_SCHOOL_SIGNATURE_SQL, {"school_id": school_id}).one())
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and index.signature == signature:
+                self._indexes.move_to_end(key)
+                self.stats["hits"] += 1
+                return index
+
+        index = _SchoolNameIndex(db.execute(_SCHOOL_NAMES_SQL, {"school_id": school_id}).all(), signature)
+        with self._lock:
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            self.stats["rebuilds"] += 1
+            while len(self._indexes) > self.max_schools:
+                self._indexes.popitem(last=False)
+                self.stats["evictions"] += 1
+        return index
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "schools": len(self._indexes), "max_schools": self.max_schools}
+
+
+_name_index_cache: Optional[StudentNameIndexCache] = None
+_backend: Optional[str] = None
+
+
+def get_student_name_index_cache() -> StudentNameIndexCache:
+    """The worker's shared in-memory name indexes"""
+    global _name_index_cache
+    if _name_index_cache is None:
+        _name_index_cache = StudentNameIndexCache(
+            max_schools=int(os.getenv("STUDENT_SEARCH_INDEX_SCHOOLS", "200"))
+        )
+    return _name_index_cache
+
+
+def get_search_backend(db: Session) -> str:
+    """postgres or memory; detected once per process unless STUDENT_SEARCH_BACKEND is set"""
+    global _backend
+    if _backend is None:
+        configured = os.getenv("STUDENT_SEARCH_BACKEND", "").lower()
+        if configured in ("postgres", "memory"):
+            _backend = configured
+        else:
+            _backend = "postgres" if db.execute(_BACKEND_SQL).scalar() else "memory"
+            print(f"Student search backend: {_backend}")
+    return _backend
+
+
+class StudentSearch:
+    """Name search over one school's students"""
+
+    def __init__(self, db: Session, school_id: str):
+        self.db = db
+        self.school_id = school_id
+
+    def search(self, name: str, limit: int = 10, status: Optional[str] = None) -> List[StudentMatch]:
+        """Students whose name matches, best first; status='ACTIVE' restricts to active students"""
+        if not normalize_name(name):
+            return []
+        if get_search_backend(self.db) == "memory":
+            index = get_student_name_index_cache().get_index(self.db, self.school_id)
+            return index.search(name, limit, status)
+
+        query = normalize_name(name)
+        self.db.execute(_SET_THRESHOLD_SQL, {"threshold": str(SIMILARITY_THRESHOLD)})
+        rows = self.db.execute(_SEARCH_SQL, {
+            "school_id": self.school_id,
+            "query": query,
+            "prefix_query": _prefix_tsquery(query),
+            "contains": "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",
+            "prefix_bonus": PREFIX_BONUS,
+            "substring_bonus": SUBSTRING_BONUS,
+            "status": status,
+            "limit": limit
+        }).all()
+        return [StudentMatch(row[0], row[1], row[2], row[3], row[4], row[5], float(row[6])) for row in rows]
+
+    def search_ids(self, name: str, limit: int = 10, status: Optional[str] = None) -> List[uuid.UUID]:
+        """Ranked ids only, for callers that join their own columns (see ranked_ids_sql)"""
+        return [uuid.UUID(str(match.student_id)) for match in self.search(name, limit, status)]
+
+
+# Join fragment for repos: FROM students s JOIN <this> ON m.id = s.id ... ORDER BY m.rank
+RANKED_IDS_JOIN = "unnest(CAST(:ranked_ids AS uuid[])) WITH ORDINALITY AS m(id, rank)"
+
+
+def get_student_search(db: Session, school_id: str) -> StudentSearch:
+    """Factory function to get student name search for a school"""
+    return StudentSearch(db, school_id)
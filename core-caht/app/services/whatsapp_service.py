@@ -1,22 +1,94 @@
 # app/services/whatsapp_service.py - Fixed QR code handling
+"""
+Client of the WhatsApp bridge (whatsapp-bridge/server.js), one instance per
+school (connection token school_<id>).
+
+get_whatsapp_client() hands out one long-lived WhatsAppService per school
+and process; all of them share a keep-alive requests.Session per bridge, so
+calls reuse pooled connections instead of opening one per request. Each
+client remembers bridge answers for a while:
+
+- registration checks per phone number, WHATSAPP_REGISTRATION_TTL_SECONDS
+  (default 6 hours);
+- instance health/status, WHATSAPP_STATUS_TTL_SECONDS (default 5), so
+  frontend status polling is served from memory;
+- the current QR code, WHATSAPP_QR_TTL_SECONDS (default 5). QR codes are
+  only ever read from the bridge and are no longer written to the database.
+
+init, logout and a bridge reporting the instance not ready drop the cached
+status and QR code. send_whatsapp_messages() uses the bridge's /send-batch
+when it has one and falls back to one /send per message.
+"""
 import requests
 import re
 import os
-import uuid
-from typing import Optional, Dict, Any
+import time
+import threading
+from typing import Optional, Dict, Any, Hashable, List, Sequence, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from requests.adapters import HTTPAdapter
+
+from app.services.notifications import render_payment_whatsapp, render_fee_reminder_whatsapp
+
+
+class _TTLCache:
+    """Small thread-safe map whose entries expire after ttl_seconds (0 disables it)"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if self.ttl_seconds <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+            if entry:
+                del self._entries[key]
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.ttl_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl_seconds, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Bridges (by URL) without /send-batch; messages to them go out one /send at a time
+_no_batch_bridges = set()
+
 
 class WhatsAppService:
     """WhatsApp notification service with multi-instance support and QR code management"""
     
-    def __init__(self, bridge_url: str = None, timeout: int = 30, api_key: str = None, connection_token: str = None, db_session: Session = None):
+    def __init__(self, bridge_url: str = None, timeout: int = 30, api_key: str = None, connection_token: str = None,
+                 http: Optional[requests.Session] = None):
         self.bridge_url = (bridge_url or os.getenv('WHATSAPP_BRIDGE_URL', 'http://localhost:3001')).rstrip('/')
         self.timeout = timeout
         self.api_key = api_key or os.getenv('WA_BRIDGE_API_KEY', 'dev-secret')
         self.connection_token = connection_token
-        self.db_session = db_session
+        # A shared requests.Session keeps bridge connections alive across calls
+        self.http = http or requests
+        
+        self._registered = _TTLCache(float(os.getenv('WHATSAPP_REGISTRATION_TTL_SECONDS', '21600')),
+                                     max_entries=int(os.getenv('WHATSAPP_REGISTRATION_CACHE_SIZE', '10000')))
+        self._status = _TTLCache(float(os.getenv('WHATSAPP_STATUS_TTL_SECONDS', '5')), max_entries=1)
+        self._qr = _TTLCache(float(os.getenv('WHATSAPP_QR_TTL_SECONDS', '5')), max_entries=1)
         
         print(f"WhatsApp service initialized:")
         print(f"  Bridge URL: {self.bridge_url}")
@@ -36,126 +108,19 @@ class WhatsAppService:
         
         return headers
     
-    def _extract_school_id(self) -> Optional[str]:
-        """Extract school ID from connection token"""
-        if not self.connection_token:
-            return None
-        
-        if self.connection_token.startswith('school_'):
-            school_id_str = self.connection_token.replace('school_', '')
-            
-            # Validate it's a proper UUID
-            try:
-                uuid.UUID(school_id_str)
-                return school_id_str
-            except ValueError:
-                print(f"Invalid UUID in connection token: {school_id_str}")
-                return None
-        
-        return None
-    
     @classmethod
-    def for_school(cls, school_id: str, db_session: Session = None, **kwargs) -> 'WhatsAppService':
+    def for_school(cls, school_id: str, **kwargs) -> 'WhatsAppService':
         """Create WhatsApp service instance for a specific school"""
         connection_token = f"school_{school_id}"
-        return cls(connection_token=connection_token, db_session=db_session, **kwargs)
-    
-    def _store_qr_code(self, qr_code: str) -> None:
-        """Store QR code in database for retrieval"""
-        if not self.db_session or not qr_code:
-            print("Cannot store QR code - no database session or QR code")
-            return
-        
-        school_id = self._extract_school_id()
-        if not school_id:
-            print("Cannot store QR code - invalid school ID")
-            return
-        
-        try:
-            print(f"Storing QR code for school {school_id} (length: {len(qr_code)})")
-            
-            # Use proper UUID casting
-            self.db_session.execute(
-                text("""
-                    INSERT INTO school_whatsapp_settings 
-                    (school_id, qr_code, qr_generated_at, created_at, updated_at, is_enabled, bridge_connected)
-                    VALUES (:school_id::uuid, :qr_code, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, true, false)
-                    ON CONFLICT (school_id) 
-                    DO UPDATE SET 
-                        qr_code = :qr_code,
-                        qr_generated_at = CURRENT_TIMESTAMP,
-                        updated_at = CURRENT_TIMESTAMP
-                """),
-                {"school_id": school_id, "qr_code": qr_code}
-            )
-            self.db_session.commit()
-            print(f"QR code stored successfully for school {school_id}")
-        except Exception as e:
-            print(f"Failed to store QR code: {e}")
-            self.db_session.rollback()
-    
-    def _get_stored_qr_code(self) -> Optional[str]:
-        """Get stored QR code from database"""
-        if not self.db_session:
-            print("No database session available")
-            return None
-        
-        school_id = self._extract_school_id()
-        if not school_id:
-            print("Cannot retrieve QR code - invalid school ID")
-            return None
-        
-        try:
-            result = self.db_session.execute(
-                text("""
-                    SELECT qr_code, qr_generated_at 
-                    FROM school_whatsapp_settings 
-                    WHERE school_id = :school_id::uuid
-                    AND qr_code IS NOT NULL
-                    AND qr_generated_at > CURRENT_TIMESTAMP - INTERVAL '10 minutes'
-                """),
-                {"school_id": school_id}
-            ).fetchone()
-            
-            if result and result[0]:
-                print(f"Retrieved stored QR code for school {school_id}")
-                return result[0]
-            
-            print(f"No valid stored QR code found for school {school_id}")
-            return None
-        except Exception as e:
-            print(f"Failed to retrieve stored QR code: {e}")
-            return None
+        return cls(connection_token=connection_token, **kwargs)
     
-    def _clear_qr_code(self) -> None:
-        """Clear stored QR code when connection is established"""
-        if not self.db_session:
-            return
-        
-        school_id = self._extract_school_id()
-        if not school_id:
-            return
-        
-        try:
-            self.db_session.execute(
-                text("""
-                    UPDATE school_whatsapp_settings 
-                    SET qr_code = NULL,
-                        qr_generated_at = NULL,
-                        updated_at = CURRENT_TIMESTAMP,
-                        bridge_connected = true
-                    WHERE school_id = :school_id::uuid
-                """),
-                {"school_id": school_id}
-            )
-            self.db_session.commit()
-            print(f"QR code cleared for school {school_id}")
-        except Exception as e:
-            print(f"Failed to clear QR code: {e}")
-            self.db_session.rollback()
+    def invalidate(self) -> None:
+        """Forget the cached status and QR code (the instance's state is changing)"""
+        self._status.clear()
+        self._qr.clear()
 
     def get_qr_code(self) -> Dict[str, Any]:
-        """Get QR code for WhatsApp authentication - always fetch fresh from bridge"""
+        """Get QR code for WhatsApp authentication - from the bridge, reused for WHATSAPP_QR_TTL_SECONDS"""
         try:
             if not self.connection_token:
                 return {
@@ -164,14 +129,18 @@ class WhatsAppService:
                     'message': 'No connection token provided'
                 }
             
+            cached = self._qr.get('qr')
+            if cached is not None:
+                return cached
+            
             print(f"=== QR CODE REQUEST ===")
             print(f"Bridge URL: {self.bridge_url}")
             print(f"Connection Token: {self.connection_token}")
             print(f"Headers: {self._get_headers()}")
             
-            # Always get fresh QR code from bridge (QR codes change frequently)
+            # QR codes change frequently; only a short-lived copy is kept
             print("Fetching QR code from bridge...")
-            response = requests.get(
+            response = self.http.get(
                 f"{self.bridge_url}/qr",
                 headers=self._get_headers(),
                 timeout=15
@@ -192,10 +161,7 @@ class WhatsAppService:
                     print(f"QR Code received (length: {len(qr_code)})")
                     print(f"QR Code starts with: {qr_code[:50]}...")
                     
-                    # Store QR code in database for tracking
-                    self._store_qr_code(qr_code)
-                    
-                    return {
+                    qr_result = {
                         'qr': qr_code,
                         'status': result.get('status', 'qr_ready'),
                         'message': result.get('message', 'QR code ready for scanning'),
@@ -203,12 +169,14 @@ class WhatsAppService:
                     }
                 else:
                     print(f"No QR code in response")
-                    return {
+                    qr_result = {
                         'qr': None,
                         'status': result.get('status', 'no_qr'),
                         'message': result.get('message', 'No QR code available'),
                         'raw_response': result
                     }
+                self._qr.put('qr', qr_result)
+                return qr_result
                 
             elif response.status_code == 404:
                 print("Instance not found (404)")
@@ -252,6 +220,15 @@ class WhatsAppService:
             }
 
     def check_bridge_health(self) -> Dict[str, Any]:
+        """Bridge health for this instance, re-checked at most every WHATSAPP_STATUS_TTL_SECONDS"""
+        cached = self._status.get('health')
+        if cached is not None:
+            return cached
+        health = self._check_bridge_health()
+        self._status.put('health', health)
+        return health
+
+    def _check_bridge_health(self) -> Dict[str, Any]:
         """Check WhatsApp bridge health for this instance with detailed logging"""
         try:
             print(f"=== BRIDGE HEALTH CHECK ===")
@@ -260,7 +237,7 @@ class WhatsAppService:
             
             # First check overall bridge health
             try:
-                health_response = requests.get(
+                health_response = self.http.get(
                     f"{self.bridge_url}/health", 
                     headers={'x-api-key': self.api_key},
                     timeout=10
@@ -281,7 +258,7 @@ class WhatsAppService:
             # Check instance-specific status if we have a token
             if self.connection_token:
                 try:
-                    status_response = requests.get(
+                    status_response = self.http.get(
                         f"{self.bridge_url}/status", 
                         headers=self._get_headers(),
                         timeout=10
@@ -293,9 +270,9 @@ class WhatsAppService:
                         status_data = status_response.json()
                         print(f"Instance status response: {status_data}")
                         
-                        # If instance is ready, clear any stored QR codes
+                        # Once connected, the last QR code is spent
                         if status_data.get('ready', False):
-                            self._clear_qr_code()
+                            self._qr.clear()
                         
                         return status_data
                     else:
@@ -331,7 +308,8 @@ class WhatsAppService:
             if not self.connection_token:
                 return {'success': False, 'error': 'No connection token provided'}
             
-            response = requests.post(
+            self.invalidate()
+            response = self.http.post(
                 f"{self.bridge_url}/init",
                 headers=self._get_headers(),
                 timeout=15
@@ -386,9 +364,13 @@ class WhatsAppService:
                 print("Invalid phone number format")
                 return False
             
+            cached = self._registered.get(cleaned_phone)
+            if cached is not None:
+                return cached
+            
             print(f"Verifying WhatsApp registration for: '{cleaned_phone}' with token: {self.connection_token}")
             
-            response = requests.get(
+            response = self.http.get(
                 f"{self.bridge_url}/number-id/{cleaned_phone}",
                 headers=self._get_headers(),
                 timeout=10
@@ -400,9 +382,12 @@ class WhatsAppService:
                 data = response.json()
                 is_registered = data.get('registered', False)
                 print(f"WhatsApp registration check result: {is_registered}")
+                # Only the bridge's definite answers are remembered, not the fallbacks below
+                self._registered.put(cleaned_phone, is_registered)
                 return is_registered
             elif response.status_code == 503:
                 print("WhatsApp bridge not ready - assuming registered")
+                self._status.clear()
                 return True
             elif response.status_code == 401:
                 print("Authentication failed - check API key")
@@ -431,7 +416,7 @@ class WhatsAppService:
             
             print(f"Attempting to send WhatsApp message to: '{cleaned_phone}' with token: {self.connection_token}")
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.bridge_url}/send",
                 headers=self._get_headers(),
                 json={
@@ -449,6 +434,8 @@ class WhatsAppService:
                 return result.get('success', False)
             else:
                 print(f"Send failed: {response.status_code} - {response.text}")
+                if response.status_code == 503:
+                    self._status.clear()
                 return False
                 
         except requests.Timeout:
@@ -458,6 +445,60 @@ class WhatsAppService:
             print(f"WhatsApp send failed: {e}")
             return False
 
+    def send_whatsapp_messages(self, messages: Sequence[Tuple[str, str]]) -> List[bool]:
+        """
+        Send (phone, message) pairs; whether each was sent, in order. Goes
+        through the bridge's /send-batch in chunks of WHATSAPP_SEND_BATCH_SIZE,
+        or one /send per message when the bridge has no batch endpoint.
+        """
+        results: List[bool] = []
+        chunk_size = max(int(os.getenv('WHATSAPP_SEND_BATCH_SIZE', '20')), 1)
+        for start in range(0, len(messages), chunk_size):
+            chunk = messages[start:start + chunk_size]
+            sent = None
+            if len(chunk) > 1 and self.bridge_url not in _no_batch_bridges:
+                sent = self._send_batch(chunk)
+            if sent is None:
+                sent = [self.send_whatsapp_message(phone, message) for phone, message in chunk]
+            results.extend(sent)
+        return results
+
+    def _send_batch(self, chunk: Sequence[Tuple[str, str]]) -> Optional[List[bool]]:
+        """One /send-batch call; None when the bridge has no such endpoint"""
+        numbers = [self.clean_phone_number(phone) for phone, _ in chunk]
+        batch = [{"number": number, "message": message}
+                 for number, (_, message) in zip(numbers, chunk) if number]
+        try:
+            print(f"Sending {len(batch)} WhatsApp messages in one batch with token: {self.connection_token}")
+            response = self.http.post(
+                f"{self.bridge_url}/send-batch",
+                headers=self._get_headers(),
+                json={"messages": batch},
+                # The bridge sends a batch's messages one after another
+                timeout=self.timeout + 5 * len(batch)
+            )
+            
+            if response.status_code == 404:
+                print(f"Bridge {self.bridge_url} has no /send-batch - sending one message at a time")
+                _no_batch_bridges.add(self.bridge_url)
+                return None
+            if response.status_code != 200:
+                print(f"Batch send failed: {response.status_code} - {response.text}")
+                if response.status_code == 503:
+                    self._status.clear()
+                return [False] * len(chunk)
+            
+            sent_numbers = [item.get('success', False) for item in response.json().get('results', [])]
+        except requests.Timeout:
+            print("WhatsApp batch send timed out")
+            return [False] * len(chunk)
+        except Exception as e:
+            print(f"WhatsApp batch send failed: {e}")
+            return [False] * len(chunk)
+        
+        sent_iter = iter(sent_numbers)
+        return [bool(next(sent_iter, False)) if number else False for number in numbers]
+
     # ... [rest of the methods remain the same - payment notifications, etc.]
     
     def send_payment_notification(self, payment_data: Dict[str, Any]) -> bool:
@@ -506,33 +547,7 @@ class WhatsAppService:
     def _format_payment_message(self, payment_data: Dict[str, Any]) -> Optional[str]:
         """Format payment confirmation message for WhatsApp"""
         try:
-            school_name = payment_data.get('school_name', 'School')
-            student_name = payment_data.get('student_name', 'Student')
-            admission_no = payment_data.get('admission_no', 'N/A')
-            amount_paid = payment_data.get('amount_paid', 0)
-            method = payment_data.get('method', 'Payment')
-            reference = payment_data.get('reference', 'N/A')
-            remaining_balance = payment_data.get('remaining_balance', 0)
-            
-            # Build message
-            message = f"*{school_name}* - Payment Received\n\n"
-            message += f"*Student:* {student_name} (#{admission_no})\n"
-            message += f"*Amount:* KES {float(amount_paid):,.2f}\n"
-            message += f"*Method:* {method}\n"
-            
-            if reference and reference != 'N/A':
-                message += f"*Reference:* {reference}\n"
-            
-            if remaining_balance and float(remaining_balance) > 0:
-                message += f"*Remaining Balance:* KES {float(remaining_balance):,.2f}\n"
-            else:
-                message += f"*Status:* Fully Paid\n"
-            
-            message += f"\nPayment recorded on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}\n"
-            message += f"\nThank you for your payment!"
-            
-            return message
-            
+            return render_payment_whatsapp(payment_data)
         except Exception as e:
             print(f"Error formatting payment message: {e}")
             return None
@@ -557,20 +572,7 @@ class WhatsAppService:
     def _format_invoice_message(self, invoice_data: Dict[str, Any]) -> Optional[str]:
         """Format invoice notification message"""
         try:
-            school_name = invoice_data.get('school_name', 'School')
-            student_name = invoice_data.get('student_name', 'Student')
-            admission_no = invoice_data.get('admission_no', 'N/A')
-            outstanding_amount = invoice_data.get('outstanding_amount', 0)
-            
-            message = f"*{school_name}* - Fee Reminder\n\n"
-            message += f"*Student:* {student_name} (#{admission_no})\n"
-            message += f"*Outstanding Balance:* KES {float(outstanding_amount):,.2f}\n"
-            message += f"\nPlease make payment as soon as possible.\n"
-            message += f"Contact the school for payment methods.\n"
-            message += f"\nThank you for your attention."
-            
-            return message
-            
+            return render_fee_reminder_whatsapp(invoice_data)
         except Exception as e:
             print(f"Error formatting invoice message: {e}")
             return None
@@ -581,10 +583,9 @@ class WhatsAppService:
             if not self.connection_token:
                 return {'success': False, 'error': 'No connection token provided'}
             
-            # Clear stored QR code
-            self._clear_qr_code()
+            self.invalidate()
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.bridge_url}/logout",
                 headers=self._get_headers(),
                 timeout=10
@@ -664,6 +665,53 @@ class WhatsAppService:
             return test_results
 
 
+# === SHARED CLIENTS ===
+
+_bridge_sessions: Dict[str, requests.Session] = {}
+_clients: Dict[Tuple[str, Optional[str]], WhatsAppService] = {}
+_clients_lock = threading.Lock()
+
+
+def _bridge_session(bridge_url: str) -> requests.Session:
+    """The process's keep-alive session to a bridge (caller holds _clients_lock)"""
+    session = _bridge_sessions.get(bridge_url)
+    if session is None:
+        pool_size = int(os.getenv('WHATSAPP_HTTP_POOL_SIZE', '10'))
+        session = requests.Session()
+        session.mount(bridge_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        _bridge_sessions[bridge_url] = session
+    return session
+
+
+def get_whatsapp_client(school_id: Optional[str] = None) -> WhatsAppService:
+    """
+    The process's long-lived WhatsAppService for a school's bridge instance
+    (school_id None: the bridge itself, e.g. for /health)
+    """
+    bridge_url = os.getenv('WHATSAPP_BRIDGE_URL', 'http://localhost:3001').rstrip('/')
+    key = (bridge_url, str(school_id) if school_id else None)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            options = {
+                "bridge_url": bridge_url,
+                "timeout": int(os.getenv('WHATSAPP_TIMEOUT', '30')),
+                "http": _bridge_session(bridge_url)
+            }
+            client = WhatsAppService.for_school(key[1], **options) if key[1] else WhatsAppService(**options)
+            _clients[key] = client
+    return client
+
+
+def close_whatsapp_clients():
+    """Drop the shared clients and close their pooled connections"""
+    with _clients_lock:
+        _clients.clear()
+        for session in _bridge_sessions.values():
+            session.close()
+        _bridge_sessions.clear()
+
+
 # Configuration
 def configure_whatsapp_service():
     """Configure WhatsApp service with environment variables"""
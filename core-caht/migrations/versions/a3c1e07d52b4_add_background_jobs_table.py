@@ -0,0 +1,64 @@
+"""add background jobs table
+
+Revision ID: a3c1e07d52b4
+Revises: 6bf9ed222185
+Create Date: 2026-10-16 19:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1e07d52b4'
+down_revision: Union[str, Sequence[str], None] = '6bf9ed222185'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('school_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('kind', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='queued'),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('idempotency_key', sa.String(length=128), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3'),
+        sa.Column('progress_done', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('progress_total', sa.Integer(), nullable=True),
+        sa.Column('progress_message', sa.String(length=256), nullable=True),
+        sa.Column('run_after', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.Column('locked_by', sa.String(length=128), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.CheckConstraint("status IN ('queued','running','succeeded','failed')", name='status'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_background_jobs_school_id', 'background_jobs', ['school_id'])
+    op.create_index('ix_background_jobs_claim', 'background_jobs', ['run_after'],
+                    postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_background_jobs_running', 'background_jobs', ['locked_at'],
+                    postgresql_where=sa.text("status = 'running'"))
+    op.create_index('uq_background_jobs_active_key', 'background_jobs',
+                    ['school_id', 'kind', 'idempotency_key'], unique=True,
+                    postgresql_where=sa.text("idempotency_key IS NOT NULL AND status IN ('queued','running')"))
+
+
+def downgrade():
+    op.drop_index('uq_background_jobs_active_key', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_running', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_claim', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_school_id', table_name='background_jobs')
+    op.drop_table('background_jobs')
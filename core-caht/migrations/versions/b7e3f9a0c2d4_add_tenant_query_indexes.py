@@ -0,0 +1,57 @@
+"""add composite and partial indexes for tenant-scoped hot queries
+
+Revision ID: b7e3f9a0c2d4
+Revises: f1a7c3b92d06
+Create Date: 2026-10-17 00:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f9a0c2d4'
+down_revision: Union[str, Sequence[str], None] = 'f1a7c3b92d06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PROBLEM_INTENTS = "final_intent IN ('unhandled', 'unknown', 'ollama_fallback')"
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    # Active/inactive counts and lists per school
+    ('ix_students_school_status', 'students', ['school_id', 'status'], None),
+    # Class rosters and class student counts (classes LEFT JOIN students ON class_id)
+    ('ix_students_class_status', 'students', ['class_id', 'status'], None),
+    # Latest students of a school (ORDER BY admission_no DESC LIMIT n)
+    ('ix_students_school_admission', 'students', ['school_id', 'admission_no'], None),
+    ('ix_enrollments_school_term_status', 'enrollments', ['school_id', 'term_id', 'status'], None),
+    # Payment history and paid totals per invoice; also backs the invoices FK
+    ('ix_payments_invoice', 'payments', ['invoice_id'], None),
+    # Admin monitoring: message type by period, then intent
+    ('ix_chat_messages_type_created_intent', 'chat_messages', ['message_type', 'created_at', 'intent'], None),
+    ('ix_routing_logs_created_fallback_intent', 'routing_logs', ['created_at', 'fallback_used', 'final_intent'], None),
+    # The tester queue's problematic routes are a small slice of the log
+    ('ix_routing_logs_problems', 'routing_logs', ['created_at'], f"fallback_used OR {PROBLEM_INTENTS}"),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while the indexes build; it
+    # cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _columns, _where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
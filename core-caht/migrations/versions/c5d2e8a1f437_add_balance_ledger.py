@@ -0,0 +1,63 @@
+"""add balance ledger (invoices.amount_paid, student_balances)
+
+Revision ID: c5d2e8a1f437
+Revises: a3c1e07d52b4
+Create Date: 2026-10-16 21:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2e8a1f437'
+down_revision: Union[str, Sequence[str], None] = 'a3c1e07d52b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('invoices', sa.Column('amount_paid', sa.Numeric(12, 2), nullable=False, server_default='0'))
+    op.execute("""
+        UPDATE invoices i
+        SET amount_paid = p.paid
+        FROM (SELECT invoice_id, SUM(amount) AS paid FROM payments GROUP BY invoice_id) p
+        WHERE p.invoice_id = i.id
+    """)
+    op.create_index('ix_invoices_open_balance', 'invoices', ['school_id', 'student_id'],
+                    postgresql_include=['total', 'amount_paid', 'due_date'],
+                    postgresql_where=sa.text("status IN ('ISSUED', 'PARTIAL')"))
+
+    op.create_table(
+        'student_balances',
+        sa.Column('school_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('student_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('outstanding', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('open_invoices', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_paid', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.ForeignKeyConstraint(['student_id'], ['students.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('school_id', 'student_id')
+    )
+    op.create_index('ix_student_balances_owing', 'student_balances', ['school_id', 'outstanding'],
+                    postgresql_include=['student_id', 'open_invoices'],
+                    postgresql_where=sa.text('outstanding > 0'))
+    op.execute("""
+        INSERT INTO student_balances (school_id, student_id, outstanding, open_invoices, total_paid)
+        SELECT school_id, student_id,
+               COALESCE(SUM(total - amount_paid) FILTER (WHERE status IN ('ISSUED', 'PARTIAL')), 0),
+               COUNT(*) FILTER (WHERE status IN ('ISSUED', 'PARTIAL')),
+               COALESCE(SUM(amount_paid), 0)
+        FROM invoices
+        GROUP BY school_id, student_id
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_student_balances_owing', table_name='student_balances')
+    op.drop_table('student_balances')
+    op.drop_index('ix_invoices_open_balance', table_name='invoices')
+    op.drop_column('invoices', 'amount_paid')
@@ -0,0 +1,66 @@
+"""add sms inbox table
+
+Revision ID: d4a8c6e2b1f9
+Revises: b7e3f9a0c2d4
+Create Date: 2026-10-17 01:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c6e2b1f9'
+down_revision: Union[str, Sequence[str], None] = 'b7e3f9a0c2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        'sms_inbox',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('seq', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('school_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('source', sa.String(length=64), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('body_hash', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='pending'),
+        sa.Column('message_type', sa.String(length=32), nullable=True),
+        sa.Column('reference', sa.String(length=64), nullable=True),
+        sa.Column('parsed', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_after', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.Column('locked_by', sa.String(length=128), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        sa.CheckConstraint("status IN ('pending','processing','processed','duplicate','ignored','dead')", name='status'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('seq')
+    )
+    op.create_index('uq_sms_inbox_body', 'sms_inbox', ['school_id', 'body_hash'], unique=True)
+    op.create_index('uq_sms_inbox_processed_reference', 'sms_inbox', ['school_id', 'reference'], unique=True,
+                    postgresql_where=sa.text("status = 'processed' AND reference IS NOT NULL"))
+    op.create_index('ix_sms_inbox_open', 'sms_inbox', ['school_id', 'seq'],
+                    postgresql_where=sa.text("status IN ('pending','processing')"))
+    op.create_index('ix_sms_inbox_school_status', 'sms_inbox', ['school_id', 'status', 'seq'])
+    # Duplicate transaction checks against payments already posted
+    op.create_index('ix_payments_school_txn_ref', 'payments', ['school_id', 'txn_ref'])
+
+
+def downgrade():
+    op.drop_index('ix_payments_school_txn_ref', table_name='payments')
+    op.drop_index('ix_sms_inbox_school_status', table_name='sms_inbox')
+    op.drop_index('ix_sms_inbox_open', table_name='sms_inbox')
+    op.drop_index('uq_sms_inbox_processed_reference', table_name='sms_inbox')
+    op.drop_index('uq_sms_inbox_body', table_name='sms_inbox')
+    op.drop_table('sms_inbox')
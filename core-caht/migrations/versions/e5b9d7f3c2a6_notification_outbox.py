@@ -0,0 +1,57 @@
+"""turn the notification table into a delivery outbox
+
+Revision ID: e5b9d7f3c2a6
+Revises: d4a8c6e2b1f9
+Create Date: 2026-10-17 03:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9d7f3c2a6'
+down_revision: Union[str, Sequence[str], None] = 'd4a8c6e2b1f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # HTML email bodies exceed the old 2000 characters
+    op.alter_column('notification', 'body', type_=sa.Text(), existing_type=sa.String(length=2000),
+                    existing_nullable=False)
+    op.add_column('notification', sa.Column('kind', sa.String(length=32), nullable=True))
+    op.add_column('notification', sa.Column('recipient', sa.String(length=255), nullable=True))
+    op.add_column('notification', sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('notification', sa.Column('dedupe_key', sa.String(length=128), nullable=True))
+    op.add_column('notification', sa.Column('error', sa.Text(), nullable=True))
+    op.add_column('notification', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('notification', sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'))
+    op.add_column('notification', sa.Column('run_after', sa.DateTime(), nullable=False,
+                                            server_default=sa.text("timezone('utc', now())")))
+    op.add_column('notification', sa.Column('locked_by', sa.String(length=128), nullable=True))
+    op.add_column('notification', sa.Column('locked_at', sa.DateTime(), nullable=True))
+    op.add_column('notification', sa.Column('sent_at', sa.DateTime(), nullable=True))
+    op.add_column('notification', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                            server_default=sa.text("timezone('utc', now())")))
+
+    op.create_index('ix_notification_claim', 'notification', ['type', 'run_after'],
+                    postgresql_where=sa.text("status = 'QUEUED'"))
+    op.create_index('ix_notification_sending', 'notification', ['locked_at'],
+                    postgresql_where=sa.text("status = 'SENDING'"))
+    op.create_index('uq_notification_dedupe', 'notification', ['school_id', 'type', 'dedupe_key'], unique=True,
+                    postgresql_where=sa.text("dedupe_key IS NOT NULL"))
+
+
+def downgrade():
+    op.drop_index('uq_notification_dedupe', table_name='notification')
+    op.drop_index('ix_notification_sending', table_name='notification')
+    op.drop_index('ix_notification_claim', table_name='notification')
+    for column in ('updated_at', 'sent_at', 'locked_at', 'locked_by', 'run_after', 'max_attempts',
+                   'attempts', 'error', 'dedupe_key', 'payload', 'recipient', 'kind'):
+        op.drop_column('notification', column)
+    op.alter_column('notification', 'body', type_=sa.String(length=2000), existing_type=sa.Text(),
+                    existing_nullable=False)
@@ -0,0 +1,54 @@
+"""add student name search (search_name, name_tsv, trigram index)
+
+Revision ID: f1a7c3b92d06
+Revises: c5d2e8a1f437
+Create Date: 2026-10-16 23:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a7c3b92d06'
+down_revision: Union[str, Sequence[str], None] = 'c5d2e8a1f437'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('students', sa.Column(
+        'search_name', sa.Text(),
+        sa.Computed("lower(first_name || ' ' || last_name)", persisted=True)
+    ))
+    op.add_column('students', sa.Column(
+        'name_tsv', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', first_name || ' ' || last_name)", persisted=True)
+    ))
+    op.create_index('ix_students_name_tsv', 'students', ['name_tsv'], postgresql_using='gin')
+
+    # pg_trgm ships with contrib; servers without it keep the in-memory
+    # fallback of app/services/student_search.py
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS ix_students_search_name_trgm
+                    ON students USING gin (search_name gin_trgm_ops);
+            ELSE
+                RAISE NOTICE 'pg_trgm not available; skipping ix_students_search_name_trgm';
+            END IF;
+        END
+        $$
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_students_search_name_trgm")
+    op.drop_index('ix_students_name_tsv', table_name='students')
+    op.drop_column('students', 'name_tsv')
+    op.drop_column('students', 'search_name')
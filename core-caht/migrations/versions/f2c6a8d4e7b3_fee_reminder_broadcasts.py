@@ -0,0 +1,31 @@
+"""fee reminder broadcasts: notification.broadcast_id and per-school bridge rate
+
+Revision ID: f2c6a8d4e7b3
+Revises: e5b9d7f3c2a6
+Create Date: 2026-10-17 05:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a8d4e7b3'
+down_revision: Union[str, Sequence[str], None] = 'e5b9d7f3c2a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('notification', sa.Column('broadcast_id', sa.String(length=36), nullable=True))
+    op.create_index('ix_notification_broadcast', 'notification', ['broadcast_id', 'type', 'status'],
+                    postgresql_where=sa.text("broadcast_id IS NOT NULL"))
+    op.add_column('school_whatsapp_settings', sa.Column('messages_per_minute', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('school_whatsapp_settings', 'messages_per_minute')
+    op.drop_index('ix_notification_broadcast', table_name='notification')
+    op.drop_column('notification', 'broadcast_id')
@@ -0,0 +1,480 @@
+# scripts/bench_chat_throughput.py
+"""
+End-to-end chat throughput benchmark over synthetic large schools.
+
+Seeds schools with scripts/seed_large_schools.py (or reuses ones generated
+earlier), then replays a weighted mix of realistic chat intents from worker
+processes through either
+
+  processor  IntentProcessor.process_message, as the endpoint calls it
+  endpoint   POST /api/chat/message through the ASGI app (auth, turn
+             persistence, commit)
+
+Ollama is replaced by a stub HTTP server started here; OLLAMA_BASE_URL points
+the real LLM client at it, so pooling, the classification cache and the
+routing pipeline all run. The stub answers the classification prompt with
+the intent each message was generated for (and its entities), after
+--llm-latency-ms.
+
+Reports p50/p95/p99 latency, statements per turn and turns/s per worker,
+overall and per intent, and writes them to a JSON file tagged with the git
+commit; --compare checks a run against an earlier file and exits 1 when
+p95 latency or statements per turn regressed by more than --max-regression.
+
+Usage:
+    python scripts/bench_chat_throughput.py --schools 4 --students 2000 --workers 4 --turns 200
+    python scripts/bench_chat_throughput.py --reuse --mode endpoint --compare bench-results/base.json
+"""
+import io
+import sys
+import os
+import re
+import json
+import math
+import logging
+import time
+import random
+import asyncio
+import argparse
+import threading
+import contextlib
+import statistics
+import subprocess
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, text
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app.main  # noqa: F401 - register every mapper and session listener
+from app.core.db import SessionLocal, engine, set_rls_context
+from app.core.executor import run_blocking
+from app.core.security import create_token
+from seed_large_schools import seed_schools, generated_schools, drop_generated_schools
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (intent, weight, message template); {placeholders} are filled from the
+# school's data and returned by the stub as the extracted entities
+INTENT_MIX = [
+    ("school_overview", 12, "give me the school overview"),
+    ("student_count", 8, "how many students do we have"),
+    ("student_search", 12, "find student {student_name}"),
+    ("student_search", 8, "look up admission number {admission_no}"),
+    ("student_list", 4, "list students"),
+    ("class_list", 6, "show all classes"),
+    ("class_details", 4, "show class {class_name}"),
+    ("invoice_pending", 8, "show pending invoices"),
+    ("invoice_show_student", 6, "show invoice for {admission_no}"),
+    ("payment_summary", 6, "payment summary"),
+    ("payment_history", 5, "payment history for {admission_no}"),
+    ("fee_overview", 5, "fee structure overview"),
+    ("academic_current_term", 5, "what is the current term"),
+    ("enrollment_status", 3, "enrollment status this term"),
+    ("greeting", 3, "hello"),
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+# === OLLAMA STUB ===
+
+def _template_pattern(template: str) -> re.Pattern:
+    pattern = re.escape(template)
+    pattern = re.sub(r"\\\{(\w+)\\\}", lambda m: f"(?P<{m.group(1)}>.+?)", pattern)
+    return re.compile(f"^{pattern}$")
+
+
+class OllamaStub:
+    """Threaded HTTP server answering /api/generate like a fast, always-right classifier"""
+
+    MESSAGE_RE = re.compile(r'^Message: "(.*)"$', re.MULTILINE)
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000.0
+        self.patterns = [(intent, _template_pattern(template)) for intent, _, template in INTENT_MIX]
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub._reply(self, stub.generate(payload.get("prompt", "")))
+
+            def do_GET(self):
+                stub._reply(self, {"models": [{"name": "stub:latest"}]})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @staticmethod
+    def _reply(request, body: Dict):
+        data = json.dumps(body).encode()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def generate(self, prompt: str) -> Dict:
+        if self.latency:
+            time.sleep(self.latency)
+        match = self.MESSAGE_RE.search(prompt)
+        if not match:
+            # Free-text generation (general handler fallbacks)
+            return {"response": "This is a stubbed answer.", "done": True}
+        message = match.group(1)
+        for intent, pattern in self.patterns:
+            found = pattern.match(message)
+            if found:
+                result = {"intent": intent, "confidence": 0.92, "entities": found.groupdict(), "alternatives": []}
+                break
+        else:
+            result = {"intent": "unknown", "confidence": 0.2, "entities": {}, "alternatives": []}
+        return {"response": json.dumps(result), "done": True}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# === TRAFFIC ===
+
+def sample_values(db, school_id: str, samples: int = 50) -> Dict[str, List[str]]:
+    """Names, admission numbers and class names to fill message templates with"""
+    students = db.execute(text("""
+        SELECT first_name || ' ' || last_name, admission_no FROM students
+        WHERE school_id = :school_id ORDER BY md5(admission_no) LIMIT :samples
+    """), {"school_id": school_id, "samples": samples}).all()
+    classes = db.execute(text("SELECT name FROM classes WHERE school_id = :school_id ORDER BY name"),
+                         {"school_id": school_id}).scalars().all()
+    return {
+        "student_name": [row[0] for row in students],
+        "admission_no": [row[1] for row in students],
+        "class_name": list(classes),
+    }
+
+
+def build_turns(rng: random.Random, values: Dict[str, List[str]], count: int) -> List[tuple]:
+    """(intent, message) pairs drawn from INTENT_MIX by weight"""
+    weights = [weight for _, weight, _ in INTENT_MIX]
+    turns = []
+    for intent, _, template in rng.choices(INTENT_MIX, weights=weights, k=count):
+        message = re.sub(r"\{(\w+)\}", lambda m: rng.choice(values[m.group(1)]), template)
+        turns.append((intent, message))
+    return turns
+
+
+class StatementCounter:
+    """Counts statements sent to the server (each one is a round-trip)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+# === WORKER ===
+
+async def _processor_turn(school: Dict, message: str, state: Dict) -> str:
+    from app.api.routers.chat.processor import IntentProcessor
+
+    db = SessionLocal()
+    try:
+        await run_blocking(set_rls_context, db, user_id=school["user_id"], school_id=school["school_id"])
+        processor = await run_blocking(IntentProcessor, db=db, user_id=school["user_id"], school_id=school["school_id"])
+        response = await processor.process_message(message, {})
+        await run_blocking(db.commit)
+        return response.intent
+    finally:
+        db.close()
+
+
+async def _endpoint_turn(school: Dict, message: str, state: Dict) -> str:
+    response = await state["client"].post(
+        "/api/chat/message",
+        json={"message": message, "conversation_id": state.get("conversation_id")},
+        headers=state["headers"]
+    )
+    if response.status_code != 200:
+        return "error"
+    body = response.json()
+    state["conversation_id"] = body.get("conversation_id")
+    return body.get("intent")
+
+
+async def _client(mode: str, school: Dict, turns: List[tuple], warmup: int, counter: StatementCounter,
+                  exact_counts: bool, samples: List):
+    """One conversation: replays its turns in order, recording the measured ones"""
+    state = {}
+    turn_fn = _processor_turn if mode == "processor" else _endpoint_turn
+    if mode == "endpoint":
+        import httpx
+        token = create_token(school["user_id"], ["ADMIN"], school["school_id"], minutes=240)
+        state["headers"] = {"Authorization": f"Bearer {token}", "X-School-ID": school["school_id"]}
+        state["client"] = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.main.app), base_url="http://bench")
+
+    try:
+        for position, (intent, message) in enumerate(turns):
+            statements_before = counter.count
+            started = time.perf_counter()
+            try:
+                answered = await turn_fn(school, message, state)
+            except Exception:
+                answered = "error"
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if position >= warmup:
+                statements = counter.count - statements_before if exact_counts else None
+                samples.append((intent, elapsed_ms, statements, answered in ("error", None)))
+    finally:
+        if "client" in state:
+            await state["client"].aclose()
+
+
+async def _replay(mode: str, schools: List[Dict], turns: int, warmup: int, concurrency: int,
+                  seed: int) -> Dict:
+    from app.services.routing_telemetry import get_routing_log_sink
+    from app.services.llm_client import get_llm_client
+
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        values = {school["school_id"]: sample_values(db, school["school_id"]) for school in schools}
+
+    counter = StatementCounter()
+    samples: List = []
+    sink = get_routing_log_sink()
+    await sink.start()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        clients = []
+        for index in range(concurrency):
+            school = schools[index % len(schools)]
+            share = turns // concurrency + (1 if index < turns % concurrency else 0)
+            clients.append(_client(mode, school, build_turns(rng, values[school["school_id"]], warmup + share),
+                                   warmup, counter, concurrency == 1, samples))
+        statements_before = counter.count
+        started = time.perf_counter()
+        await asyncio.gather(*clients)
+        elapsed = time.perf_counter() - started
+        statements = counter.count - statements_before
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+        await sink.stop()
+        await get_llm_client().close()
+
+    return {
+        "samples": samples,
+        "elapsed": elapsed,
+        "replayed": len(samples) + warmup * concurrency,
+        "statements": statements,
+    }
+
+
+def run_worker(mode: str, schools: List[Dict], turns: int, warmup: int, concurrency: int, seed: int) -> Dict:
+    """Entry point of one worker process"""
+    # Handler debug prints and tracebacks of failed turns would swamp the report;
+    # failures are counted per intent instead
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return asyncio.run(_replay(mode, schools, turns, warmup, concurrency, seed))
+
+
+# === REPORT ===
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(math.ceil(p / 100 * len(ordered)) - 1, 0))]
+
+
+def _latency_summary(timings: List[float]) -> Dict:
+    ordered = sorted(timings)
+    summary = {f"p{p}_ms": round(percentile(ordered, p), 2) for p in PERCENTILES}
+    summary["mean_ms"] = round(statistics.fmean(ordered), 2) if ordered else 0.0
+    return summary
+
+
+def summarize(workers: List[Dict]) -> Dict:
+    samples = [sample for worker in workers for sample in worker["samples"]]
+    turns = len(samples)
+    by_intent = defaultdict(list)
+    for sample in samples:
+        by_intent[sample[0]].append(sample)
+
+    per_intent = {}
+    for intent, intent_samples in sorted(by_intent.items()):
+        counts = [s[2] for s in intent_samples if s[2] is not None]
+        per_intent[intent] = {
+            "turns": len(intent_samples),
+            **_latency_summary([s[1] for s in intent_samples]),
+            "statements_per_turn": round(statistics.fmean(counts), 2) if counts else None,
+            "errors": sum(1 for s in intent_samples if s[3]),
+        }
+
+    # Exact per-turn counts exist with one conversation per worker; otherwise
+    # statements of concurrent turns interleave and only the average is known
+    counts = [sample[2] for sample in samples]
+    if counts and None not in counts:
+        statements_per_turn = statistics.fmean(counts)
+    else:
+        statements_per_turn = sum(w["statements"] for w in workers) / max(sum(w["replayed"] for w in workers), 1)
+
+    per_worker = [round(worker["replayed"] / worker["elapsed"], 2) for worker in workers]
+    return {
+        "turns": turns,
+        **_latency_summary([sample[1] for sample in samples]),
+        "statements_per_turn": round(statements_per_turn, 2),
+        "throughput_per_worker": per_worker,
+        "throughput_per_worker_mean": round(statistics.fmean(per_worker), 2) if per_worker else 0.0,
+        "throughput_total": round(sum(w["replayed"] for w in workers) / max(w["elapsed"] for w in workers), 2) if workers else 0.0,
+        "errors": sum(1 for sample in samples if sample[3]),
+        "per_intent": per_intent,
+    }
+
+
+def git_revision() -> Dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except Exception:
+            return None
+    status = git("status", "--porcelain")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def print_summary(mode: str, summary: Dict):
+    print(f"\n{mode}: {summary['turns']} turns, {summary['errors']} errors")
+    print(f"  latency  p50 {summary['p50_ms']:8.2f} ms  p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms")
+    print(f"  {summary['statements_per_turn']:.1f} statements/turn, "
+          f"{summary['throughput_per_worker_mean']:.1f} turns/s per worker, {summary['throughput_total']:.1f} turns/s total")
+    print(f"  {'intent':<24}{'turns':>6}{'p50 ms':>10}{'p95 ms':>10}{'stmts':>8}")
+    for intent, stats in summary["per_intent"].items():
+        statements = f"{stats['statements_per_turn']:.1f}" if stats["statements_per_turn"] is not None else "-"
+        print(f"  {intent:<24}{stats['turns']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{statements:>8}")
+
+
+def compare(baseline: Dict, current: Dict, max_regression: float) -> List[str]:
+    """Regressions of current against baseline, one line each"""
+    regressions = []
+    base_commit = (baseline.get("git") or {}).get("commit") or "baseline"
+    print(f"\nCompared with {base_commit[:12]}:")
+    ignored = ("max_regression", "reuse", "keep_data")
+    differing = sorted(key for key, value in current["config"].items()
+                       if key not in ignored and baseline.get("config", {}).get(key) != value)
+    if differing:
+        print(f"  note: configuration differs ({', '.join(differing)}); numbers may not be comparable")
+    for mode, summary in current["results"].items():
+        base = baseline.get("results", {}).get(mode)
+        if not base:
+            print(f"  {mode}: not in baseline")
+            continue
+        for metric, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True),
+                                        ("statements_per_turn", True), ("throughput_per_worker_mean", False)):
+            before, after = base.get(metric), summary.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            print(f"  {mode:<10}{metric:<28}{before:>10.2f} -> {after:>10.2f}  ({change:+.1f}%)")
+            if metric in ("p95_ms", "statements_per_turn") and higher_is_worse and change > max_regression:
+                regressions.append(f"{mode} {metric} {change:+.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a chat intent mix over synthetic schools and measure throughput")
+    parser.add_argument("--mode", choices=("processor", "endpoint", "both"), default="both")
+    parser.add_argument("--schools", type=int, default=4, help="Schools to generate")
+    parser.add_argument("--students", type=int, default=2000, help="Students per school")
+    parser.add_argument("--streams", type=int, default=3, help="Classes per CBC level")
+    parser.add_argument("--terms", type=int, default=3, help="Terms per school (invoiced; the last active)")
+    parser.add_argument("--paid-share", type=float, default=0.5, help="Share of invoices with a payment")
+    parser.add_argument("--reuse", action="store_true", help="Use previously generated schools; keep them")
+    parser.add_argument("--keep-data", action="store_true", help="Do not drop the generated schools afterwards")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent conversations per worker")
+    parser.add_argument("--turns", type=int, default=200, help="Measured turns per worker")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured turns per conversation first")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Stubbed Ollama response time")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the replayed traffic")
+    parser.add_argument("--output", help="Result JSON (default bench-results/chat_throughput_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result JSON to compare with")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="Allowed %% increase of p95 latency and statements/turn with --compare")
+    args = parser.parse_args()
+
+    stub = OllamaStub(args.llm_latency_ms)
+    stub.start()
+    # Spawned workers inherit the environment; the LLM client reads it lazily
+    os.environ["OLLAMA_BASE_URL"] = stub.url
+
+    generated = False
+    try:
+        if args.reuse:
+            with SessionLocal() as db:
+                schools = generated_schools(db)
+            if not schools:
+                sys.exit("No generated schools found; run without --reuse first")
+        else:
+            started = time.perf_counter()
+            schools = seed_schools(args.schools, args.students, args.streams, args.terms, args.paid_share)
+            generated = True
+            print(f"Generated {len(schools)} schools x {args.students} students in {time.perf_counter() - started:.1f} s")
+
+        modes = ("processor", "endpoint") if args.mode == "both" else (args.mode,)
+        results = {}
+        context = multiprocessing.get_context("spawn")
+        for mode in modes:
+            with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(run_worker, mode,
+                                [schools[(worker + n) % len(schools)] for n in range(len(schools))],
+                                args.turns, args.warmup, args.concurrency, args.seed + worker)
+                    for worker in range(args.workers)
+                ]
+                results[mode] = summarize([future.result() for future in futures])
+            print_summary(mode, results[mode])
+    finally:
+        stub.stop()
+        if generated and not args.keep_data:
+            drop_generated_schools()
+
+    report = {
+        "benchmark": "chat_throughput",
+        "git": git_revision(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        REPO_ROOT, "bench-results", f"chat_throughput_{(report['git']['commit'] or 'unknown')[:12]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.max_regression)
+        if regressions:
+            print(f"\nRegressed beyond {args.max_regression:.0f}%: {'; '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
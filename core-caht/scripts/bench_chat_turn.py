@@ -0,0 +1,138 @@
+# scripts/bench_chat_turn.py
+"""
+Benchmark DB round-trips and latency of one /chat/message turn.
+
+Compares the legacy ChatService sequence (get_conversation, add_message x2,
+get_conversation_context) with the begin_turn/complete_turn API. Each turn
+commits like the endpoint does (so the conversation state cache is warm for
+the next one); the benchmark conversation is deleted afterwards.
+
+Usage:
+    python scripts/bench_chat_turn.py --turns 200
+    python scripts/bench_chat_turn.py --school-id <uuid> --user-id <uuid>
+"""
+import io
+import sys
+import os
+import time
+import contextlib
+import uuid
+import argparse
+import statistics
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+import app.models  # noqa: F401 - register every mapper before the first query
+import app.models.password_reset  # noqa: F401
+from app.core.db import SessionLocal, engine, set_rls_context
+from app.models.chat import MessageType
+from app.services.chat_service import ChatService
+
+
+class StatementCounter:
+    """Counts statements sent to the server (each one is a round-trip)"""
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self.count += 1
+
+
+def legacy_turn(service: ChatService, conversation_id: str, user_id: str, school_id: str):
+    conversation = service.get_conversation(conversation_id, user_id, school_id)
+    service.add_message(
+        conversation_id=str(conversation.id), user_id=user_id, school_id=school_id,
+        message_type=MessageType.USER, content="show pending invoices", context_data={}
+    )
+    service.get_conversation_context(conversation_id, user_id, school_id)
+    service.add_message(
+        conversation_id=conversation_id, user_id=user_id, school_id=school_id,
+        message_type=MessageType.ASSISTANT, content="Here are the pending invoices",
+        intent="invoice_pending", response_data={"context": {"handler": "invoice"}},
+        processing_time_ms=12
+    )
+
+
+def batched_turn(service: ChatService, conversation_id: str, user_id: str, school_id: str):
+    turn = service.begin_turn(conversation_id, user_id, school_id, "show pending invoices")
+    service.complete_turn(
+        turn,
+        user_content="show pending invoices",
+        assistant_content="Here are the pending invoices",
+        user_context={},
+        intent="invoice_pending",
+        response_data={"context": {"handler": "invoice"}},
+        processing_time_ms=12
+    )
+
+
+def run(name, turn_fn, turns: int, user_id: str, school_id: str):
+    counter = StatementCounter()
+    db = SessionLocal()
+    service = ChatService(db)
+    conversation_id = None
+    try:
+        set_rls_context(db, user_id=user_id, school_id=school_id)
+        conversation = service.create_conversation(user_id, school_id, "benchmark conversation")
+        conversation_id = str(conversation.id)
+        db.commit()
+
+        # Warm up so the conversation has recent messages to load
+        for _ in range(3):
+            set_rls_context(db, user_id=user_id, school_id=school_id)
+            turn_fn(service, conversation_id, user_id, school_id)
+            db.commit()
+
+        event.listen(engine, "before_cursor_execute", counter)
+        timings = []
+        try:
+            for _ in range(turns):
+                set_rls_context(db, user_id=user_id, school_id=school_id)
+                started = time.perf_counter()
+                counter.active = True
+                turn_fn(service, conversation_id, user_id, school_id)
+                counter.active = False
+                db.commit()
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+
+        timings.sort()
+        return (f"{name:>8}: {counter.count / turns:5.1f} statements/turn, "
+                f"p50 {statistics.median(timings):6.2f} ms, "
+                f"p95 {timings[max(int(len(timings) * 0.95) - 1, 0)]:6.2f} ms")
+    finally:
+        db.rollback()
+        if conversation_id:
+            set_rls_context(db, user_id=user_id, school_id=school_id)
+            service.delete_conversation(conversation_id, user_id, school_id)
+            db.commit()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat turn persistence")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--user-id", default=str(uuid.uuid4()))
+    parser.add_argument("--school-id", default=str(uuid.uuid4()))
+    args = parser.parse_args()
+
+    results = []
+    for name, fn in (("legacy", legacy_turn), ("batched", batched_turn)):
+        # Silence the per-call debug prints so timings measure the database
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(run(name, fn, args.turns, args.user_id, args.school_id))
+
+    print(f"Chat turn benchmark ({args.turns} turns each, statements exclude RLS setup and COMMIT)")
+    for line in results:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# scripts/bench_handler_registry.py
+"""
+Microbenchmark: per-request handler setup in IntentProcessor.
+
+Compares building every chat handler up front (the old IntentProcessor
+behaviour) with HandlerRegistry, which builds only the handler a message is
+dispatched to. Handler constructors do not touch the database, so no
+connection is needed.
+
+Usage:
+    python scripts/bench_handler_registry.py --iterations 20000
+"""
+import sys
+import os
+import uuid
+import argparse
+import timeit
+import tracemalloc
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.routers.chat.handler_registry import HandlerRegistry, HANDLER_CLASSES
+
+SCHOOL_ID = str(uuid.uuid4())
+USER_ID = str(uuid.uuid4())
+
+
+def eager_setup():
+    handlers = {key: cls(None, SCHOOL_ID, USER_ID) for key, cls in HANDLER_CLASSES.items()}
+    return handlers["student"]
+
+
+def lazy_setup():
+    handlers = HandlerRegistry(None, SCHOOL_ID, USER_ID)
+    return handlers["student"]
+
+
+def peak_kib(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat handler construction")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"Handler setup per request ({args.iterations} iterations, best of 5)")
+    for name, fn in (("eager", eager_setup), ("lazy", lazy_setup)):
+        fn()  # warm imports and caches
+        best = min(timeit.repeat(fn, number=args.iterations, repeat=5))
+        print(f"{name:>6}: {best / args.iterations * 1e6:8.2f} us/request, "
+              f"peak {peak_kib(fn):6.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
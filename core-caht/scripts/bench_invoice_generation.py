@@ -0,0 +1,247 @@
+# scripts/bench_invoice_generation.py
+"""
+Benchmark term invoice generation at school scale.
+
+Seeds a synthetic school (classes across CBC levels, one published fee
+structure per level with class-specific, optional and annual items, N
+enrolled students) and compares:
+
+  per-enrollment  existing-invoice check, structure lookup, item query and
+                  flush per student (the old generate_invoices_for_term loop)
+  bulk            FeesService.generate_invoices_bulk (InvoiceBuilder)
+
+Everything runs inside one transaction that is rolled back at the end, so
+nothing is left behind in the database.
+
+Usage:
+    python scripts/bench_invoice_generation.py --enrollments 5000 20000
+    python scripts/bench_invoice_generation.py --enrollments 20000 --skip-per-enrollment
+"""
+import io
+import sys
+import os
+import time
+import contextlib
+import uuid
+import string
+import argparse
+from datetime import date, datetime
+from decimal import Decimal
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert, select, and_
+
+import app.models  # noqa: F401 - register every mapper before the first query
+import app.models.password_reset  # noqa: F401
+from app.core.db import SessionLocal, engine
+from app.models.academic import AcademicYear, AcademicTerm, Enrollment
+from app.models.class_model import Class
+from app.models.student import Student
+from app.models.fee import FeeStructure, FeeItem
+from app.models.payment import Invoice
+from app.services.fees import FeesService
+
+LEVELS = ["PP1", "PP2", "Grade 1", "Grade 2", "Grade 3", "Grade 4", "Grade 5", "Grade 6"]
+STREAMS_PER_LEVEL = 3
+
+
+class StatementCounter:
+    """Counts statements sent to the server (each one is a round-trip)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def seed(db, school_id: uuid.UUID, enrollments: int, streams: int = STREAMS_PER_LEVEL, terms: int = 1):
+    """Insert a school's year, terms, classes, fee structures and enrolled students; returns the active term id
+
+    The last of `terms` terms is ACTIVE and earlier ones CLOSED; every student
+    is enrolled, with a fee structure per level, in each of them.
+    """
+    now = datetime.utcnow()
+    year = AcademicYear(school_id=school_id, year=2031, title="Academic Year 2031", state="ACTIVE")
+    db.add(year)
+    db.flush()
+    term_objs = [
+        AcademicTerm(school_id=school_id, year_id=year.id, term=number, title=f"Term {number}",
+                     state="ACTIVE" if number == terms else "CLOSED")
+        for number in range(1, terms + 1)
+    ]
+    db.add_all(term_objs)
+    db.flush()
+
+    classes = []
+    for level in LEVELS:
+        for stream in string.ascii_uppercase[:streams]:
+            classes.append({"id": uuid.uuid4(), "school_id": school_id, "name": f"{level} {stream}",
+                            "level": level, "academic_year": 2031, "stream": stream,
+                            "created_at": now, "updated_at": now})
+    db.execute(insert(Class.__table__), classes)
+
+    structures, items = [], []
+    for term in term_objs:
+        for level in LEVELS:
+            structure_id = uuid.uuid4()
+            structures.append({"id": structure_id, "school_id": school_id, "name": f"{level} fees",
+                               "level": level, "term": term.term, "year": 2031, "is_default": False,
+                               "is_published": True, "created_at": now, "updated_at": now})
+            level_classes = [c["id"] for c in classes if c["level"] == level]
+            for name, amount, optional, cycle, class_id in (
+                ("Tuition", "15000", False, "TERM", None),
+                ("Activity", "1500", False, "TERM", None),
+                ("Admission", "2000", False, "ANNUAL", None),
+                ("Transport", "6000", True, "TERM", None),
+                ("Lunch", "4500", True, "TERM", None),
+                ("Lab", "800", False, "TERM", level_classes[0]),
+            ):
+                items.append({"id": uuid.uuid4(), "school_id": school_id, "fee_structure_id": structure_id,
+                              "class_id": class_id, "item_name": name, "amount": Decimal(amount),
+                              "is_optional": optional, "category": "OTHER", "billing_cycle": cycle,
+                              "created_at": now, "updated_at": now})
+    db.execute(insert(FeeStructure.__table__), structures)
+    db.execute(insert(FeeItem.__table__), items)
+
+    students, enrolled = [], []
+    prefix = school_id.hex[:8]
+    for n in range(enrollments):
+        student_id = uuid.uuid4()
+        class_row = classes[n % len(classes)]
+        students.append({"id": student_id, "school_id": school_id, "admission_no": f"B{prefix}{n}",
+                         "first_name": f"Student{n}", "last_name": "Bench", "status": "ACTIVE",
+                         "class_id": class_row["id"], "created_at": now, "updated_at": now})
+        for term in term_objs:
+            enrolled.append({"id": uuid.uuid4(), "school_id": school_id, "student_id": student_id,
+                             "class_id": class_row["id"], "term_id": term.id, "status": "ENROLLED",
+                             "joined_on": date.today(), "created_at": now, "updated_at": now})
+    db.execute(insert(Student.__table__), students)
+    db.execute(insert(Enrollment.__table__), enrolled)
+    db.flush()
+    return term_objs[-1].id
+
+
+def per_enrollment_generate(service: FeesService, term_id, include_optional):
+    """The per-student loop generate_invoices_for_term used before InvoiceBuilder"""
+    db = service.db
+    term_obj, year_obj = service._get_term_and_year(term_id)
+    rows = db.execute(
+        select(Enrollment, Student, Class).join(
+            Student, Student.id == Enrollment.student_id
+        ).join(
+            Class, Class.id == Enrollment.class_id
+        ).where(
+            and_(
+                Enrollment.school_id == service.school_id,
+                Enrollment.term_id == term_id,
+                Enrollment.status == "ENROLLED"
+            )
+        )
+    ).all()
+
+    created = []
+    for enrollment, student, class_obj in rows:
+        existing = db.execute(
+            select(Invoice).where(
+                and_(
+                    Invoice.school_id == service.school_id,
+                    Invoice.student_id == student.id,
+                    Invoice.term == term_obj.term,
+                    Invoice.year == year_obj.year
+                )
+            )
+        ).scalar_one_or_none()
+        if existing:
+            continue
+        structure = service._get_fee_structure_for_enrollment(
+            enrollment, class_obj, term_obj.term, year_obj.year
+        )
+        if not structure:
+            continue
+        invoice = service._create_invoice_for_enrollment(
+            enrollment=enrollment, student=student, class_obj=class_obj,
+            fee_structure=structure, term=term_obj.term, year=year_obj.year,
+            include_optional=include_optional, due_date=None
+        )
+        if invoice:
+            created.append(invoice)
+    db.flush()
+    return len(created)
+
+
+def timed(fn):
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    started = time.perf_counter()
+    try:
+        outcome = fn()
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", counter)
+    return outcome, elapsed, counter.count
+
+
+def run(enrollments: int, skip_per_enrollment: bool):
+    school_id = uuid.uuid4()
+    include_optional = {"Transport": True}
+    lines = []
+    db = SessionLocal()
+    try:
+        term_id = seed(db, school_id, enrollments)
+        service = FeesService(db, str(school_id))
+
+        if not skip_per_enrollment:
+            savepoint = db.begin_nested()
+            created, elapsed, statements = timed(
+                lambda: per_enrollment_generate(service, term_id, include_optional)
+            )
+            savepoint.rollback()
+            lines.append(f"  per-enrollment: {created:6d} invoices in {elapsed:7.2f} s, {statements:6d} statements")
+
+        savepoint = db.begin_nested()
+        result, elapsed, statements = timed(
+            lambda: service.generate_invoices_bulk(term_id, include_optional=include_optional, dry_run=True)
+        )
+        savepoint.rollback()
+        lines.append(f"  bulk dry-run:   {result.invoice_count:6d} invoices in {elapsed:7.2f} s, {statements:6d} statements"
+                     f" (total {result.total_amount:,.2f})")
+
+        result, elapsed, statements = timed(
+            lambda: service.generate_invoices_bulk(term_id, include_optional=include_optional)
+        )
+        lines.append(f"  bulk:           {result.invoice_count:6d} invoices in {elapsed:7.2f} s, {statements:6d} statements"
+                     f" ({result.line_count} lines)")
+
+        # Second pass: everyone is invoiced, so everyone is skipped
+        result, elapsed, statements = timed(
+            lambda: service.generate_invoices_bulk(term_id, include_optional=include_optional)
+        )
+        lines.append(f"  bulk re-run:    {result.invoice_count:6d} invoices in {elapsed:7.2f} s, {statements:6d} statements"
+                     f" (skipped {result.skip_counts()})")
+    finally:
+        db.rollback()
+        db.close()
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark term invoice generation")
+    parser.add_argument("--enrollments", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--skip-per-enrollment", action="store_true",
+                        help="only run the bulk engine (the per-enrollment loop is slow at 20k)")
+    args = parser.parse_args()
+
+    for enrollments in args.enrollments:
+        # Silence debug prints so timings measure the database
+        with contextlib.redirect_stdout(io.StringIO()):
+            lines = run(enrollments, args.skip_per_enrollment)
+        print(f"{enrollments} enrollments ({len(LEVELS) * STREAMS_PER_LEVEL} classes):")
+        for line in lines:
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
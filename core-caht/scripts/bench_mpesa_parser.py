@@ -0,0 +1,109 @@
+# scripts/bench_mpesa_parser.py
+"""
+Accuracy and throughput of the M-Pesa SMS parser over the SMS corpus.
+
+Each corpus line (scripts/data/mpesa_sms_corpus.jsonl) is an anonymized SMS
+and the fields the parser must extract from it; only the listed fields are
+checked. Throughput is measured by parsing the whole corpus repeatedly, the
+way a burst of forwarded SMS arrives at the inbox workers. No database is
+needed.
+
+Usage:
+    python scripts/bench_mpesa_parser.py
+    python scripts/bench_mpesa_parser.py --iterations 5000 --verbose
+
+Exits 1 when a corpus message is parsed wrongly (for CI), 0 otherwise.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.mpesa_parser import parse_sms, TEMPLATES
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mpesa_sms_corpus.jsonl")
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_accuracy(corpus: List[Dict], verbose: bool = False) -> List[Dict]:
+    """Per-message mismatches between the parser and the corpus' expected fields"""
+    mismatches = []
+    for entry in corpus:
+        info = parse_sms(entry["message"])
+        wrong = {field: {"expected": expected, "parsed": info.get(field)}
+                 for field, expected in entry["expected"].items() if info.get(field) != expected}
+        if wrong:
+            mismatches.append({"message": entry["message"], "fields": wrong})
+        elif verbose:
+            print(f"  ok  {info['format'] or info['message_type']:<18} {entry['message'][:70]}")
+    return mismatches
+
+
+def measure_throughput(corpus: List[Dict], iterations: int) -> Dict:
+    messages = [entry["message"] for entry in corpus]
+    per_format: Dict[str, List[float]] = defaultdict(list)
+    for message in messages:
+        label = parse_sms(message)["format"] or "unmatched"
+        started = time.perf_counter()
+        for _ in range(max(iterations // 10, 1)):
+            parse_sms(message)
+        per_format[label].append((time.perf_counter() - started) / max(iterations // 10, 1))
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            parse_sms(message)
+    elapsed = time.perf_counter() - started
+    parsed = iterations * len(messages)
+    return {
+        "messages": parsed,
+        "seconds": elapsed,
+        "per_second": parsed / elapsed,
+        "us_per_message": elapsed / parsed * 1e6,
+        "us_by_format": {label: sum(times) / len(times) * 1e6 for label, times in sorted(per_format.items())}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="M-Pesa SMS parser accuracy and throughput over the corpus")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--iterations", type=int, default=2000, help="Passes over the corpus for throughput")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    formats = defaultdict(int)
+    for entry in corpus:
+        formats[entry["expected"].get("format") or "unmatched"] += 1
+    print(f"Corpus: {len(corpus)} messages, templates: {', '.join(t.name for t in TEMPLATES)}")
+    print("  " + ", ".join(f"{label} {count}" for label, count in sorted(formats.items())))
+
+    mismatches = check_accuracy(corpus, args.verbose)
+    correct = len(corpus) - len(mismatches)
+    print(f"\nAccuracy: {correct}/{len(corpus)} messages parsed exactly ({correct / len(corpus):.1%})")
+    for mismatch in mismatches:
+        print(f"  WRONG {mismatch['message'][:90]}")
+        for field, values in mismatch["fields"].items():
+            print(f"        {field}: expected {values['expected']!r}, parsed {values['parsed']!r}")
+
+    throughput = measure_throughput(corpus, args.iterations)
+    print(f"\nThroughput: {throughput['per_second']:,.0f} messages/s "
+          f"({throughput['us_per_message']:.1f} us/message over {throughput['messages']:,} parses)")
+    for label, us in throughput["us_by_format"].items():
+        print(f"  {label:<12} {us:6.1f} us")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# scripts/check_query_plans.py
+"""
+Query-plan regression check for the chat handler repositories.
+
+Seeds a multi-school dataset, calls every public method of every repo in
+app/api/routers/chat/handlers/*/repo.py against one school, captures the
+SQL each call runs and EXPLAINs it. The check fails when a plan reads a
+tenant-scoped table (one with a school_id column) without an index
+condition: a Seq Scan, or an index scanned end to end and filtered by school.
+
+Plans are taken with enable_seqscan off, so a sequential scan means no index
+can serve the query at all; the verdict does not depend on table statistics
+or on how much data was seeded. Everything runs in one transaction that is
+rolled back, so the script is safe against a development database.
+
+Usage:
+    python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --schools 20 --students 500 --verbose
+
+Exits 1 when a violation is found (for CI), 0 otherwise.
+"""
+import io
+import sys
+import os
+import uuid
+import json
+import inspect
+import argparse
+import importlib
+import contextlib
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, text
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app.main  # noqa: F401 - register every mapper and session listener
+from app.core.db import SessionLocal
+from app.services.fees import get_fees_service
+from bench_invoice_generation import seed
+
+HANDLERS_DIR = Path(__file__).resolve().parent.parent / "app" / "api" / "routers" / "chat" / "handlers"
+
+# Statements worth planning; SET/set_config and the like are skipped
+PLANNED_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+# A known-unfixable plan can be allowed here as "<module>.<Repo>.<method>": "<table>", with a reason
+ALLOWED_SCANS: Dict[str, str] = {}
+
+# Statements that cannot be planned for a known reason; reported, but not failures
+KNOWN_BROKEN: Dict[str, str] = {
+    "payment.PaymentRepo.log_mpesa_transaction": "mpesa_transactions has no model or migration",
+}
+
+
+def _tenant_tables(db) -> set:
+    return {row[0] for row in db.execute(text("""
+        SELECT table_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND column_name = 'school_id'
+    """))}
+
+
+def seed_dataset(db, schools: int, students: int) -> uuid.UUID:
+    """Seed schools with terms, classes, fee structures, students, invoices and payments; returns the probe school"""
+    school_ids = [uuid.uuid4() for _ in range(schools)]
+    for school_id in school_ids:
+        term_id = seed(db, school_id, students)
+        get_fees_service(db, school_id).generate_invoices_bulk(term_id)
+    # Pay half of every invoice for half of the invoices
+    db.execute(text("""
+        INSERT INTO payments (id, school_id, invoice_id, amount, method, txn_ref, posted_at, created_at, updated_at)
+        SELECT gen_random_uuid(), i.school_id, i.id, ROUND(i.total / 2, 2), 'MPESA', 'SEED' || i.id, now(), now(), now()
+        FROM invoices i
+        WHERE i.school_id = ANY(CAST(:school_ids AS uuid[])) AND i.total > 0 AND random() < 0.5
+    """), {"school_ids": school_ids})
+    db.execute(text("ANALYZE"))
+    return school_ids[0]
+
+
+def sample_arguments(db, school_id) -> Dict:
+    """Realistic values, by parameter name, for calling repo methods against the probe school"""
+    row = db.execute(text("""
+        SELECT s.id AS student_id, s.admission_no, s.first_name, s.last_name,
+               c.id AS class_id, c.name AS class_name, c.level,
+               e.term_id, t.term, y.year
+        FROM students s
+        JOIN classes c ON c.id = s.class_id
+        JOIN enrollments e ON e.student_id = s.id
+        JOIN academic_terms t ON t.id = e.term_id
+        JOIN academic_years y ON y.id = t.year_id
+        WHERE s.school_id = :school_id
+        LIMIT 1
+    """), {"school_id": school_id}).mappings().one()
+    invoice = db.execute(text("""
+        SELECT i.id, li.item_name FROM invoices i JOIN invoiceline li ON li.invoice_id = i.id
+        WHERE i.school_id = :school_id LIMIT 1
+    """), {"school_id": school_id}).mappings().one()
+
+    return {
+        "student_id": str(row["student_id"]),
+        "student_ids": [str(row["student_id"])],
+        "admission_no": row["admission_no"],
+        "name": f"{row['first_name']} {row['last_name']}",
+        "class_id": str(row["class_id"]),
+        "class_name": row["class_name"],
+        "level": row["level"],
+        "class_level": row["level"],
+        "grade_level": row["level"],
+        "grade_label": row["level"],
+        "grade_name": row["level"],
+        "grades": [{"label": row["level"]}],
+        "term_id": str(row["term_id"]),
+        "term": row["term"],
+        "year": row["year"],
+        "current_term": {"term_number": row["term"], "year": row["year"]},
+        "invoice_id": str(invoice["id"]),
+        "item_name": invoice["item_name"],
+        "fee_item": invoice["item_name"],
+        "student_data": {"id": str(row["student_id"]), "class_id": str(row["class_id"]), "level": row["level"]},
+        "students": [{"id": str(row["student_id"]), "class_id": str(row["class_id"])}],
+        "limit": 10,
+        "amount": Decimal("100.00"),
+        "total_amount": Decimal("100.00"),
+        "due_date": date.today() + timedelta(days=30),
+        "invoice_id_new": str(uuid.uuid4()),
+        "line_id": str(uuid.uuid4()),
+        "payment_id": str(uuid.uuid4()),
+        "method": "MPESA",
+        "reference": "PLANCHECK",
+        "transaction_id": "PLANCHECK",
+        "phone_number": "254700000000",
+        "account_number": row["admission_no"],
+        "status": "SUCCESS",
+        "error_message": None,
+    }
+
+
+def repo_classes():
+    """(module name, class) for every *Repo class under handlers/*/repo.py"""
+    for path in sorted(HANDLERS_DIR.glob("*/repo.py")):
+        module_name = f"app.api.routers.chat.handlers.{path.parent.name}.repo"
+        module = importlib.import_module(module_name)
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if name.endswith("Repo") and cls.__module__ == module_name:
+                yield path.parent.name, cls
+
+
+def scans_without_index(plan: Dict, tenant_tables: set) -> List[str]:
+    """Tenant tables the plan reads without an index condition"""
+    found = []
+    node_type = plan.get("Node Type", "")
+    table = plan.get("Relation Name")
+    if table in tenant_tables:
+        if node_type == "Seq Scan":
+            found.append(f"{table} (Seq Scan)")
+        elif (node_type in ("Index Scan", "Index Only Scan") and not plan.get("Index Cond")
+              and "school_id" in plan.get("Filter", "")):
+            # Walking a whole index only to filter it by school (joins that
+            # read an index end to end are an artifact of enable_seqscan off)
+            found.append(f"{table} (full scan of {plan.get('Index Name')})")
+    for child in plan.get("Plans", []):
+        found.extend(scans_without_index(child, tenant_tables))
+    return found
+
+
+def check(db, school_id, verbose: bool = False) -> int:
+    tenant_tables = _tenant_tables(db)
+    arguments = sample_arguments(db, school_id)
+    connection = db.connection()
+    captured: List = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(PLANNED_PREFIXES) and not statement.lstrip().upper().startswith("EXPLAIN"):
+            captured.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    violations, failures, planned, skipped = [], [], 0, []
+    try:
+        for handler, cls in repo_classes():
+            for method_name, method in inspect.getmembers(cls, inspect.isfunction):
+                if method_name.startswith("_"):
+                    continue
+                label = f"{handler}.{cls.__name__}.{method_name}"
+                params = list(inspect.signature(method).parameters.values())[1:]
+                call_args = {}
+                for param in params:
+                    key = "invoice_id_new" if (method_name == "create_invoice" and param.name == "invoice_id") else param.name
+                    if key in arguments:
+                        call_args[param.name] = arguments[key]
+                    elif param.default is inspect.Parameter.empty:
+                        break
+                else:
+                    captured.clear()
+                    savepoint = db.begin_nested()
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            getattr(cls(db, str(school_id)), method_name)(**call_args)
+                    except Exception as e:
+                        if verbose:
+                            print(f"  {label}: call failed ({str(e).splitlines()[0]}); planning what it ran")
+                    statements = list(captured)
+                    captured.clear()
+                    savepoint.rollback()
+
+                    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+                    for statement, statement_params in statements:
+                        connection.exec_driver_sql("SAVEPOINT plan_check")
+                        try:
+                            plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", statement_params).scalar()
+                            plan = json.loads(plan) if isinstance(plan, str) else plan
+                            planned += 1
+                            for scan in scans_without_index(plan[0]["Plan"], tenant_tables):
+                                if ALLOWED_SCANS.get(label) == scan.split(" ")[0]:
+                                    continue
+                                violations.append((label, scan, " ".join(statement.split())[:160]))
+                            if verbose:
+                                print(f"  {label}: planned")
+                        except Exception as e:
+                            failures.append((label, str(getattr(e, "orig", e)).splitlines()[0]))
+                        connection.exec_driver_sql("ROLLBACK TO SAVEPOINT plan_check")
+                    connection.exec_driver_sql("SET LOCAL enable_seqscan = on")
+                    continue
+                skipped.append(label)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    print(f"Planned {planned} statements from handler repos; {len(skipped)} methods skipped (no sample arguments)")
+    for label in skipped:
+        print(f"  skipped {label}")
+    for label, error in failures:
+        known = f" (known: {KNOWN_BROKEN[label]})" if label in KNOWN_BROKEN else ""
+        print(f"  EXPLAIN failed for {label}: {error}{known}")
+    failures = [failure for failure in failures if failure[0] not in KNOWN_BROKEN]
+    if violations:
+        print(f"\n{len(violations)} plan(s) read a tenant table without an index:")
+        for label, scan, statement in violations:
+            print(f"  {label}: {scan}\n      {statement}")
+    if violations or failures:
+        return 1
+    print("No unindexed scans of tenant tables")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN every handler repo query and fail on unindexed tenant scans")
+    parser.add_argument("--schools", type=int, default=20, help="Schools to seed")
+    parser.add_argument("--students", type=int, default=500, help="Students per school")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        school_id = seed_dataset(db, args.schools, args.students)
+        status = check(db, school_id, verbose=args.verbose)
+    finally:
+        db.rollback()
+        db.close()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
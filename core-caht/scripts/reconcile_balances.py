@@ -0,0 +1,57 @@
+# scripts/reconcile_balances.py
+"""
+Reconcile materialized fee balances (invoices.amount_paid, student_balances)
+against the payments table for every school, e.g. nightly from cron.
+
+By default one balance_reconcile background job is queued per school (a
+school that already has one queued or running is skipped); --inline runs the
+reconciliation here instead and prints what had drifted.
+
+Usage:
+    python scripts/reconcile_balances.py
+    python scripts/reconcile_balances.py --inline
+    python scripts/reconcile_balances.py --school <school_id> --inline
+"""
+import io
+import sys
+import os
+import argparse
+import contextlib
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app.models  # noqa: F401 - register every mapper before the first query
+    import app.models.password_reset  # noqa: F401
+from app.core.db import SessionLocal, set_rls_context
+from app.services.balance_ledger import get_balance_ledger
+from app.services.jobs import enqueue_job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile fee balances against payments")
+    parser.add_argument("--school", action="append", help="Only this school (repeatable)")
+    parser.add_argument("--inline", action="store_true", help="Reconcile now instead of queueing jobs")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        school_ids = args.school or [str(row[0]) for row in db.execute(text("SELECT id FROM schools ORDER BY id"))]
+
+    for school_id in school_ids:
+        if not args.inline:
+            job = enqueue_job("balance_reconcile", school_id, None, idempotency_key="balance_reconcile")
+            print(f"{school_id}: job {job['id']} ({job['status']})")
+            continue
+
+        with SessionLocal() as db:
+            set_rls_context(db, school_id=school_id)
+            result = get_balance_ledger(db, school_id).reconcile()
+            db.commit()
+        print(f"{school_id}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# scripts/run_job_worker.py
+"""
+Run background job workers as separate processes.
+
+Each process claims jobs from the background_jobs table (FOR UPDATE SKIP
+LOCKED), so processes can run on any number of machines next to the API.
+Set JOB_EMBEDDED_WORKERS=0 on the API when all jobs should run here.
+
+--queue sms_inbox runs SMS inbox workers instead, which post the M-Pesa
+payments queued by the SMS webhook (SMS_INBOX_EMBEDDED_WORKERS=0 on the API
+moves them all here).
+
+--queue notifications runs notification dispatchers, which send the guardian
+emails and WhatsApp messages in the notification outbox
+(NOTIFY_EMAIL_EMBEDDED_WORKERS=0 and NOTIFY_WHATSAPP_EMBEDDED_WORKERS=0 on
+the API moves them all here).
+
+Usage:
+    python scripts/run_job_worker.py                 # one process per CPU core
+    python scripts/run_job_worker.py --processes 4
+    python scripts/run_job_worker.py --queue sms_inbox --processes 2
+    python scripts/run_job_worker.py --queue notifications --processes 2
+"""
+import io
+import sys
+import os
+import signal
+import socket
+import argparse
+import threading
+import contextlib
+import multiprocessing
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def worker_main(index: int, queue: str = "jobs"):
+    # Register every mapper before the first query; silence import-time banners
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app.models  # noqa: F401
+        import app.models.password_reset  # noqa: F401
+    from app.services.jobs import load_job_handlers, new_job_worker
+    from app.services.sms_inbox import new_sms_inbox_worker
+    from app.services.notification_dispatcher import new_notification_dispatcher
+    # Job writes drop dashboard snapshots (shared with the API when DASHBOARD_SNAPSHOT_REDIS_URL is set)
+    import app.services.dashboard_snapshot  # noqa: F401
+
+    load_job_handlers()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    factory = {
+        "sms_inbox": new_sms_inbox_worker,
+        "notifications": new_notification_dispatcher
+    }.get(queue, new_job_worker)
+    worker = factory(f"{socket.gethostname()}:{os.getpid()}:{queue}-worker-{index}")
+    print(f"{queue} worker {worker.name} started")
+    worker.run_forever(stop)
+    print(f"{queue} worker {worker.name} stopped: {worker.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job worker processes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queue", choices=["jobs", "sms_inbox", "notifications"], default="jobs",
+                        help="background_jobs, the SMS inbox or the notification outbox")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        worker_main(0, args.queue)
+        return
+
+    processes = [multiprocessing.Process(target=worker_main, args=(i, args.queue), daemon=False)
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, _frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
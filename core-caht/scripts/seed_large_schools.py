@@ -0,0 +1,179 @@
+# scripts/seed_large_schools.py
+"""
+Synthetic large-school data generator.
+
+Creates schools, each with an admin user and membership, a year of terms
+(the last ACTIVE), classes across CBC levels (a number of streams per
+level), published fee structures, students enrolled in every term, each
+term's invoices and payments against a share of them, with materialized
+balances reconciled. Generated schools are named "Synthetic School <n>" and their
+users use @synthetic.invalid addresses, so --drop can find and remove them
+(and any chat history or routing logs written against them) later.
+
+Unlike the other benchmark seeds this one commits: the chat throughput
+benchmark replays traffic from separate worker processes.
+
+Usage:
+    python scripts/seed_large_schools.py --schools 5 --students 2000 --terms 3
+    python scripts/seed_large_schools.py --drop
+"""
+import io
+import sys
+import os
+import time
+import uuid
+import argparse
+import contextlib
+from datetime import date, datetime
+from typing import Dict, List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app.models  # noqa: F401 - register every mapper before the first query
+    import app.models.password_reset  # noqa: F401
+from app.core.db import SessionLocal, set_rls_context
+from app.models.school import School, SchoolMember
+from app.models.user import User
+from app.services.balance_ledger import get_balance_ledger
+from app.services.fees import get_fees_service
+from bench_invoice_generation import seed, STREAMS_PER_LEVEL
+
+SCHOOL_NAME_PREFIX = "Synthetic School"
+USER_EMAIL_DOMAIN = "synthetic.invalid"
+
+
+def generate_school(db, index: int, students: int, streams: int = STREAMS_PER_LEVEL,
+                    terms: int = 1, paid_share: float = 0.5) -> Dict:
+    """Seed one school end to end; returns its ids. Does not commit."""
+    school_id, user_id = uuid.uuid4(), uuid.uuid4()
+    now = datetime.utcnow()
+
+    db.add(User(id=user_id, email=f"admin-{school_id.hex[:12]}@{USER_EMAIL_DOMAIN}",
+                full_name=f"Synthetic Admin {index}", password_hash="!", roles_csv="ADMIN",
+                is_active=True, is_verified=True, created_at=now, updated_at=now))
+    db.flush()
+    db.add(School(id=school_id, name=f"{SCHOOL_NAME_PREFIX} {index}", currency="KES",
+                  academic_year_start=date(2031, 1, 1), created_by=user_id,
+                  created_at=now, updated_at=now))
+    db.flush()
+    db.add(SchoolMember(school_id=school_id, user_id=user_id, role="OWNER", created_at=now, updated_at=now))
+    db.flush()
+
+    set_rls_context(db, user_id=user_id, school_id=school_id)
+    active_term_id = seed(db, school_id, students, streams=streams, terms=terms)
+
+    fees = get_fees_service(db, str(school_id))
+    term_ids = [row[0] for row in db.execute(
+        text("SELECT id FROM academic_terms WHERE school_id = :school_id ORDER BY term"),
+        {"school_id": school_id}
+    )]
+    for term_id in term_ids:
+        fees.generate_invoices_bulk(term_id)
+
+    # A share of invoices is paid: half of those in full, the rest in part
+    db.execute(text("""
+        INSERT INTO payments (id, school_id, invoice_id, amount, method, txn_ref, posted_at, created_at, updated_at)
+        SELECT gen_random_uuid(), i.school_id, i.id,
+               CASE WHEN random() < 0.5 THEN i.total ELSE ROUND(i.total * CAST(0.2 + random() * 0.6 AS numeric), 2) END,
+               'MPESA', 'SYN' || substr(md5(i.id::text), 1, 10), now(), now(), now()
+        FROM invoices i
+        WHERE i.school_id = :school_id AND i.total > 0 AND random() < :paid_share
+    """), {"school_id": school_id, "paid_share": paid_share})
+    get_balance_ledger(db, str(school_id)).reconcile()
+
+    return {"school_id": str(school_id), "user_id": str(user_id), "term_id": str(active_term_id)}
+
+
+def seed_schools(schools: int, students: int, streams: int = STREAMS_PER_LEVEL,
+                 terms: int = 1, paid_share: float = 0.5) -> List[Dict]:
+    """Generate and commit `schools` schools, one transaction each"""
+    created = []
+    with SessionLocal() as db:
+        start = db.execute(
+            text("SELECT COUNT(*) FROM schools WHERE name LIKE :prefix"),
+            {"prefix": f"{SCHOOL_NAME_PREFIX} %"}
+        ).scalar()
+    for index in range(start + 1, start + schools + 1):
+        with SessionLocal() as db:
+            with contextlib.redirect_stdout(io.StringIO()):
+                school = generate_school(db, index, students, streams, terms, paid_share)
+            db.commit()
+        created.append(school)
+    return created
+
+
+def generated_schools(db) -> List[Dict]:
+    """Previously generated schools with their admin user"""
+    rows = db.execute(text("""
+        SELECT s.id, sm.user_id,
+               (SELECT t.id FROM academic_terms t WHERE t.school_id = s.id AND t.state = 'ACTIVE' LIMIT 1)
+        FROM schools s
+        JOIN schoolmember sm ON sm.school_id = s.id AND sm.role = 'OWNER'
+        WHERE s.name LIKE :prefix
+        ORDER BY s.name
+    """), {"prefix": f"{SCHOOL_NAME_PREFIX} %"}).all()
+    return [{"school_id": str(row[0]), "user_id": str(row[1]), "term_id": str(row[2])} for row in rows]
+
+
+def drop_generated_schools() -> int:
+    """Delete every generated school, its users and all rows referencing them; returns schools removed"""
+    with SessionLocal() as db:
+        school_ids = [row[0] for row in db.execute(
+            text("SELECT id FROM schools WHERE name LIKE :prefix"), {"prefix": f"{SCHOOL_NAME_PREFIX} %"}
+        )]
+        tables = [row[0] for row in db.execute(text("""
+            SELECT table_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND column_name = 'school_id'
+        """))]
+
+        # Foreign keys between tenant tables decide the order; retry a table
+        # after the tables referencing it have been emptied
+        remaining = set(tables)
+        while remaining:
+            progressed = False
+            for table in sorted(remaining):
+                savepoint = db.begin_nested()
+                try:
+                    db.execute(text(f"DELETE FROM {table} WHERE CAST(school_id AS text) = ANY(:school_ids)"),
+                               {"school_ids": [str(school_id) for school_id in school_ids]})
+                    savepoint.commit()
+                    remaining.discard(table)
+                    progressed = True
+                except Exception:
+                    savepoint.rollback()
+            if not progressed:
+                raise RuntimeError(f"Could not delete generated rows from: {', '.join(sorted(remaining))}")
+
+        db.execute(text("DELETE FROM schools WHERE id = ANY(:school_ids)"), {"school_ids": school_ids})
+        db.execute(text("DELETE FROM users WHERE email LIKE :domain"), {"domain": f"%@{USER_EMAIL_DOMAIN}"})
+        db.commit()
+    return len(school_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate (or drop) synthetic large schools")
+    parser.add_argument("--schools", type=int, default=5)
+    parser.add_argument("--students", type=int, default=2000, help="Students per school")
+    parser.add_argument("--streams", type=int, default=STREAMS_PER_LEVEL, help="Classes per CBC level")
+    parser.add_argument("--terms", type=int, default=3, help="Terms per school; the last is active")
+    parser.add_argument("--paid-share", type=float, default=0.5, help="Share of invoices with a payment")
+    parser.add_argument("--drop", action="store_true", help="Remove all generated schools instead")
+    args = parser.parse_args()
+
+    if args.drop:
+        print(f"Dropped {drop_generated_schools()} generated schools")
+        return
+
+    started = time.perf_counter()
+    for school in seed_schools(args.schools, args.students, args.streams, args.terms, args.paid_share):
+        print(f"school {school['school_id']}  admin {school['user_id']}  active term {school['term_id']}")
+    print(f"Generated {args.schools} schools x {args.students} students in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 # webhook_app.py - Completely separate FastAPI app for webhooks
 
 import logging
-import re
 from typing import Dict, Any, Optional
 from datetime import datetime
 from fastapi import FastAPI, BackgroundTasks
@@ -11,6 +10,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
+from app.services.mpesa_parser import parse_sms
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -34,62 +35,20 @@ def get_db():
         db.close()
 
 def parse_mpesa_sms(message: str) -> Optional[Dict[str, Any]]:
-    """Parse M-Pesa SMS message to extract payment details"""
+    """Parse M-Pesa SMS message to extract payment details (shared parser in app/services/mpesa_parser.py)"""
     try:
-        logger.info(f"Parsing SMS: {message}")
+        info = parse_sms(message)
         
-        # Check if this looks like an M-Pesa message
-        if not any(keyword in message.lower() for keyword in ['ksh', 'm-pesa', 'mpesa', 'ref', 'received']):
+        # Only the payment layouts; balance, airtime and transfer-out SMS carry amounts too
+        if info["format"] is None or info["amount"] is None:
             logger.info("SMS doesn't appear to be M-Pesa payment")
             return None
         
-        # Extract amount
-        amount_match = re.search(r'ksh\s*([0-9,]+(?:\.[0-9]{2})?)', message, re.IGNORECASE)
-        if not amount_match:
-            logger.warning("Could not extract amount from SMS")
-            return None
-        
-        amount_str = amount_match.group(1).replace(',', '')
-        try:
-            amount = float(amount_str)
-        except ValueError:
-            logger.error(f"Invalid amount format: {amount_str}")
-            return None
-        
-        # Extract M-Pesa reference
-        ref_patterns = [
-            r'ref[:\s]+([A-Z0-9]+)',
-            r'm-pesa\s+ref[:\s]+([A-Z0-9]+)',
-            r'transaction[:\s]+([A-Z0-9]+)'
-        ]
-        
-        transaction_id = None
-        for pattern in ref_patterns:
-            ref_match = re.search(pattern, message, re.IGNORECASE)
-            if ref_match:
-                transaction_id = ref_match.group(1)
-                break
-        
-        if not transaction_id:
-            transaction_id = f"SMS_{int(datetime.now().timestamp())}"
-        
-        # Extract account/student info
-        account_patterns = [
-            r'account[:\s]+([A-Z0-9]+)',
-            r'to\s+([A-Z0-9\s]+)\s+account',
-        ]
-        
-        account_number = None
-        for pattern in account_patterns:
-            account_match = re.search(pattern, message, re.IGNORECASE)
-            if account_match:
-                account_number = account_match.group(1).strip()
-                break
-        
         payment_data = {
-            "amount": amount,
-            "transaction_id": transaction_id,
-            "account_number": account_number,
+            "amount": info["amount"],
+            "transaction_id": info["reference"] or f"SMS_{int(datetime.now().timestamp())}",
+            "account_number": info["student_id"] or info["account_number"],
+            "format": info["format"],
             "raw_message": message
         }
         
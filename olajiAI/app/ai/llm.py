@@ -1,13 +1,61 @@
 # app/ai/llm.py
 import os
+import json
+import asyncio
+import hashlib
 import httpx
 from typing import List, Dict, Optional
 
+from app.core.config import settings
+from app.core.logging import log
+
+
+class LLMSaturatedError(Exception):
+    """All model slots are busy and the wait queue is full"""
+
+
 class OllamaClient:
-    def __init__(self, base_url: Optional[str] = None, model: Optional[str] = None, timeout: float = 30.0):
+    """
+    Keep-alive Ollama client shared by the whole process.
+
+    Requests are bounded by a semaphore sized to the model server's parallelism
+    (OLLAMA_NUM_PARALLEL), callers beyond OLLAMA_MAX_QUEUE waiters are rejected,
+    and identical in-flight chat payloads are coalesced into one HTTP call.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, model: Optional[str] = None, timeout: Optional[float] = None):
         self.base = (base_url or os.getenv("OLLAMA_BASE_URL") or "http://localhost:11434").rstrip("/")
         self.model = model or os.getenv("OLLAMA_MODEL") or "llama3.2:latest"
-        self.client = httpx.AsyncClient(base_url=self.base, timeout=timeout)
+        self.timeout = timeout or settings.OLLAMA_MODEL_TIMEOUTS.get(self.model, settings.OLLAMA_TIMEOUT)
+        self.max_parallel = settings.OLLAMA_NUM_PARALLEL
+        self.max_queue = settings.OLLAMA_MAX_QUEUE
+        self.client = httpx.AsyncClient(
+            base_url=self.base,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_parallel * 2,
+                max_keepalive_connections=self.max_parallel,
+                keepalive_expiry=60,
+            ),
+        )
+        self._slots = asyncio.Semaphore(self.max_parallel)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Callers still awaiting each in-flight task
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._active = 0
+        self._waiting = 0
+
+    def is_saturated(self) -> bool:
+        return self._active >= self.max_parallel
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "inflight_keys": len(self._inflight),
+            "max_parallel": self.max_parallel,
+            "max_queue": self.max_queue,
+        }
 
     async def generate(self, system_prompt: str, messages: List[Dict[str, str]]) -> str:
         """
@@ -22,14 +70,66 @@ class OllamaClient:
             msgs.append({"role": "system", "content": system_prompt})
         msgs.extend(messages)
 
-        r = await self.client.post("/api/chat", json={
+        payload = {
             "model": self.model,
             "messages": msgs,
             "stream": False
-        })
-        r.raise_for_status()
-        data = r.json()
+        }
+        key = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._post_chat(payload))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            log.info("llm_request_coalesced", model=self.model)
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shielded so a cancelled caller does not cancel the shared request
+            data = await asyncio.shield(task)
+        finally:
+            remaining = self._waiters.get(task, 1) - 1
+            if remaining > 0:
+                self._waiters[task] = remaining
+            else:
+                self._waiters.pop(task, None)
+                if not task.done():
+                    # The last caller gave up: abort the request and free its slot
+                    task.cancel()
         return data.get("message", {}).get("content", "")
 
+    async def _post_chat(self, payload: Dict) -> Dict:
+        if self._active >= self.max_parallel and self._waiting >= self.max_queue:
+            log.warning("llm_queue_saturated", active=self._active, waiting=self._waiting)
+            raise LLMSaturatedError("Ollama queue full")
+
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        try:
+            r = await self.client.post("/api/chat", json=payload)
+            r.raise_for_status()
+            return r.json()
+        finally:
+            self._active -= 1
+            self._slots.release()
+
     async def aclose(self):
-        await self.client.aclose()
\ No newline at end of file
+        await self.client.aclose()
+
+
+_client: Optional[OllamaClient] = None
+
+
+def get_ollama_client() -> OllamaClient:
+    """Process-wide client so every orchestrator shares one connection pool"""
+    global _client
+    if _client is None:
+        _client = OllamaClient()
+    return _client
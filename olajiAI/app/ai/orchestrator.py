@@ -2,7 +2,7 @@
 
 from typing import Dict, Any, List
 from app.ai.intents import detect_intent, extract_slots, missing_slots
-from app.ai.llm import OllamaClient
+from app.ai.llm import get_ollama_client
 from app.ai import prompt_templates as T
 from app.state.memory import get_state, set_state, clear_state
 from app.core.http import CoreHTTP
@@ -18,7 +18,7 @@ from app.ai.tools import fee_operations as tool_fee_ops
 
 class Orchestrator:
     def __init__(self):
-        self.llm = OllamaClient()
+        self.llm = get_ollama_client()
         self.http = CoreHTTP()
 
     async def run_chat_turn(
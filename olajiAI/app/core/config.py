@@ -6,6 +6,10 @@ class Settings(BaseSettings):
     ENV: str = "dev"
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "llama3.2:latest"
+    OLLAMA_TIMEOUT: float = 30
+    OLLAMA_MODEL_TIMEOUTS: dict[str, float] = {}
+    OLLAMA_NUM_PARALLEL: int = 4
+    OLLAMA_MAX_QUEUE: int = 16
     CORE_API_BASE: str = "http://localhost:8000"
     SERVICE_TOKEN: str = "change_me"
     JWT_AUDIENCE: str = "schoolops"
@@ -31,6 +31,11 @@ async def add_trace(request: Request, call_next):
     response.headers["X-Trace-Id"] = trace_id
     return response
 
+@app.on_event("shutdown")
+async def close_llm_client():
+    from app.ai.llm import get_ollama_client
+    await get_ollama_client().aclose()
+
 @app.get("/healthz")
 async def healthz():
     return {"ok": True}
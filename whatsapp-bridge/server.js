@@ -345,6 +345,70 @@ app.post('/send', extractToken, async (req, res) => {
   }
 });
 
+// Send several messages in one request (sent one after another; results in request order)
+const MAX_BATCH_SIZE = parseInt(process.env.MAX_BATCH_SIZE || '50', 10);
+
+app.post('/send-batch', extractToken, async (req, res) => {
+  const token = req.instanceToken;
+  const { client, state } = getClientAndState(token);
+
+  if (!client || !state || !state.isReady) {
+    return res.status(503).json({
+      success: false,
+      error: 'WhatsApp client not ready',
+      token: token
+    });
+  }
+
+  const { messages } = req.body;
+
+  if (!Array.isArray(messages) || messages.length === 0) {
+    return res.status(400).json({
+      success: false,
+      error: 'A non-empty messages array is required'
+    });
+  }
+
+  if (messages.length > MAX_BATCH_SIZE) {
+    return res.status(400).json({
+      success: false,
+      error: `At most ${MAX_BATCH_SIZE} messages per batch`
+    });
+  }
+
+  const results = [];
+  for (const { number, message } of messages) {
+    if (!number || !message) {
+      results.push({ number: number || null, success: false, error: 'Number and message are required' });
+      continue;
+    }
+
+    const formattedNumber = number.includes('@') ? number : `${number}@c.us`;
+    try {
+      const sentMessage = await client.sendMessage(formattedNumber, message);
+      results.push({
+        number: number,
+        success: true,
+        messageId: sentMessage.id._serialized,
+        timestamp: sentMessage.timestamp
+      });
+    } catch (error) {
+      console.error(`Error sending batch message for ${token} to ${formattedNumber}:`, error);
+      results.push({ number: number, success: false, error: error.message });
+    }
+  }
+
+  const sent = results.filter(result => result.success).length;
+  console.log(`[${token}] Batch sent ${sent}/${messages.length} messages`);
+
+  res.json({
+    success: sent === messages.length,
+    sent: sent,
+    results: results,
+    token: token
+  });
+});
+
 // Get client info
 app.get('/info', extractToken, async (req, res) => {
   const token = req.instanceToken;